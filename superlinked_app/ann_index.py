@@ -0,0 +1,739 @@
+import math
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Literal, Protocol, Sequence
+
+import numpy as np
+from loguru import logger
+from superlinked.framework.common.storage.entity.entity_data import EntityData
+from superlinked.framework.common.storage.field.field import Field
+from superlinked.framework.common.storage.query.vdb_knn_search_params import VDBKNNSearchParams
+from superlinked.framework.common.storage.result_entity_data import ResultEntityData
+from superlinked.framework.common.storage.search import Search
+from superlinked.framework.dsl.storage.vector_database import VectorDatabase
+from superlinked.framework.storage.common.vdb_settings import VDBSettings
+from superlinked.framework.storage.in_memory.in_memory_search import UNLIMITED_SEARCH_RESULTS
+from superlinked.framework.storage.in_memory.in_memory_vdb import InMemoryVDB
+from superlinked.framework.storage.in_memory.object_serializer import ObjectSerializer
+
+from superlinked_app.filter_index import FilterIndex
+from superlinked_app.instrumentation import span
+from superlinked_app.lexical_search import LexicalIndex, current_lexical_query, lexical_field_weights
+from superlinked_app.micro_batching import get_scheduler
+from superlinked_app.neighbor_table import NO_NEIGHBOR, NeighborTable, vector_keys
+from superlinked_app.product_store import OBJECT_ID_FIELD, ProductStore
+from superlinked_app.snapshot import Snapshot, fingerprint, index_fingerprint
+
+IndexType = Literal["exact", "ivf"]
+
+
+class VectorIndex(Protocol):
+    """Inner-product nearest-neighbour index over the rows of a matrix."""
+
+    @property
+    def nbytes(self) -> int: ...
+
+    def build(self, vectors: np.ndarray) -> None: ...
+
+    def search(self, query: np.ndarray, k: int, allowed: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Return the positions and scores of the best `k` rows, best first.
+
+        `allowed` is a boolean mask of the rows that pass the filters; other rows
+        are never returned.
+        """
+        ...
+
+    def search_batch(
+        self, queries: np.ndarray, ks: Sequence[int], allowed: Sequence[np.ndarray | None]
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        """`search` for every row of `queries`, with its own `k` and filter mask."""
+        ...
+
+    def score(self, query: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """Scores of the rows at `positions`."""
+        ...
+
+    def state(self) -> dict[str, np.ndarray]:
+        """Arrays of the built index for a snapshot, empty when rebuilding it costs no more than reading them."""
+        ...
+
+    def load_state(self, state: dict[str, np.ndarray]) -> bool:
+        """Restore the index from `state`, False if it was built with other params and must be rebuilt."""
+        ...
+
+
+def _top_k(scores: np.ndarray, positions: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    if k < len(scores):
+        best = np.argpartition(-scores, k - 1)[:k]
+        scores, positions = scores[best], positions[best]
+    order = np.argsort(-scores, kind="stable")
+
+    return positions[order], scores[order]
+
+
+class BruteForceIndex:
+    """Exact search, scanning every allowed row."""
+
+    def __init__(self) -> None:
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        return self._vectors.nbytes
+
+    def build(self, vectors: np.ndarray) -> None:
+        self._vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def search(self, query: np.ndarray, k: int, allowed: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        if allowed is None:
+            return _top_k(self._vectors @ query, np.arange(len(self._vectors)), k)
+
+        positions = np.flatnonzero(allowed)
+        return _top_k(self._vectors[positions] @ query, positions, k)
+
+    def search_batch(
+        self, queries: np.ndarray, ks: Sequence[int], allowed: Sequence[np.ndarray | None]
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        # One matrix multiply scores every query, reading the vectors once instead of once per query.
+        scores = np.atleast_2d(np.asarray(queries, dtype=np.float32)) @ self._vectors.T
+        all_positions = np.arange(len(self._vectors))
+        results = []
+        for query_scores, k, query_allowed in zip(scores, ks, allowed):
+            if query_allowed is None:
+                results.append(_top_k(query_scores, all_positions, k))
+            else:
+                positions = np.flatnonzero(query_allowed)
+                results.append(_top_k(query_scores[positions], positions, k))
+
+        return results
+
+    def score(self, query: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        return self._vectors[positions] @ query
+
+    def state(self) -> dict[str, np.ndarray]:
+        # Building is a copy of the stored vectors at most, none for a snapshot's store.
+        return {}
+
+    def load_state(self, state: dict[str, np.ndarray]) -> bool:
+        return False
+
+
+class IVFFlatIndex:
+    """Inverted-file index: rows are clustered with k-means and a query only scans
+    the rows of the `num_probes` clusters whose centroids score best.
+
+    Rows are stored grouped by cluster so every probed list is a contiguous
+    block. When the filters leave few rows, at most `exact_fraction` of the
+    index, those rows are scanned exactly instead. If the probed lists hold
+    fewer than `k` allowed rows, more lists are probed.
+
+    Args:
+        num_lists: Number of clusters, 2 * sqrt(rows) when None.
+        num_probes: Clusters scanned per query, trading recall for latency.
+        exact_fraction: Largest share of allowed rows that is scanned exactly.
+        max_iterations: k-means iterations.
+        train_rows_per_list: Sampled rows per cluster used to train k-means.
+        seed: Seed of the k-means initialization.
+    """
+
+    def __init__(
+        self,
+        num_lists: int | None = None,
+        num_probes: int = 8,
+        exact_fraction: float = 0.05,
+        max_iterations: int = 10,
+        train_rows_per_list: int = 32,
+        seed: int = 6,
+    ) -> None:
+        self.num_lists = num_lists
+        self.num_probes = num_probes
+        self.exact_fraction = exact_fraction
+        self.max_iterations = max_iterations
+        self.train_rows_per_list = train_rows_per_list
+        self.seed = seed
+
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._positions = np.empty(0, dtype=np.int64)
+        self._slots = np.empty(0, dtype=np.int64)
+        self._centroids = np.empty((0, 0), dtype=np.float32)
+        self._offsets = np.zeros(1, dtype=np.int64)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self._vectors.nbytes
+            + self._positions.nbytes
+            + self._slots.nbytes
+            + self._centroids.nbytes
+            + self._offsets.nbytes
+        )
+
+    def build(self, vectors: np.ndarray) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        num_rows = len(vectors)
+        if not num_rows:
+            # No rows to cluster, every list is empty.
+            self._vectors = np.ascontiguousarray(vectors)
+            self._positions = np.empty(0, dtype=np.int64)
+            self._slots = np.empty(0, dtype=np.int64)
+            self._centroids = np.empty((0, vectors.shape[1] if vectors.ndim == 2 else 0), dtype=np.float32)
+            self._offsets = np.zeros(1, dtype=np.int64)
+            return
+        num_lists = min(self.num_lists or max(1, int(2 * math.sqrt(num_rows))), max(num_rows, 1))
+
+        # k-means is trained on a sample, which is plenty to place the centroids.
+        rng = np.random.default_rng(self.seed)
+        sample = vectors[rng.choice(num_rows, size=min(num_rows, self.train_rows_per_list * num_lists), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=num_lists, replace=False)]
+        for _ in range(self.max_iterations):
+            assignments = self._assign(sample, centroids)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=num_lists)
+            non_empty = counts > 0
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty]
+            centroids[non_empty] = np.add.reduceat(sample[order], starts, axis=0) / counts[non_empty, None]
+
+        assignments = self._assign(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        self._vectors = np.ascontiguousarray(vectors[order])
+        self._positions = order
+        self._slots = np.empty_like(order)
+        self._slots[order] = np.arange(num_rows)
+        self._centroids = centroids
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=num_lists))))
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 16_384) -> np.ndarray:
+        # argmin ||x - c||^2 == argmax x.c - ||c||^2 / 2, computed in blocks to bound memory.
+        half_norms = (centroids**2).sum(axis=1) / 2
+        return np.concatenate(
+            [
+                np.argmax(vectors[start : start + block_size] @ centroids.T - half_norms, axis=1)
+                for start in range(0, len(vectors), block_size)
+            ]
+            or [np.empty(0, dtype=np.int64)]
+        )
+
+    def search(self, query: np.ndarray, k: int, allowed: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        num_rows = len(self._positions)
+        if allowed is not None:
+            num_allowed = int(allowed.sum())
+            if num_allowed <= max(k, self.exact_fraction * num_rows):
+                positions = np.flatnonzero(allowed)
+                return _top_k(self._vectors[self._slots[positions]] @ query, positions, k)
+            k = min(k, num_allowed)
+        k = min(k, num_rows)
+
+        list_order = np.argsort(-(self._centroids @ query))
+        blocks: list[np.ndarray] = []
+        found = 0
+        for probed, list_id in enumerate(list_order):
+            if probed >= self.num_probes and found >= k:
+                break
+            block = np.arange(self._offsets[list_id], self._offsets[list_id + 1])
+            if allowed is not None:
+                block = block[allowed[self._positions[block]]]
+            blocks.append(block)
+            found += len(block)
+
+        candidates = np.concatenate(blocks) if blocks else np.empty(0, dtype=np.int64)
+        slots, scores = _top_k(self._vectors[candidates] @ query, candidates, k)
+
+        return self._positions[slots], scores
+
+    def search_batch(
+        self, queries: np.ndarray, ks: Sequence[int], allowed: Sequence[np.ndarray | None]
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        # Every query probes its own lists, so there is no shared matrix to score.
+        return [self.search(query, k, query_allowed) for query, k, query_allowed in zip(queries, ks, allowed)]
+
+    def score(self, query: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        return self._vectors[self._slots[positions]] @ query
+
+    def _build_params(self) -> np.ndarray:
+        return np.array([self.num_lists or 0, self.max_iterations, self.train_rows_per_list, self.seed], dtype=np.int64)
+
+    def state(self) -> dict[str, np.ndarray]:
+        return {
+            "vectors": self._vectors,
+            "positions": self._positions,
+            "slots": self._slots,
+            "centroids": self._centroids,
+            "offsets": self._offsets,
+            "build_params": self._build_params(),
+        }
+
+    def load_state(self, state: dict[str, np.ndarray]) -> bool:
+        if not np.array_equal(state["build_params"], self._build_params()):
+            return False
+        self._vectors, self._positions, self._slots = state["vectors"], state["positions"], state["slots"]
+        self._centroids, self._offsets = state["centroids"], state["offsets"]
+        return True
+
+
+def create_index(index_type: IndexType, num_lists: int | None = None, num_probes: int = 8) -> VectorIndex:
+    if index_type == "ivf":
+        return IVFFlatIndex(num_lists=num_lists, num_probes=num_probes)
+    if index_type == "exact":
+        return BruteForceIndex()
+
+    raise ValueError(f"Unknown index type '{index_type}', expected 'exact' or 'ivf'.")
+
+
+def _search_batch(
+    searches: list[tuple[VectorIndex, np.ndarray, int, np.ndarray | None]]
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Run micro-batched searches, scoring the ones on the same index together."""
+
+    by_index: dict[int, list[int]] = {}
+    for i, (index, _, _, _) in enumerate(searches):
+        by_index.setdefault(id(index), []).append(i)
+
+    results: list = [None] * len(searches)
+    for batch in by_index.values():
+        index = searches[batch[0]][0]
+        batch_results = index.search_batch(
+            np.stack([searches[i][1] for i in batch]),
+            [searches[i][2] for i in batch],
+            [searches[i][3] for i in batch],
+        )
+        for i, result in zip(batch, batch_results):
+            results[i] = result
+
+    return results
+
+
+class ANNInMemoryVDB(InMemoryVDB):
+    """InMemoryVDB whose kNN search goes through a `VectorIndex` per vector field.
+
+    Entities are stored exactly like in InMemoryVDB. The index is rebuilt on
+    the first search after a write, together with a `FilterIndex` over the
+    indexed fields. Filters are resolved to a row mask from it first, so only
+    rows passing them are candidates, and the result keeps the filter semantics
+    of the exhaustive search. With micro-batching on, concurrent searches on
+    the same index are scored together, see `micro_batching`.
+
+    With a `NeighborTable`, a "more like this" query whose vector is in the
+    table only scores the precomputed neighbours of its product, see
+    `_search_neighbor_table`. With `compact_store`, the rows are kept in a
+    `ProductStore` instead of a dict per row.
+
+    With a `snapshot_path`, `persist` and `restore`, which the Superlinked
+    server calls on shutdown and startup, write and memory-map a `Snapshot` of
+    the rows and the built indexes there instead of going through the
+    serializer. A snapshot saved for another `snapshot_fingerprint`, see
+    `snapshot.index_fingerprint`, or other index configs is ignored.
+
+    With `lexical_fields`, a `LexicalIndex` over those fields is updated on
+    every write, and a query run with a `LexicalQuery` only scores its best
+    BM25 matches, see `_search_lexical`.
+    """
+
+    def __init__(
+        self,
+        vdb_settings: VDBSettings,
+        index_factory: Callable[[], VectorIndex],
+        neighbor_table: NeighborTable | None = None,
+        compact_store: bool = False,
+        snapshot_path: Path | None = None,
+        snapshot_fingerprint: str = "",
+        lexical_fields: dict[str, float] | None = None,
+    ) -> None:
+        super().__init__(vdb_settings)
+        self._compact_store = compact_store
+        if compact_store:
+            self._vdb = ProductStore()
+        self._index_factory = index_factory
+        self._indices: dict[str, tuple[list[str], VectorIndex, FilterIndex]] = {}
+        self._indices_lock = threading.Lock()
+        self._neighbor_table = neighbor_table
+        # Vector field -> position in the index of every row of the neighbor table.
+        self._neighbor_rows: dict[str, np.ndarray] = {}
+        self._snapshot_path = snapshot_path
+        self._snapshot_fingerprint = snapshot_fingerprint
+        # Vector field -> (rows, index) restored from the snapshot, used by the first search instead of a build.
+        self._restored_indices: dict[str, tuple[int, VectorIndex]] = {}
+        self._changed_since_snapshot = True
+        self._lexical_index = LexicalIndex(lexical_fields) if lexical_fields else None
+        # Restored rows are only indexed by the first lexical query, so a restore stays fast.
+        self._lexical_stale = False
+        # Vector field -> position in its index of every row id, for the lexical candidates.
+        self._row_positions: dict[str, dict[str, int]] = {}
+
+    def close_connection(self) -> None:
+        super().close_connection()
+        if self._compact_store:
+            self._vdb = ProductStore()
+        if self._lexical_index is not None:
+            self._lexical_index.clear()
+        self.invalidate_indices()
+
+    def write_entities(self, entity_data: Sequence[EntityData]) -> None:
+        if self._compact_store:
+            for ed in entity_data:
+                self._vdb.update_row(
+                    InMemoryVDB._get_row_id_from_entity_id(ed.id_), {name: fd.value for name, fd in ed.field_data.items()}
+                )
+        else:
+            super().write_entities(entity_data)
+        if self._lexical_index is not None and not self._lexical_stale:
+            for ed in entity_data:
+                row_id = InMemoryVDB._get_row_id_from_entity_id(ed.id_)
+                self._lexical_index.update(row_id, self._vdb[row_id])
+        self.invalidate_indices()
+
+    def remove_rows(self, row_ids: Sequence[str]) -> None:
+        """Delete rows, Superlinked has no delete operation."""
+
+        for row_id in row_ids:
+            self._vdb.pop(row_id, None)
+            if self._lexical_index is not None:
+                self._lexical_index.remove(row_id)
+        self.invalidate_indices()
+
+    def persist(self, serializer: ObjectSerializer) -> None:
+        if self._snapshot_path is not None:
+            return self.save_snapshot()
+        if not self._compact_store:
+            return super().persist(serializer)
+
+        store, self._vdb = self._vdb, defaultdict(dict, self._vdb.to_dict())
+        try:
+            super().persist(serializer)
+        finally:
+            self._vdb = store
+
+    def restore(self, serializer: ObjectSerializer) -> None:
+        if self._snapshot_path is not None:
+            return self.restore_snapshot()
+        if not self._compact_store:
+            super().restore(serializer)
+        else:
+            store, self._vdb = self._vdb, defaultdict(dict)
+            try:
+                super().restore(serializer)
+                rows = self._vdb
+            finally:
+                self._vdb = store
+            for row_id, values in rows.items():
+                store.update_row(row_id, values)
+        self._lexical_stale = True
+        self.invalidate_indices()
+
+    def invalidate_indices(self) -> None:
+        """Drop the vector and filter indexes, e.g. after rows were removed from `_vdb`."""
+
+        self._indices = {}
+        self._neighbor_rows = {}
+        self._restored_indices = {}
+        self._row_positions = {}
+        self._changed_since_snapshot = True
+
+    def save_snapshot(self) -> None:
+        """Write the rows and the built vector indexes to the snapshot path, unless nothing changed since the last one."""
+
+        if not self._changed_since_snapshot and (self._snapshot_path / "meta.json").exists():
+            logger.info(f"Nothing changed since the snapshot at '{self._snapshot_path}' was written or restored.")
+            return
+        if self._compact_store:
+            store = self._vdb
+        else:
+            store = ProductStore()
+            for row_id, values in self._vdb.items():
+                store.update_row(row_id, values)
+        indices = {
+            vector_field: (len(row_ids), type(index).__name__, state)
+            for vector_field, (row_ids, index, _) in self._indices.items()
+            if (state := index.state())
+        }
+        Snapshot(store, indices, self._get_snapshot_fingerprint()).save(self._snapshot_path)
+        self._changed_since_snapshot = False
+
+    def restore_snapshot(self) -> None:
+        """Read the rows, and the vector indexes that were built, from the snapshot path, if it has a valid one."""
+
+        snapshot = Snapshot.load(self._snapshot_path, self._get_snapshot_fingerprint())
+        if snapshot is None:
+            return
+        if self._compact_store:
+            self._vdb = snapshot.store
+        else:
+            self._vdb.update(snapshot.store.to_dict())
+        self._lexical_stale = True
+        self.invalidate_indices()
+        for vector_field, (rows, index_type, state) in snapshot.indices.items():
+            index = self._index_factory()
+            if type(index).__name__ == index_type and index.load_state(state):
+                self._restored_indices[vector_field] = (rows, index)
+        self._changed_since_snapshot = False
+
+    def _get_snapshot_fingerprint(self) -> str:
+        index_configs = sorted(repr(config) for config in self.search_index_manager._index_configs.values())
+        return fingerprint(self._snapshot_fingerprint, index_configs)
+
+    def _knn_search(
+        self,
+        index_name: str,
+        schema_name: str,
+        returned_fields: Sequence[Field],
+        vdb_knn_search_params: VDBKNNSearchParams,
+        **params: Any,
+    ) -> Sequence[ResultEntityData]:
+        index_config = self._get_index_config(index_name)
+        Search.check_vector_field(index_config, vdb_knn_search_params.vector_field)
+        Search.check_filters(index_config, vdb_knn_search_params.filters)
+
+        limit = vdb_knn_search_params.limit
+        if not limit or not self._vdb:
+            # Nothing can be returned, so the indexes aren't built.
+            return []
+        row_ids, index, filter_index = self._get_index(
+            vdb_knn_search_params.vector_field.name, index_config.indexed_field_names
+        )
+        allowed = None
+        if vdb_knn_search_params.filters:
+            with span("filters"):
+                allowed = filter_index.mask(vdb_knn_search_params.filters)
+
+        k = len(row_ids) if limit == UNLIMITED_SEARCH_RESULTS else min(limit, len(row_ids))
+        if not k:
+            return []
+        query = np.asarray(vdb_knn_search_params.vector_field.value.value, dtype=np.float32)
+        scheduler = get_scheduler()
+        with span("scoring"):
+            if (
+                neighbors := self._search_neighbor_table(vdb_knn_search_params.vector_field.name, index, query, k, allowed)
+            ) is not None:
+                positions, scores = neighbors
+            elif (
+                lexical := self._search_lexical(vdb_knn_search_params.vector_field.name, row_ids, index, query, k, allowed)
+            ) is not None:
+                positions, scores = lexical
+            elif scheduler is None:
+                positions, scores = index.search(query, k, allowed)
+            else:
+                positions, scores = scheduler.submit("search", (index, query, k, allowed), _search_batch)
+
+        radius = vdb_knn_search_params.radius
+        return [
+            self._get_result_entity_data(row_ids[position], float(score), returned_fields)
+            for position, score in zip(positions, scores)
+            if not radius or score >= 1 - radius
+        ]
+
+    def _get_index(
+        self, vector_field_name: str, indexed_field_names: Sequence[str]
+    ) -> tuple[list[str], VectorIndex, FilterIndex]:
+        with self._indices_lock:
+            if vector_field_name not in self._indices:
+                if self._compact_store:
+                    row_ids, vectors = self._vdb.vectors(vector_field_name)
+                else:
+                    row_ids = [row_id for row_id, values in self._vdb.items() if values.get(vector_field_name) is not None]
+                    vectors = np.array([self._vdb[row_id][vector_field_name].value for row_id in row_ids], dtype=np.float32)
+                # No row may have the vector field, and an empty array can't be reshaped to its unknown dimension.
+                vectors = vectors.reshape(len(row_ids), -1) if row_ids else np.empty((0, 0), dtype=np.float32)
+                rows, index = self._restored_indices.pop(vector_field_name, (None, None))
+                if rows != len(row_ids):
+                    index = self._index_factory()
+                    index.build(vectors)
+                filter_index = FilterIndex(
+                    [self._vdb[row_id] for row_id in row_ids],
+                    [name for name in indexed_field_names if name != vector_field_name],
+                )
+                self._indices[vector_field_name] = (row_ids, index, filter_index)
+                if self._neighbor_table is not None and self._neighbor_table.vector_field == vector_field_name:
+                    self._bind_neighbor_table(vector_field_name, row_ids, vectors)
+
+            return self._indices[vector_field_name]
+
+    def _bind_neighbor_table(self, vector_field_name: str, row_ids: list[str], vectors: np.ndarray) -> None:
+        """Map the neighbor table to the index rows, if it was built from exactly the stored vectors."""
+
+        table = self._neighbor_table
+        positions = {row_id: position for position, row_id in enumerate(row_ids)}
+        table_positions = np.array([positions.get(row_id, NO_NEIGHBOR) for row_id in table.row_ids.tolist()], dtype=np.int64)
+        stale = len(row_ids) != len(table.row_ids) or (table_positions == NO_NEIGHBOR).any()
+        if not stale:
+            stale = not np.array_equal(vector_keys(vectors)[table_positions], table.vector_keys)
+        if stale:
+            logger.warning(
+                f"The neighbor table of {len(table.row_ids)} products doesn't match the {len(row_ids)} stored ones, "
+                "so it isn't used. Update it with 'python -m tools.build_neighbor_table --incremental'."
+            )
+            return
+
+        self._neighbor_rows[vector_field_name] = table_positions
+
+    def _search_neighbor_table(
+        self, vector_field_name: str, index: VectorIndex, query: np.ndarray, k: int, allowed: np.ndarray | None
+    ) -> tuple[np.ndarray, np.ndarray] | None:
+        """`index.search` from the precomputed neighbours of the product `query` is the query vector of.
+
+        The filters are applied to the neighbours, which are scored again
+        exactly. None, to search the whole index, when the query isn't in the
+        table, or when fewer than `k` neighbours pass the filters and the table
+        row doesn't hold every product.
+        """
+
+        table_positions = self._neighbor_rows.get(vector_field_name)
+        if table_positions is None or k > self._neighbor_table.k:
+            return None
+        row = self._neighbor_table.find(query)
+        if row is None:
+            return None
+
+        neighbors = np.asarray(self._neighbor_table.neighbors[row])
+        complete = neighbors[-1] == NO_NEIGHBOR
+        candidates = table_positions[neighbors[neighbors != NO_NEIGHBOR]]
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+        if len(candidates) < k and not complete:
+            return None
+
+        return _top_k(index.score(query, candidates), candidates, k)
+
+    def _search_lexical(
+        self, vector_field_name: str, row_ids: list[str], index: VectorIndex, query: np.ndarray, k: int, allowed: np.ndarray | None
+    ) -> tuple[np.ndarray, np.ndarray] | None:
+        """`index.search` over the best BM25 matches of the current `LexicalQuery`.
+
+        Its best `candidates` rows that pass the filters are scored by the
+        index, plus `weight` times their BM25 score over the best one. When
+        fewer than `k` match, the best vector scores fill up the result. None,
+        to search the whole index, without a lexical query or when no row
+        matches it.
+        """
+
+        lexical = current_lexical_query()
+        if lexical is None or self._lexical_index is None:
+            return None
+        with span("lexical"):
+            if self._lexical_stale:
+                self._lexical_index.clear()
+                for row_id in list(self._vdb):
+                    self._lexical_index.update(row_id, self._vdb[row_id])
+                self._lexical_stale = False
+            if vector_field_name not in self._row_positions:
+                self._row_positions[vector_field_name] = {row_id: position for position, row_id in enumerate(row_ids)}
+            positions_by_row = self._row_positions[vector_field_name]
+            matches, lexical_scores = self._lexical_index.search(lexical.text, lexical.candidates)
+            found = [(positions_by_row[row_id], score) for row_id, score in zip(matches, lexical_scores) if row_id in positions_by_row]
+            candidates = np.array([position for position, _ in found], dtype=np.int64)
+            lexical_scores = np.array([score for _, score in found], dtype=np.float32)
+            if allowed is not None:
+                passed = allowed[candidates]
+                candidates, lexical_scores = candidates[passed], lexical_scores[passed]
+        if not len(candidates):
+            return None
+
+        scores = index.score(query, candidates) + lexical.weight * lexical_scores / lexical_scores.max()
+        if len(candidates) < k:
+            positions, vector_scores = index.search(query, min(k + len(candidates), len(row_ids)), allowed)
+            others = ~np.isin(positions, candidates)
+            candidates = np.concatenate([candidates, positions[others]])
+            scores = np.concatenate([scores, vector_scores[others]])
+
+        return _top_k(scores, candidates, k)
+
+
+class ANNInMemoryVectorDatabase(VectorDatabase[ANNInMemoryVDB]):
+    """In-memory vector database with an approximate nearest-neighbour index.
+
+    Pass it as `vector_database` to an executor, e.g.
+    `sl.InteractiveExecutor(sources, indices, vector_database=ANNInMemoryVectorDatabase())`.
+
+    Args:
+        index_type: "ivf" for the IVF-flat index, "exact" for a vectorized exhaustive scan.
+        num_lists: IVF clusters, derived from the number of rows when None.
+        num_probes: IVF clusters scanned per query.
+        default_query_limit: The default limit for query results, -1 for no limit.
+        neighbor_table_path: Directory of a `NeighborTable` that answers "more like this"
+            queries, see tools/build_neighbor_table.py.
+        compact_store: Keep the rows in an array-backed `ProductStore`.
+        snapshot_path: Directory the rows and indexes are saved to on shutdown and
+            restored from on startup, see `Snapshot`.
+        snapshot_fingerprint: Fingerprint of the schemas and spaces of the indexes,
+            a snapshot saved for another one is ignored.
+        lexical_fields: Stored fields, with the weight of their words, of the BM25
+            index queries with lexical params are searched with, see `lexical_search`.
+    """
+
+    def __init__(
+        self,
+        index_type: IndexType = "ivf",
+        num_lists: int | None = None,
+        num_probes: int = 8,
+        default_query_limit: int = -1,
+        neighbor_table_path: Path | None = None,
+        compact_store: bool = False,
+        snapshot_path: Path | None = None,
+        snapshot_fingerprint: str = "",
+        lexical_fields: dict[str, float] | None = None,
+    ) -> None:
+        super().__init__()
+        self._settings = VDBSettings(default_query_limit)
+        self._index_factory = lambda: create_index(index_type, num_lists, num_probes)
+        self._neighbor_table_path = neighbor_table_path
+        self._compact_store = compact_store
+        self._snapshot_path = snapshot_path
+        self._snapshot_fingerprint = snapshot_fingerprint
+        self._lexical_fields = lexical_fields
+
+    @property
+    def _vdb_connector(self) -> ANNInMemoryVDB:
+        neighbor_table = None
+        if self._neighbor_table_path is not None:
+            if (self._neighbor_table_path / "meta.json").exists():
+                neighbor_table = NeighborTable.load(self._neighbor_table_path)
+            else:
+                logger.warning(f"No neighbor table at '{self._neighbor_table_path}', build it with 'python -m tools.build_neighbor_table'.")
+
+        return ANNInMemoryVDB(
+            self._settings,
+            self._index_factory,
+            neighbor_table,
+            self._compact_store,
+            self._snapshot_path,
+            self._snapshot_fingerprint,
+            self._lexical_fields,
+        )
+
+
+def in_memory_vector_database(settings) -> VectorDatabase | None:
+    """Vector database for the in-memory deployment, None keeps Superlinked's exhaustive scan."""
+
+    if settings.IN_MEMORY_INDEX == "scan":
+        return None
+
+    from superlinked_app import index
+
+    snapshot_fingerprint = ""
+    if settings.IN_MEMORY_SNAPSHOT_PATH is not None:
+        snapshot_fingerprint = index_fingerprint(index.product_index)
+    lexical_fields = None
+    if settings.LEXICAL_SEARCH_ENABLED:
+        lexical_fields = lexical_field_weights(index.product, OBJECT_ID_FIELD)
+
+    return ANNInMemoryVectorDatabase(
+        index_type=settings.IN_MEMORY_INDEX,
+        num_lists=settings.IVF_NUM_LISTS,
+        num_probes=settings.IVF_NUM_PROBES,
+        neighbor_table_path=settings.NEIGHBOR_TABLE_PATH,
+        compact_store=settings.IN_MEMORY_STORE == "compact",
+        snapshot_path=settings.IN_MEMORY_SNAPSHOT_PATH,
+        snapshot_fingerprint=snapshot_fingerprint,
+        lexical_fields=lexical_fields,
+    )
+
+
+def vector_database(settings) -> VectorDatabase | None:
+    """Vector database of the app: MongoDB's with USE_MONGO_VECTOR_DB, else the InMemory one."""
+
+    if settings.USE_MONGO_VECTOR_DB:
+        from superlinked_app.mongo_ingestion import mongo_vector_database
+
+        return mongo_vector_database(settings)
+
+    return in_memory_vector_database(settings)
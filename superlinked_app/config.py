@@ -1,13 +1,13 @@
+import functools
 from pathlib import Path
+from typing import Any, Literal
 from loguru import logger
-from pydantic import SecretStr, model_validator
+from pydantic import Field, SecretStr, field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from superlinked_app import constants
 
 ROOT_DIR = Path(__file__).parent.parent
 ENV_FILE = ROOT_DIR / ".env"
-logger.info(f"Loading '.env' file from: {ENV_FILE}")
-
-assert ENV_FILE.exists(), ".env doesn't exists at the expected location"
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=str(ENV_FILE), env_file_encoding="utf-8")
@@ -15,21 +15,116 @@ class Settings(BaseSettings):
     # Superlinked
     PROCESSED_DATASET_PATH: Path = (
         Path("data") / "processed_300_sample.jsonl"
-    )  # or change it for a bigger dataset to: processed_850_sample.jsonl
+    )  # or change it for a bigger dataset to: processed_850_sample.jsonl, or to a .parquet/.arrow file
     GPU_EMBEDDING_THRESHOLD: int = 32
+    # Shorter title/description embeddings shrink every stored product vector. Run
+    # 'make benchmark-vector-compression' to see the recall cost of each setting.
+    EMBEDDING_DIMENSIONS: int = Field(default=constants.EMBEDDING_DIMENSIONS, ge=1, le=constants.EMBEDDING_DIMENSIONS)
+
+    # Query cache for the natural-query params and query-text embeddings
+    QUERY_CACHE_ENABLED: bool = True
+    QUERY_CACHE_TTL_SECONDS: float = 3600.0
+    QUERY_CACHE_MAX_ENTRIES: int = 10_000
+    QUERY_CACHE_PATH: Path | None = None  # e.g. data/query_cache.sqlite to keep the cache between server restarts
+
+    # Natural queries made only of a product type, price and rating bounds and product ids are parsed
+    # with rules instead of the LLM, see `nlq_fast_path`. The others, e.g. with a category, still go to the LLM.
+    NLQ_FAST_PATH_ENABLED: bool = True
+    # Superlinked's filter of the tokenizer warnings of LLM calls swaps the process-wide stderr, which
+    # can hang concurrent natural queries, so it's skipped unless this is set.
+    NLQ_FILTER_TOKENIZER_WARNINGS: bool = False
+
+    # Micro-batching of concurrent queries: their query-text embeddings are sent in one request and,
+    # with IN_MEMORY_INDEX 'exact' or 'ivf', their searches are scored together. A query waits at most
+    # MICRO_BATCH_MAX_WAIT_MS for others to join its batch.
+    MICRO_BATCHING_ENABLED: bool = False
+    MICRO_BATCH_MAX_WAIT_MS: float = Field(default=2.0, ge=0.0)
+    MICRO_BATCH_MAX_SIZE: int = Field(default=32, ge=1)
+    # Per query type overrides, e.g. '{"similar_items_query": {"max_wait_ms": 0.5, "max_batch_size": 8}}'
+    MICRO_BATCH_QUERY_TYPES: dict[str, dict[Literal["max_wait_ms", "max_batch_size"], float]] = {}
+
+    # Per-stage timings of every query and ingest batch (LLM parse, embedding, cache lookups, filters,
+    # scoring, serialization), logged with loguru and kept as Prometheus histograms, served at
+    # http://localhost:<METRICS_PORT>/metrics when METRICS_PORT is set. PROFILE_SAMPLE_RATE of the
+    # requests run under cProfile, and the profiles of those slower than SLOW_REQUEST_MS go to PROFILE_DIR.
+    INSTRUMENTATION_ENABLED: bool = False
+    METRICS_PORT: int | None = None  # e.g. 9464
+    SLOW_REQUEST_MS: float = Field(default=1000.0, ge=0.0)
+    PROFILE_SAMPLE_RATE: float = Field(default=0.0, ge=0.0, le=1.0)
+    PROFILE_DIR: Path = Path("data") / "profiles"
 
     # MongoDB
     USE_MONGO_VECTOR_DB: bool = False  # If 'False', we will use an InMemory vector database that requires no credentials.
+    # Search of the InMemory vector database: 'scan' is Superlinked's exhaustive search, 'exact' a
+    # vectorized exhaustive search and 'ivf' an approximate IVF-flat index.
+    IN_MEMORY_INDEX: Literal["scan", "exact", "ivf"] = "scan"
+    IVF_NUM_LISTS: int | None = None  # Defaults to 2 * sqrt(number of products)
+    IVF_NUM_PROBES: int = 8
+    # How the InMemory vector database keeps the products: 'dict' is Superlinked's dict of Python objects
+    # per product, 'compact' an array-backed store, several times smaller, see superlinked_app/product_store.py.
+    # 'compact' needs the 'exact' or 'ivf' index. Run 'make benchmark-product-store' to compare them.
+    IN_MEMORY_STORE: Literal["dict", "compact"] = "dict"
+    # Precomputed nearest products of every product, answering "more like this" queries of the 'exact'
+    # and 'ivf' indexes without a search. Built by 'python -m tools.build_neighbor_table', e.g. into data/neighbors.
+    NEIGHBOR_TABLE_PATH: Path | None = None
+    # Snapshot of the products and indexes of the 'exact' and 'ivf' indexes, e.g. data/snapshot: written on
+    # server shutdown and memory-mapped back on startup, so no 'load-data' is needed. A snapshot saved for
+    # other schemas or spaces in index.py is ignored. Run 'make benchmark-snapshot' to time a restore.
+    IN_MEMORY_SNAPSHOT_PATH: Path | None = None
+    # BM25 index over the products' title, description and id, updated on ingest. Queries given a
+    # 'lexical_query' (brands, model numbers, ASINs) only score its best matches with the vector spaces,
+    # fused with their BM25 score, see superlinked_app/lexical_search.py. Needs the 'exact' or 'ivf' index.
+    LEXICAL_SEARCH_ENABLED: bool = False
     MONGO_CLUSTER_URL: str | None = None
     MONGO_CLUSTER_NAME: str = "free-cluster"
     MONGO_DATABASE_NAME: str = "tabular-semantic-search"
     MONGO_PROJECT_ID: str | None = None
     MONGO_API_PUBLIC_KEY: SecretStr | None = None
     MONGO_API_PRIVATE_KEY: SecretStr | None = None
+    # Ingestion into MongoDB: the fields written to a product are merged into one document, upserted in
+    # unordered bulk writes of MONGO_WRITE_BATCH_SIZE products sent by MONGO_WRITERS threads (0 writes from
+    # the ingesting thread). A batch that isn't full is sent after MONGO_WRITE_FLUSH_MS or before a query.
+    # Writers and queries share one client of MONGO_MAX_POOL_SIZE connections, see superlinked_app/mongo_ingestion.py.
+    # MONGO_CLUSTER_URL may be 'mongodb://localhost:27017' for a local mongod, which needs no Atlas API keys
+    # but has no vector search. Run 'make benchmark-mongo-ingestion' against one to time the writes.
+    MONGO_WRITE_BATCH_SIZE: int = Field(default=1000, ge=1)
+    MONGO_WRITERS: int = Field(default=4, ge=0)
+    MONGO_WRITE_CONCERN: int | Literal["majority"] = 1
+    MONGO_WRITE_JOURNAL: bool | None = None
+    MONGO_MAX_POOL_SIZE: int = Field(default=100, ge=1)
+    MONGO_WRITE_FLUSH_MS: float = Field(default=200.0, ge=0.0)
 
     # OpenAI
     OPENAI_MODEL_ID: str = "gpt-4o"
-    OPENAI_API_KEY: SecretStr
+    OPENAI_API_KEY: SecretStr | None = None  # Only checked when an OpenAI client or natural query is first used.
+
+    @field_validator("PROCESSED_DATASET_PATH")
+    @classmethod
+    def validate_processed_dataset_format(cls, path: Path) -> Path:
+        """The processed dataset format is picked from the file extension, so it must be a known one."""
+
+        if path.suffix not in constants.PROCESSED_DATASET_FORMATS:
+            raise ValueError(
+                f"Unsupported processed dataset extension '{path.suffix}', "
+                f"expected one of {', '.join(constants.PROCESSED_DATASET_FORMATS)}."
+            )
+
+        return path
+
+    @model_validator(mode="after")
+    def validate_in_memory_store(self) -> "Settings":
+        """The compact store, the snapshot, the neighbor table and the lexical index are kept by the vector database of the 'exact' and 'ivf' indexes."""
+
+        if self.IN_MEMORY_STORE == "compact" and self.IN_MEMORY_INDEX == "scan":
+            raise ValueError("IN_MEMORY_STORE='compact' needs IN_MEMORY_INDEX set to 'exact' or 'ivf'.")
+        if self.IN_MEMORY_SNAPSHOT_PATH is not None and self.IN_MEMORY_INDEX == "scan":
+            raise ValueError("IN_MEMORY_SNAPSHOT_PATH needs IN_MEMORY_INDEX set to 'exact' or 'ivf'.")
+        if self.NEIGHBOR_TABLE_PATH is not None and self.IN_MEMORY_INDEX == "scan":
+            raise ValueError("NEIGHBOR_TABLE_PATH needs IN_MEMORY_INDEX set to 'exact' or 'ivf'.")
+        if self.LEXICAL_SEARCH_ENABLED and (self.USE_MONGO_VECTOR_DB or self.IN_MEMORY_INDEX == "scan"):
+            raise ValueError("LEXICAL_SEARCH_ENABLED needs the InMemory vector database with IN_MEMORY_INDEX set to 'exact' or 'ivf'.")
+
+        return self
 
     @model_validator(mode="after")
     def validate_mongo_config(self) -> "Settings":
@@ -39,11 +134,15 @@ class Settings(BaseSettings):
             required_settings = {
                                 "MONGO_CLUSTER_URL": self.MONGO_CLUSTER_URL,
                                 "MONGO_DATABASE_NAME": self.MONGO_DATABASE_NAME,
-                                "MONGO_CLUSTER_NAME": self.MONGO_CLUSTER_NAME,
-                                "MONGO_PROJECT_ID": self.MONGO_PROJECT_ID,
-                                "MONGO_API_PUBLIC_KEY": self.MONGO_API_PUBLIC_KEY,
-                                "MONGO_API_PRIVATE_KEY": self.MONGO_API_PRIVATE_KEY,
                                 }
+            # The Atlas admin API creates the search indexes, a local mongod has none.
+            if not (self.MONGO_CLUSTER_URL or "").startswith("mongodb://"):
+                required_settings |= {
+                                    "MONGO_CLUSTER_NAME": self.MONGO_CLUSTER_NAME,
+                                    "MONGO_PROJECT_ID": self.MONGO_PROJECT_ID,
+                                    "MONGO_API_PUBLIC_KEY": self.MONGO_API_PUBLIC_KEY,
+                                    "MONGO_API_PRIVATE_KEY": self.MONGO_API_PRIVATE_KEY,
+                                    }
 
             missing_settings = [
                                 key for key, value in required_settings.items() if not value
@@ -63,5 +162,30 @@ class Settings(BaseSettings):
                             "Please run 'make download-and-process-sample-dataset' first to download and process the Amazon dataset."
                             )
 
+    def require_openai_api_key(self) -> str:
+        if self.OPENAI_API_KEY is None:
+            raise ValueError("OPENAI_API_KEY must be set in the environment or in the '.env' file to call OpenAI.")
+
+        return self.OPENAI_API_KEY.get_secret_value()
+
+
+@functools.cache
+def get_settings() -> Settings:
+    logger.info(f"Loading '.env' file from: {ENV_FILE}")
+    if not ENV_FILE.exists():
+        logger.warning(".env doesn't exists at the expected location, reading the settings from the environment only")
+
+    return Settings()
+
+
+class LazySettings:
+    """Reads through to `get_settings()`, so the settings are only loaded on first use and not at import."""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_settings(), name)
+
+    def __repr__(self) -> str:
+        return repr(get_settings())
+
 
-settings = Settings()
\ No newline at end of file
+settings = LazySettings()
@@ -68,4 +68,13 @@ CATEGORIES = [
     "Video Games",
     "Wall Art",
     "Women",
-]
\ No newline at end of file
+]
+EMBEDDING_MODEL_ID = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 1536
+# Processed dataset formats, picked from the file extension.
+PROCESSED_DATASET_FORMATS = {
+    ".jsonl": "jsonl",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+}
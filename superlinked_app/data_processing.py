@@ -1,6 +1,25 @@
+import hashlib
+import io
 import random
+import numpy as np
 import pandas as pd
-from typing import Optional
+import pyarrow as pa
+import pyarrow.compute as pc
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, Literal, Optional, Sequence
+
+# The vectorized parsers only decide rows whose first token is made of ASCII
+# digits, signs and dots and is delimited by ASCII whitespace. For those tokens
+# Python's str.split()/float()/int() provably agree with the Arrow kernels, and
+# every other non-missing value falls back to the scalar parser, which keeps the
+# output identical to the apply-based engine.
+_ASCII_WHITESPACE = r"[\t\n\f\r ]"
+_FLOAT_PATTERN = r"^[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)$"
+_INT_PATTERN = r"^-?[0-9]{1,18}$"
+# Blank values and values starting with a letter other than n/i (nan, inf) can
+# never be parsed by float() or int().
+_UNPARSABLE_PATTERN = rf"^{_ASCII_WHITESPACE}*(?:[A-HJ-MO-Za-hj-mo-z]|$)"
 
 
 def parse_category(category: str) -> list[str]:
@@ -83,7 +102,191 @@ def parse_price(price: str) -> Optional[float]:
         return None
 
 
-def process_amazon_dataset(df: pd.DataFrame) -> pd.DataFrame:
+def _to_arrow_strings(values: pd.Series) -> pa.Array:
+    """Convert a column to an Arrow string array with missing values as nulls."""
+
+    try:
+        return pa.array(values.to_numpy(dtype=object), type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed columns, e.g. prices stored as numbers, are stringified like the scalar parsers do.
+        stringified = values.where(values.isna(), values.astype(str))
+        return pa.array(stringified.to_numpy(dtype=object), type=pa.string(), from_pandas=True)
+
+
+def _vectorized_parse(
+    values: pd.Series,
+    parse: Callable,
+    missing_value: float,
+    token_pattern: str,
+    castable_pattern: str,
+    parsable_pattern: str,
+    target_type: pa.DataType,
+    invalid_value: float,
+    replacements: Sequence[tuple[str, str]] = (),
+    token_replacements: Sequence[tuple[str, str]] = (),
+) -> pd.Series:
+    """Parse a whole column with Arrow kernels, mirroring the scalar `parse` function.
+
+    After applying `replacements`, the `token` group of `token_pattern` is
+    extracted from every value. Tokens matching `castable_pattern` are cast to
+    `target_type`, tokens not matching `parsable_pattern` are known to fail the
+    scalar parser and get `invalid_value`, and missing values get
+    `missing_value`. The remaining values are passed to `parse` one by one.
+    """
+
+    strings = _to_arrow_strings(values)
+    for old, new in replacements:
+        strings = pc.replace_substring(strings, old, new)
+    tokens = pc.struct_field(pc.extract_regex(strings, token_pattern), [0])
+    for old, new in token_replacements:
+        tokens = pc.replace_substring(tokens, old, new)
+
+    castable = pc.fill_null(pc.match_substring_regex(tokens, castable_pattern), False).to_numpy(zero_copy_only=False)
+    invalid = pc.or_(
+        pc.invert(pc.fill_null(pc.match_substring_regex(tokens, parsable_pattern), True)),
+        pc.fill_null(pc.match_substring_regex(strings, _UNPARSABLE_PATTERN), False),
+    ).to_numpy(zero_copy_only=False)
+    present = strings.is_valid().to_numpy(zero_copy_only=False)
+
+    result = pc.cast(tokens.filter(pa.array(castable)), target_type).to_numpy(zero_copy_only=False)
+    parsed = np.full(len(values), np.nan)
+    parsed[castable] = result
+    parsed[invalid] = invalid_value
+    parsed[~present] = missing_value
+
+    undecided = present & ~castable & ~invalid
+    if not undecided.any():
+        return pd.Series(parsed, index=values.index)
+
+    parsed = pd.Series(parsed, index=values.index, dtype=object)
+    # As objects, or pandas casts large ints to float on assignment.
+    parsed[undecided] = values[undecided].map(parse).astype(object)
+
+    return parsed
+
+
+def parse_review_rating_vectorized(stars: pd.Series) -> pd.Series:
+    """Vectorized equivalent of `parse_review_rating` over a whole column."""
+
+    return _vectorized_parse(
+        stars,
+        parse_review_rating,
+        missing_value=-1.0,
+        token_pattern=rf"^{_ASCII_WHITESPACE}*(?P<token>[0-9.+-]+)(?:{_ASCII_WHITESPACE}|$)",
+        castable_pattern=_FLOAT_PATTERN,
+        parsable_pattern=_FLOAT_PATTERN,
+        target_type=pa.float64(),
+        invalid_value=-1.0,
+        replacements=[(",", ".")],
+    ).astype(float)
+
+
+def parse_review_count_vectorized(ratings: pd.Series) -> pd.Series:
+    """Vectorized equivalent of `parse_review_count` over a whole column."""
+
+    return _vectorized_parse(
+        ratings,
+        parse_review_count,
+        missing_value=0,
+        token_pattern=rf"^{_ASCII_WHITESPACE}*(?P<token>[0-9,.-]+)(?:{_ASCII_WHITESPACE}|$)",
+        castable_pattern=_INT_PATTERN,
+        # Longer digit runs are still valid Python ints, they just don't fit the Arrow cast.
+        parsable_pattern=r"^-?[0-9]+$",
+        target_type=pa.int64(),
+        invalid_value=0,
+        token_replacements=[(",.", "")],
+    ).astype(int)
+
+
+def parse_price_vectorized(price: pd.Series) -> pd.Series:
+    """Vectorized equivalent of `parse_price` over a whole column, including the 1000 cap."""
+
+    return _vectorized_parse(
+        price,
+        parse_price,
+        missing_value=np.nan,
+        token_pattern=rf"^{_ASCII_WHITESPACE}*(?P<token>[0-9.+-]+){_ASCII_WHITESPACE}*$",
+        castable_pattern=_FLOAT_PATTERN,
+        parsable_pattern=_FLOAT_PATTERN,
+        target_type=pa.float64(),
+        invalid_value=np.nan,
+        replacements=[("$", ""), ("€", ""), (",", ".")],
+    ).astype(float).clip(upper=1000.0)
+
+
+def parse_category_vectorized(categories: pd.Series, draws: Optional[np.ndarray] = None) -> pd.Series:
+    """Vectorized equivalent of `parse_category` over a whole column.
+
+    The random draws happen in row order and only for the rows on which
+    `parse_category` would draw, so both engines consume the random stream
+    identically.
+
+    Args:
+        categories: Column of category lists.
+        draws: Precomputed uniform draws, one per drawing row. Drawn from the
+            global random stream when None.
+
+    Returns:
+        Column with the truncated, stripped category lists.
+    """
+
+    try:
+        lists = pa.array(categories.tolist(), type=pa.list_(pa.string()), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Values Arrow can't represent as lists of strings go through the scalar parser.
+        return categories.apply(parse_category)
+
+    lengths = pc.fill_null(pc.list_value_length(lists), 0).to_numpy()
+    has_null_item = np.bincount(
+        pc.list_parent_indices(lists).to_numpy()[pc.is_null(pc.list_flatten(lists)).to_numpy(zero_copy_only=False)],
+        minlength=len(lists),
+    ).astype(bool)
+    drawing = lists.is_valid().to_numpy(zero_copy_only=False) & ~has_null_item
+
+    if draws is None:
+        draws = np.array([random.random() for _ in range(int(drawing.sum()))])
+    keep = np.zeros(len(lists), dtype=np.int64)
+    keep[drawing] = np.where(draws < 0.9, 1, 2)
+    kept = np.minimum(lengths, keep)
+
+    # Gather the kept items of every row from the flat child array.
+    starts = lists.offsets.to_numpy()[:-1]
+    new_offsets = np.concatenate([[0], np.cumsum(kept)])
+    item_indices = np.repeat(starts, kept) + np.arange(new_offsets[-1]) - np.repeat(new_offsets[:-1], kept)
+    items = lists.values.take(pa.array(item_indices, type=pa.int64()))
+
+    # Arrow's whitespace table differs from Python's for some non-ASCII characters.
+    is_ascii = pc.fill_null(pc.string_is_ascii(items), True).to_numpy(zero_copy_only=False)
+    if is_ascii.all():
+        stripped = pc.utf8_trim_whitespace(items)
+    else:
+        stripped = pa.array([item.strip() for item in items.to_pylist()], type=pa.string())
+    truncated = pa.ListArray.from_arrays(pa.array(new_offsets, type=pa.int32()), stripped)
+
+    return pd.Series(truncated.to_pylist(), index=categories.index, dtype=object)
+
+
+PARSERS = {
+    "apply": {
+        "category": lambda column: column.apply(parse_category),
+        "review_rating": lambda column: column.apply(parse_review_rating),
+        "review_count": lambda column: column.apply(parse_review_count),
+        "price": lambda column: column.apply(parse_price),
+    },
+    "vectorized": {
+        "category": parse_category_vectorized,
+        "review_rating": parse_review_rating_vectorized,
+        "review_count": parse_review_count_vectorized,
+        "price": parse_price_vectorized,
+    },
+}
+
+
+def process_amazon_dataset(
+    df: pd.DataFrame,
+    seed: Optional[int] = 6,
+    engine: Literal["apply", "vectorized"] = "vectorized",
+) -> pd.DataFrame:
     """Process raw product data into a standardized format.
 
     This function takes a DataFrame containing raw product data and processes it to ensure
@@ -98,6 +301,12 @@ def process_amazon_dataset(df: pd.DataFrame) -> pd.DataFrame:
             - stars (str): Star rating
             - ratings (str): Number of ratings
             - price (str): Product price
+        seed: Seed of the random draws that truncate the categories. Pass None to
+            continue the current random stream, e.g. when processing consecutive
+            chunks of the same dataset.
+        engine: "vectorized" parses whole columns with pandas/Arrow kernels,
+            "apply" runs the scalar parse_* functions row by row. Both produce
+            identical output.
 
     Returns:
         Processed DataFrame with the following columns and types:
@@ -110,13 +319,12 @@ def process_amazon_dataset(df: pd.DataFrame) -> pd.DataFrame:
             - price (float): Price value
     """
 
-    random.seed(6)
-
-    # Create a copy to avoid modifying the original DataFrame
-    df_processed = df.copy()
-    df_processed = df_processed[df_processed["locale"] == "us"]
+    if seed is not None:
+        random.seed(seed)
 
-    # Keep only required columns
+    # Keep only US rows and the required columns. Selecting them before copying
+    # avoids duplicating the columns we drop anyway, and reindexing tolerates
+    # chunks in which a column is missing from every record.
     columns_to_keep = [
         "asin",
         "type",
@@ -127,13 +335,14 @@ def process_amazon_dataset(df: pd.DataFrame) -> pd.DataFrame:
         "ratings",
         "price",
     ]
-    df_processed = df_processed[columns_to_keep]
+    df_processed = df.loc[df["locale"] == "us"].reindex(columns=columns_to_keep)
 
     # Apply transformations
-    df_processed["category"] = df_processed["category"].apply(parse_category)
-    df_processed["review_rating"] = df_processed["stars"].apply(parse_review_rating)
-    df_processed["review_count"] = df_processed["ratings"].apply(parse_review_count)
-    df_processed["price"] = df_processed["price"].apply(parse_price)
+    parsers = PARSERS[engine]
+    df_processed["category"] = parsers["category"](df_processed["category"])
+    df_processed["review_rating"] = parsers["review_rating"](df_processed["stars"])
+    df_processed["review_count"] = parsers["review_count"](df_processed["ratings"])
+    df_processed["price"] = parsers["price"](df_processed["price"])
 
     # Drop original stars and ratings columns since we've extracted the values
     df_processed = df_processed.drop(columns=["stars", "ratings"])
@@ -152,4 +361,72 @@ def process_amazon_dataset(df: pd.DataFrame) -> pd.DataFrame:
         }
     )
 
-    return df_processed
\ No newline at end of file
+    return df_processed
+
+
+def partition_seed(seed: int, partition: int) -> int:
+    """Seed of the category draws of one partition, whichever worker processes it."""
+
+    digest = hashlib.sha256(f"{seed}:{partition}".encode("ascii")).digest()
+
+    return int.from_bytes(digest[:8], "little")
+
+
+def _process_partition(
+    partition: int,
+    data: pd.DataFrame | str,
+    seed: int,
+    engine: Literal["apply", "vectorized"],
+) -> pd.DataFrame:
+    if isinstance(data, str):
+        data = pd.read_json(io.StringIO(data), lines=True)
+
+    return process_amazon_dataset(data, seed=partition_seed(seed, partition), engine=engine)
+
+
+def process_amazon_dataset_parallel(
+    partitions: Iterable[pd.DataFrame | str],
+    num_workers: int,
+    seed: int = 6,
+    engine: Literal["apply", "vectorized"] = "vectorized",
+) -> Iterator[pd.DataFrame]:
+    """Process partitions of the raw dataset in a process pool, yielding them in input order.
+
+    Every partition seeds its category draws from `seed` and its position, so
+    the output only depends on how the input is partitioned, not on the number
+    of workers. It differs from a single `process_amazon_dataset` call, whose
+    draws come from one stream over the whole dataset.
+
+    Args:
+        partitions: Raw rows as DataFrames, or as JSON lines text that is then
+            parsed in the workers, e.g. the chunks of `utils.iter_text_chunks`.
+        num_workers: Worker processes, 1 processes the partitions in this process.
+        seed: Base seed of the category draws.
+        engine: Parsing engine, see `process_amazon_dataset`.
+
+    Yields:
+        One processed DataFrame per partition.
+    """
+
+    if num_workers == 1:
+        for partition, data in enumerate(partitions):
+            yield _process_partition(partition, data, seed, engine)
+        return
+
+    # At most two partitions per worker are in flight, which bounds memory use
+    # when the partitions stream from a large file.
+    pending: deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for partition, data in enumerate(partitions):
+            pending.append(executor.submit(_process_partition, partition, data, seed, engine))
+            if len(pending) >= 2 * num_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def split_partitions(df: pd.DataFrame, partition_size: int) -> Iterator[pd.DataFrame]:
+    """Split an in-memory dataset into consecutive partitions of `partition_size` rows."""
+
+    for start in range(0, len(df), partition_size):
+        yield df.iloc[start : start + partition_size]
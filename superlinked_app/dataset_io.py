@@ -0,0 +1,196 @@
+from pathlib import Path
+from typing import Iterator, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from superlinked_app import constants
+
+# Arrow types of the columns written by `process_amazon_dataset`. Columns ending
+# with EMBEDDING_SUFFIX are stored as fixed-size float32 lists, any other column
+# keeps the type Arrow infers for it.
+PROCESSED_DATASET_TYPES = {
+    "asin": pa.string(),
+    "type": pa.string(),
+    "category": pa.list_(pa.string()),
+    "title": pa.string(),
+    "description": pa.string(),
+    "price": pa.float64(),
+    "review_rating": pa.float64(),
+    "review_count": pa.int64(),
+}
+EMBEDDING_SUFFIX = "_embedding"
+
+
+def dataset_format(path: Path) -> str:
+    """Return the processed dataset format matching the extension of `path`."""
+
+    try:
+        return constants.PROCESSED_DATASET_FORMATS[path.suffix]
+    except KeyError:
+        raise ValueError(
+            f"Unsupported processed dataset extension '{path.suffix}', "
+            f"expected one of {', '.join(constants.PROCESSED_DATASET_FORMATS)}."
+        ) from None
+
+
+def to_arrow_table(df: pd.DataFrame) -> pa.Table:
+    """Convert a processed DataFrame to a typed Arrow table."""
+
+    arrays = []
+    for column in df.columns:
+        if column.endswith(EMBEDDING_SUFFIX):
+            arrays.append(_embedding_array(df[column]))
+        else:
+            arrays.append(pa.array(df[column], type=PROCESSED_DATASET_TYPES.get(column), from_pandas=True))
+
+    return pa.Table.from_arrays(arrays, names=[str(column) for column in df.columns])
+
+
+def _embedding_array(vectors: pd.Series, dimensions: int = constants.EMBEDDING_DIMENSIONS) -> pa.FixedSizeListArray:
+    values = np.asarray(vectors.tolist(), dtype=np.float32)
+    if len(values):
+        dimensions = values.shape[1]
+
+    return pa.FixedSizeListArray.from_arrays(pa.array(values.reshape(-1)), dimensions)
+
+
+def embedding_matrix(table: pa.Table, column: str) -> np.ndarray:
+    """Return an embedding column as a (rows, dimensions) float32 array.
+
+    For a single-chunk column, e.g. one read from a memory-mapped Arrow IPC
+    file, this is a view of the Arrow buffer and no data is copied.
+    """
+
+    array = table[column].combine_chunks()
+
+    return array.flatten().to_numpy(zero_copy_only=True).reshape(len(array), array.type.list_size)
+
+
+class ProcessedDatasetWriter:
+    """Writes a processed dataset chunk by chunk as JSON lines, Parquet or Arrow IPC.
+
+    Args:
+        path: Output file, its extension selects the format unless `format` is given.
+        format: One of the values of `constants.PROCESSED_DATASET_FORMATS`.
+    """
+
+    def __init__(self, path: Path, format: str | None = None) -> None:
+        self.path = path
+        self.format = format or dataset_format(path)
+        self._file = None
+        self._writer = None
+        self._schema: pa.Schema | None = None
+
+    def __enter__(self) -> "ProcessedDatasetWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.format == "jsonl":
+            if self._file is None:
+                self._file = self.path.open("w")
+            df.to_json(self._file, orient="records", lines=True)
+            return
+
+        table = to_arrow_table(df)
+        if self._writer is None:
+            self._open(table.schema)
+        self._writer.write_table(table.cast(self._schema))
+
+    def close(self) -> None:
+        if self._file is None and self._writer is None:
+            # Nothing was written, still leave a valid empty dataset behind.
+            if self.format == "jsonl":
+                self._file = self.path.open("w")
+            else:
+                self._open(pa.schema(PROCESSED_DATASET_TYPES.items()))
+        if self._file is not None:
+            self._file.close()
+        if self._writer is not None:
+            self._writer.close()
+
+    def _open(self, schema: pa.Schema) -> None:
+        self._schema = schema
+        if self.format == "parquet":
+            self._writer = pq.ParquetWriter(self.path, schema, compression="zstd")
+        else:
+            self._writer = ipc.new_file(str(self.path), schema)
+
+
+def write_processed_dataset(df: pd.DataFrame, path: Path) -> None:
+    with ProcessedDatasetWriter(path) as writer:
+        writer.write(df)
+
+
+def read_processed_table(path: Path, columns: Sequence[str] | None = None) -> pa.Table:
+    """Read a processed dataset as an Arrow table.
+
+    Parquet and Arrow IPC files are memory-mapped. Arrow IPC columns are not
+    copied at all, so only the pages that are actually accessed get loaded.
+    """
+
+    format = dataset_format(path)
+    if format == "parquet":
+        return pq.read_table(path, columns=columns, memory_map=True)
+    if format == "arrow":
+        with pa.memory_map(str(path)) as source:
+            table = ipc.open_file(source).read_all()
+        return table.select(columns) if columns is not None else table
+
+    df = pd.read_json(path, lines=True)
+
+    return to_arrow_table(df if columns is None else df[list(columns)])
+
+
+def read_processed_dataset(path: Path, columns: Sequence[str] | None = None) -> pd.DataFrame:
+    """Read a processed dataset as a DataFrame that Superlinked's DataFrameParser accepts."""
+
+    if dataset_format(path) == "jsonl":
+        df = pd.read_json(path, lines=True)
+        return df if columns is None else df[list(columns)]
+
+    return to_pandas(read_processed_table(path, columns))
+
+
+def to_pandas(table: pa.Table) -> pd.DataFrame:
+    """Convert an Arrow table to pandas, keeping list columns as Python lists.
+
+    `Table.to_pandas` turns list cells into numpy arrays, which Superlinked's
+    parsers don't accept.
+    """
+
+    list_columns = [
+        field.name
+        for field in table.schema
+        if pa.types.is_list(field.type) or pa.types.is_fixed_size_list(field.type)
+    ]
+    df = table.drop_columns(list_columns).to_pandas()
+    for column in list_columns:
+        if pa.types.is_fixed_size_list(table.schema.field(column).type) and not table[column].null_count:
+            # Going through numpy is an order of magnitude faster than to_pylist for embeddings.
+            df[column] = embedding_matrix(table, column).tolist()
+        else:
+            df[column] = table[column].to_pylist()
+
+    return df[table.column_names]
+
+
+def iter_processed_dataset(path: Path, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Yield a processed dataset as DataFrames of at most `chunk_size` rows."""
+
+    format = dataset_format(path)
+    if format == "jsonl":
+        with pd.read_json(path, lines=True, chunksize=chunk_size) as reader:
+            yield from reader
+    elif format == "parquet":
+        for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunk_size):
+            yield to_pandas(pa.Table.from_batches([batch]))
+    else:
+        for batch in read_processed_table(path).to_batches(max_chunksize=chunk_size):
+            yield to_pandas(pa.Table.from_batches([batch]))
@@ -0,0 +1,334 @@
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+import requests
+from loguru import logger
+
+SEGMENT_SIZE = 8 * 1024**2
+CHUNK_SIZE = 256 * 1024
+TIMEOUT_SECONDS = 30
+CONTENT_RANGE_PATTERN = re.compile(r"bytes \d+-\d+/(\d+)")
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+class ChecksumError(DownloadError):
+    pass
+
+
+@dataclass
+class RemoteFile:
+    size: int | None
+    accepts_ranges: bool
+    etag: str | None
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        while block := file.read(SEGMENT_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Download:
+    """Ranged download of `url` to `output_path` over several connections, resumable across runs.
+
+    The file is fetched in segments of `segment_size` bytes into
+    `<output_path>.part`, and the bytes written to each segment are recorded in
+    `<output_path>.part.json`, so a download that was interrupted resumes where
+    it stopped if the remote file (size and ETag) didn't change. Segments are
+    handed out in file order, so the start of the file completes first and can
+    be read with `open` while the rest is still downloading. Servers that don't
+    support ranges are downloaded on a single connection from the start.
+
+    Args:
+        url: File to download.
+        output_path: Where the file is moved once it's complete and verified.
+        connections: Segments downloaded at the same time.
+        segment_size: Bytes per ranged request.
+        sha256: Expected hex digest of the file, checked before it's moved to `output_path`.
+        retries: Attempts per segment after the first one, each resuming from the bytes already written.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        output_path: Path,
+        connections: int = 4,
+        segment_size: int = SEGMENT_SIZE,
+        sha256: str | None = None,
+        retries: int = 3,
+    ) -> None:
+        self.url = url
+        self.output_path = output_path
+        self.part_path = output_path.with_name(output_path.name + ".part")
+        self.state_path = output_path.with_name(output_path.name + ".part.json")
+        self.connections = max(1, connections)
+        self.segment_size = segment_size
+        self.sha256 = sha256.lower() if sha256 else None
+        self.retries = retries
+
+        self.remote: RemoteFile | None = None
+        self._segments: list[tuple[int, int | None]] = []
+        self._progress: list[int] = []
+        self._condition = threading.Condition()
+        self._state_lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._finished = False
+        self._error: BaseException | None = None
+        self._thread: threading.Thread | None = None
+        self._sessions = threading.local()
+        self._progress_bar = None
+
+    def start(self) -> "Download":
+        """Probe the remote file, restore the progress of an earlier run and download in a background thread."""
+
+        from tqdm import tqdm
+
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.remote = self._probe()
+        resumed = self._restore_state()
+        if not resumed:
+            with self.part_path.open("wb") as file:
+                if self.remote.size is not None and self.remote.accepts_ranges:
+                    file.truncate(self.remote.size)
+            self._save_state()
+
+        downloaded = sum(self._progress)
+        if downloaded:
+            logger.info(f"Resuming the download of '{self.output_path.name}' at {downloaded / 1024**2:.1f} MB.")
+        self._progress_bar = tqdm(
+            total=self.remote.size, initial=downloaded, unit="B", unit_scale=True, desc="Downloading"
+        )
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def wait(self) -> Path:
+        """Block until the download is complete and verified, re-raising its error if it failed."""
+
+        if self._thread is not None:
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.output_path
+
+    def cancel(self) -> None:
+        """Stop the download, keeping its progress for the next run."""
+
+        self._cancelled.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def open(self) -> BinaryIO:
+        """Read the file from the start while it downloads, blocking until the next bytes arrive.
+
+        The end of the file is only reported once the whole file is verified,
+        and errors of the download are raised from `read`.
+        """
+
+        with self._condition:
+            path = self.output_path if self._finished and self._error is None else self.part_path
+            file = path.open("rb", buffering=0)
+
+        return io.BufferedReader(_DownloadReader(self, file), buffer_size=CHUNK_SIZE)
+
+    @property
+    def available(self) -> int:
+        """Bytes downloaded contiguously from the start of the file."""
+
+        available = 0
+        for (start, end), progress in zip(self._segments, self._progress):
+            available += progress
+            if end is None or start + progress < end:
+                break
+        return available
+
+    def wait_for(self, position: int) -> int:
+        """Block until byte `position` is downloaded or the download finished, returning `available`."""
+
+        with self._condition:
+            while self.available <= position and not self._finished:
+                self._condition.wait()
+            if self._error is not None:
+                raise self._error
+            return self.available
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._sessions, "session"):
+            self._sessions.session = requests.Session()
+        return self._sessions.session
+
+    def _probe(self) -> RemoteFile:
+        headers = {"Range": "bytes=0-0", "Accept-Encoding": "identity"}
+        with self._session().get(self.url, headers=headers, stream=True, timeout=TIMEOUT_SECONDS) as response:
+            response.raise_for_status()
+            etag = response.headers.get("ETag")
+            content_range = CONTENT_RANGE_PATTERN.fullmatch(response.headers.get("Content-Range", ""))
+            if response.status_code == 206 and content_range:
+                return RemoteFile(size=int(content_range.group(1)), accepts_ranges=True, etag=etag)
+
+            content_length = response.headers.get("Content-Length")
+            return RemoteFile(size=int(content_length) if content_length else None, accepts_ranges=False, etag=etag)
+
+    def _plan_segments(self) -> list[tuple[int, int | None]]:
+        if not self.remote.accepts_ranges:
+            return [(0, self.remote.size)]
+        return [
+            (start, min(start + self.segment_size, self.remote.size))
+            for start in range(0, self.remote.size, self.segment_size)
+        ]
+
+    def _restore_state(self) -> bool:
+        self._segments = self._plan_segments()
+        self._progress = [0] * len(self._segments)
+        if not self.remote.accepts_ranges or not (self.state_path.exists() and self.part_path.exists()):
+            return False
+
+        state = json.loads(self.state_path.read_text())
+        expected = {"url": self.url, "size": self.remote.size, "etag": self.remote.etag, "segment_size": self.segment_size}
+        if any(state.get(key) != value for key, value in expected.items()) or len(state["progress"]) != len(self._segments):
+            logger.info(f"The remote file changed since '{self.part_path}' was written, downloading it again.")
+            return False
+
+        self._progress = state["progress"]
+        return True
+
+    def _save_state(self) -> None:
+        if not self.remote.accepts_ranges:
+            return
+        with self._condition:
+            state = {
+                "url": self.url,
+                "size": self.remote.size,
+                "etag": self.remote.etag,
+                "segment_size": self.segment_size,
+                "progress": list(self._progress),
+            }
+        with self._state_lock:
+            partial_path = self.state_path.with_suffix(".tmp")
+            partial_path.write_text(json.dumps(state))
+            partial_path.replace(self.state_path)
+
+    def _advance(self, segment: int, num_bytes: int) -> None:
+        with self._condition:
+            self._progress[segment] += num_bytes
+            self._condition.notify_all()
+        self._progress_bar.update(num_bytes)
+
+    def _run(self) -> None:
+        try:
+            pending = [
+                segment
+                for segment, ((start, end), progress) in enumerate(zip(self._segments, self._progress))
+                if end is None or start + progress < end
+            ]
+            with ThreadPoolExecutor(max_workers=min(self.connections, len(pending) or 1)) as executor:
+                for _ in executor.map(self._download_segment, pending):
+                    pass
+
+            if self.remote.size is not None and self.available != self.remote.size:
+                raise DownloadError(f"Downloaded {self.available} bytes of {self.remote.size}.")
+            if self.sha256 is not None:
+                checksum = sha256_file(self.part_path)
+                if checksum != self.sha256:
+                    self.part_path.unlink()
+                    self.state_path.unlink(missing_ok=True)
+                    raise ChecksumError(f"'{self.url}' has SHA-256 {checksum}, expected {self.sha256}.")
+
+            with self._condition:
+                self.part_path.replace(self.output_path)
+            self.state_path.unlink(missing_ok=True)
+        except BaseException as e:
+            self._cancelled.set()
+            self._error = e
+            if self.part_path.exists():
+                self._save_state()
+        finally:
+            self._progress_bar.close()
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+    def _download_segment(self, segment: int) -> None:
+        start, end = self._segments[segment]
+        for attempt in range(self.retries + 1):
+            offset = start + self._progress[segment]
+            try:
+                self._fetch(segment, offset, end)
+                break
+            except (requests.exceptions.RequestException, DownloadError) as e:
+                if self._cancelled.is_set() or attempt == self.retries:
+                    raise
+                logger.warning(f"Retrying bytes {offset}-{end} of '{self.url}' after: {e}")
+                time.sleep(2**attempt)
+
+        if self.remote.accepts_ranges:
+            self._save_state()
+
+    def _fetch(self, segment: int, offset: int, end: int | None) -> None:
+        headers = {"Accept-Encoding": "identity"}
+        if self.remote.accepts_ranges:
+            headers["Range"] = f"bytes={offset}-{end - 1}"
+        elif offset:
+            # Without ranges a retry starts over.
+            with self._condition:
+                self._progress[segment] = 0
+            self._progress_bar.reset(total=self.remote.size)
+            offset = 0
+
+        with self._session().get(self.url, headers=headers, stream=True, timeout=TIMEOUT_SECONDS) as response:
+            response.raise_for_status()
+            if self.remote.accepts_ranges and response.status_code != 206:
+                raise DownloadError(f"The server ignored the range request for bytes {offset}-{end - 1}.")
+
+            with self.part_path.open("r+b") as file:
+                file.seek(offset)
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if self._cancelled.is_set():
+                        raise DownloadError("The download was cancelled.")
+                    file.write(chunk)
+                    # Flushed before the progress is published, so readers never see unwritten bytes.
+                    file.flush()
+                    self._advance(segment, len(chunk))
+                    offset += len(chunk)
+
+        if end is not None and offset < end:
+            raise DownloadError(f"The connection closed at byte {offset} of {end}.")
+
+
+class _DownloadReader(io.RawIOBase):
+    """Sequential reader over the file of a `Download` that is still being written."""
+
+    def __init__(self, download: Download, file: BinaryIO) -> None:
+        self._download = download
+        self._file = file
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        available = self._download.wait_for(self._position)
+        if available <= self._position:
+            return 0
+
+        num_bytes = self._file.readinto(memoryview(buffer)[: available - self._position])
+        self._position += num_bytes
+        return num_bytes
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
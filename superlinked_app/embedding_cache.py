@@ -0,0 +1,181 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+from loguru import logger
+
+# Rough OpenAI tokenizer ratio, only used to estimate the API spend saved by the cache.
+CHARS_PER_TOKEN = 4
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing so trivially different copies share one cache entry."""
+
+    return " ".join(unicodedata.normalize("NFC", str(text)).split())
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    duplicates: int = 0
+    evictions: int = 0
+    saved_chars: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.saved_chars // CHARS_PER_TOKEN
+
+    def log(self) -> None:
+        logger.info(
+            f"Embedding cache: {self.hits} hits, {self.misses} misses ({self.hit_rate:.1%} hit rate), "
+            f"{self.duplicates} in-batch duplicates, {self.evictions} evictions, "
+            f"~{self.saved_tokens} tokens saved."
+        )
+
+
+class EmbeddingCache:
+    """Persistent, content-addressed embedding cache stored in SQLite.
+
+    Entries are keyed by the model id and the SHA-256 of the normalized text, and
+    vectors are stored as float32 blobs. When the stored vectors exceed `max_bytes`
+    the least recently used entries are evicted.
+
+    Args:
+        path: SQLite database file, created if it doesn't exist.
+        max_bytes: Size budget for the stored vectors, or None for no limit.
+    """
+
+    def __init__(self, path: Path, max_bytes: int | None = 2 * 1024**3) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash BLOB NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)"
+        )
+        self._connection.commit()
+        self._total_bytes = self._connection.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+        if max_bytes is not None and self._total_bytes > max_bytes:
+            self._evict(target_bytes=int(max_bytes * 0.9))
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def get_many(self, model: str, texts: Sequence[str]) -> dict[str, list[float]]:
+        """Return the cached vectors of the given (already normalized) texts."""
+
+        hashes = {text_hash(text): text for text in texts}
+        found: dict[str, list[float]] = {}
+        with self._lock:
+            hash_list = list(hashes)
+            # Stay well below SQLite's limit of host parameters per statement.
+            for start in range(0, len(hash_list), 500):
+                chunk = hash_list[start : start + 500]
+                rows = self._connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                    f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk],
+                ).fetchall()
+                for hash_, vector in rows:
+                    found[hashes[hash_]] = np.frombuffer(vector, dtype=np.float32).tolist()
+
+            now = time.time()
+            self._connection.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                [(now, model, text_hash(text)) for text in found],
+            )
+            self._connection.commit()
+
+            self.stats.hits += len(found)
+            self.stats.misses += len(texts) - len(found)
+            self.stats.saved_chars += sum(len(text) for text in found)
+
+        return found
+
+    def put_many(self, model: str, vectors: dict[str, Sequence[float]]) -> None:
+        """Store vectors of (already normalized) texts and evict if over budget."""
+
+        now = time.time()
+        rows = [
+            (model, text_hash(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in vectors.items()
+        ]
+        with self._lock:
+            before = self._connection.total_changes
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._connection.commit()
+            inserted = self._connection.total_changes - before
+            if inserted:
+                self._total_bytes += inserted * len(rows[0][2])
+
+            if self.max_bytes is not None and self._total_bytes > self.max_bytes:
+                self._evict(target_bytes=int(self.max_bytes * 0.9))
+
+    def record_duplicates(self, count: int) -> None:
+        with self._lock:
+            self.stats.duplicates += count
+
+    def _evict(self, target_bytes: int) -> None:
+        while self._total_bytes > target_bytes:
+            rows = self._connection.execute(
+                "SELECT model, text_hash, LENGTH(vector) FROM embeddings ORDER BY last_access LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+
+            evicted = []
+            for model, hash_, size in rows:
+                evicted.append((model, hash_))
+                self._total_bytes -= size
+                if self._total_bytes <= target_bytes:
+                    break
+            self._connection.executemany(
+                "DELETE FROM embeddings WHERE model = ? AND text_hash = ?", evicted
+            )
+            self._connection.commit()
+            self.stats.evictions += len(evicted)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
@@ -0,0 +1,310 @@
+import functools
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Protocol, Sequence
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from superlinked_app import constants
+from superlinked_app.embedding_cache import EmbeddingCache, normalize_text
+from superlinked_app.instrumentation import span, trace
+
+if TYPE_CHECKING:
+    import openai
+
+# Maps the text column of a processed row to the column holding its embedding.
+EMBEDDING_COLUMNS = {
+    "title": "title_embedding",
+    "description": "description_embedding",
+}
+
+# text-embedding-3-small accepts at most 8191 tokens per input, so very long
+# descriptions are clipped before being sent.
+MAX_TEXT_CHARS = 16_000
+
+
+@functools.cache
+def retryable_errors() -> tuple[type[Exception], ...]:
+    """OpenAI errors worth retrying. openai is imported here so the hash embedder doesn't pay for it."""
+
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.InternalServerError,
+    )
+
+
+class Embedder(Protocol):
+    """Anything that turns a batch of texts into one vector per text."""
+
+    model: str
+
+    def embed(self, texts: Sequence[str]) -> list[list[float]]: ...
+
+
+class OpenAIEmbedder:
+    """Embeds a whole batch of texts with a single `embeddings.create` call.
+
+    Retries are disabled on the client because `EmbeddingPipeline` owns the
+    backoff policy. With `dimensions` set, the API returns shortened vectors and
+    the dimension becomes part of `model`, so cached vectors of different sizes
+    don't mix.
+    """
+
+    def __init__(
+        self,
+        model: str = constants.EMBEDDING_MODEL_ID,
+        base_url: str | None = None,
+        client: "openai.OpenAI | None" = None,
+        dimensions: int | None = None,
+    ) -> None:
+        self.model = model if dimensions is None else f"{model}@{dimensions}"
+        self.model_id = model
+        self.dimensions = dimensions
+        if client is None:
+            import openai
+
+            client = openai.OpenAI(base_url=base_url, max_retries=0)
+        self._client = client
+
+    def embed(self, texts: Sequence[str]) -> list[list[float]]:
+        options = {} if self.dimensions is None else {"dimensions": self.dimensions}
+        response = self._client.embeddings.create(input=list(texts), model=self.model_id, **options)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class HashEmbedder:
+    """Deterministic, network-free embedder used for offline runs and benchmarks.
+
+    Every text is mapped to a unit vector seeded from its SHA-256 digest, so the
+    same text always gets the same vector. `latency_seconds` simulates the round
+    trip of a remote endpoint.
+    """
+
+    def __init__(
+        self,
+        dimensions: int = constants.EMBEDDING_DIMENSIONS,
+        latency_seconds: float = 0.0,
+        model: str = "hash-embedder",
+    ) -> None:
+        self.model = model if dimensions == constants.EMBEDDING_DIMENSIONS else f"{model}@{dimensions}"
+        self.dimensions = dimensions
+        self.latency_seconds = latency_seconds
+
+    def embed(self, texts: Sequence[str]) -> list[list[float]]:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+        return [self.embed_one(text) for text in texts]
+
+    def embed_one(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions)
+
+        return (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+
+
+@dataclass
+class EmbeddingStats:
+    rows: int = 0
+    texts: int = 0
+    requests: int = 0
+    retries: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def log(self) -> None:
+        logger.info(
+            f"Embedded {self.rows} rows ({self.texts} texts) in {self.elapsed_seconds:.2f}s: "
+            f"{self.rows_per_second:.1f} rows/sec, {self.requests} requests, {self.retries} retries."
+        )
+
+
+class EmbeddingPipeline:
+    """Embeds texts in batches with bounded concurrency and rate-limit backoff.
+
+    Args:
+        embedder: Backend that embeds one batch per call.
+        batch_size: Maximum number of texts per request.
+        max_batch_chars: Maximum number of characters per request, to stay under
+            the per-request token limit when descriptions are long.
+        max_workers: Number of requests in flight at the same time.
+        max_retries: Retries per batch before the error is raised.
+        initial_backoff_seconds: First backoff delay, doubled on every retry.
+        max_backoff_seconds: Upper bound of a single backoff delay.
+        dimensions: Size of the zero vector used for empty texts.
+        cache: Optional persistent cache consulted before any request is made.
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        batch_size: int = 128,
+        max_batch_chars: int = 200_000,
+        max_workers: int = 4,
+        max_retries: int = 6,
+        initial_backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 60.0,
+        dimensions: int = constants.EMBEDDING_DIMENSIONS,
+        cache: EmbeddingCache | None = None,
+    ) -> None:
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.initial_backoff_seconds = initial_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.dimensions = dimensions
+        self.cache = cache
+
+        self.stats = EmbeddingStats()
+        self._stats_lock = threading.Lock()
+
+    def embed_texts(self, texts: Sequence[str]) -> list[list[float]]:
+        """Embed texts, preserving their order. Empty texts get a zero vector.
+
+        Duplicate texts are embedded once, and with a cache configured only the
+        texts missing from it are sent to the embedder. The cache is keyed by the
+        normalized text, but the embedder always gets the original one, so the
+        vectors don't depend on whether the cache is on.
+        """
+
+        start_time = time.perf_counter()
+
+        texts = [str(text)[:MAX_TEXT_CHARS] for text in texts]
+
+        positions: dict[str, list[int]] = {}
+        for i, text in enumerate(texts):
+            if text.strip():
+                positions.setdefault(text, []).append(i)
+
+        vectors: list[list[float]] = [[0.0] * self.dimensions for _ in texts]
+        found: dict[str, list[float]] = {}
+        if self.cache is not None:
+            self.cache.record_duplicates(
+                sum(len(indices) - 1 for indices in positions.values())
+            )
+            keys = {text: normalize_text(text) for text in positions}
+            with span("cache"):
+                cached = self.cache.get_many(self.embedder.model, list(dict.fromkeys(keys.values())))
+            found = {text: cached[key] for text, key in keys.items() if key in cached}
+
+        missing = [text for text in positions if text not in found]
+        batches = self._make_batches(missing)
+        with span("embedding"), ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for batch, batch_vectors in zip(
+                batches, executor.map(self._embed_batch, batches)
+            ):
+                found.update(zip(batch, batch_vectors))
+
+        for text, indices in positions.items():
+            for i in indices:
+                vectors[i] = found[text]
+
+        with self._stats_lock:
+            self.stats.texts += len(texts)
+            self.stats.elapsed_seconds += time.perf_counter() - start_time
+
+        return vectors
+
+    def embed_dataframe(
+        self, df: pd.DataFrame, columns: dict[str, str] = EMBEDDING_COLUMNS
+    ) -> pd.DataFrame:
+        """Return a copy of `df` with one embedding column per text column."""
+
+        df_embedded = df.copy()
+        with trace("ingest", "embed_dataframe"):
+            for text_column, embedding_column in columns.items():
+                df_embedded[embedding_column] = self.embed_texts(
+                    df_embedded[text_column].fillna("").tolist()
+                )
+
+        with self._stats_lock:
+            self.stats.rows += len(df_embedded)
+
+        return df_embedded
+
+    def _make_batches(self, texts: list[str]) -> list[list[str]]:
+        batches: list[list[str]] = []
+        batch: list[str] = []
+        batch_chars = 0
+        for text in texts:
+            if batch and (
+                len(batch) >= self.batch_size
+                or batch_chars + len(text) > self.max_batch_chars
+            ):
+                batches.append(batch)
+                batch, batch_chars = [], 0
+            batch.append(text)
+            batch_chars += len(text)
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        vectors = self._embed_batch_with_retries(texts)
+        if self.cache is not None:
+            self.cache.put_many(self.embedder.model, {normalize_text(text): vector for text, vector in zip(texts, vectors)})
+
+        return vectors
+
+    def _embed_batch_with_retries(self, texts: list[str]) -> list[list[float]]:
+        attempt = 0
+        while True:
+            with self._stats_lock:
+                self.stats.requests += 1
+            try:
+                return self.embedder.embed(texts)
+            except retryable_errors() as e:
+                if attempt >= self.max_retries:
+                    raise
+
+                delay = self._backoff_delay(attempt, e)
+                attempt += 1
+                logger.warning(
+                    f"Embedding request failed with {type(e).__name__}, retrying in {delay:.1f}s "
+                    f"(attempt {attempt}/{self.max_retries})."
+                )
+                with self._stats_lock:
+                    self.stats.retries += 1
+                time.sleep(delay)
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff_seconds)
+
+        delay = min(self.initial_backoff_seconds * 2**attempt, self.max_backoff_seconds)
+
+        return delay * random.uniform(0.5, 1.0)
+
+
+def _retry_after_seconds(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+
+    return None
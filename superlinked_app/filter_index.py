@@ -0,0 +1,234 @@
+import numbers
+from typing import Any, Callable, Sequence
+
+import numpy as np
+from superlinked.framework.common.interface.comparison_operand import ComparisonOperation
+from superlinked.framework.common.interface.comparison_operation_type import ComparisonOperationType as Op
+from superlinked.framework.common.storage.field.field import Field
+from superlinked.framework.storage.in_memory.in_memory_search import InMemorySearch
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+class Bitmap:
+    """Fixed-size set of row positions stored one bit per row."""
+
+    def __init__(self, bits: np.ndarray, size: int) -> None:
+        self.bits = bits
+        self.size = size
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray) -> "Bitmap":
+        return cls(np.packbits(mask), len(mask))
+
+    @classmethod
+    def from_positions(cls, positions: np.ndarray, size: int) -> "Bitmap":
+        mask = np.zeros(size, dtype=bool)
+        mask[positions] = True
+        return cls.from_mask(mask)
+
+    @classmethod
+    def full(cls, size: int, value: bool) -> "Bitmap":
+        return cls.from_mask(np.full(size, value))
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        return Bitmap(self.bits & other.bits, self.size)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        return Bitmap(self.bits | other.bits, self.size)
+
+    def __invert__(self) -> "Bitmap":
+        # Padding bits past `size` flip too, but to_mask never reads them.
+        return Bitmap(~self.bits, self.size)
+
+    def to_mask(self) -> np.ndarray:
+        return np.unpackbits(self.bits, count=self.size).astype(bool)
+
+
+class ValueBitmapIndex:
+    """One bitmap per distinct value, for string fields and for the elements of list fields."""
+
+    def __init__(self, values: Sequence[Any], is_list: bool) -> None:
+        self.size = len(values)
+        self.is_list = is_list
+        positions: dict[Any, list[int]] = {}
+        missing = []
+        for position, value in enumerate(values):
+            if value is None:
+                missing.append(position)
+            elif is_list:
+                for element in set(value):
+                    positions.setdefault(element, []).append(position)
+            else:
+                positions.setdefault(value, []).append(position)
+        self.bitmaps = {key: Bitmap.from_positions(np.array(rows), self.size) for key, rows in positions.items()}
+        self.missing = Bitmap.from_positions(np.array(missing, dtype=np.int64), self.size)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(bitmap.nbytes for bitmap in self.bitmaps.values()) + self.missing.nbytes
+
+    def _lookup(self, key: Any) -> Bitmap:
+        if key is None:
+            return self.missing if not self.is_list else Bitmap.full(self.size, False)
+        try:
+            return self.bitmaps.get(key) or Bitmap.full(self.size, False)
+        except TypeError:
+            return Bitmap.full(self.size, False)
+
+    def _any_of(self, keys: Sequence[Any]) -> Bitmap:
+        result = Bitmap.full(self.size, False)
+        for key in keys:
+            result = result | self._lookup(key)
+        return result
+
+    def evaluate(self, op: Op, other: Any, others: Sequence[Any]) -> Bitmap | None:
+        """Bitmap of the rows for which `ComparisonOperation.evaluate` is True, None if unsupported.
+
+        `others` is the operand as the sequence the membership operations iterate over.
+        """
+
+        if not self.is_list:
+            if op == Op.EQUAL:
+                return self._lookup(other)
+            if op == Op.NOT_EQUAL:
+                return ~self._lookup(other)
+            if op == Op.IN:
+                return self._any_of(others)
+            if op == Op.NOT_IN:
+                return ~self._any_of(others)
+            return None
+
+        # For list fields `other in value` tests the elements, and a list never
+        # equals a scalar, so only missing rows can equal one (None).
+        if op in (Op.EQUAL, Op.NOT_EQUAL) and not isinstance(other, list):
+            equal = self.missing if other is None else Bitmap.full(self.size, False)
+            return equal if op == Op.EQUAL else ~equal
+        if op == Op.CONTAINS:
+            return self._any_of(others)
+        if op == Op.NOT_CONTAINS:
+            return ~self.missing & ~self._any_of(others)
+        if op == Op.CONTAINS_ALL:
+            result = Bitmap.full(self.size, True)
+            for key in others:
+                result = result & self._lookup(key)
+            return result | self.missing
+        return None
+
+
+class SortedNumberIndex:
+    """Values of a numeric field sorted once, so range filters are two binary searches."""
+
+    def __init__(self, values: Sequence[Any]) -> None:
+        self.size = len(values)
+        numbers_ = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        present = np.flatnonzero(~np.isnan(numbers_))
+        order = np.argsort(numbers_[present], kind="stable")
+        self.positions = present[order]
+        self.values = numbers_[self.positions]
+
+    @property
+    def nbytes(self) -> int:
+        return self.positions.nbytes + self.values.nbytes
+
+    def _range(self, low: float, high: float, include_low: bool, include_high: bool) -> Bitmap:
+        start = np.searchsorted(self.values, low, side="left" if include_low else "right")
+        end = np.searchsorted(self.values, high, side="right" if include_high else "left")
+        return Bitmap.from_positions(self.positions[start:max(start, end)], self.size)
+
+    def _equal_any(self, others: Sequence[Any]) -> Bitmap:
+        result = Bitmap.full(self.size, False)
+        for other in others:
+            result = result | self._range(other, other, True, True)
+        return result
+
+    def evaluate(self, op: Op, other: Any, others: Sequence[Any]) -> Bitmap | None:
+        others = others if op in (Op.IN, Op.NOT_IN) else [other]
+        if not all(_is_number(value) and not np.isnan(value) for value in others):
+            return None
+
+        match op:
+            case Op.GREATER_THAN:
+                return self._range(other, np.inf, False, True)
+            case Op.GREATER_EQUAL:
+                return self._range(other, np.inf, True, True)
+            case Op.LESS_THAN:
+                return self._range(-np.inf, other, True, False)
+            case Op.LESS_EQUAL:
+                return self._range(-np.inf, other, True, True)
+            case Op.EQUAL | Op.IN:
+                return self._equal_any(others)
+            case Op.NOT_EQUAL | Op.NOT_IN:
+                return ~self._equal_any(others)
+        return None
+
+
+class FilterIndex:
+    """Secondary indexes over the filterable fields of the rows of a vector index.
+
+    String fields get a bitmap per value, list fields a bitmap per element and
+    numeric fields a sorted array. Filters are answered with bitmap operations
+    that follow `ComparisonOperation.evaluate`; any filter these indexes can't
+    answer, e.g. on a field with mixed value types, is evaluated row by row.
+
+    Args:
+        rows: Stored values of every row, in the order of the vector index.
+        field_names: Fields to index.
+    """
+
+    def __init__(self, rows: Sequence[dict[str, Any]], field_names: Sequence[str]) -> None:
+        self.rows = rows
+        self.indices: dict[str, ValueBitmapIndex | SortedNumberIndex] = {}
+        for field_name in field_names:
+            index = self._build(field_name, [row.get(field_name) for row in rows])
+            if index is not None:
+                self.indices[field_name] = index
+
+    @property
+    def nbytes(self) -> int:
+        return sum(index.nbytes for index in self.indices.values())
+
+    @staticmethod
+    def _build(field_name: str, values: list[Any]) -> ValueBitmapIndex | SortedNumberIndex | None:
+        present = [value for value in values if value is not None]
+        if all(isinstance(value, str) for value in present):
+            return ValueBitmapIndex(values, is_list=False)
+        if all(isinstance(value, list) and all(isinstance(element, str) for element in value) for value in present):
+            return ValueBitmapIndex(values, is_list=True)
+        if all(_is_number(value) for value in present):
+            return SortedNumberIndex(values)
+        return None
+
+    def mask(self, filters: Sequence[ComparisonOperation[Field]]) -> np.ndarray:
+        """Boolean mask of the rows passing all filter groups."""
+
+        result = Bitmap.full(len(self.rows), True)
+        for group_key, group in ComparisonOperation._group_filters_by_group_key(filters).items():
+            combine: Callable[[Bitmap, Bitmap], Bitmap] = (lambda a, b: a & b) if group_key is None else (lambda a, b: a | b)
+            group_result = Bitmap.full(len(self.rows), group_key is None)
+            for filter_ in group:
+                group_result = combine(group_result, self._evaluate(filter_))
+            result = result & group_result
+
+        return result.to_mask()
+
+    def _evaluate(self, filter_: ComparisonOperation[Field]) -> Bitmap:
+        field_name = filter_._operand.name
+        index = self.indices.get(field_name)
+        bitmap = index.evaluate(filter_._op, filter_._other, filter_._get_other_as_sequence()) if index is not None else None
+        if bitmap is not None:
+            return bitmap
+
+        return Bitmap.from_mask(
+            np.fromiter(
+                (InMemorySearch._is_subset(row, [filter_]) for row in self.rows),
+                dtype=bool,
+                count=len(self.rows),
+            )
+        )
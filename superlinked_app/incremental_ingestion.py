@@ -0,0 +1,236 @@
+import hashlib
+import json
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from superlinked_app.embedding_cache import normalize_text
+from superlinked_app.embeddings import EMBEDDING_COLUMNS, EmbeddingPipeline
+
+ID_COLUMN = "asin"
+
+
+def text_fingerprints(texts: pd.Series) -> list[str]:
+    """Fingerprint of the text that is embedded, so formatting-only edits don't trigger re-embedding."""
+
+    return [hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest() for text in texts.fillna("")]
+
+
+def row_fingerprints(df: pd.DataFrame) -> list[str]:
+    """Fingerprint of every stored field of a row, embeddings excluded."""
+
+    columns = sorted(column for column in df.columns if column not in EMBEDDING_COLUMNS.values())
+    records = df[columns].to_dict(orient="records")
+
+    return [
+        hashlib.sha256(json.dumps(record, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        for record in records
+    ]
+
+
+@dataclass
+class DeltaStats:
+    new: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    reembedded: dict[str, int] = field(default_factory=dict)
+
+    def log(self) -> None:
+        reembedded = ", ".join(f"{count} {column}s" for column, count in self.reembedded.items()) or "nothing"
+        logger.info(
+            f"Delta: {self.new} new, {self.changed} changed, {self.unchanged} unchanged, "
+            f"{self.removed} removed products; re-embedded {reembedded}."
+        )
+
+
+@dataclass
+class ProductDelta:
+    """Products to upsert, with their embeddings, and asins to tombstone.
+
+    `snapshot` is the full embedded catalogue after the delta is applied, in
+    the order of the processed dataset.
+    """
+
+    upserts: pd.DataFrame
+    removed: list[str]
+    snapshot: pd.DataFrame
+    stats: DeltaStats
+    fingerprints: pd.DataFrame
+
+    @property
+    def is_empty(self) -> bool:
+        return self.upserts.empty and not self.removed
+
+
+class IngestionState:
+    """Per-asin content fingerprints of the last loaded catalogue, stored in SQLite.
+
+    Removed products are kept as tombstones, so a product that comes back is
+    reported as new rather than unchanged.
+
+    Args:
+        path: SQLite database file, created if it doesn't exist.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.path = path
+        self._connection = sqlite3.connect(str(path))
+        columns = ", ".join(f"{column}_hash TEXT" for column in EMBEDDING_COLUMNS)
+        self._connection.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS products (
+                asin TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                {columns},
+                deleted INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+
+    def load(self) -> pd.DataFrame:
+        """Fingerprints of the live products, indexed by asin."""
+
+        return pd.read_sql_query(
+            "SELECT * FROM products WHERE deleted = 0", self._connection, index_col=ID_COLUMN
+        )
+
+    def commit(self, delta: ProductDelta) -> None:
+        """Record a delta once it has been loaded, so a failed load is retried on the next run."""
+
+        now = time.time()
+        hash_columns = [f"{column}_hash" for column in EMBEDDING_COLUMNS]
+        fingerprints = delta.fingerprints.loc[delta.upserts[ID_COLUMN]]
+        with self._connection:
+            self._connection.executemany(
+                f"""
+                INSERT INTO products (asin, fingerprint, {', '.join(hash_columns)}, deleted, updated_at)
+                VALUES (?, ?, {', '.join('?' * len(hash_columns))}, 0, ?)
+                ON CONFLICT (asin) DO UPDATE SET
+                    fingerprint = excluded.fingerprint,
+                    {', '.join(f'{column} = excluded.{column}' for column in hash_columns)},
+                    deleted = 0,
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    (asin, row.fingerprint, *(getattr(row, column) for column in hash_columns), now)
+                    for asin, row in zip(fingerprints.index, fingerprints.itertuples(index=False))
+                ],
+            )
+            self._connection.executemany(
+                "UPDATE products SET deleted = 1, updated_at = ? WHERE asin = ?",
+                [(now, asin) for asin in delta.removed],
+            )
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def compute_delta(
+    df: pd.DataFrame,
+    state: IngestionState,
+    pipeline: EmbeddingPipeline,
+    previous: pd.DataFrame | None = None,
+) -> ProductDelta:
+    """Compare a processed catalogue with the last loaded one and embed what changed.
+
+    A product is new if its asin isn't live in `state` and changed if any of its
+    fields differ. Embeddings of `previous`, the last embedded snapshot, are
+    reused for texts whose fingerprint didn't change; every other text of a new
+    or changed product goes through `pipeline`.
+    """
+
+    df = df.drop(columns=[column for column in EMBEDDING_COLUMNS.values() if column in df.columns])
+    df = df.drop_duplicates(ID_COLUMN, keep="last").reset_index(drop=True)
+
+    fingerprints = pd.DataFrame(
+        {
+            "fingerprint": row_fingerprints(df),
+            **{f"{column}_hash": text_fingerprints(df[column]) for column in EMBEDDING_COLUMNS},
+        },
+        index=pd.Index(df[ID_COLUMN], name=ID_COLUMN),
+    )
+    live = state.load()
+    loaded = live.reindex(fingerprints.index)
+    is_new = loaded["fingerprint"].isna().to_numpy()
+    is_changed = ~is_new & (loaded["fingerprint"] != fingerprints["fingerprint"]).to_numpy()
+    removed = sorted(set(live.index) - set(fingerprints.index))
+
+    stats = DeltaStats(
+        new=int(is_new.sum()),
+        changed=int(is_changed.sum()),
+        unchanged=int((~is_new & ~is_changed).sum()),
+        removed=len(removed),
+    )
+
+    previous_embeddings = None
+    if previous is not None and not previous.empty:
+        previous_embeddings = previous.drop_duplicates(ID_COLUMN, keep="last").set_index(ID_COLUMN)
+
+    snapshot = df.copy()
+    for text_column, embedding_column in EMBEDDING_COLUMNS.items():
+        hash_column = f"{text_column}_hash"
+        # Texts the last snapshot embedded and that are still the same.
+        reusable = (~is_new & (loaded[hash_column] == fingerprints[hash_column])).to_numpy()
+        embeddings: list = [None] * len(df)
+        if previous_embeddings is not None and embedding_column in previous_embeddings.columns:
+            found = previous_embeddings[embedding_column].reindex(df[ID_COLUMN]).tolist()
+            reusable &= np.array([isinstance(vector, (list, np.ndarray)) for vector in found], dtype=bool)
+            for i in np.flatnonzero(reusable):
+                embeddings[i] = list(found[i])
+        else:
+            reusable[:] = False
+
+        to_embed = np.flatnonzero(~reusable)
+        if len(to_embed):
+            vectors = pipeline.embed_texts(df[text_column].iloc[to_embed].fillna("").tolist())
+            for i, vector in zip(to_embed, vectors):
+                embeddings[i] = vector
+        snapshot[embedding_column] = embeddings
+        stats.reembedded[text_column] = len(to_embed)
+
+    upserts = snapshot[is_new | is_changed].reset_index(drop=True)
+
+    return ProductDelta(upserts=upserts, removed=removed, snapshot=snapshot, stats=stats, fingerprints=fingerprints)
+
+
+def apply_delta(app, source, schema, delta: ProductDelta) -> None:
+    """Upsert the changed products through `source` and delete the removed ones from the app's vector database.
+
+    Superlinked has no delete operation, so tombstones are only supported with
+    the InMemory vector databases, where rows are dropped from the store, and
+    with `BulkMongoDBVectorDatabase`, where their documents are deleted.
+    """
+
+    # Imported here, computing a delta doesn't need Superlinked.
+    from superlinked.framework.storage.in_memory.in_memory_vdb import InMemoryVDB
+
+    from superlinked_app.ann_index import ANNInMemoryVDB
+    from superlinked_app.mongo_ingestion import BulkMongoDBVDBConnector
+
+    if not delta.upserts.empty:
+        source.put([delta.upserts])
+    if not delta.removed:
+        return
+
+    connector = app.storage_manager._vdb_connector
+    row_ids = [f"{schema._schema_name}:{asin}" for asin in delta.removed]
+    if isinstance(connector, (ANNInMemoryVDB, BulkMongoDBVDBConnector)):
+        connector.remove_rows(row_ids)
+        return
+    if not isinstance(connector, InMemoryVDB):
+        raise NotImplementedError(
+            f"Removing products isn't supported by {type(connector).__name__}, reload the full catalogue instead."
+        )
+
+    for row_id in row_ids:
+        connector._vdb.pop(row_id, None)
@@ -1,15 +1,44 @@
-from openai import OpenAI
+import functools
 from superlinked_app import constants
+from superlinked_app.config import settings
+from superlinked_app.instrumentation import span
+from superlinked_app.micro_batching import get_scheduler
+from superlinked_app.query_cache import get_query_cache
+from superlinked_app.vector_compression import truncate_embeddings
 from superlinked import framework as sl
 
-client = OpenAI()
+# Embeddings requests of micro-batched queries in flight at the same time.
+EMBEDDING_BATCH_CONCURRENCY = 8
+
+@functools.cache
+def get_openai_client():
+    """OpenAI client for the query embeddings, created on first use so importing needs no credentials."""
+
+    from openai import OpenAI
+
+    return OpenAI(api_key=settings.require_openai_api_key())
 
 def openai_embed(text: str) -> list[float]:
-    resp = client.embeddings.create(
-                                input=text,
-                                model="text-embedding-3-small"          # <-- your desired model here
+    vector = get_query_cache().embed_query(text, constants.EMBEDDING_MODEL_ID, _openai_embed)
+    return truncate_embeddings(vector, settings.EMBEDDING_DIMENSIONS).tolist()
+
+def _openai_embed(text: str) -> list[float]:
+    scheduler = get_scheduler()
+    with span("embedding"):
+        if scheduler is None:
+            return _openai_embed_batch([text])[0]
+
+        # Concurrent queries share one embeddings request.
+        return scheduler.submit("embedding", text, _openai_embed_batch, concurrency=EMBEDDING_BATCH_CONCURRENCY)
+
+def _openai_embed_batch(texts: list[str]) -> list[list[float]]:
+    unique_texts = list(dict.fromkeys(texts))
+    resp = get_openai_client().embeddings.create(
+                                input=unique_texts,
+                                model=constants.EMBEDDING_MODEL_ID
                                 )
-    return resp.data[0].embedding
+    embeddings = {unique_texts[item.index]: item.embedding for item in resp.data}
+    return [embeddings[text] for text in texts]
 
 class ProductSchema(sl.Schema):
         id: sl.IdField
@@ -48,13 +77,13 @@ category_space = sl.CategoricalSimilaritySpace(
 
 title_space = sl.CustomSpace(
                             vector=product.title_embedding,
-                            length=1536,
+                            length=settings.EMBEDDING_DIMENSIONS,
                             description="Embedding from OpenAI text-embedding-3-small"
                             )
 
 description_space = sl.CustomSpace(
                                 vector=product.description_embedding,
-                                length=1536,
+                                length=settings.EMBEDDING_DIMENSIONS,
                                 description="Embedding from OpenAI text-embedding-3-small"
                                 )
 
@@ -0,0 +1,372 @@
+import bisect
+import contextvars
+import cProfile
+import functools
+import itertools
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Mapping
+
+from loguru import logger
+
+from superlinked_app.micro_batching import current_query_type
+
+# Upper bounds in seconds, from a cache hit to a slow LLM call.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram with one series per combination of label values."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...],
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, *label_values: str) -> None:
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Counts per bucket plus +Inf, and [sum].
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[label_values] = series
+            series[0][bucket] += 1
+            series[1][0] += seconds
+
+    def count(self, *label_values: str) -> int:
+        with self._lock:
+            series = self._series.get(label_values)
+            return sum(series[0]) if series else 0
+
+    def total(self, *label_values: str) -> float:
+        with self._lock:
+            series = self._series.get(label_values)
+            return series[1][0] if series else 0.0
+
+    def label_values(self) -> list[tuple[str, ...]]:
+        with self._lock:
+            return sorted(self._series)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(counts), total[0]) for labels, (counts, total) in self._series.items())
+
+        for label_values, counts, total in series:
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, label_values))
+            cumulative = 0
+            for upper_bound, count in zip([*map(repr, self.buckets), "+Inf"], counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{upper_bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_SECONDS = Histogram(
+    "superlinked_app_stage_duration_seconds",
+    "Time spent in one stage of a query or ingest batch.",
+    ("kind", "name", "stage"),
+)
+REQUEST_SECONDS = Histogram(
+    "superlinked_app_request_duration_seconds",
+    "Time of a whole query or ingest batch.",
+    ("kind", "name"),
+)
+METRICS = (REQUEST_SECONDS, STAGE_SECONDS)
+
+
+def render_metrics() -> str:
+    return "\n".join(line for histogram in METRICS for line in histogram.render()) + "\n"
+
+
+@dataclass
+class InstrumentationConfig:
+    """What is recorded besides the histograms.
+
+    Args:
+        slow_request_ms: Requests at least this slow are logged as warnings, the others at debug level.
+        profile_sample_rate: Fraction of the requests run under cProfile.
+        profile_dir: Where the profiles of sampled requests that turned out slow are written.
+    """
+
+    slow_request_ms: float = 1000.0
+    profile_sample_rate: float = 0.0
+    profile_dir: Path = Path("data") / "profiles"
+
+
+@dataclass
+class Trace:
+    """Timings of one query or ingest batch. Stages that run more than once are summed."""
+
+    kind: str
+    name: str
+    started_at: float = field(default_factory=time.perf_counter)
+    stages: dict[str, float] = field(default_factory=dict)
+    profiler: cProfile.Profile | None = None
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+_config: InstrumentationConfig | None = None
+_profile_ids = itertools.count()
+_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("trace", default=None)
+
+
+def is_enabled() -> bool:
+    return _config is not None
+
+
+def enable(config: InstrumentationConfig | None = None) -> None:
+    global _config
+    _config = config or InstrumentationConfig()
+
+
+def disable() -> None:
+    global _config
+    _config = None
+
+
+def current_trace() -> Trace | None:
+    return _trace.get()
+
+
+class span:
+    """Time the enclosed block as `stage` of the current query or ingest batch.
+
+    Spans may nest, e.g. 'scoring' inside 'search', and each one records its
+    own duration. Outside of a `trace` the duration is still added to the
+    histograms, named after the current micro-batching query type.
+    """
+
+    __slots__ = ("stage", "_started_at")
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+        self._started_at = 0.0
+
+    def __enter__(self) -> "span":
+        self._started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if _config is None:
+            return
+        seconds = time.perf_counter() - self._started_at
+        trace_ = _trace.get()
+        if trace_ is None:
+            STAGE_SECONDS.observe(seconds, "query", current_query_type(), self.stage)
+        else:
+            trace_.add(self.stage, seconds)
+            STAGE_SECONDS.observe(seconds, trace_.kind, trace_.name, self.stage)
+
+
+class trace:
+    """Collect the spans of one request, e.g. `with trace("query", "semantic_query"):`.
+
+    When the request ends its total time goes to the histograms and one log
+    line with its stage timings is written. A sampled request is run under
+    cProfile, and its profile kept if it was slow. A trace opened inside
+    another one is part of the outer request and records nothing of its own.
+    """
+
+    __slots__ = ("kind", "name", "_trace", "_token")
+
+    def __init__(self, kind: str, name: str) -> None:
+        self.kind = kind
+        self.name = name
+        self._trace: Trace | None = None
+        self._token = None
+
+    def __enter__(self) -> Trace | None:
+        if _config is None or _trace.get() is not None:
+            return None
+
+        self._trace = Trace(self.kind, self.name)
+        self._token = _trace.set(self._trace)
+        if _config.profile_sample_rate and random.random() < _config.profile_sample_rate:
+            self._trace.profiler = _start_profiler()
+        return self._trace
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if self._trace is None:
+            return
+        trace_ = self._trace
+        seconds = time.perf_counter() - trace_.started_at
+        if trace_.profiler is not None:
+            trace_.profiler.disable()
+        _trace.reset(self._token)
+        self._trace = None
+
+        config = _config
+        if config is None:
+            return
+        REQUEST_SECONDS.observe(seconds, trace_.kind, trace_.name)
+        _log_trace(trace_, seconds, config, failed=exc_type is not None)
+        if trace_.profiler is not None and seconds * 1000 >= config.slow_request_ms:
+            _dump_profile(trace_, seconds, config.profile_dir)
+
+
+def _start_profiler() -> cProfile.Profile | None:
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is active in this process.
+        return None
+    return profiler
+
+
+def _log_trace(trace_: Trace, seconds: float, config: InstrumentationConfig, failed: bool) -> None:
+    stages = {stage: round(stage_seconds * 1000, 2) for stage, stage_seconds in trace_.stages.items()}
+    summary = ", ".join(f"{stage} {ms:.1f} ms" for stage, ms in stages.items())
+    message = f"{trace_.kind} '{trace_.name}' {'failed after' if failed else 'took'} {seconds * 1000:.1f} ms | {summary or 'no spans'}"
+    bound = logger.bind(kind=trace_.kind, name=trace_.name, duration_ms=round(seconds * 1000, 2), stages_ms=stages)
+    if seconds * 1000 >= config.slow_request_ms:
+        bound.warning(message)
+    else:
+        bound.debug(message)
+
+
+def _dump_profile(trace_: Trace, seconds: float, profile_dir: Path) -> None:
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    path = profile_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{next(_profile_ids):04d}-{trace_.kind}-{trace_.name}-{seconds * 1000:.0f}ms.prof"
+    trace_.profiler.dump_stats(path)
+    logger.warning(f"Profile of the slow {trace_.kind} '{trace_.name}' written to '{path}', read it with 'python -m pstats'.")
+
+
+def traced(kind: str, name: Callable[..., str]) -> Callable[[Callable], Callable]:
+    """Decorator running the function in a `trace`, named by calling `name` with the function's arguments."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _config is None:
+                return func(*args, **kwargs)
+            with trace(kind, name(*args, **kwargs)):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def timed(stage: str) -> Callable[[Callable], Callable]:
+    """Decorator running the function in a `span`."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _config is None:
+                return func(*args, **kwargs)
+            with span(stage):
+                return func(*args, **kwargs)
+
+        wrapper.__instrumented__ = True
+        return wrapper
+
+    return decorator
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve the histograms at http://<host>:<port>/metrics from a background thread."""
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving the query and ingest metrics at http://{host}:{server.server_port}/metrics")
+
+    return server
+
+
+def _patch(owner: type, attribute: str, wrap: Callable[[Callable], Callable]) -> None:
+    original = getattr(owner, attribute)
+    if getattr(original, "__instrumented__", False):
+        return
+    wrapped = wrap(original)
+    wrapped.__instrumented__ = True
+    setattr(owner, attribute, wrapped)
+
+
+def install_instrumentation(queries: Mapping[str, Any], config: InstrumentationConfig | None = None) -> None:
+    """Time the stages Superlinked runs for every query and ingested batch.
+
+    Opens a trace per `app.query` call and per `source.put`, and adds spans
+    for the LLM call parsing natural queries, the vector database search and
+    the mapping of its results to stored objects. The stages of this app
+    (embedding, cache lookups, filters, scoring) record their own spans.
+
+    Args:
+        queries: Query descriptors by name, used to name the traces.
+        config: Logging and profiling options.
+    """
+
+    from superlinked.framework.common.nlq.open_ai import OpenAIClient
+    from superlinked.framework.dsl.executor.query.query_executor import QueryExecutor
+    from superlinked.framework.dsl.source.interactive_source import InteractiveSource
+    from superlinked.framework.storage.in_memory.in_memory_vdb import InMemoryVDB
+
+    names = {id(query): name for name, query in queries.items()}
+
+    def query_name(executor, **params) -> str:
+        return names.get(id(executor._query_descriptor), "unknown")
+
+    def source_name(source, data) -> str:
+        return source._schema._schema_name
+
+    _patch(QueryExecutor, "query", traced("query", query_name))
+    _patch(InteractiveSource, "put", traced("ingest", source_name))
+    _patch(OpenAIClient, "query", timed("llm"))
+    _patch(QueryExecutor, "_knn_search", timed("search"))
+    _patch(QueryExecutor, "_map_entities_to_result_entries", timed("serialization"))
+    _patch(InMemoryVDB, "write_entities", timed("write"))
+    enable(config)
+
+
+def instrumentation_from_settings(settings) -> InstrumentationConfig | None:
+    if not settings.INSTRUMENTATION_ENABLED:
+        return None
+
+    return InstrumentationConfig(
+        slow_request_ms=settings.SLOW_REQUEST_MS,
+        profile_sample_rate=settings.PROFILE_SAMPLE_RATE,
+        profile_dir=settings.PROFILE_DIR,
+    )
@@ -0,0 +1,237 @@
+import contextlib
+import contextvars
+import functools
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Iterator, Mapping
+
+import numpy as np
+
+# Words, and the model numbers, sizes and ids made of words joined by '-', '.' or '/', e.g. 'wh-1000xm4'.
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:[-./][^\W_]+)*")
+TOKEN_SEPARATORS = re.compile(r"[-./]")
+# ProductSchema fields matched by lexical queries, with the weight of their words, and the product id.
+FIELD_WEIGHTS = {"title": 2.0, "description": 1.0}
+ID_WEIGHT = 1.0
+DEFAULT_WEIGHT = 1.0
+DEFAULT_CANDIDATES = 100
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased words of `text`. A joined token, e.g. 'usb-c', is kept whole and as its parts."""
+
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if TOKEN_SEPARATORS.search(token):
+            tokens.extend(TOKEN_SEPARATORS.split(token))
+
+    return tokens
+
+
+class LexicalIndex:
+    """BM25 inverted index over the text fields of the stored rows, updated row by row.
+
+    A row's term frequencies sum the weights of the fields the terms are in,
+    so a title word counts more than a description word. The postings of a
+    term are turned into arrays the first time it's searched after a change.
+
+    Args:
+        field_weights: Weight of the words of every indexed field.
+        k1: BM25 term frequency saturation.
+        b: BM25 document length normalization.
+    """
+
+    def __init__(self, field_weights: Mapping[str, float], k1: float = 1.2, b: float = 0.75) -> None:
+        self.field_weights = dict(field_weights)
+        self.k1 = k1
+        self.b = b
+        self._docs: dict[str, int] = {}
+        self._row_ids: list[str | None] = []
+        self._free: list[int] = []
+        self._terms: list[dict[str, float]] = []
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._total_length = 0.0
+        self._postings: dict[str, dict[int, float]] = {}
+        self._arrays: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, row_id: object) -> bool:
+        return row_id in self._docs
+
+    def update(self, row_id: str, values: Mapping[str, Any]) -> None:
+        """Index the indexed fields of a row, replacing its previous terms. Values that aren't strings are skipped."""
+
+        terms: dict[str, float] = {}
+        for field_name, weight in self.field_weights.items():
+            value = values.get(field_name)
+            if isinstance(value, str):
+                for token in tokenize(value):
+                    terms[token] = terms.get(token, 0.0) + weight
+        self.remove(row_id)
+        if not terms:
+            return
+
+        doc = self._free.pop() if self._free else len(self._row_ids)
+        if doc == len(self._row_ids):
+            self._row_ids.append(row_id)
+            self._terms.append(terms)
+            if doc >= len(self._lengths):
+                lengths = np.zeros(max(16, 2 * len(self._lengths)), dtype=np.float32)
+                lengths[: len(self._lengths)] = self._lengths
+                self._lengths = lengths
+        else:
+            self._row_ids[doc], self._terms[doc] = row_id, terms
+        self._docs[row_id] = doc
+        self._lengths[doc] = sum(terms.values())
+        self._total_length += self._lengths[doc]
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[doc] = frequency
+            self._arrays.pop(term, None)
+
+    def remove(self, row_id: str) -> None:
+        doc = self._docs.pop(row_id, None)
+        if doc is None:
+            return
+        for term in self._terms[doc]:
+            postings = self._postings[term]
+            del postings[doc]
+            if not postings:
+                del self._postings[term]
+            self._arrays.pop(term, None)
+        self._total_length -= self._lengths[doc]
+        self._row_ids[doc], self._terms[doc] = None, {}
+        self._lengths[doc] = 0.0
+        self._free.append(doc)
+
+    def clear(self) -> None:
+        self.__init__(self.field_weights, self.k1, self.b)
+
+    def search(self, text: str, limit: int) -> tuple[list[str], np.ndarray]:
+        """Row ids and BM25 scores of the best `limit` rows for `text`, best first. Rows without any of its terms aren't returned."""
+
+        if not self._docs:
+            return [], np.empty(0, dtype=np.float32)
+        num_docs = len(self._docs)
+        average_length = self._total_length / num_docs
+        docs, scores = [], []
+        for term in dict.fromkeys(tokenize(text)):
+            if term not in self._postings:
+                continue
+            term_docs, frequencies = self._posting_arrays(term)
+            idf = math.log(1 + (num_docs - len(term_docs) + 0.5) / (len(term_docs) + 0.5))
+            norms = self.k1 * (1 - self.b + self.b * self._lengths[term_docs] / average_length)
+            docs.append(term_docs)
+            scores.append(idf * frequencies * (self.k1 + 1) / (frequencies + norms))
+        if not docs:
+            return [], np.empty(0, dtype=np.float32)
+
+        unique_docs, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        doc_scores = np.bincount(inverse, weights=np.concatenate(scores)).astype(np.float32)
+        if limit < len(unique_docs):
+            best = np.argpartition(-doc_scores, limit - 1)[:limit]
+            unique_docs, doc_scores = unique_docs[best], doc_scores[best]
+        order = np.argsort(-doc_scores, kind="stable")
+
+        return [self._row_ids[doc] for doc in unique_docs[order]], doc_scores[order]
+
+    def _posting_arrays(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        if term not in self._arrays:
+            postings = self._postings[term]
+            self._arrays[term] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings)),
+            )
+
+        return self._arrays[term]
+
+
+def lexical_field_weights(schema, id_field_name: str) -> dict[str, float]:
+    """Stored field names of the `FIELD_WEIGHTS` fields of `schema` and of its id, with their weights."""
+
+    prefix = f"__schema_field__{schema._schema_name}_"
+
+    return {**{f"{prefix}{name}": weight for name, weight in FIELD_WEIGHTS.items()}, id_field_name: ID_WEIGHT}
+
+
+@dataclass(frozen=True)
+class LexicalQuery:
+    """Words to match exactly, e.g. brands, model numbers or ASINs, and how their matches are fused with the vector scores.
+
+    Attributes:
+        text: The words to match.
+        weight: Added to the vector score of a product times its BM25 score over the best one.
+        candidates: Best BM25 products the vector index re-scores.
+    """
+
+    text: str
+    weight: float = DEFAULT_WEIGHT
+    candidates: int = DEFAULT_CANDIDATES
+
+
+_lexical_query: contextvars.ContextVar[LexicalQuery | None] = contextvars.ContextVar("lexical_query", default=None)
+
+
+@contextlib.contextmanager
+def lexical_query(query: LexicalQuery | None) -> Iterator[None]:
+    """Search the enclosed queries with `query`'s lexical candidates."""
+
+    token = _lexical_query.set(query)
+    try:
+        yield
+    finally:
+        _lexical_query.reset(token)
+
+
+def current_lexical_query() -> LexicalQuery | None:
+    return _lexical_query.get()
+
+
+# id of a query descriptor -> names of its text, weight and candidates params.
+_param_names: dict[int, tuple[str, str, str]] = {}
+
+
+def install_lexical_search(queries: Mapping[str, Any], text_param, weight_param, candidates_param) -> None:
+    """Accept the lexical params in `queries`, and search those queries with the lexical candidates.
+
+    Superlinked rejects params no clause uses, so the params are taken out of
+    the query's params and passed to the vector database in a `LexicalQuery`.
+    A query without a text, or with one of only spaces, searches as before.
+
+    Args:
+        queries: Query descriptors by name.
+        text_param, weight_param, candidates_param: `sl.Param`s of the `LexicalQuery` attributes.
+    """
+
+    from superlinked.framework.dsl.executor.query.query_executor import QueryExecutor
+
+    names = (text_param.name, weight_param.name, candidates_param.name)
+    for query_descriptor in queries.values():
+        _param_names[id(query_descriptor)] = names
+
+    query = QueryExecutor.query
+    if getattr(query, "__lexical_search__", False):
+        return
+
+    @functools.wraps(query)
+    def lexical_search_query(self, **params):
+        param_names = _param_names.get(id(self._query_descriptor))
+        if param_names is None or not any(name in params for name in param_names):
+            return query(self, **params)
+
+        text, weight, candidates = (params.pop(name, None) for name in param_names)
+        if not text or not text.strip():
+            return query(self, **params)
+        lexical = LexicalQuery(
+            text,
+            DEFAULT_WEIGHT if weight is None else float(weight),
+            DEFAULT_CANDIDATES if candidates is None else int(candidates),
+        )
+        with lexical_query(lexical):
+            return query(self, **params)
+
+    lexical_search_query.__lexical_search__ = True
+    QueryExecutor.query = lexical_search_query
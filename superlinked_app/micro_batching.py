@@ -0,0 +1,276 @@
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Generic, Iterator, Mapping, Sequence, TypeVar
+
+import numpy as np
+from loguru import logger
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_QUERY_TYPE = "default"
+_query_type: contextvars.ContextVar[str] = contextvars.ContextVar("query_type", default=DEFAULT_QUERY_TYPE)
+
+
+@contextlib.contextmanager
+def query_type(name: str) -> Iterator[None]:
+    """Attribute the embeddings and searches of the enclosed query to `name`, e.g. 'semantic_query'."""
+
+    token = _query_type.set(name)
+    try:
+        yield
+    finally:
+        _query_type.reset(token)
+
+
+def current_query_type() -> str:
+    return _query_type.get()
+
+
+# id of a query descriptor -> its name, the query type of its executions.
+_query_names: dict[int, str] = {}
+
+
+def install_query_types(queries: Mapping[str, Any]) -> None:
+    """Run every `app.query` of `queries` under the `query_type` of its name.
+
+    So the searches and the embeddings of a query, including the ones of its
+    natural query, are batched with the limits of MICRO_BATCH_QUERY_TYPES.
+    Texts the caller embeds before `app.query` need their own `query_type`.
+
+    Args:
+        queries: Query descriptors by name.
+    """
+
+    from superlinked.framework.dsl.executor.query.query_executor import QueryExecutor
+
+    for name, query_descriptor in queries.items():
+        _query_names[id(query_descriptor)] = name
+
+    query = QueryExecutor.query
+    if getattr(query, "__query_types__", False):
+        return
+
+    @functools.wraps(query)
+    def typed_query(self, **params):
+        name = _query_names.get(id(self._query_descriptor))
+        if name is None:
+            return query(self, **params)
+        with query_type(name):
+            return query(self, **params)
+
+    typed_query.__query_types__ = True
+    QueryExecutor.query = typed_query
+
+
+@dataclass(frozen=True)
+class BatchingConfig:
+    """How long a query may wait for others, and how many are processed together.
+
+    A batch is flushed when it is full or when its oldest query has waited
+    `max_wait_ms`, so the wait bounds the latency batching adds. A
+    `max_batch_size` of 1 turns batching off.
+    """
+
+    max_wait_ms: float = 2.0
+    max_batch_size: int = 32
+
+
+@dataclass
+class BatchStats:
+    batches: int = 0
+    items: int = 0
+    wait_seconds: list[float] = field(default_factory=list)
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+    def wait_percentile_ms(self, percentile: float) -> float:
+        return float(np.percentile(self.wait_seconds, percentile)) * 1000 if self.wait_seconds else 0.0
+
+
+@dataclass
+class _Pending(Generic[T]):
+    item: T
+    future: Future
+    submitted_at: float
+    deadline: float
+
+
+class MicroBatcher(Generic[T, R]):
+    """Collects items submitted from many threads and processes them in batches.
+
+    There is no scheduler thread: the caller whose item is the oldest pending
+    one leads the next batch. It waits until `config.max_batch_size` items are
+    pending or its item's deadline passes, then processes the batch in its own
+    thread and hands the other callers their results. Up to `concurrency`
+    batches run at the same time, and while they are all busy new items keep
+    accumulating, so batches grow with the load instead of queueing up.
+
+    Args:
+        name: Used in the logs.
+        process_batch: Returns one result per item, in order. If it raises, every item of the batch fails.
+        config: Batch size and wait limits.
+        concurrency: Batches processed at the same time.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        process_batch: Callable[[list[T]], Sequence[R]],
+        config: BatchingConfig,
+        concurrency: int = 1,
+    ) -> None:
+        self.name = name
+        self.process_batch = process_batch
+        self.config = config
+        self.concurrency = concurrency
+        self.stats = BatchStats()
+
+        self._pending: list[_Pending[T]] = []
+        self._condition = threading.Condition()
+        self._running = 0
+
+    def submit(self, item: T) -> R:
+        """Process `item` in the next batch and return its result, blocking until it's ready."""
+
+        if self.config.max_batch_size <= 1:
+            return self.process_batch([item])[0]
+
+        now = time.perf_counter()
+        pending = _Pending(item, Future(), now, now + self.config.max_wait_ms / 1000)
+        with self._condition:
+            self._pending.append(pending)
+            self._condition.notify_all()
+            while not pending.future.done():
+                if self._running < self.concurrency and self._pending and self._pending[0] is pending:
+                    batch = self._take_batch(pending)
+                    break
+                self._condition.wait()
+            else:
+                return pending.future.result()
+
+        self._run(batch)
+        return pending.future.result()
+
+    def _take_batch(self, leader: _Pending[T]) -> list[_Pending[T]]:
+        # Called with the lock held, which `wait` releases while the batch fills up.
+        self._running += 1
+        while len(self._pending) < self.config.max_batch_size:
+            timeout = leader.deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            self._condition.wait(timeout)
+        batch = self._pending[: self.config.max_batch_size]
+        del self._pending[: self.config.max_batch_size]
+        # The owner of the next oldest item may lead a batch of its own.
+        self._condition.notify_all()
+
+        return batch
+
+    def _run(self, batch: list[_Pending[T]]) -> None:
+        started_at = time.perf_counter()
+        try:
+            results = self.process_batch([pending.item for pending in batch])
+            for pending, result in zip(batch, results, strict=True):
+                pending.future.set_result(result)
+        except BaseException as e:
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+        finally:
+            with self._condition:
+                self._running -= 1
+                self.stats.batches += 1
+                self.stats.items += len(batch)
+                self.stats.wait_seconds.extend(started_at - pending.submitted_at for pending in batch)
+                self._condition.notify_all()
+
+
+class MicroBatchScheduler:
+    """One `MicroBatcher` per stage (e.g. 'embedding', 'search') and query type.
+
+    Every query type gets its own batches and limits, so a latency-sensitive
+    query isn't held back by the wait of a throughput-oriented one.
+
+    Args:
+        default: Limits of the query types without an override.
+        overrides: Limits per query type, missing fields fall back to `default`.
+    """
+
+    def __init__(self, default: BatchingConfig, overrides: dict[str, dict[str, Any]] | None = None) -> None:
+        self.default = default
+        self.configs = {
+            name: replace(default, **{key: type(getattr(default, key))(value) for key, value in override.items()})
+            for name, override in (overrides or {}).items()
+        }
+        self._batchers: dict[tuple[str, str], MicroBatcher] = {}
+        self._lock = threading.Lock()
+
+    def config(self, query_type: str) -> BatchingConfig:
+        return self.configs.get(query_type, self.default)
+
+    def submit(self, stage: str, item: Any, process_batch: Callable[[list], Sequence], concurrency: int = 1) -> Any:
+        """Process `item` with the other items of `stage` submitted by queries of the current query type."""
+
+        key = (stage, current_query_type())
+        with self._lock:
+            batcher = self._batchers.get(key)
+            if batcher is None:
+                batcher = MicroBatcher(f"{stage}:{key[1]}", process_batch, self.config(key[1]), concurrency)
+                self._batchers[key] = batcher
+
+        return batcher.submit(item)
+
+    def log_stats(self) -> None:
+        for (stage, query_type_), batcher in sorted(self._batchers.items()):
+            stats = batcher.stats
+            logger.info(
+                f"{stage:<10} {query_type_:<22} {stats.items} items in {stats.batches} batches "
+                f"(mean {stats.mean_batch_size:.1f}), queue wait p50 {stats.wait_percentile_ms(50):.1f} ms, "
+                f"p99 {stats.wait_percentile_ms(99):.1f} ms"
+            )
+
+
+_scheduler: MicroBatchScheduler | None = None
+_scheduler_loaded = False
+_scheduler_lock = threading.Lock()
+
+
+def scheduler_from_settings(settings) -> MicroBatchScheduler | None:
+    if not settings.MICRO_BATCHING_ENABLED:
+        return None
+
+    return MicroBatchScheduler(
+        BatchingConfig(max_wait_ms=settings.MICRO_BATCH_MAX_WAIT_MS, max_batch_size=settings.MICRO_BATCH_MAX_SIZE),
+        settings.MICRO_BATCH_QUERY_TYPES,
+    )
+
+
+def get_scheduler() -> MicroBatchScheduler | None:
+    """The scheduler of the app, created from the settings on first use, None when micro-batching is off."""
+
+    global _scheduler, _scheduler_loaded
+    with _scheduler_lock:
+        if not _scheduler_loaded:
+            from superlinked_app.config import settings
+
+            _scheduler = scheduler_from_settings(settings)
+            _scheduler_loaded = True
+
+        return _scheduler
+
+
+def set_scheduler(scheduler: MicroBatchScheduler | None) -> None:
+    """Replace the scheduler of the app, e.g. to compare settings in one process."""
+
+    global _scheduler, _scheduler_loaded
+    with _scheduler_lock:
+        _scheduler = scheduler
+        _scheduler_loaded = True
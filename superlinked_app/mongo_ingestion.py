@@ -0,0 +1,341 @@
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Literal, Sequence
+
+from loguru import logger
+from pymongo import MongoClient, UpdateOne
+from pymongo.write_concern import WriteConcern
+from superlinked.framework.common.storage.entity.entity import Entity
+from superlinked.framework.common.storage.entity.entity_data import EntityData
+from superlinked.framework.common.storage.field.field import Field
+from superlinked.framework.common.storage.query.vdb_knn_search_params import VDBKNNSearchParams
+from superlinked.framework.common.storage.result_entity_data import ResultEntityData
+from superlinked.framework.common.storage.search_index.manager.search_index_manager import SearchIndexManager
+from superlinked.framework.common.storage.vdb_connector import VDBConnector
+from superlinked.framework.dsl.storage.vector_database import VectorDatabase
+from superlinked.framework.storage.common.vdb_settings import VDBSettings
+from superlinked.framework.storage.in_memory.in_memory_search_index_manager import InMemorySearchIndexManager
+from superlinked.framework.storage.mongo_db.mongo_db_connection_params import MongoDBConnectionParams
+from superlinked.framework.storage.mongo_db.mongo_db_field_encoder import MongoDBFieldEncoder
+from superlinked.framework.storage.mongo_db.mongo_db_vdb_connector import MongoDBVDBConnector
+from superlinked.framework.storage.mongo_db.query.mongo_db_search import MongoDBSearch
+from superlinked.framework.storage.mongo_db.search_index.mongo_db_admin_params import MongoDBAdminParams
+from superlinked.framework.storage.mongo_db.search_index.mongo_db_search_index_manager import MongoDBSearchIndexManager
+
+from superlinked_app.instrumentation import span
+
+# A 'mongodb://host:port' URL is used as is, e.g. for a local mongod. Other URLs are Atlas hosts, see `MongoDBConnectionParams`.
+LOCAL_URL_PREFIX = "mongodb://"
+
+
+@dataclass(frozen=True)
+class MongoWriteSettings:
+    """How `BulkMongoDBVDBConnector` writes and connects.
+
+    Attributes:
+        batch_size: Product documents per unordered bulk write.
+        writers: Threads sending the bulk writes, 0 sends them from the ingesting thread.
+        write_concern: Acknowledgment asked of every bulk write: 0, 1, ... or 'majority'.
+        journal: Whether the writes are acknowledged only once journaled, None for the server default.
+        max_pool_size: Connections of the client shared by the writers and the queries.
+        flush_interval_ms: Longest time a write waits in a batch that isn't full.
+    """
+
+    batch_size: int = 1000
+    writers: int = 4
+    write_concern: int | Literal["majority"] = 1
+    journal: bool | None = None
+    max_pool_size: int = 100
+    flush_interval_ms: float = 200.0
+
+
+# (connection string, max pool size) -> [client, connectors using it].
+_clients: dict[tuple[str, int], list[Any]] = {}
+_clients_lock = threading.Lock()
+
+
+def acquire_client(connection_string: str, max_pool_size: int) -> MongoClient:
+    """The process' client of `connection_string`, created on first use.
+
+    A `MongoClient` is thread-safe and keeps its own connection pool, so every
+    connector, writer and query shares one instead of opening a pool each.
+    Give it back with `release_client`, the last release closes it.
+    """
+
+    key = (connection_string, max_pool_size)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = [MongoClient(connection_string, maxPoolSize=max_pool_size), 0]
+        _clients[key][1] += 1
+
+        return _clients[key][0]
+
+
+def release_client(connection_string: str, max_pool_size: int) -> None:
+    key = (connection_string, max_pool_size)
+    with _clients_lock:
+        if key not in _clients:
+            return
+        _clients[key][1] -= 1
+        if _clients[key][1] <= 0:
+            client, _ = _clients.pop(key)
+            client.close()
+
+
+class BulkMongoDBVDBConnector(MongoDBVDBConnector):
+    """MongoDB connector that buffers the writes into unordered bulk upserts sent by a pool of writer threads.
+
+    Superlinked writes every field of every product separately, and its
+    connector sends each write as its own ordered bulk write, so an ingest
+    costs several round-trips per product. Here the fields written to a
+    product are merged into one `$set` in a buffer, and a buffer of
+    `batch_size` products is sent as one unordered bulk write.
+
+    Products are spread over the writers by a hash of their id, and each
+    writer sends its batches in order, so two writes of a product are never
+    applied out of order. Buffered writes are sent after `flush_interval_ms`,
+    and before every read or search, which see all the earlier writes. Write
+    errors are raised by the next write, read or `flush`.
+
+    Args:
+        connection_string: MongoDB URL, see `acquire_client`.
+        db_name: Database of the products.
+        search_index_manager: Creates the Atlas Vector Search indexes.
+        vdb_settings: Default query limit.
+        write_settings: Batching, writers, write concern and pool size.
+    """
+
+    def __init__(
+        self,
+        connection_string: str,
+        db_name: str,
+        search_index_manager: SearchIndexManager,
+        vdb_settings: VDBSettings,
+        write_settings: MongoWriteSettings,
+    ) -> None:
+        # Superlinked's __init__ opens a client of its own, so its attributes are set here.
+        VDBConnector.__init__(self)
+        self._connection_string = connection_string
+        self._write_settings = write_settings
+        self._client = acquire_client(connection_string, write_settings.max_pool_size)
+        self._db = self._client[db_name]
+        self._encoder = MongoDBFieldEncoder()
+        self._search_index_manager = search_index_manager
+        self._search = MongoDBSearch(self._db, self._encoder)
+        self._vdb_settings = vdb_settings
+
+        self._lock = threading.Lock()
+        self._collection = None
+        # Per writer: product id -> fields to set, in write order.
+        self._pending: list[dict[str, dict[str, Any]]] = [{} for _ in range(max(1, write_settings.writers))]
+        self._writers = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"mongo-writer-{number}") for number in range(write_settings.writers)
+        ]
+        self._futures: deque[Future] = deque()
+        self._flush_timer: threading.Timer | None = None
+        self._closed = False
+
+    @property
+    def _default_search_limit(self) -> int:
+        return self._vdb_settings.default_query_limit
+
+    def write_entities(self, entity_data: Sequence[EntityData]) -> None:
+        if not entity_data:
+            return
+
+        with span("mongo_write"), self._lock:
+            self._raise_write_errors(wait=False)
+            for entity in entity_data:
+                mongo_id = self._get_mongo_id(entity.id_)
+                lane = zlib.crc32(mongo_id.encode()) % len(self._pending)
+                fields = self._pending[lane].setdefault(mongo_id, {})
+                for field_data in entity.field_data.values():
+                    fields[field_data.name] = self._encoder.encode_field(field_data)
+                if len(self._pending[lane]) >= self._write_settings.batch_size:
+                    self._submit(lane)
+            if self._flush_timer is None and any(self._pending):
+                self._flush_timer = threading.Timer(self._write_settings.flush_interval_ms / 1000, self._flush_on_timer)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self) -> None:
+        """Send the buffered writes and wait for every write, raising the first error."""
+
+        with self._lock:
+            self._submit_pending()
+            self._raise_write_errors(wait=True)
+
+    def remove_rows(self, row_ids: Sequence[str]) -> None:
+        """Delete the stored products of `row_ids`, '<schema>:<object id>' like their `_id`."""
+
+        self.flush()
+        if row_ids:
+            self._get_collection().delete_many({"_id": {"$in": list(row_ids)}})
+
+    def read_entities(self, entities: Sequence[Entity]) -> Sequence[EntityData]:
+        self.flush()
+
+        return super().read_entities(entities)
+
+    def _knn_search(
+        self,
+        index_name: str,
+        schema_name: str,
+        returned_fields: Sequence[Field],
+        vdb_knn_search_params: VDBKNNSearchParams,
+        **params: Any,
+    ) -> Sequence[ResultEntityData]:
+        self.flush()
+
+        return super()._knn_search(index_name, schema_name, returned_fields, vdb_knn_search_params, **params)
+
+    def close_connection(self) -> None:
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._closed = True
+            for writer in self._writers:
+                writer.shutdown(wait=True)
+            release_client(self._connection_string, self._write_settings.max_pool_size)
+
+    def _get_collection(self):
+        if self._collection is None:
+            write_concern = WriteConcern(w=self._write_settings.write_concern, j=self._write_settings.journal)
+            self._collection = self._db.get_collection(self.collection_name, write_concern=write_concern)
+
+        return self._collection
+
+    def _write(self, docs: dict[str, dict[str, Any]]) -> None:
+        requests = [UpdateOne({"_id": mongo_id}, {"$set": fields}, upsert=True) for mongo_id, fields in docs.items()]
+        self._get_collection().bulk_write(requests, ordered=False)
+
+    def _submit(self, lane: int) -> None:
+        """Send the buffer of a writer. Called with the lock held."""
+
+        docs, self._pending[lane] = self._pending[lane], {}
+        if not self._writers:
+            self._write(docs)
+            return
+
+        self._futures.append(self._writers[lane].submit(self._write, docs))
+        # Bounds the buffered documents: once every writer has 2 batches queued, wait for the oldest.
+        while len(self._futures) > 2 * len(self._writers):
+            self._futures.popleft().result()
+
+    def _submit_pending(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        for lane, docs in enumerate(self._pending):
+            if docs:
+                self._submit(lane)
+
+    def _raise_write_errors(self, wait: bool) -> None:
+        """Raise the error of the first failed write. `wait` waits for the writes in progress too."""
+
+        while self._futures and (wait or self._futures[0].done()):
+            self._futures.popleft().result()
+
+    def _flush_on_timer(self) -> None:
+        with self._lock:
+            self._flush_timer = None
+            if self._closed:
+                return
+            try:
+                self._submit_pending()
+            except Exception:
+                # With writers=0 there's no future to raise from later, so the error is only logged.
+                logger.exception("Writing the buffered products to MongoDB failed.")
+
+
+class BulkMongoDBVectorDatabase(VectorDatabase[BulkMongoDBVDBConnector]):
+    """MongoDB vector database whose ingestion is batched, see `BulkMongoDBVDBConnector`.
+
+    Pass it as `vector_database` to an executor instead of `sl.MongoDBVectorDatabase`,
+    which takes the same arguments but `url` and `write_settings`. `ann_index.vector_database`
+    builds it from the settings with USE_MONGO_VECTOR_DB.
+
+    Args:
+        url: Atlas host, or 'mongodb://host:port' of a mongod. A mongod has no
+            Atlas Vector Search, so its search indexes are only kept in memory,
+            and it serves writes and reads but not vector queries.
+        db_name: Database of the products.
+        cluster_name, project_id, admin_api_user, admin_api_password: Atlas admin API
+            access, which creates the search indexes. Unused with a mongod.
+        default_query_limit: The default limit for query results.
+        write_settings: Batching, writers, write concern and pool size.
+        **extra_params: Connection string params, e.g. `username` and `password`.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        db_name: str,
+        cluster_name: str = "",
+        project_id: str = "",
+        admin_api_user: str = "",
+        admin_api_password: str = "",
+        default_query_limit: int = 10,
+        write_settings: MongoWriteSettings = MongoWriteSettings(),
+        **extra_params: Any,
+    ) -> None:
+        super().__init__()
+        self._is_local = url.startswith(LOCAL_URL_PREFIX)
+        self._connection_params = MongoDBConnectionParams(
+            url.removeprefix(LOCAL_URL_PREFIX),
+            db_name,
+            MongoDBAdminParams(cluster_name, project_id, admin_api_user, admin_api_password),
+            **extra_params,
+        )
+        self._settings = VDBSettings(default_query_limit)
+        self._write_settings = write_settings
+
+    @property
+    def _vdb_connector(self) -> BulkMongoDBVDBConnector:
+        connection_string = self._connection_params.connection_string
+        if self._is_local:
+            connection_string = LOCAL_URL_PREFIX + connection_string.removeprefix("mongodb+srv://")
+            search_index_manager = InMemorySearchIndexManager()
+        else:
+            search_index_manager = MongoDBSearchIndexManager(self._connection_params.db_name, self._connection_params.admin_params)
+
+        return BulkMongoDBVDBConnector(
+            connection_string,
+            self._connection_params.db_name,
+            search_index_manager,
+            self._settings,
+            self._write_settings,
+        )
+
+
+def mongo_write_settings(settings) -> MongoWriteSettings:
+    return MongoWriteSettings(
+        batch_size=settings.MONGO_WRITE_BATCH_SIZE,
+        writers=settings.MONGO_WRITERS,
+        write_concern=settings.MONGO_WRITE_CONCERN,
+        journal=settings.MONGO_WRITE_JOURNAL,
+        max_pool_size=settings.MONGO_MAX_POOL_SIZE,
+        flush_interval_ms=settings.MONGO_WRITE_FLUSH_MS,
+    )
+
+
+def mongo_vector_database(settings) -> BulkMongoDBVectorDatabase:
+    """Vector database of the MongoDB deployment, from the MONGO_* settings."""
+
+    def secret(value) -> str:
+        return value.get_secret_value() if value is not None else ""
+
+    return BulkMongoDBVectorDatabase(
+        url=settings.MONGO_CLUSTER_URL,
+        db_name=settings.MONGO_DATABASE_NAME,
+        cluster_name=settings.MONGO_CLUSTER_NAME,
+        project_id=settings.MONGO_PROJECT_ID or "",
+        admin_api_user=secret(settings.MONGO_API_PUBLIC_KEY),
+        admin_api_password=secret(settings.MONGO_API_PRIVATE_KEY),
+        write_settings=mongo_write_settings(settings),
+    )
@@ -0,0 +1,215 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+TABLE_VERSION = 1
+NO_NEIGHBOR = -1
+ARRAYS = ["row_ids", "neighbors", "scores", "query_keys", "vector_keys"]
+
+
+def vector_keys(vectors: np.ndarray) -> np.ndarray:
+    """16 byte digest of every row of `vectors` as float32, to find a row by its exact value."""
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+
+    return np.array([hashlib.blake2b(row.tobytes(), digest_size=16).digest() for row in vectors], dtype="S16")
+
+
+def compute_neighbors(
+    queries: np.ndarray, vectors: np.ndarray, k: int, block_size: int = 1024
+) -> tuple[np.ndarray, np.ndarray]:
+    """Positions and scores of the `k` best rows of `vectors` for every query, best first.
+
+    The queries are scored a block at a time, so only a `block_size` x rows
+    score matrix is in memory. Rows past the number of vectors are padded with
+    `NO_NEIGHBOR` and a score of -inf.
+    """
+
+    queries = np.asarray(queries, dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    neighbors = np.full((len(queries), k), NO_NEIGHBOR, dtype=np.int32)
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    found = min(k, len(vectors))
+    if not found:
+        return neighbors, scores
+
+    for start in range(0, len(queries), block_size):
+        block_scores = queries[start : start + block_size] @ vectors.T
+        if found < len(vectors):
+            best = np.argpartition(-block_scores, found - 1, axis=1)[:, :found]
+        else:
+            best = np.broadcast_to(np.arange(found), block_scores.shape)
+        best_scores = np.take_along_axis(block_scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        neighbors[start : start + block_size, :found] = np.take_along_axis(best, order, axis=1)
+        scores[start : start + block_size, :found] = np.take_along_axis(best_scores, order, axis=1)
+
+    return neighbors, scores
+
+
+@dataclass
+class UpdateStats:
+    unchanged: int = 0
+    merged: int = 0
+    recomputed: int = 0
+    removed: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.unchanged} unchanged, {self.merged} merged, {self.recomputed} recomputed and {self.removed} removed rows"
+
+
+@dataclass
+class NeighborTable:
+    """The `k` nearest products of every product, for its "more like this" query.
+
+    Row `i` lists the positions in `row_ids` of the products that score best
+    against the query vector of product `i`, best first, as int32, with their
+    scores as float16. A row is found from the exact query vector Superlinked
+    produces for the product through `query_keys`, so a query with other
+    weights or with text to match never hits the table. `vector_keys` are the
+    digests of the stored vectors the table was computed from, to tell which
+    products changed since.
+
+    Saved as one .npy file per array plus `meta.json` in a directory, and
+    memory-mapped when loaded.
+    """
+
+    row_ids: np.ndarray
+    neighbors: np.ndarray
+    scores: np.ndarray
+    query_keys: np.ndarray
+    vector_keys: np.ndarray
+    vector_field: str
+    params: dict = field(default_factory=dict)
+    _rows_by_query_key: dict[bytes, int] | None = field(default=None, init=False, repr=False)
+
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    @classmethod
+    def build(
+        cls,
+        row_ids: list[str],
+        vectors: np.ndarray,
+        queries: np.ndarray,
+        k: int,
+        vector_field: str,
+        params: dict | None = None,
+        block_size: int = 1024,
+    ) -> "NeighborTable":
+        """Compute the table of `vectors`, the stored vectors, with `queries`, the query vector of every row."""
+
+        neighbors, scores = compute_neighbors(queries, vectors, k, block_size)
+
+        return cls(
+                np.array(row_ids, dtype=str),
+                neighbors,
+                scores.astype(np.float16),
+                vector_keys(queries),
+                vector_keys(vectors),
+                vector_field,
+                params or {},
+                )
+
+    def find(self, query: np.ndarray) -> int | None:
+        """Row of the product whose query vector is exactly `query`, None if there is none."""
+
+        if self._rows_by_query_key is None:
+            self._rows_by_query_key = {key: row for row, key in enumerate(self.query_keys.tolist())}
+
+        return self._rows_by_query_key.get(vector_keys(query[np.newaxis])[0])
+
+    def update(
+        self, row_ids: list[str], vectors: np.ndarray, queries: np.ndarray, block_size: int = 1024
+    ) -> tuple["NeighborTable", UpdateStats]:
+        """The table of the current `vectors`, recomputing only what the changed products affect.
+
+        New and changed products get their whole row computed. The other rows
+        only score the changed products, merged with their previous neighbours.
+        A row left with fewer than `k` products reaching its previous last score,
+        because neighbours were removed or changed, doesn't know which product
+        came after that one, so it is recomputed as well.
+        """
+
+        row_ids = list(row_ids)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        queries = np.asarray(queries, dtype=np.float32)
+        current_keys = vector_keys(vectors)
+        previous_rows = {row_id: row for row, row_id in enumerate(self.row_ids.tolist())}
+        old_rows = np.array([previous_rows.get(row_id, NO_NEIGHBOR) for row_id in row_ids], dtype=np.int64)
+        kept = old_rows != NO_NEIGHBOR
+        kept[kept] = self.vector_keys[old_rows[kept]] == current_keys[kept]
+        stats = UpdateStats(removed=len(previous_rows) - int((old_rows != NO_NEIGHBOR).sum()))
+
+        # Previous position -> current position, for the products whose vector didn't change.
+        new_positions = np.full(len(self.row_ids) + 1, NO_NEIGHBOR, dtype=np.int64)
+        new_positions[old_rows[kept]] = np.flatnonzero(kept)
+        changed = np.flatnonzero(~kept)
+
+        neighbors = np.full((len(row_ids), self.k), NO_NEIGHBOR, dtype=np.int32)
+        scores = np.full((len(row_ids), self.k), -np.inf, dtype=np.float32)
+        recompute = [int(row) for row in changed]
+        for row in np.flatnonzero(kept):
+            old_neighbors = np.asarray(self.neighbors[old_rows[row]])
+            old_scores = np.asarray(self.scores[old_rows[row]], dtype=np.float32)
+            previous = new_positions[old_neighbors]
+            present = previous != NO_NEIGHBOR
+            if not len(changed) and present.sum() == (old_neighbors != NO_NEIGHBOR).sum():
+                neighbors[row], scores[row] = previous, old_scores
+                stats.unchanged += 1
+                continue
+            candidates = np.concatenate([previous[present], changed])
+            candidate_scores = np.concatenate([old_scores[present], vectors[changed] @ queries[row]])
+            # Products out of the previous row score at most its last score, so the row is exact if at
+            # least k candidates still reach it.
+            if old_neighbors[-1] != NO_NEIGHBOR and (candidate_scores >= old_scores[-1]).sum() < self.k:
+                recompute.append(int(row))
+                continue
+            best = np.argsort(-candidate_scores, kind="stable")[: self.k]
+            neighbors[row, : len(best)], scores[row, : len(best)] = candidates[best], candidate_scores[best]
+            stats.merged += 1
+
+        if recompute:
+            recompute_rows = np.array(sorted(recompute))
+            neighbors[recompute_rows], scores[recompute_rows] = compute_neighbors(
+                queries[recompute_rows], vectors, self.k, block_size
+            )
+            stats.recomputed = len(recompute_rows)
+
+        table = NeighborTable(
+                            np.array(row_ids, dtype=str),
+                            neighbors,
+                            scores.astype(np.float16),
+                            vector_keys(queries),
+                            current_keys,
+                            self.vector_field,
+                            self.params,
+                            )
+
+        return table, stats
+
+    def save(self, path: Path) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(path / f"{name}.npy", np.ascontiguousarray(getattr(self, name)))
+        meta = {"version": TABLE_VERSION, "k": self.k, "vector_field": self.vector_field, "params": self.params}
+        (path / "meta.json").write_text(json.dumps(meta, indent=2))
+        logger.info(f"Saved the {self.k} nearest neighbours of {len(self.row_ids)} products to '{path}' ({self.nbytes / 2**20:.1f} MiB).")
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "NeighborTable":
+        meta = json.loads((path / "meta.json").read_text())
+        if meta.get("version") != TABLE_VERSION:
+            raise ValueError(f"Neighbor table '{path}' has version {meta.get('version')}, expected {TABLE_VERSION}, rebuild it.")
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None) for name in ARRAYS}
+
+        return cls(**arrays, vector_field=meta["vector_field"], params=meta["params"])
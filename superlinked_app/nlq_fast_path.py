@@ -0,0 +1,323 @@
+import functools
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Sequence
+
+from loguru import logger
+
+from superlinked_app import constants
+from superlinked_app.instrumentation import span
+
+# Weight given to the weights a natural query leaves unset, as the LLM is asked to
+# use equal non-zero weights when the query expresses no preference.
+NEUTRAL_WEIGHT = 1.0
+MAX_RATING = 5.0
+
+_NUMBER = r"(\d+(?:\.\d+)?)"
+_CURRENCY = r"(?:\s*(?:\$|dollars?|usd|bucks))?"
+_THAN = r"(?:\s+than)?(?:\s+or\s+equal\s+to)?"
+_NOT_RATING = r"(?!\s*(?:\+|stars?|rating|points?|%))"
+PRICE_UPPER_BOUND_PATTERNS = [
+    # "a price lower than 100", "priced under $20", "costing at most 30 dollars"
+    re.compile(
+        rf"\b(?:with\s+)?(?:an?\s+)?(?:price[ds]?|costs?|costing)\s+(?:of\s+)?(?:is\s+)?"
+        rf"(?:lower|less|smaller|cheaper|below|under|at\s+most|up\s+to|no\s+more\s+than|max(?:imum)?(?:\s+of)?){_THAN}"
+        rf"\s*\$?\s*{_NUMBER}{_CURRENCY}"
+    ),
+    # "cheaper than 50", "under $20", "below 15 dollars", but not "for kids under 12", only
+    # "cheaper than" names a price without a currency.
+    re.compile(rf"\b(?:that\s+(?:is|are)\s+)?cheaper\s+than(?:\s+or\s+equal\s+to)?\s*\$?\s*{_NUMBER}{_CURRENCY}{_NOT_RATING}"),
+    re.compile(
+        rf"\b(?:(?:less|lower)\s+than|under|below|at\s+most|up\s+to|no\s+more\s+than)(?:\s+or\s+equal\s+to)?"
+        rf"\s*(?=\$|\d+(?:\.\d+)?\s*(?:dollars?|usd|bucks)\b)\$?\s*{_NUMBER}{_CURRENCY}"
+    ),
+    # "$20 or less", "30 dollars or under"
+    re.compile(rf"\$\s*{_NUMBER}\s+or\s+(?:less|under|below|cheaper)\b"),
+    re.compile(rf"\b{_NUMBER}\s*(?:dollars?|usd|bucks)\s+or\s+(?:less|under|below|cheaper)\b"),
+]
+RATING_LOWER_BOUND_PATTERNS = [
+    # "a rating bigger than 4", "rated higher than 4.5", "a review rating of at least 4"
+    re.compile(
+        rf"\b(?:with\s+)?(?:an?\s+)?(?:(?:review|customer|star)\s+)?(?:ratings?|rated|reviews?|scores?)\s+(?:of\s+)?"
+        rf"(?:bigger|higher|greater|more|above|over|better|at\s+least|no\s+less\s+than){_THAN}\s*{_NUMBER}(?:\s*stars?)?"
+    ),
+    # "rated 4 stars or more", "4+ stars", "4 stars and up", "at least 4 stars"
+    re.compile(
+        rf"\b(?:rated\s+)?{_NUMBER}\s*(?:\+\s*)?(?:stars?|star\s+rating)?\s*"
+        rf"(?:\+|or\s+(?:more|higher|better|above)|and\s+(?:up|above|higher))"
+        rf"(?:\s+(?:stars?|rating))?"
+    ),
+    re.compile(rf"\b(?:at\s+least|over|above|more\s+than|minimum(?:\s+of)?)\s+{_NUMBER}\s*stars?\b"),
+    re.compile(rf"\b{_NUMBER}\s*\+\s*(?:stars?|rating)\b"),
+]
+# Amazon standard identification numbers, and the ISBN-10s books are listed under.
+ASIN_PATTERN = re.compile(r"\b(B0[0-9A-Z]{8}|\d{9}[\dX])\b")
+TYPE_WORDS = {
+    "book": re.compile(r"\b(?:books?|novels?|paperbacks?|hardcovers?|textbooks?|cookbooks?|e-?books?)\b"),
+    "product": re.compile(r"\bproducts?\b"),
+}
+# Words a query without constraints is made of, besides the text searched semantically.
+FILLER_WORDS = {
+    "a", "an", "the", "and", "or", "with", "for", "of", "to", "in", "on", "that", "which", "is", "are", "be",
+    "me", "my", "i", "show", "find", "get", "give", "want", "looking", "look", "search", "need", "some", "any",
+    "all", "please", "items", "item", "things", "stuff", "one", "ones", "like", "this", "these", "similar",
+}
+# Words that express a constraint or preference the rules don't capture, like a price
+# lower bound, a negation or "cheapest". Queries that still contain one go to the LLM.
+CONSTRAINT_WORDS = {
+    "price", "priced", "prices", "cost", "costs", "costing", "dollar", "dollars", "usd", "bucks", "cheap",
+    "cheaper", "cheapest", "expensive", "affordable", "budget", "rating", "ratings", "rated", "star", "stars",
+    "review", "reviews", "than", "under", "over", "below", "above", "between", "least", "most", "max",
+    "maximum", "min", "minimum", "not", "no", "non", "but", "other", "without", "except", "excluding", "exclude", "best", "top",
+    "highest", "lowest", "popular", "only", "category", "type",
+}
+# Comparison operators of filter clauses, a strict bound is filled like an inclusive one.
+OPERATORS = {"EQUAL": "==", "GREATER_EQUAL": ">=", "GREATER_THAN": ">=", "LESS_EQUAL": "<=", "LESS_THAN": "<="}
+WORD_PATTERN = re.compile(r"[a-z0-9$%+']+(?:\.\d+)?")
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower().replace("&", " and ").replace(",", " ")).strip()
+
+
+def _category_pattern(category: str) -> re.Pattern:
+    words = [re.escape(word) for word in _normalize(category).split()]
+    # "Toys & Games" also matches "toys and games" and "toy and game".
+    return re.compile(r"\b" + r"\s+".join(rf"{word}s?" if word[-1] != "s" else rf"{word}?" for word in words) + r"\b")
+
+
+# Superlinked fails on the category filter, `filter_by_cateogry`, with a TypeError, so the rules only
+# recognize categories to leave their queries to the LLM. The 'Books' category is left out, "books"
+# selects the 'book' type instead.
+CATEGORY_PATTERNS = sorted(
+    ((category, _category_pattern(category)) for category in constants.CATEGORIES if category.lower() != "books"),
+    key=lambda item: len(item[0]),
+    reverse=True,
+)
+
+
+@dataclass
+class Constraints:
+    """What a natural query asks for, as far as the rules understood it."""
+
+    type: str | None = None
+    max_price: float | None = None
+    min_rating: float | None = None
+    asin: str | None = None
+    # Words that weren't part of a recognized constraint.
+    remaining_words: list[str] = field(default_factory=list)
+    # Why the rules can't be trusted with this query.
+    ambiguities: list[str] = field(default_factory=list)
+
+
+def extract_constraints(natural_query: str) -> Constraints:
+    """Read the product type, price and rating bounds and ASIN from `natural_query`, a category is an ambiguity."""
+
+    constraints = Constraints()
+    asins = ASIN_PATTERN.findall(natural_query)
+    text = _normalize(ASIN_PATTERN.sub(" ", natural_query))
+    if len(set(asins)) > 1:
+        constraints.ambiguities.append(f"several product ids {sorted(set(asins))}")
+    elif asins:
+        constraints.asin = asins[0]
+
+    text, max_prices = _take(text, PRICE_UPPER_BOUND_PATTERNS)
+    text, min_ratings = _take(text, RATING_LOWER_BOUND_PATTERNS)
+    if len(set(max_prices)) > 1:
+        constraints.ambiguities.append(f"several price bounds {sorted(set(max_prices))}")
+    elif max_prices:
+        constraints.max_price = max_prices[0]
+    if len(set(min_ratings)) > 1:
+        constraints.ambiguities.append(f"several rating bounds {sorted(set(min_ratings))}")
+    elif min_ratings:
+        if min_ratings[0] > MAX_RATING:
+            constraints.ambiguities.append(f"rating bound {min_ratings[0]:g} above {MAX_RATING:g}")
+        else:
+            constraints.min_rating = min_ratings[0]
+
+    # Before the categories, so "children's books" is also of the 'book' type.
+    types = [type_ for type_, pattern in TYPE_WORDS.items() if pattern.search(text)]
+    if len(types) > 1:
+        constraints.ambiguities.append(f"several types {types}")
+    elif types:
+        constraints.type = types[0]
+
+    categories = []
+    for category, pattern in CATEGORY_PATTERNS:
+        if pattern.search(text):
+            categories.append(category)
+            # Keeps "Electronics" from matching again inside "Computers & Electronics".
+            text = pattern.sub(" ", text)
+    if categories:
+        constraints.ambiguities.append(f"categories {categories} are left to the LLM")
+
+    for pattern in TYPE_WORDS.values():
+        text = pattern.sub(" ", text)
+
+    words = [word for word in WORD_PATTERN.findall(text) if word not in FILLER_WORDS]
+    for word in words:
+        if word in CONSTRAINT_WORDS or any(character.isdigit() for character in word) or word in {"$", "%", "+"}:
+            constraints.ambiguities.append(f"unrecognized constraint '{word}'")
+    constraints.remaining_words = words
+
+    return constraints
+
+
+def _take(text: str, patterns: Sequence[re.Pattern]) -> tuple[str, list[float]]:
+    values = []
+    for pattern in patterns:
+        values.extend(float(match.group(1)) for match in pattern.finditer(text))
+        text = pattern.sub(" ", text)
+    return text, values
+
+
+@dataclass
+class FastPathResult:
+    params: dict[str, Any]
+    # Empty when the params can be used instead of asking the LLM.
+    reasons: list[str]
+
+    @property
+    def confident(self) -> bool:
+        return not self.reasons
+
+
+def parse_natural_query(natural_query: str, param_infos: Sequence[Any]) -> FastPathResult:
+    """Fill the params of a query from `natural_query` with rules, where the LLM would otherwise be asked.
+
+    Params are matched by the schema field and operator of their clause, so
+    they are found whatever they are named: the 'type' equality filter, the upper bound filter on 'price', the lower bound filter on
+    'review_rating' and the product id of a `with_vector` clause. Weights the
+    caller didn't set get `NEUTRAL_WEIGHT`. The result isn't confident if the
+    query has a constraint the rules don't recognize, asks for one the query
+    has no param for, or has text to search for while the text params are unset.
+    """
+
+    constraints = extract_constraints(natural_query)
+    reasons = list(constraints.ambiguities)
+    unset = [
+        param_info
+        for param_info in param_infos
+        if param_info.value is None or param_info.is_default
+    ]
+
+    values = {
+        ("type", "=="): constraints.type,
+        ("price", "<="): constraints.max_price,
+        ("review_rating", ">="): constraints.min_rating,
+        ("id", None): constraints.asin,
+    }
+    params: dict[str, Any] = {}
+    used = set()
+    for param_info in unset:
+        if param_info.is_weight:
+            params[param_info.name] = NEUTRAL_WEIGHT
+            continue
+        key = _constraint_key(param_info)
+        if key in values:
+            used.add(key)
+            if values[key] is not None:
+                params[param_info.name] = values[key]
+        elif param_info.space is not None and constraints.remaining_words:
+            # A text param the LLM would fill with part of the query.
+            reasons.append(f"'{param_info.name}' needs the text of the query")
+
+    preset = {_constraint_key(param_info) for param_info in param_infos if param_info not in unset}
+    for key, value in values.items():
+        if value is not None and key not in used and key not in preset:
+            reasons.append(f"no param for the {key[0]} constraint {value!r}")
+
+    return FastPathResult(params, reasons)
+
+
+def _constraint_key(param_info) -> tuple[str, str | None] | None:
+    if param_info.schema_field is None:
+        return None
+    op = OPERATORS.get(param_info.op.name, param_info.op.name) if param_info.op is not None else None
+    return param_info.schema_field.name, op
+
+
+@dataclass
+class FastPathStats:
+    local: int = 0
+    llm: int = 0
+
+    @property
+    def local_rate(self) -> float:
+        queries = self.local + self.llm
+        return self.local / queries if queries else 0.0
+
+
+class NLQFastPath:
+    """Answers natural queries with `parse_natural_query` when it's confident, and with the LLM otherwise.
+
+    Args:
+        query_type: Names the query of a list of param infos in the stats.
+    """
+
+    def __init__(self, query_type: Callable[[Sequence[Any]], str] = lambda param_infos: "all") -> None:
+        self.query_type = query_type
+        self.stats: dict[str, FastPathStats] = {}
+        self._lock = threading.Lock()
+
+    def evaluate(self, param_infos: Sequence[Any], natural_query: str, call_llm: Callable[[], dict[str, Any]]) -> dict[str, Any]:
+        with span("nlq_fast_path"):
+            result = parse_natural_query(natural_query, param_infos)
+        with self._lock:
+            stats = self.stats.setdefault(self.query_type(param_infos), FastPathStats())
+            if result.confident:
+                stats.local += 1
+            else:
+                stats.llm += 1
+        if result.confident:
+            return result.params
+
+        logger.debug(f"Natural query '{natural_query}' goes to the LLM: {'; '.join(result.reasons)}.")
+        return call_llm()
+
+    def log_stats(self) -> None:
+        with self._lock:
+            for query_type, stats in sorted(self.stats.items()):
+                logger.info(
+                    f"NLQ fast path '{query_type}': {stats.local} parsed locally, {stats.llm} sent to the LLM "
+                    f"({stats.local_rate:.1%} local)."
+                )
+
+
+def install_nlq_fast_path(fast_path: NLQFastPath) -> None:
+    """Answer the natural queries `fast_path` is confident about without calling the LLM.
+
+    Install it after the query cache, so the queries that do reach the LLM
+    still go through the cache.
+    """
+
+    from superlinked.framework.dsl.query.nlq_param_evaluator import NLQParamEvaluator
+
+    evaluate_param_infos = NLQParamEvaluator.evaluate_param_infos
+    if getattr(evaluate_param_infos, "__nlq_fast_path__", False):
+        return
+
+    @functools.wraps(evaluate_param_infos)
+    def fast_evaluate_param_infos(self, natural_query, client_config, system_prompt=None):
+        # With a system prompt the query creator expects the LLM to interpret the query.
+        if system_prompt or self._all_params_have_value_set():
+            return evaluate_param_infos(self, natural_query, client_config, system_prompt)
+
+        return fast_path.evaluate(
+            self._param_infos,
+            natural_query,
+            lambda: evaluate_param_infos(self, natural_query, client_config, system_prompt),
+        )
+
+    fast_evaluate_param_infos.__nlq_fast_path__ = True
+    NLQParamEvaluator.evaluate_param_infos = fast_evaluate_param_infos
+
+
+@functools.cache
+def get_nlq_fast_path() -> NLQFastPath:
+    """The fast path shared by the app, reporting its stats per query name."""
+
+    from superlinked_app.query_cache import get_query_cache
+
+    return NLQFastPath(get_query_cache().query_type)
@@ -0,0 +1,514 @@
+import json
+import sys
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Iterator
+
+import numpy as np
+from superlinked.framework.common.data_types import Vector
+from superlinked.framework.storage.in_memory.json_codec import JsonDecoder, JsonEncoder
+
+SCHEMA_FIELD = "__schema__"
+SCHEMA_FIELD_PREFIX = "__schema_field__"
+OBJECT_ID_FIELD = "__object_id__"
+OBJECT_JSON_FIELD = "__object_json__"
+# ProductSchema fields with a handful of distinct values, stored as codes into a table of the values.
+CATEGORICAL_FIELDS = ("type", "category")
+MISSING = -1
+
+
+def _grow(array: np.ndarray, size: int, fill: Any) -> np.ndarray:
+    """`array` with room for at least `size` rows.
+
+    It grows by a quarter at a time, so appends are amortized and at most a
+    fifth of a large matrix is unused.
+    """
+
+    if size <= len(array):
+        return array
+    grown = np.full((max(size, len(array) + len(array) // 4, 16), *array.shape[1:]), fill, dtype=array.dtype)
+    grown[: len(array)] = array
+
+    return grown
+
+
+def _encode_key(key: Any) -> Any:
+    """JSON value of a categorical key: tuples become lists and frozensets `{"frozenset": [...]}`."""
+
+    if isinstance(key, tuple):
+        return [_encode_key(element) for element in key]
+    if isinstance(key, frozenset):
+        return {"frozenset": sorted(key)}
+    return key
+
+
+def _decode_key(value: Any) -> Any:
+    if isinstance(value, list):
+        return tuple(_decode_key(element) for element in value)
+    if isinstance(value, dict):
+        return frozenset(value["frozenset"])
+    return value
+
+
+class ObjectColumn:
+    """Any Python value, the fallback when a value doesn't fit the column type of a field."""
+
+    def __init__(self) -> None:
+        self.values: list[Any] = []
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.values)
+
+    def get(self, position: int) -> Any:
+        return self.values[position] if position < len(self.values) else None
+
+    def set(self, position: int, value: Any) -> bool:
+        if position >= len(self.values):
+            self.values.extend([None] * (position + 1 - len(self.values)))
+        self.values[position] = value
+        return True
+
+    def clear(self, position: int) -> None:
+        # Not through `set`, which subclasses restrict to the values they store.
+        if position < len(self.values):
+            self.values[position] = None
+
+    def state(self, size: int) -> tuple[dict[str, Any], dict[str, np.ndarray]]:
+        """JSON-able description and arrays of the first `size` rows, read back by `from_state`."""
+
+        return {"values": self.values[:size]}, {}
+
+    @classmethod
+    def from_state(cls, meta: dict[str, Any], arrays: dict[str, np.ndarray]) -> "ObjectColumn":
+        column = cls()
+        column.values = meta["values"]
+        return column
+
+
+class StringColumn(ObjectColumn):
+    """Strings, interned so repeated values share one object."""
+
+    def set(self, position: int, value: Any) -> bool:
+        return isinstance(value, str) and super().set(position, sys.intern(value))
+
+    @classmethod
+    def from_state(cls, meta: dict[str, Any], arrays: dict[str, np.ndarray]) -> "StringColumn":
+        column = cls()
+        column.values = [value if value is None else sys.intern(value) for value in meta["values"]]
+        return column
+
+
+class NumberColumn:
+    """Ints or floats in a contiguous array, with a mask of the rows that have one."""
+
+    def __init__(self, python_type: type) -> None:
+        self.python_type = python_type
+        self.values = np.zeros(0, dtype=np.int64 if python_type is int else np.float64)
+        self.present = np.zeros(0, dtype=bool)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.present.nbytes
+
+    def get(self, position: int) -> Any:
+        if position >= len(self.present) or not self.present[position]:
+            return None
+        return self.python_type(self.values[position])
+
+    def set(self, position: int, value: Any) -> bool:
+        if type(value) is not self.python_type:
+            return False
+        self.values = _grow(self.values, position + 1, 0)
+        self.present = _grow(self.present, position + 1, False)
+        self.values[position], self.present[position] = value, True
+        return True
+
+    def clear(self, position: int) -> None:
+        if position < len(self.present):
+            self.present[position] = False
+
+    def state(self, size: int) -> tuple[dict[str, Any], dict[str, np.ndarray]]:
+        return {"python_type": self.python_type.__name__}, {"values": self.values[:size], "present": self.present[:size]}
+
+    @classmethod
+    def from_state(cls, meta: dict[str, Any], arrays: dict[str, np.ndarray]) -> "NumberColumn":
+        column = cls(int if meta["python_type"] == "int" else float)
+        column.values, column.present = arrays["values"], arrays["present"]
+        return column
+
+
+class CategoricalColumn:
+    """Strings or lists of strings, dictionary-encoded as int32 codes into a table of the distinct values."""
+
+    def __init__(self, is_list: bool) -> None:
+        self.is_list = is_list
+        self.codes = np.zeros(0, dtype=np.int32)
+        self.values: list[Any] = []
+        self._codes_by_value: dict[Any, int] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + sys.getsizeof(self.values)
+
+    def get(self, position: int) -> Any:
+        if position >= len(self.codes) or self.codes[position] == MISSING:
+            return None
+        value = self.values[self.codes[position]]
+        return list(value) if self.is_list else value
+
+    def set(self, position: int, value: Any) -> bool:
+        if self.is_list:
+            if not isinstance(value, list) or not all(isinstance(element, str) for element in value):
+                return False
+            self.set_key(position, tuple(sys.intern(element) for element in value))
+        elif isinstance(value, str):
+            self.set_key(position, sys.intern(value))
+        else:
+            return False
+        return True
+
+    def set_key(self, position: int, key: Any) -> None:
+        """Store the hashable `key`, the value itself or, for lists, their tuple."""
+
+        if (code := self._codes_by_value.get(key)) is None:
+            code = self._codes_by_value[key] = len(self.values)
+            self.values.append(key)
+        self.codes = _grow(self.codes, position + 1, MISSING)
+        self.codes[position] = code
+
+    def clear(self, position: int) -> None:
+        if position < len(self.codes):
+            self.codes[position] = MISSING
+
+    def state(self, size: int) -> tuple[dict[str, Any], dict[str, np.ndarray]]:
+        return {"is_list": self.is_list, "values": [_encode_key(key) for key in self.values]}, {"codes": self.codes[:size]}
+
+    @classmethod
+    def from_state(cls, meta: dict[str, Any], arrays: dict[str, np.ndarray]) -> "CategoricalColumn":
+        column = cls(meta["is_list"])
+        for key in meta["values"]:
+            key = _decode_key(key)
+            key = sys.intern(key) if isinstance(key, str) else key
+            column._codes_by_value[key] = len(column.values)
+            column.values.append(key)
+        column.codes = arrays["codes"]
+        return column
+
+
+class FloatListColumn:
+    """Lists of floats of one length, e.g. embeddings, as the rows of a float32 matrix."""
+
+    def __init__(self, dimension: int) -> None:
+        self.dimension = dimension
+        self.matrix = np.zeros((0, dimension), dtype=np.float32)
+        self.present = np.zeros(0, dtype=bool)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes + self.present.nbytes
+
+    def accepts(self, value: Any) -> bool:
+        return isinstance(value, list) and len(value) == self.dimension and all(isinstance(element, float) for element in value)
+
+    def get(self, position: int) -> Any:
+        if position >= len(self.present) or not self.present[position]:
+            return None
+        return self.matrix[position].tolist()
+
+    def set(self, position: int, value: Any) -> bool:
+        if not self.accepts(value):
+            return False
+        self._set_row(position, value)
+        return True
+
+    def _set_row(self, position: int, value: Any) -> None:
+        self.matrix = _grow(self.matrix, position + 1, 0.0)
+        self.present = _grow(self.present, position + 1, False)
+        self.matrix[position], self.present[position] = value, True
+
+    def equals(self, position: int, value: Any) -> bool:
+        """Whether `value` reads back as the stored row, after the float32 rounding."""
+
+        return (
+            self.accepts(value)
+            and position < len(self.present)
+            and bool(self.present[position])
+            and np.array_equal(self.matrix[position], np.asarray(value, dtype=np.float32))
+        )
+
+    def clear(self, position: int) -> None:
+        if position < len(self.present):
+            self.present[position] = False
+
+    def state(self, size: int) -> tuple[dict[str, Any], dict[str, np.ndarray]]:
+        return {"dimension": self.dimension}, {"matrix": self.matrix[:size], "present": self.present[:size]}
+
+    @classmethod
+    def from_state(cls, meta: dict[str, Any], arrays: dict[str, np.ndarray]) -> "FloatListColumn":
+        column = cls(meta["dimension"])
+        column.matrix, column.present = arrays["matrix"], arrays["present"]
+        return column
+
+
+class VectorColumn(FloatListColumn):
+    """Superlinked `Vector`s of one dimension as the rows of a float32 matrix.
+
+    Their negative filter indices are dictionary-encoded. The vector before
+    normalization isn't kept: queries split the stored vectors, which drops it,
+    and the persistent vector databases don't store it either.
+    """
+
+    def __init__(self, dimension: int) -> None:
+        super().__init__(dimension)
+        self.negative_filters = CategoricalColumn(is_list=False)
+
+    @property
+    def nbytes(self) -> int:
+        return super().nbytes + self.negative_filters.nbytes
+
+    def get(self, position: int) -> Any:
+        if position >= len(self.present) or not self.present[position]:
+            return None
+        return Vector(self.matrix[position].astype(np.float64), self.negative_filters.get(position))
+
+    def set(self, position: int, value: Any) -> bool:
+        if not isinstance(value, Vector) or value.dimension != self.dimension:
+            return False
+        self._set_row(position, value.value)
+        self.negative_filters.set_key(position, value.negative_filter_indices)
+        return True
+
+    def state(self, size: int) -> tuple[dict[str, Any], dict[str, np.ndarray]]:
+        meta, arrays = super().state(size)
+        negative_filters_meta, negative_filters_arrays = self.negative_filters.state(size)
+        arrays["negative_filters"] = negative_filters_arrays["codes"]
+        return {**meta, "negative_filters": negative_filters_meta}, arrays
+
+    @classmethod
+    def from_state(cls, meta: dict[str, Any], arrays: dict[str, np.ndarray]) -> "VectorColumn":
+        column = super().from_state(meta, arrays)
+        column.negative_filters = CategoricalColumn.from_state(meta["negative_filters"], {"codes": arrays["negative_filters"]})
+        return column
+
+
+def _is_categorical(field_name: str) -> bool:
+    return field_name == SCHEMA_FIELD or (
+        field_name.startswith(SCHEMA_FIELD_PREFIX) and field_name.rsplit("_", 1)[-1] in CATEGORICAL_FIELDS
+    )
+
+
+def _new_column(field_name: str, value: Any):
+    if isinstance(value, Vector):
+        return VectorColumn(value.dimension)
+    if type(value) in (int, float):
+        return NumberColumn(type(value))
+    if isinstance(value, str):
+        return CategoricalColumn(is_list=False) if _is_categorical(field_name) else StringColumn()
+    if isinstance(value, list) and value and all(isinstance(element, str) for element in value) and _is_categorical(field_name):
+        return CategoricalColumn(is_list=True)
+    if isinstance(value, list) and value and all(isinstance(element, float) for element in value):
+        return FloatListColumn(len(value))
+
+    return ObjectColumn()
+
+
+COLUMN_TYPES = {
+    column_type.__name__: column_type
+    for column_type in [ObjectColumn, StringColumn, NumberColumn, CategoricalColumn, FloatListColumn, VectorColumn]
+}
+
+
+class RowView(Mapping):
+    """Read-only view of the stored values of one row, like the dict InMemoryVDB keeps per row."""
+
+    def __init__(self, store: "ProductStore", position: int | None) -> None:
+        self._store = store
+        self._position = position
+
+    def __getitem__(self, field_name: str) -> Any:
+        value = None if self._position is None else self._store._get(self._position, field_name)
+        if value is None:
+            raise KeyError(field_name)
+        return value
+
+    def get(self, field_name: str, default: Any = None) -> Any:
+        value = None if self._position is None else self._store._get(self._position, field_name)
+        return default if value is None else value
+
+    def __iter__(self) -> Iterator[str]:
+        if self._position is None:
+            return iter([])
+        names = [name for name in self._store._columns if self._store._get(self._position, name) is not None]
+        if OBJECT_JSON_FIELD not in names and self._store._object_json_layouts.get(self._position) is not None:
+            names.append(OBJECT_JSON_FIELD)
+        return iter(names)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class ProductStore(Mapping):
+    """Array-backed replacement for the dict of row dicts InMemoryVDB keeps.
+
+    Every field is a column: numbers in contiguous arrays, the categorical
+    ProductSchema fields (`type`, `category`) dictionary-encoded, other strings
+    interned, and the embeddings and the vectors of every space as one float32
+    matrix per field. The `__object_json__` of a row isn't stored again: its
+    values that equal the row's schema fields are read from them. A value that
+    doesn't fit its column's type turns the column into a list of objects.
+
+    Rows are read as `RowView`s. A row's values round-trip exactly, except
+    float lists and vectors, which are rounded to float32, and `None`, which is
+    not stored. `save` writes the arrays as .npy files, which `load` maps back.
+    """
+
+    def __init__(self) -> None:
+        self._positions: dict[str, int] = {}
+        self._free: list[int] = []
+        self._columns: dict[str, Any] = {}
+        # Per row, a code into the tuples of (key, field the value is read from) of `__object_json__`.
+        self._object_json_layouts = CategoricalColumn(is_list=False)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the arrays and of the lists of objects, not of the objects themselves."""
+
+        return sum(column.nbytes for column in self._columns.values()) + self._object_json_layouts.nbytes
+
+    def __getitem__(self, row_id: str) -> RowView:
+        return RowView(self, self._positions.get(row_id))
+
+    def __contains__(self, row_id: object) -> bool:
+        return row_id in self._positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._positions)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def pop(self, row_id: str, default: Any = None) -> Any:
+        position = self._positions.pop(row_id, None)
+        if position is None:
+            return default
+        row = {name: value for name in self._columns if (value := self._get(position, name)) is not None}
+        for column in self._columns.values():
+            column.clear(position)
+        self._object_json_layouts.clear(position)
+        self._free.append(position)
+
+        return row
+
+    def update_row(self, row_id: str, values: dict[str, Any]) -> None:
+        """Set the given fields of a row, adding it if it's new, like `dict.update` on the row."""
+
+        if (position := self._positions.get(row_id)) is None:
+            position = self._free.pop() if self._free else len(self._positions)
+            self._positions[sys.intern(row_id)] = position
+        object_json = values.get(OBJECT_JSON_FIELD)
+        for field_name, value in values.items():
+            if field_name != OBJECT_JSON_FIELD:
+                self._set(position, field_name, value)
+        if isinstance(object_json, dict):
+            self._set_object_json(position, object_json)
+        elif OBJECT_JSON_FIELD in values:
+            self._set(position, OBJECT_JSON_FIELD, object_json)
+
+    def vectors(self, field_name: str) -> tuple[list[str], np.ndarray]:
+        """Row ids and float32 matrix of the rows that have a value for `field_name`, in row order."""
+
+        column = self._columns.get(field_name)
+        row_ids = [row_id for row_id, position in self._positions.items() if column is not None and column.get(position) is not None]
+        if not isinstance(column, FloatListColumn):
+            return row_ids, np.array([self[row_id][field_name].value for row_id in row_ids], dtype=np.float32)
+        positions = np.fromiter((self._positions[row_id] for row_id in row_ids), dtype=np.int64, count=len(row_ids))
+        if np.array_equal(positions, np.arange(len(row_ids))):
+            # Every row in position order, e.g. a store loaded once: a view, nothing is copied or read
+            # from a memory-mapped snapshot until it's used.
+            return row_ids, column.matrix[: len(row_ids)]
+
+        return row_ids, column.matrix[positions]
+
+    def to_dict(self) -> dict[str, dict[str, Any]]:
+        return {row_id: dict(self[row_id]) for row_id in self._positions}
+
+    def save(self, path: Path) -> None:
+        """Write the store to the directory `path`: one .npy file per array and `store.json` for the rest."""
+
+        path.mkdir(parents=True, exist_ok=True)
+        size = len(self._positions) + len(self._free)
+        columns = []
+        for number, (field_name, column) in enumerate(self._columns.items()):
+            meta, arrays = column.state(size)
+            for name, array in arrays.items():
+                np.save(path / f"{number}.{name}.npy", array)
+            columns.append({"field": field_name, "type": type(column).__name__, "meta": meta, "arrays": list(arrays)})
+        layouts_meta, layouts_arrays = self._object_json_layouts.state(size)
+        np.save(path / "object_json_layouts.codes.npy", layouts_arrays["codes"])
+        np.save(path / "positions.npy", np.fromiter(self._positions.values(), dtype=np.int64, count=len(self._positions)))
+        meta = {"row_ids": list(self._positions), "free": self._free, "columns": columns, "object_json_layouts": layouts_meta}
+        (path / "store.json").write_text(json.dumps(meta, cls=JsonEncoder))
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "ProductStore":
+        """Read a store written by `save`, its arrays memory-mapped copy-on-write, so writes never reach the files."""
+
+        def load_array(name: str) -> np.ndarray:
+            return np.load(path / f"{name}.npy", mmap_mode="c" if mmap else None)
+
+        meta = json.loads((path / "store.json").read_text(), cls=JsonDecoder)
+        store = cls()
+        positions = load_array("positions").tolist()
+        store._positions = {sys.intern(row_id): position for row_id, position in zip(meta["row_ids"], positions)}
+        store._free = meta["free"]
+        for number, column in enumerate(meta["columns"]):
+            arrays = {name: load_array(f"{number}.{name}") for name in column["arrays"]}
+            store._columns[column["field"]] = COLUMN_TYPES[column["type"]].from_state(column["meta"], arrays)
+        store._object_json_layouts = CategoricalColumn.from_state(
+            meta["object_json_layouts"], {"codes": load_array("object_json_layouts.codes")}
+        )
+
+        return store
+
+    def _get(self, position: int, field_name: str) -> Any:
+        if field_name == OBJECT_JSON_FIELD and self._object_json_layouts.get(position) is not None:
+            return {key: self._get(position, source) for key, source in self._object_json_layouts.get(position)}
+        column = self._columns.get(field_name)
+
+        return None if column is None else column.get(position)
+
+    def _set(self, position: int, field_name: str, value: Any) -> None:
+        column = self._columns.get(field_name)
+        if value is None:
+            if column is not None:
+                column.clear(position)
+            return
+        if column is None:
+            column = self._columns[field_name] = _new_column(field_name, value)
+        if not column.set(position, value):
+            fallback = ObjectColumn()
+            for row_position in self._positions.values():
+                fallback.set(row_position, column.get(row_position))
+            self._columns[field_name] = fallback
+            fallback.set(position, value)
+
+    def _set_object_json(self, position: int, object_json: dict[str, Any]) -> None:
+        schema_name = self._get(position, SCHEMA_FIELD)
+        layout = []
+        for key, value in object_json.items():
+            source = OBJECT_ID_FIELD if key == "id" else f"{SCHEMA_FIELD_PREFIX}{schema_name}_{key}"
+            column = self._columns.get(source)
+            if isinstance(column, FloatListColumn) and not isinstance(column, VectorColumn):
+                same = column.equals(position, value)
+            else:
+                stored = self._get(position, source)
+                same = stored is not None and type(stored) is type(value) and stored == value
+            if not same:
+                source = f"{OBJECT_JSON_FIELD}.{key}"
+                self._set(position, source, value)
+            layout.append((sys.intern(key), source))
+        self._object_json_layouts.set_key(position, tuple(layout))
@@ -1,16 +1,24 @@
+import contextlib
+import functools
 from superlinked import framework as sl
+from superlinked.framework.common.nlq import open_ai
+from superlinked.framework.dsl.query.query_descriptor import QueryDescriptor
 from superlinked_app import constants, index
 from superlinked_app.config import settings
+from superlinked_app.instrumentation import install_instrumentation, instrumentation_from_settings, start_metrics_server
+from superlinked_app.lexical_search import install_lexical_search
+from superlinked_app.micro_batching import install_query_types
+from superlinked_app.nlq_fast_path import get_nlq_fast_path, install_nlq_fast_path
+from superlinked_app.query_cache import get_query_cache, install_nlq_cache
 
-assert (
-        settings.OPENAI_API_KEY
-        ), "OPENAI_API_KEY must be set in environment variables to use natural language queries"
+# Built on first access, see `__getattr__`.
+QUERY_NAMES = ("filter_query", "semantic_query", "similar_items_query")
 
-
-openai_config = sl.OpenAIClientConfig(
-                                    api_key=settings.OPENAI_API_KEY.get_secret_value(), 
-                                    model=settings.OPENAI_MODEL_ID
-                                    )
+def get_openai_config() -> sl.OpenAIClientConfig:
+    return sl.OpenAIClientConfig(
+                                api_key=settings.require_openai_api_key(),
+                                model=settings.OPENAI_MODEL_ID
+                                )
 
 
 title_similar_param = sl.Param(
@@ -29,6 +37,15 @@ text_similar_param = sl.Param(
                             ),
                             )
 
+# Hybrid retrieval with LEXICAL_SEARCH_ENABLED: the products matching 'lexical_query' (brand names, model
+# numbers, ASINs) best by BM25 are re-scored by the spaces, their score fused with the BM25 one, weighted by
+# 'lexical_weight' among the best 'lexical_candidates', see the defaults in `lexical_search`.
+# No clause uses these params, so the natural query never fills them: they are REST-only, set by the caller,
+# and passed to the vector database by `install_lexical_search`.
+lexical_query_param = sl.Param("lexical_query")
+lexical_weight_param = sl.Param("lexical_weight")
+lexical_candidates_param = sl.Param("lexical_candidates")
+
 '''
 The here to understand is that their are two types of variables that we can use for the search 
 
@@ -42,82 +59,131 @@ we use,
     .similar() : for semantic search
     
 '''
-base_query = (
-            sl.Query(
-                index.product_index,
-                weights={
-                        index.title_space: sl.Param("title_weight"),
-                        index.description_space: sl.Param("description_weight"),
-                        index.review_rating_maximizer_space: sl.Param(
-                            "review_rating_maximizer_weight"
-                            ),
-                        index.price_minimizer_space: sl.Param("price_minimizer_weights"),
-                        },
-            )
-            .find(index.product)
-            .limit(sl.Param("limit"))
-            .with_natural_query(sl.Param("natural_query"), openai_config)
-            .filter(
-                index.product.type
-                == sl.Param(
-                    "filter_by_type",
-                    description="Used to only present items that have a specific type",
-                    options=constants.TYPES,
-                )
-            )
-        )
 
-filter_query = (
-                base_query.similar(
-                    index.description_space,
-                    text_similar_param,
-                    sl.Param("description_similar_clause_weight"),
+
+@functools.cache
+def build_queries() -> dict[str, QueryDescriptor]:
+    """Build the queries, register them with the query cache and instrument them if enabled.
+
+    Building needs the settings and the OpenAI API key, so it runs the first
+    time a query is used rather than when this module is imported.
+    """
+
+    openai_config = get_openai_config()
+
+    base_query = (
+                sl.Query(
+                    index.product_index,
+                    weights={
+                            index.title_space: sl.Param("title_weight"),
+                            index.description_space: sl.Param("description_weight"),
+                            index.review_rating_maximizer_space: sl.Param(
+                                "review_rating_maximizer_weight"
+                                ),
+                            index.price_minimizer_space: sl.Param("price_minimizer_weights"),
+                            },
                 )
+                .find(index.product)
+                .limit(sl.Param("limit"))
+                .with_natural_query(sl.Param("natural_query"), openai_config)
                 .filter(
-                    index.product.category
-                    == sl.Param(                                                    ## Equal Filter
-                        "filter_by_cateogry",
-                        description="Used to only present items that have a specific cateogry",
-                        options=constants.CATEGORIES,
+                    index.product.type
+                    == sl.Param(
+                        "filter_by_type",
+                        description="Used to only present items that have a specific type",
+                        options=constants.TYPES,
                     )
                 )
-                .filter(
-                    index.product.review_rating                                     ## Greater than Filter
-                    >= sl.Param(
-                        "review_rating_bigger_than",
-                        description="Used to find items with a review rating bigger than the provided number.",
+            )
+
+    filter_query = (
+                    base_query.similar(
+                        index.description_space,
+                        text_similar_param,
+                        sl.Param("description_similar_clause_weight"),
                     )
-                )
-                .filter(
-                    index.product.price
-                    <= sl.Param(                                                    ## Less than Filter
-                        "price_smaller_than",
-                        description="Used to find items with a price smaller than the provided number.",
+                    .filter(
+                        index.product.category
+                        == sl.Param(                                                    ## Equal Filter
+                            "filter_by_cateogry",
+                            description="Used to only present items that have a specific cateogry",
+                            options=constants.CATEGORIES,
+                        )
                     )
-                )
-)
-
-# leverages the full power of vector spaces to understand and match complex search intentions across multiple attributes
-semantic_query = (
-                base_query.similar(
-                    index.description_space,
-                    text_similar_param,
-                    sl.Param("description_similar_clause_weight"),
-                )
-                .similar(
-                    index.title_space,
-                    title_similar_param,
-                    sl.Param("title_similar_clause_weight"),
-                )
-                .filter(
-                    index.product.category
-                    == sl.Param(
-                        "filter_by_cateogry",
-                        description="Used to only present items that have a specific cateogry",
-                        options=constants.CATEGORIES,
+                    .filter(
+                        index.product.review_rating                                     ## Greater than Filter
+                        >= sl.Param(
+                            "review_rating_bigger_than",
+                            description="Used to find items with a review rating bigger than the provided number.",
+                        )
                     )
-                )
-)
+                    .filter(
+                        index.product.price
+                        <= sl.Param(                                                    ## Less than Filter
+                            "price_smaller_than",
+                            description="Used to find items with a price smaller than the provided number.",
+                        )
+                    )
+    )
+
+    # leverages the full power of vector spaces to understand and match complex search intentions across multiple attributes
+    semantic_query = (
+                    base_query.similar(
+                        index.description_space,
+                        text_similar_param,
+                        sl.Param("description_similar_clause_weight"),
+                    )
+                    .similar(
+                        index.title_space,
+                        title_similar_param,
+                        sl.Param("title_similar_clause_weight"),
+                    )
+                    .filter(
+                        index.product.category
+                        == sl.Param(
+                            "filter_by_cateogry",
+                            description="Used to only present items that have a specific cateogry",
+                            options=constants.CATEGORIES,
+                        )
+                    )
+    )
+
+    # enabling product recommendations and "more like this"
+    similar_items_query = semantic_query.with_vector(index.product, sl.Param("product_id"))
+
+    # Superlinked points the process-wide stderr at a pipe around every LLM call to filter
+    # tokenizer fork warnings. Concurrent natural queries race on that swap and can leave
+    # stderr on a pipe nobody drains, hanging every later call, so the filter is skipped.
+    if not settings.NLQ_FILTER_TOKENIZER_WARNINGS:
+        open_ai.suppress_tokenizer_warnings = contextlib.nullcontext
+    cache = get_query_cache()
+    if settings.QUERY_CACHE_ENABLED:
+        install_nlq_cache(cache)
+    # After the cache, so only the natural queries the rules can't parse reach it.
+    if settings.NLQ_FAST_PATH_ENABLED:
+        install_nlq_fast_path(get_nlq_fast_path())
+    queries = {
+            "filter_query": filter_query,
+            "semantic_query": semantic_query,
+            "similar_items_query": similar_items_query,
+            }
+    cache.register_queries(queries)
+    if settings.MICRO_BATCHING_ENABLED:
+        install_query_types(queries)
+    if settings.LEXICAL_SEARCH_ENABLED:
+        install_lexical_search(queries, lexical_query_param, lexical_weight_param, lexical_candidates_param)
+
+    instrumentation_config = instrumentation_from_settings(settings)
+    if instrumentation_config is not None:
+        install_instrumentation(queries, instrumentation_config)
+        if settings.METRICS_PORT is not None:
+            start_metrics_server(settings.METRICS_PORT)
+
+    return queries
+
+
+def __getattr__(name: str):
+    if name in QUERY_NAMES:
+        return build_queries()[name]
 
-# enabling product recommendations and "more like this"
-similar_items_query = semantic_query.with_vector(index.product, sl.Param("product_id"))
\ No newline at end of file
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,230 @@
+import copy
+import functools
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Mapping
+
+from loguru import logger
+
+from superlinked_app.config import settings
+from superlinked_app.embedding_cache import normalize_text
+from superlinked_app.instrumentation import span
+
+# Query type reported for the query-text embeddings.
+QUERY_EMBEDDING = "query_embedding"
+
+
+@dataclass
+class QueryTypeStats:
+    hits: int = 0
+    misses: int = 0
+    hit_seconds: float = 0.0
+    miss_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def mean_hit_ms(self) -> float:
+        return self.hit_seconds / self.hits * 1000 if self.hits else 0.0
+
+    @property
+    def mean_miss_ms(self) -> float:
+        return self.miss_seconds / self.misses * 1000 if self.misses else 0.0
+
+
+class QueryCache:
+    """TTL + LRU cache for the natural-query params and the query-text embeddings.
+
+    Entries expire `ttl_seconds` after they were computed, and the least recently
+    used ones are dropped beyond `max_entries`. With `path` set, entries are also
+    written to SQLite so they survive server restarts.
+
+    Args:
+        ttl_seconds: Lifetime of an entry.
+        max_entries: Number of entries kept in memory.
+        path: Optional SQLite file persisting the entries.
+        enabled: When False every lookup is a miss, but the stats are still recorded.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 3600.0,
+        max_entries: int = 10_000,
+        path: Path | None = None,
+        enabled: bool = True,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.stats: dict[str, QueryTypeStats] = {}
+
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._query_types: dict[frozenset[str], str] = {}
+        self._connection = None
+        if path is not None and enabled:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(path), check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._connection.execute("DELETE FROM query_cache WHERE expires_at <= ?", (time.time(),))
+            self._connection.commit()
+
+    def get_or_compute(self, query_type: str, key_parts: Any, compute: Callable[[], Any]) -> Any:
+        """Return the cached value of `key_parts`, computing and storing it on a miss."""
+
+        start_time = time.perf_counter()
+        key = hashlib.sha256(json.dumps(key_parts, default=str).encode("utf-8")).hexdigest()
+
+        found, value = False, None
+        if self.enabled:
+            with span("cache"):
+                found, value = self._get(key)
+        if not found:
+            value = compute()
+            if self.enabled:
+                self._put(key, value)
+
+        elapsed = time.perf_counter() - start_time
+        with self._lock:
+            stats = self.stats.setdefault(query_type, QueryTypeStats())
+            if found:
+                stats.hits += 1
+                stats.hit_seconds += elapsed
+            else:
+                stats.misses += 1
+                stats.miss_seconds += elapsed
+
+        return copy.deepcopy(value)
+
+    def embed_query(self, text: str, model: str, embed: Callable[[str], list[float]]) -> list[float]:
+        """Embed a query text through the cache."""
+
+        return self.get_or_compute(QUERY_EMBEDDING, [model, normalize_text(text)], lambda: embed(text))
+
+    def register_queries(self, queries: Mapping[str, Any]) -> None:
+        """Name the query types so the natural-query stats are reported per query.
+
+        Queries are recognized by their set of param names.
+        """
+
+        for name, query in queries.items():
+            param_names = frozenset(param_info.name for param_info in query.calculate_param_infos())
+            self._query_types[param_names] = name
+
+    def query_type(self, param_infos) -> str:
+        return self._query_types.get(frozenset(param_info.name for param_info in param_infos), "unknown")
+
+    def log_stats(self) -> None:
+        with self._lock:
+            for query_type, stats in sorted(self.stats.items()):
+                logger.info(
+                    f"Query cache '{query_type}': {stats.hits} hits, {stats.misses} misses "
+                    f"({stats.hit_rate:.1%} hit rate), {stats.mean_hit_ms:.2f} ms per hit, "
+                    f"{stats.mean_miss_ms:.1f} ms per miss."
+                )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM query_cache")
+                self._connection.commit()
+
+    def _get(self, key: str) -> tuple[bool, Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._connection is not None:
+                row = self._connection.execute(
+                    "SELECT expires_at, value FROM query_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], json.loads(row[1]))
+                    self._remember(key, entry)
+            if entry is None:
+                return False, None
+
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+
+            return True, value
+
+    def _put(self, key: str, value: Any) -> None:
+        entry = (time.time() + self.ttl_seconds, value)
+        with self._lock:
+            self._remember(key, entry)
+            if self._connection is not None:
+                try:
+                    serialized = json.dumps(value)
+                except TypeError:
+                    return
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO query_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, serialized, entry[0]),
+                )
+                self._connection.commit()
+
+    def _remember(self, key: str, entry: tuple[float, Any]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def install_nlq_cache(query_cache: QueryCache) -> None:
+    """Route Superlinked's natural-query param extraction through `query_cache`.
+
+    The LLM answer depends on the natural query, the model, the system prompt, the
+    params of the query it fills and the ones the caller already set, so all of
+    them are part of the key.
+    """
+
+    from superlinked.framework.dsl.query.nlq_param_evaluator import NLQParamEvaluator
+
+    evaluate_param_infos = NLQParamEvaluator.evaluate_param_infos
+    if getattr(evaluate_param_infos, "__wrapped__", None) is not None:
+        return
+
+    @functools.wraps(evaluate_param_infos)
+    def cached_evaluate_param_infos(self, natural_query, client_config, system_prompt=None):
+        preset_params = sorted(
+            (param_info.name, param_info.value)
+            for param_info in self._param_infos
+            if param_info.value is not None and not param_info.is_default
+        )
+        param_names = sorted(param_info.name for param_info in self._param_infos)
+        key_parts = [client_config.model, normalize_text(natural_query), system_prompt, param_names, preset_params]
+
+        return query_cache.get_or_compute(
+            query_cache.query_type(self._param_infos),
+            key_parts,
+            lambda: evaluate_param_infos(self, natural_query, client_config, system_prompt),
+        )
+
+    NLQParamEvaluator.evaluate_param_infos = cached_evaluate_param_infos
+
+
+@functools.cache
+def get_query_cache() -> QueryCache:
+    """The cache shared by the app, created from the settings on first use."""
+
+    return QueryCache(
+        ttl_seconds=settings.QUERY_CACHE_TTL_SECONDS,
+        max_entries=settings.QUERY_CACHE_MAX_ENTRIES,
+        path=settings.QUERY_CACHE_PATH,
+        enabled=settings.QUERY_CACHE_ENABLED,
+    )
@@ -0,0 +1,244 @@
+import heapq
+import multiprocessing
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+import pandas as pd
+from loguru import logger
+
+ID_COLUMN = "asin"
+
+
+def shard_of(object_id: str, num_shards: int) -> int:
+    """Shard of a product, the same in every process, unlike `hash`."""
+
+    return zlib.crc32(str(object_id).encode()) % num_shards
+
+
+def partition(df: pd.DataFrame, num_shards: int, id_column: str = ID_COLUMN) -> list[pd.DataFrame]:
+    """The rows of `df` of every shard, by the hash of their id."""
+
+    shards = df[id_column].map(lambda object_id: shard_of(object_id, num_shards))
+
+    return [df[shards == shard].reset_index(drop=True) for shard in range(num_shards)]
+
+
+@dataclass
+class ShardStats:
+    shard: int
+    products: int
+    rss_mb: float
+    # Before any product was put, the RSS of Python and Superlinked alone.
+    startup_rss_mb: float
+
+
+def _serve(connection, shard: int, num_shards: int) -> None:
+    """Loop of a shard worker: an InMemory app of its products, answering the coordinator's commands one at a time.
+
+    Commands are (name, payload) tuples, answered with (True, result) or (False, error):
+    'put' a DataFrame, 'query' (query name, params, looks-like vectors by object id),
+    'vector' (query name, object id) of a stored product, 'stats', and 'close'.
+    """
+
+    from superlinked import framework as sl
+    from superlinked.framework.common.data_types import Vector
+
+    from superlinked_app import ann_index, index, query
+    from superlinked_app.config import get_settings
+    from superlinked_app.utils import rss_mb
+
+    settings = get_settings()
+    # The coordinator serves the metrics, and every shard keeps its own snapshot.
+    settings.METRICS_PORT = None
+    if settings.IN_MEMORY_SNAPSHOT_PATH is not None:
+        settings.IN_MEMORY_SNAPSHOT_PATH = settings.IN_MEMORY_SNAPSHOT_PATH / f"shard-{shard}-of-{num_shards}"
+    source = sl.InMemorySource(
+                            index.product,
+                            parser=sl.DataFrameParser(schema=index.product, mapping={index.product.id: ID_COLUMN}),
+                            )
+    app = sl.InteractiveExecutor(
+                                sources=[source],
+                                indices=[index.product_index],
+                                vector_database=ann_index.in_memory_vector_database(settings),
+                                ).run()
+    connector = app.storage_manager._vdb_connector
+    if settings.IN_MEMORY_SNAPSHOT_PATH is not None:
+        connector.restore(None)
+
+    # The stored vectors of the products of "more like this" queries, which are in one shard only.
+    storage_manager = app._storage_manager
+    read_node_result = storage_manager.read_node_result
+    looks_like_vectors: dict[str, Vector] = {}
+
+    def read_shared_node_result(schema, object_id, node_id, result_type):
+        if object_id in looks_like_vectors:
+            return looks_like_vectors[object_id]
+        return read_node_result(schema, object_id, node_id, result_type)
+
+    storage_manager.read_node_result = read_shared_node_result
+    startup_rss_mb = rss_mb()
+
+    while True:
+        command, payload = connection.recv()
+        try:
+            if command == "put":
+                source.put([payload])
+                reply = len(payload)
+            elif command == "query":
+                query_name, params, looks_like_vectors = payload
+                result = app.query(getattr(query, query_name), **params)
+                reply = (list(result.entries), result.search_vector)
+            elif command == "vector":
+                query_name, object_id = payload
+                query_descriptor = getattr(query, query_name)
+                reply = read_node_result(query_descriptor.schema, object_id, query_descriptor.index._node_id, Vector)
+            elif command == "stats":
+                reply = ShardStats(shard, len(connector._vdb), rss_mb(), startup_rss_mb)
+            elif command == "close":
+                if settings.IN_MEMORY_SNAPSHOT_PATH is not None:
+                    connector.persist(None)
+                connection.send((True, None))
+                return
+            else:
+                raise ValueError(f"Unknown shard command '{command}'.")
+        except Exception as error:
+            reply = error
+            ok = False
+        else:
+            ok = True
+        finally:
+            looks_like_vectors = {}
+        try:
+            connection.send((ok, reply))
+        except Exception as error:
+            # An error that doesn't pickle.
+            connection.send((False, RuntimeError(f"Shard {shard}: {error!r}, sending {reply!r}")))
+
+
+class ShardedApp:
+    """Products partitioned by the hash of their ASIN across worker processes, each with its own InMemory app.
+
+    A query is sent to every shard, which returns its best `limit` products,
+    and the coordinator keeps the best `limit` of those, so the results are
+    the ones of a single app holding every product. The spaces of index.py
+    score a product the same whatever the other products are, which this
+    relies on. Only the lexical candidates of `lexical_search` are picked by
+    the BM25 statistics of each shard, not of the whole catalogue.
+
+    The natural query is turned into params once, by the coordinator, and a
+    "more like this" product's vector is read from its shard and given to
+    the others, which don't have it. Every shard runs one query at a time,
+    while concurrent queries run on all shards at once.
+
+    Use it like an app: `put` products, then `query(query.semantic_query, **params)`.
+    The workers read the settings from the environment, like the coordinator.
+
+    Args:
+        num_shards: Worker processes.
+        start_method: multiprocessing start method of the workers.
+    """
+
+    def __init__(self, num_shards: int, start_method: str = "spawn") -> None:
+        context = multiprocessing.get_context(start_method)
+        self.num_shards = num_shards
+        self._connections = []
+        self._processes = []
+        for shard in range(num_shards):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_serve, args=(worker_connection, shard, num_shards), name=f"shard-{shard}", daemon=True)
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+        self._locks = [threading.Lock() for _ in range(num_shards)]
+        self._pool = ThreadPoolExecutor(max_workers=4 * num_shards, thread_name_prefix="shard-client")
+
+    def put(self, df: pd.DataFrame) -> None:
+        """Ingest the products of `df` in the shards of their ASINs, all shards at once."""
+
+        shard_dfs = partition(df, self.num_shards)
+        self._gather([(shard, "put", shard_df) for shard, shard_df in enumerate(shard_dfs) if not shard_df.empty])
+
+    def query(self, query_descriptor, **params: Any):
+        """The `Result` of a query of query.py over every shard, as `app.query` would return it."""
+
+        from superlinked.framework.dsl.query.query_clause import LooksLikeFilterClause
+        from superlinked.framework.dsl.query.query_param_value_setter import QueryParamValueSetter
+        from superlinked.framework.dsl.query.result import Result
+
+        from superlinked_app import lexical_search, query
+
+        query_name = next((name for name, descriptor in query.build_queries().items() if descriptor is query_descriptor), None)
+        if query_name is None:
+            raise ValueError("Only the queries of query.py can be sharded.")
+
+        # The lexical params are taken out by the shards' `install_lexical_search`.
+        lexical_names = lexical_search._param_names.get(id(query_descriptor), ())
+        lexical_params = {name: value for name, value in params.items() if name in lexical_names}
+        params = self._resolve_natural_query(query_descriptor, {name: value for name, value in params.items() if name not in lexical_names})
+        resolved_descriptor = QueryParamValueSetter.set_values(query_descriptor, params)
+
+        looks_like_vectors = {}
+        looks_like_clause = resolved_descriptor.get_clause_by_type(LooksLikeFilterClause)
+        if looks_like_clause is not None and looks_like_clause.evaluate():
+            object_id = str(looks_like_clause.get_value())
+            vector = self._call(shard_of(object_id, self.num_shards), "vector", (query_name, object_id))
+            if vector is not None:
+                looks_like_vectors[object_id] = vector
+
+        replies = self._gather([(shard, "query", (query_name, params | lexical_params, looks_like_vectors)) for shard in range(self.num_shards)])
+        limit = resolved_descriptor.get_limit()
+        entries = heapq.merge(*[shard_entries for shard_entries, _ in replies], key=lambda entry: -entry.entity.score)
+        entries = list(entries)[:limit] if limit is not None and limit >= 0 else list(entries)
+
+        return Result(entries, resolved_descriptor, replies[0][1])
+
+    def stats(self) -> list[ShardStats]:
+        return self._gather([(shard, "stats", None) for shard in range(self.num_shards)])
+
+    def close(self) -> None:
+        """Stop the workers, which save their snapshots first if IN_MEMORY_SNAPSHOT_PATH is set."""
+
+        try:
+            self._gather([(shard, "close", None) for shard in range(self.num_shards)])
+        finally:
+            self._pool.shutdown()
+            for process in self._processes:
+                process.join(timeout=30)
+                if process.is_alive():
+                    logger.warning(f"Shard worker {process.name} didn't stop, terminating it.")
+                    process.terminate()
+
+    def _resolve_natural_query(self, query_descriptor, params: dict[str, Any]) -> dict[str, Any]:
+        """`params` with the params of the natural query, which is dropped, where they aren't given."""
+
+        from superlinked.framework.dsl.query.query_param_value_setter import QueryParamValueSetter
+
+        if not params.get("natural_query"):
+            return dict(params)
+        # What `QueryParamValueSetter.set_values` does before setting the natural query's params.
+        descriptor = QueryParamValueSetter._QueryParamValueSetter__alter_query_descriptor(query_descriptor, params, True)
+        natural_params = QueryParamValueSetter._QueryParamValueSetter__calculate_nlq_params(descriptor)
+        resolved = {**params, "natural_query": None}
+        for name, value in natural_params.items():
+            if resolved.get(name) is None:
+                resolved[name] = value
+
+        return resolved
+
+    def _call(self, shard: int, command: str, payload: Any) -> Any:
+        with self._locks[shard]:
+            self._connections[shard].send((command, payload))
+            ok, reply = self._connections[shard].recv()
+        if not ok:
+            raise reply
+
+        return reply
+
+    def _gather(self, calls: Sequence[tuple[int, str, Any]]) -> list[Any]:
+        futures = [self._pool.submit(self._call, shard, command, payload) for shard, command, payload in calls]
+
+        return [future.result() for future in futures]
@@ -0,0 +1,114 @@
+import hashlib
+import importlib.metadata
+import json
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from loguru import logger
+
+from superlinked_app.product_store import ProductStore
+
+SNAPSHOT_VERSION = 1
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable hash of JSON-able `parts`, other objects are hashed by their repr."""
+
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+def index_fingerprint(index) -> str:
+    """Hash of what the stored rows of a Superlinked `Index` depend on.
+
+    The fields of its schemas, and its node id, which Superlinked derives from
+    the parameters of every space, so editing a space or a schema in index.py
+    gives another fingerprint.
+    """
+
+    schemas = {
+        schema._schema_name: [(field.name, type(field).__name__) for field in schema._get_schema_fields()]
+        for schema in index._space_schemas
+    }
+
+    return fingerprint(importlib.metadata.version("superlinked"), index._node_id, schemas, [field.name for field in index._fields])
+
+
+@dataclass
+class Snapshot:
+    """Rows and built vector indexes of an in-memory vector database, see `save` and `load`."""
+
+    store: ProductStore
+    # Vector field -> (rows, class name, arrays) of its built index.
+    indices: dict[str, tuple[int, str, dict[str, np.ndarray]]]
+    fingerprint: str
+
+    def save(self, path: Path) -> None:
+        """Write the snapshot to the directory `path`, replacing the previous one only once it's complete.
+
+        The store goes to `store/`, the arrays of every index to `indices/`, and
+        the version and fingerprint to `meta.json`.
+        """
+
+        start_time = time.perf_counter()
+        tmp_path, old_path = path.with_name(f".{path.name}.tmp"), path.with_name(f".{path.name}.old")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        self.store.save(tmp_path / "store")
+        (tmp_path / "indices").mkdir()
+        indices = []
+        for number, (vector_field, (rows, index_type, arrays)) in enumerate(self.indices.items()):
+            for name, array in arrays.items():
+                np.save(tmp_path / "indices" / f"{number}.{name}.npy", array)
+            indices.append({"vector_field": vector_field, "rows": rows, "type": index_type, "arrays": list(arrays)})
+        meta = {"version": SNAPSHOT_VERSION, "fingerprint": self.fingerprint, "indices": indices}
+        (tmp_path / "meta.json").write_text(json.dumps(meta, indent=2))
+
+        # Renames are atomic, so a crash leaves either the previous snapshot or the new one.
+        shutil.rmtree(old_path, ignore_errors=True)
+        if path.exists():
+            path.rename(old_path)
+        tmp_path.rename(path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        size = sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+        logger.info(
+            f"Saved a snapshot of {len(self.store)} products and {len(indices)} vector indexes to '{path}' "
+            f"({size / 2**20:.1f} MiB) in {time.perf_counter() - start_time:.2f}s."
+        )
+
+    @classmethod
+    def load(cls, path: Path, expected_fingerprint: str, mmap: bool = True) -> "Snapshot | None":
+        """The snapshot at `path`, memory-mapped, or None if there is none or it's for another version or index."""
+
+        if not (path / "meta.json").exists():
+            logger.info(f"No snapshot at '{path}', starting empty.")
+            return None
+        meta = json.loads((path / "meta.json").read_text())
+        if meta.get("version") != SNAPSHOT_VERSION:
+            reason = f"has version {meta.get('version')}, expected {SNAPSHOT_VERSION}"
+        elif meta.get("fingerprint") != expected_fingerprint:
+            reason = "was saved for other schemas, spaces or indexes"
+        else:
+            reason = None
+        if reason is not None:
+            logger.warning(f"The snapshot at '{path}' {reason}, so it's ignored. Load the data again, the snapshot is replaced on shutdown.")
+            return None
+
+        start_time = time.perf_counter()
+        store = ProductStore.load(path / "store", mmap)
+        indices = {
+            index["vector_field"]: (
+                index["rows"],
+                index["type"],
+                {
+                    name: np.load(path / "indices" / f"{number}.{name}.npy", mmap_mode="c" if mmap else None)
+                    for name in index["arrays"]
+                },
+            )
+            for number, index in enumerate(meta["indices"])
+        }
+        logger.info(f"Restored {len(store)} products and {len(indices)} vector indexes from '{path}' in {time.perf_counter() - start_time:.2f}s.")
+
+        return cls(store, indices, expected_fingerprint)
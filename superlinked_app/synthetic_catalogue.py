@@ -0,0 +1,255 @@
+import collections
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from superlinked_app import constants
+from superlinked_app.dataset_io import ProcessedDatasetWriter
+from superlinked_app.embeddings import EMBEDDING_COLUMNS
+
+# Products generated at a time. Every block is drawn from its own seed, so the
+# products are the same whatever the catalogue size and however they're written.
+BLOCK_SIZE = 10_000
+NO_RATING = -1.0
+# Share of a cluster's products whose first category is the cluster's one.
+CLUSTER_CATEGORY_RATE = 0.8
+# Share of the title and description words drawn from the words of the product's cluster.
+CLUSTER_WORD_RATE = 0.5
+CLUSTER_WORDS = 3
+
+
+@dataclass
+class Distribution:
+    """Empirical distribution of a numeric column, sampled by interpolating its quantiles."""
+
+    quantiles: np.ndarray
+
+    @classmethod
+    def fit(cls, values: np.ndarray, points: int = 101) -> "Distribution":
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            values = np.zeros(1)
+
+        return cls(np.quantile(values, np.linspace(0.0, 1.0, points)))
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        return np.interp(rng.random(size), np.linspace(0.0, 1.0, len(self.quantiles)), self.quantiles)
+
+
+@dataclass
+class TypeProfile:
+    """How the products of a type are distributed, see `CatalogueProfile.fit`."""
+
+    share: float
+    category_weights: np.ndarray  # Over constants.CATEGORIES.
+    category_counts: np.ndarray  # Probability of a product having 0, 1, ... categories.
+    price: Distribution
+    no_rating_rate: float
+    review_rating: Distribution
+    no_review_rate: float
+    review_count: Distribution
+
+
+@dataclass
+class CatalogueProfile:
+    """Distributions of a processed dataset, per product type, that synthetic products are drawn from.
+
+    Categories outside `constants.CATEGORIES` are dropped, and every known
+    category gets `category_smoothing` extra products of a type, so all of
+    them appear in a large catalogue. Missing ratings are `NO_RATING`.
+    """
+
+    types: dict[str, TypeProfile]
+    vocabulary: list[str]
+    word_weights: np.ndarray
+    title_lengths: np.ndarray  # Probability of a title of 0, 1, ... words.
+    description_lengths: np.ndarray
+
+    @classmethod
+    def fit(cls, df: pd.DataFrame, category_smoothing: float = 0.5) -> "CatalogueProfile":
+        category_positions = {category: position for position, category in enumerate(constants.CATEGORIES)}
+        types = {}
+        for product_type, type_df in df.groupby("type"):
+            categories = type_df["category"].map(
+                lambda values: [value for value in (values if isinstance(values, (list, np.ndarray)) else []) if value in category_positions]
+            )
+            category_weights = np.full(len(constants.CATEGORIES), category_smoothing)
+            for values in categories:
+                for value in values:
+                    category_weights[category_positions[value]] += 1
+            ratings = type_df["review_rating"].fillna(NO_RATING).to_numpy()
+            review_counts = type_df["review_count"].fillna(0).to_numpy()
+            types[str(product_type)] = TypeProfile(
+                share=len(type_df) / len(df),
+                category_weights=category_weights / category_weights.sum(),
+                category_counts=_frequencies(categories.map(len)),
+                price=Distribution.fit(type_df["price"].dropna().to_numpy()),
+                no_rating_rate=float(np.mean(ratings == NO_RATING)),
+                review_rating=Distribution.fit(ratings[ratings != NO_RATING]),
+                no_review_rate=float(np.mean(review_counts == 0)),
+                review_count=Distribution.fit(review_counts[review_counts > 0]),
+            )
+
+        words = collections.Counter(word for text in pd.concat([df["title"], df["description"]]).dropna() for word in str(text).split())
+        vocabulary = sorted(words)
+        word_weights = np.array([words[word] for word in vocabulary], dtype=np.float64)
+
+        return cls(
+            types=types,
+            vocabulary=vocabulary,
+            word_weights=word_weights / word_weights.sum(),
+            title_lengths=_frequencies(df["title"].fillna("").str.split().map(len)),
+            description_lengths=_frequencies(df["description"].fillna("").str.split().map(len)),
+        )
+
+
+def _frequencies(counts: pd.Series) -> np.ndarray:
+    """Probability of every count from 0 to the largest one."""
+
+    frequencies = np.bincount(counts.to_numpy(dtype=np.int64)).astype(np.float64)
+
+    return frequencies / frequencies.sum()
+
+
+class SyntheticCatalogue:
+    """Products with the columns of a processed dataset and embeddings, drawn from a `CatalogueProfile`.
+
+    Every product belongs to one of `num_clusters` clusters, of uneven sizes,
+    which gives it its type, mostly its first category, some of its words,
+    and embeddings close to the cluster's center: its title and description
+    embeddings are the center plus noise of norm `cluster_spread` shared by
+    both, plus noise of norm `text_noise` of their own, normalized. So nearest
+    neighbour searches behave like on real embeddings rather than on uniform
+    random vectors, where every product is about as far as any other.
+
+    The catalogue is deterministic for a `seed`: a smaller one is a prefix of
+    a larger one, and ASINs are 'S' and the product's number.
+
+    Args:
+        profile: Distributions the products are drawn from.
+        num_rows: Products in the catalogue.
+        dimensions: Length of the embeddings.
+        num_clusters: Clusters of products.
+        cluster_spread: Distance of the products from their cluster's center.
+        text_noise: Distance of the title and description embeddings of a product from each other.
+        seed: Seed of every random draw.
+    """
+
+    def __init__(
+        self,
+        profile: CatalogueProfile,
+        num_rows: int,
+        dimensions: int = constants.EMBEDDING_DIMENSIONS,
+        num_clusters: int = 1000,
+        cluster_spread: float = 0.6,
+        text_noise: float = 0.3,
+        seed: int = 6,
+    ) -> None:
+        self.profile = profile
+        self.num_rows = num_rows
+        self.dimensions = dimensions
+        self.cluster_spread = cluster_spread
+        self.text_noise = text_noise
+        self.seed = seed
+
+        rng = np.random.default_rng([seed, 0])
+        self.type_names = list(profile.types)
+        self.type_shares = np.array([profile.types[name].share for name in self.type_names])
+        # Every type gets clusters in proportion to its share, at least one.
+        cluster_counts = np.maximum(1, np.floor(self.type_shares * num_clusters).astype(np.int64))
+        cluster_counts[np.argmax(cluster_counts)] += max(0, num_clusters - cluster_counts.sum())
+        self.cluster_types = rng.permutation(np.repeat(np.arange(len(self.type_names)), cluster_counts))
+        # Zipf-like cluster sizes, the largest clusters at random positions.
+        self.cluster_sizes = rng.permutation(1.0 / np.arange(1, len(self.cluster_types) + 1) ** 0.8)
+        self.cluster_categories = np.array(
+            [rng.choice(len(constants.CATEGORIES), p=profile.types[self.type_names[cluster_type]].category_weights) for cluster_type in self.cluster_types]
+        )
+        self.cluster_words = rng.choice(len(profile.vocabulary), size=(len(self.cluster_types), CLUSTER_WORDS), p=profile.word_weights)
+        centers = rng.standard_normal((len(self.cluster_types), dimensions), dtype=np.float32)
+        self.centers = centers / np.linalg.norm(centers, axis=1, keepdims=True)
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def blocks(self) -> Iterator[pd.DataFrame]:
+        """The products, `BLOCK_SIZE` at a time."""
+
+        for block in range((self.num_rows + BLOCK_SIZE - 1) // BLOCK_SIZE):
+            yield self.block(block)
+
+    def block(self, block: int) -> pd.DataFrame:
+        # A whole block is always drawn, so its products don't depend on where the catalogue ends.
+        rng = np.random.default_rng([self.seed, 1, block])
+        start = block * BLOCK_SIZE
+        size = min(BLOCK_SIZE, self.num_rows - start)
+        profile = self.profile
+
+        # The type of a product is drawn from the shares of the sample, then its cluster among those of the type.
+        type_codes = rng.choice(len(self.type_names), size=BLOCK_SIZE, p=self.type_shares)
+        clusters = np.zeros(BLOCK_SIZE, dtype=np.int64)
+        for code in range(len(self.type_names)):
+            rows = np.flatnonzero(type_codes == code)
+            type_clusters = np.flatnonzero(self.cluster_types == code)
+            weights = self.cluster_sizes[type_clusters]
+            clusters[rows] = rng.choice(type_clusters, size=len(rows), p=weights / weights.sum())
+        columns: dict[str, list | np.ndarray] = {
+            "asin": [f"S{number:09d}" for number in range(start, start + BLOCK_SIZE)],
+            "type": [self.type_names[code] for code in type_codes],
+            "category": [[] for _ in range(BLOCK_SIZE)],
+            "title": self._texts(rng, clusters, profile.title_lengths),
+            "description": self._texts(rng, clusters, profile.description_lengths),
+            "price": np.zeros(BLOCK_SIZE),
+            "review_rating": np.zeros(BLOCK_SIZE),
+            "review_count": np.zeros(BLOCK_SIZE, dtype=np.int64),
+        }
+        for code, type_name in enumerate(self.type_names):
+            rows = np.flatnonzero(type_codes == code)
+            type_profile = profile.types[type_name]
+            columns["price"][rows] = np.round(type_profile.price.sample(rng, len(rows)), 2)
+            ratings = np.round(type_profile.review_rating.sample(rng, len(rows)), 1)
+            columns["review_rating"][rows] = np.where(rng.random(len(rows)) < type_profile.no_rating_rate, NO_RATING, ratings)
+            review_counts = np.round(type_profile.review_count.sample(rng, len(rows))).astype(np.int64)
+            columns["review_count"][rows] = np.where(rng.random(len(rows)) < type_profile.no_review_rate, 0, review_counts)
+            num_categories = rng.choice(len(type_profile.category_counts), size=len(rows), p=type_profile.category_counts)
+            drawn = rng.choice(len(constants.CATEGORIES), size=(len(rows), max(1, len(type_profile.category_counts) - 1)), p=type_profile.category_weights)
+            from_cluster = rng.random(len(rows)) < CLUSTER_CATEGORY_RATE
+            drawn[from_cluster, 0] = self.cluster_categories[clusters[rows[from_cluster]]]
+            for row, count, codes in zip(rows, num_categories, drawn):
+                columns["category"][row] = list(dict.fromkeys(constants.CATEGORIES[code] for code in codes[:count]))
+
+        product_noise = self._noise(rng, self.cluster_spread)
+        products = self.centers[clusters] + product_noise
+        for column in EMBEDDING_COLUMNS.values():
+            vectors = products + self._noise(rng, self.text_noise)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            columns[column] = list(vectors)
+
+        return pd.DataFrame(columns).head(size)
+
+    def write(self, path: Path) -> None:
+        """Write the catalogue to a processed dataset, in the format of the extension of `path`, a block at a time."""
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with ProcessedDatasetWriter(path) as writer:
+            for df in self.blocks():
+                writer.write(df)
+
+    def _noise(self, rng: np.random.Generator, norm: float) -> np.ndarray:
+        """Gaussian noise of about `norm` per row."""
+
+        noise = rng.standard_normal((BLOCK_SIZE, self.dimensions), dtype=np.float32)
+
+        return noise * np.float32(norm / np.sqrt(self.dimensions))
+
+    def _texts(self, rng: np.random.Generator, clusters: np.ndarray, lengths: np.ndarray) -> list[str]:
+        vocabulary = np.asarray(self.profile.vocabulary, dtype=object)
+        max_length = len(lengths) - 1
+        words = rng.choice(len(vocabulary), size=(BLOCK_SIZE, max(1, max_length)), p=self.profile.word_weights)
+        cluster_words = self.cluster_words[clusters][np.arange(BLOCK_SIZE)[:, None], rng.integers(0, CLUSTER_WORDS, size=words.shape)]
+        words = np.where(rng.random(words.shape) < CLUSTER_WORD_RATE, cluster_words, words)
+        text_lengths = rng.choice(len(lengths), size=BLOCK_SIZE, p=lengths)
+
+        return [" ".join(vocabulary[row_words[:length]]) for row_words, length in zip(words, text_lengths)]
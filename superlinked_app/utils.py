@@ -1,51 +1,99 @@
 import gzip
+import io
+import itertools
+import resource
+import shutil
+import sys
 import requests
 import zstandard
+import pandas as pd
 from pathlib import Path
+from typing import BinaryIO, Iterator, TextIO
 from loguru import logger
+from superlinked_app.downloads import Download, DownloadError
+
+DECOMPRESSION_BUFFER_SIZE = 1024**2
+
+
+def download_file(url: str, output_path: Path, connections: int = 4, sha256: str | None = None) -> bool:
+    """Download `url` over `connections` ranged requests, resuming an earlier partial download, see `Download`."""
 
-def download_file(url: str, output_path: Path) -> bool:
     try:
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-
-        # Get the file size from headers (if available)
-        file_size = int(response.headers.get("content-length", 0))
-
-        with output_path.open("wb") as file:
-            if file_size == 0:
-                file.write(response.content)
-            else:
-                downloaded = 0
-                from tqdm import tqdm
-
-                for chunk in tqdm(
-                    response.iter_content(chunk_size=8192),
-                    total=file_size // 8192,
-                    unit="KB",
-                    desc="Downloading",
-                ):
-                    if chunk:
-                        file.write(chunk)
-                        downloaded += len(chunk)
+        Download(url, output_path, connections=connections, sha256=sha256).start().wait()
         return True
 
-    except requests.exceptions.RequestException:
-        logger.error("Failed to donwload the file.")
+    except (requests.exceptions.RequestException, DownloadError) as e:
+        logger.error(f"Failed to download the file: {e}")
 
         return False
 
 
-def decompress_zst(input_path: Path, output_path: Path) -> None:
-    with open(input_path, "rb") as compressed:
-        dctx = zstandard.ZstdDecompressor()
+def decompress_zst(input_path: Path, output_path: Path, stream: BinaryIO | None = None) -> None:
+    """Decompress `input_path`, or `stream` with its content, e.g. a download in progress."""
+
+    with stream or open(input_path, "rb") as compressed:
+        dctx = zstandard.ZstdDecompressor(max_window_size=2**31)
         with open(output_path, "wb") as destination:
             dctx.copy_stream(compressed, destination)
 
 
-def decompress_gz(input_path: Path, output_path: Path) -> None:
-    with gzip.open(input_path, "rb") as gz_file:
+def decompress_gz(input_path: Path, output_path: Path, stream: BinaryIO | None = None) -> None:
+    """Decompress `input_path`, or `stream` with its content, without holding the file in memory."""
+
+    with gzip.open(stream or input_path, "rb") as gz_file:
         with open(output_path, "wb") as output_file:
-            output_file.write(gz_file.read())
\ No newline at end of file
+            shutil.copyfileobj(gz_file, output_file, DECOMPRESSION_BUFFER_SIZE)
+
+
+def open_text_stream(path: Path, stream: BinaryIO | None = None) -> TextIO:
+    """Open a JSON lines file for incremental reading, decompressing '.zst' and '.gz' on the fly.
+
+    `stream` replaces reading `path` with an already open binary stream of its
+    content, e.g. `Download.open` to process a file while it downloads.
+    """
+
+    raw = stream or path.open("rb")
+    if path.suffix == ".zst":
+        dctx = zstandard.ZstdDecompressor(max_window_size=2**31)
+        return io.TextIOWrapper(dctx.stream_reader(raw), encoding="utf-8")
+    if path.suffix == ".gz":
+        return gzip.open(raw, "rt", encoding="utf-8")
+
+    return io.TextIOWrapper(raw, encoding="utf-8")
+
+
+def iter_text_chunks(path: Path, chunk_size: int, stream: BinaryIO | None = None) -> Iterator[str]:
+    """Yield a JSON lines file as unparsed text blocks of at most `chunk_size` lines."""
+
+    with open_text_stream(path, stream) as text_stream:
+        while lines := list(itertools.islice(text_stream, chunk_size)):
+            yield "".join(lines)
+
+
+def iter_json_chunks(path: Path, chunk_size: int, stream: BinaryIO | None = None) -> Iterator[pd.DataFrame]:
+    """Yield a JSON lines file as DataFrames of at most `chunk_size` rows, keeping only one chunk in memory."""
+
+    for text in iter_text_chunks(path, chunk_size, stream):
+        yield pd.read_json(io.StringIO(text), lines=True)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the current process in MB."""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux.
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def rss_mb() -> float:
+    """Resident set size of the current process in MB, its peak where /proc isn't available.
+
+    The peak of a process started by another one can be its parent's, which
+    Linux keeps across exec.
+    """
+
+    statm = Path("/proc/self/statm")
+    if not statm.exists():
+        return peak_rss_mb()
+
+    return int(statm.read_text().split()[1]) * resource.getpagesize() / 1024**2
@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+from typing import Literal, Sequence
+
+import numpy as np
+import pandas as pd
+
+from superlinked_app.embeddings import EMBEDDING_COLUMNS
+
+Quantization = Literal["none", "float16", "int8"]
+QUANTIZATIONS: tuple[Quantization, ...] = ("none", "float16", "int8")
+
+
+def truncate_embeddings(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """Keep the first `dimensions` components and re-normalize to unit length.
+
+    text-embedding-3 models are trained so that their leading dimensions carry
+    most of the information, and this is exactly how the API's `dimensions`
+    option shortens them.
+    """
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dimensions >= vectors.shape[-1]:
+        return vectors
+
+    truncated = vectors[..., :dimensions]
+    norms = np.linalg.norm(truncated, axis=-1, keepdims=True)
+
+    return truncated / np.where(norms == 0, 1.0, norms)
+
+
+@dataclass
+class QuantizedVectors:
+    """A matrix of vectors stored as float32, float16 or int8 codes.
+
+    int8 codes use one symmetric scale per row, so a row is approximately
+    `codes[i] * scales[i]`.
+    """
+
+    codes: np.ndarray
+    scales: np.ndarray | None = None
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def dequantize(self) -> np.ndarray:
+        vectors = self.codes.astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[:, None]
+
+        return vectors
+
+    def dot(self, queries: np.ndarray) -> np.ndarray:
+        """Scores of every query against every stored vector, shaped (queries, rows)."""
+
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        scores = queries @ self.codes.T.astype(np.float32, copy=False)
+        if self.scales is not None:
+            scores *= self.scales[None, :]
+
+        return scores
+
+
+def quantize(vectors: np.ndarray, quantization: Quantization = "none") -> QuantizedVectors:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if quantization == "none":
+        return QuantizedVectors(vectors)
+    if quantization == "float16":
+        return QuantizedVectors(vectors.astype(np.float16))
+    if quantization == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return QuantizedVectors(codes, scales.astype(np.float32))
+
+    raise ValueError(f"Unknown quantization '{quantization}', expected one of {', '.join(QUANTIZATIONS)}.")
+
+
+def compress_embedding_columns(
+    df: pd.DataFrame,
+    dimensions: int,
+    columns: Sequence[str] = tuple(EMBEDDING_COLUMNS.values()),
+) -> pd.DataFrame:
+    """Return a copy of `df` with its embedding columns truncated to `dimensions`.
+
+    Superlinked stores every vector as float64, so quantized codes would be
+    expanded again on ingestion; `quantize` is only measured by
+    tools/benchmark_vector_compression.py. Columns missing from `df` are skipped.
+    """
+
+    df_compressed = df.copy()
+    for column in columns:
+        if column not in df_compressed or df_compressed.empty:
+            continue
+        vectors = truncate_embeddings(np.asarray(df_compressed[column].tolist(), dtype=np.float32), dimensions)
+        df_compressed[column] = vectors.tolist()
+
+    return df_compressed
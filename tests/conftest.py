@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The settings are read on first use: the tests run offline, with no cache answering a query instead of the search.
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("QUERY_CACHE_ENABLED", "false")
+os.environ.setdefault("NLQ_FAST_PATH_ENABLED", "false")
+
+WORDS = ["usb", "cable", "lamp", "steel", "mug", "novel", "guide", "robot", "toy", "chair", "kindle", "puzzle"]
+CATEGORIES = [["Electronics"], ["Books", "Literature & Fiction"], ["Toys & Games"], ["Kitchen & Dining"], []]
+
+
+def make_products(num_rows: int, seed: int = 6) -> pd.DataFrame:
+    """`num_rows` processed products with random words, embedded with the offline HashEmbedder."""
+
+    from superlinked_app.embeddings import EmbeddingPipeline, HashEmbedder
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "asin": [f"B{number:09d}" for number in range(num_rows)],
+            "type": rng.choice(["book", "product"], size=num_rows),
+            "category": [CATEGORIES[index] for index in rng.integers(len(CATEGORIES), size=num_rows)],
+            "title": [" ".join(rng.choice(WORDS, size=4)) for _ in range(num_rows)],
+            "description": [" ".join(rng.choice(WORDS, size=12)) for _ in range(num_rows)],
+            "price": rng.uniform(1, 200, size=num_rows).round(2),
+            "review_rating": rng.uniform(1, 5, size=num_rows).round(1),
+            "review_count": rng.integers(0, 1000, size=num_rows),
+        }
+    )
+
+    return EmbeddingPipeline(HashEmbedder()).embed_dataframe(df)
+
+
+@pytest.fixture(scope="session")
+def products() -> pd.DataFrame:
+    return make_products(120)
+
+
+@pytest.fixture
+def make_app():
+    """Build an app on a vector database, None for Superlinked's exhaustive scan, loaded with frames of products in order."""
+
+    from superlinked import framework as sl
+    from superlinked_app import index
+
+    def build(vector_database=None, *frames: pd.DataFrame):
+        source = sl.InMemorySource(
+            index.product, parser=sl.DataFrameParser(schema=index.product, mapping={index.product.id: "asin"})
+        )
+        executor = sl.InteractiveExecutor(sources=[source], indices=[index.product_index], vector_database=vector_database)
+        app = executor.run()
+        for df in frames:
+            source.put([df])
+
+        return app
+
+    return build
+
+
+def semantic_params(products: pd.DataFrame, row: int, **params) -> dict:
+    """Params of a `semantic_query` whose texts are the embeddings of product `row`."""
+
+    from tools.benchmark_queries import DEFAULT_PARAMS
+
+    return {
+        **DEFAULT_PARAMS["semantic_query"],
+        "query_title": products["title_embedding"][row],
+        "query_description": products["description_embedding"][row],
+        **params,
+    }
+
+
+def result_scores(result) -> list[tuple[str, float]]:
+    return [(entry.entity.header.object_id, entry.entity.score) for entry in result.entries]
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+from conftest import result_scores, semantic_params
+
+from superlinked_app.ann_index import ANNInMemoryVDB, ANNInMemoryVectorDatabase, IVFFlatIndex
+
+
+@pytest.fixture
+def index_builds(monkeypatch) -> list[str]:
+    """The vector field of every index an `ANNInMemoryVDB` builds."""
+
+    builds = []
+    get_index = ANNInMemoryVDB._get_index
+
+    def recording_get_index(self, vector_field_name, indexed_field_names):
+        if vector_field_name not in self._indices:
+            builds.append(vector_field_name)
+        return get_index(self, vector_field_name, indexed_field_names)
+
+    monkeypatch.setattr(ANNInMemoryVDB, "_get_index", recording_get_index)
+
+    return builds
+
+
+def test_ivf_index_builds_and_searches_no_rows() -> None:
+    index = IVFFlatIndex()
+    index.build(np.empty((0, 4), dtype=np.float32))
+    positions, scores = index.search(np.ones(4, dtype=np.float32), 0)
+
+    assert len(positions) == len(scores) == 0
+
+
+@pytest.mark.parametrize("index_type", ["exact", "ivf"])
+@pytest.mark.parametrize("compact_store", [False, True])
+def test_empty_store_returns_no_results_without_building(make_app, products, index_builds, index_type, compact_store) -> None:
+    from superlinked_app import query
+
+    app = make_app(ANNInMemoryVectorDatabase(index_type=index_type, compact_store=compact_store))
+
+    assert result_scores(app.query(query.semantic_query, **semantic_params(products, 0))) == []
+    assert index_builds == []
+
+
+@pytest.mark.parametrize("index_type", ["exact", "ivf"])
+def test_limit_zero_returns_no_results_without_building(make_app, products, index_builds, index_type) -> None:
+    from superlinked_app import query
+
+    app = make_app(ANNInMemoryVectorDatabase(index_type=index_type), products)
+
+    assert result_scores(app.query(query.semantic_query, **semantic_params(products, 0, limit=0))) == []
+    assert index_builds == []
+    assert len(result_scores(app.query(query.semantic_query, **semantic_params(products, 0)))) == 10
+    assert index_builds
+
+
+def _run_queries(app, query_name: str, params: list[dict]) -> list[list[tuple[str, float]]]:
+    from superlinked_app import query
+
+    return [result_scores(app.query(getattr(query, query_name), **query_params)) for query_params in params]
+
+
+def _assert_same_results(results: list, reference: list) -> None:
+    for entries, reference_entries in zip(results, reference, strict=True):
+        assert [object_id for object_id, _ in entries] == [object_id for object_id, _ in reference_entries]
+        np.testing.assert_allclose([score for _, score in entries], [score for _, score in reference_entries], atol=1e-5)
+
+
+# Vector databases whose searches are exact, so they must give the results of the scan. Probing every list scans every row.
+EXACT_DATABASES = [
+    pytest.param(lambda: ANNInMemoryVectorDatabase(index_type="exact"), id="exact"),
+    pytest.param(lambda: ANNInMemoryVectorDatabase(index_type="ivf", num_lists=4, num_probes=4), id="ivf-all-lists"),
+]
+
+
+@pytest.mark.parametrize("vector_database", EXACT_DATABASES)
+def test_exact_search_matches_the_scan(make_app, products, vector_database) -> None:
+    params = [semantic_params(products, row, limit=limit) for row, limit in [(0, 10), (7, 1), (42, -1)]]
+
+    reference = _run_queries(make_app(None, products), "semantic_query", params)
+    results = _run_queries(make_app(vector_database(), products), "semantic_query", params)
+
+    assert len(reference[2]) == len(products)
+    _assert_same_results(results, reference)
+
+
+@pytest.mark.parametrize("vector_database", EXACT_DATABASES)
+def test_filtered_search_matches_the_scan(make_app, products, vector_database) -> None:
+    from tools.benchmark_queries import DEFAULT_PARAMS
+
+    # Superlinked itself rejects the operand of the category filter, so only the other ones are compared.
+    filters = [
+        {"filter_by_type": "book"},
+        {"filter_by_type": "product", "price_smaller_than": 50.0},
+        {"review_rating_bigger_than": 3.5, "price_smaller_than": 120.0},
+        # A price no product has.
+        {"price_smaller_than": 0.5},
+        {"filter_by_type": "book", "review_rating_bigger_than": 4.0, "limit": -1},
+    ]
+    params = [
+        {**DEFAULT_PARAMS["filter_query"], "query_description": products["description_embedding"][row], **query_filters}
+        for row, query_filters in enumerate(filters)
+    ]
+
+    reference = _run_queries(make_app(None, products), "filter_query", params)
+    results = _run_queries(make_app(vector_database(), products), "filter_query", params)
+
+    assert reference[3] == [] and all(reference[:3]) and reference[4]
+    _assert_same_results(results, reference)
+
+
+def test_compact_store_matches_the_scan(make_app, products) -> None:
+    # Some products are updated after the first load, so their rows are rewritten in place.
+    updated = products.iloc[:20].assign(price=products["price"][:20] * 2, title="updated title")
+    params = [semantic_params(products, row) for row in [0, 30, 60]]
+    similar_params = [
+        semantic_params(products, row, query_title=None, query_description=None, product_id=products["asin"][row]) for row in [5, 90]
+    ]
+
+    results = {}
+    for name, vector_database in [("scan", None), ("compact", ANNInMemoryVectorDatabase(index_type="exact", compact_store=True))]:
+        app = make_app(vector_database, products, updated)
+        results[name] = _run_queries(app, "semantic_query", params) + _run_queries(app, "similar_items_query", similar_params)
+
+    _assert_same_results(results["compact"], results["scan"])
@@ -0,0 +1,91 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from superlinked_app import data_processing
+
+# Missing values, blanks, the number types JSON gives and values the scalar parsers reject.
+EDGE_CASES = {
+    "stars": [None, np.nan, "", "   ", "nan stars", "nan", "4.0", 4.0, "4,2 de 5 estrellas", "5.0 out of 5 stars", "abc", "inf", "-1"],
+    "ratings": [None, np.nan, "", "   ", "7", 7, "1,116 ratings", "1,.5 ratings", "90 valoraciones", "abc", "-3", "9223372036854775807 ratings"],
+    "price": [None, np.nan, "", "abc", "$9.99", "25,63€", "$1,299.99", 12.5, 7, "2000", "1e3", "inf", "-5", " 3 "],
+}
+# What the parsers give the values they can't read.
+SENTINELS = {"stars": -1.0, "ratings": 0, "price": np.nan}
+PARSERS = {"stars": "review_rating", "ratings": "review_count", "price": "price"}
+# Raw values in the shapes of the ESCI dataset, the rows of `sample` are drawn from.
+RAW_VALUES = {
+    "locale": ["us", "us", "us", "es", "jp"],
+    "category": [["Books", "Literature & Fiction"], [" Toys & Games ", "Puzzles", "Jigsaw"], ["Electronics"], [], None, ["Books", None]],
+    "stars": ["4.5 out of 5 stars", "3,9 de 5 estrellas", "5.0 out of 5 stars", "", "nan stars", None, 4.0],
+    "ratings": ["1,116 ratings", "90 valoraciones", "7 ratings", "", None, 7, "12,345 ratings"],
+    "price": ["$9.99", "25,63€", "$1,299.99", "abc", None, 12.5, "$2000.00", "7"],
+}
+
+
+@pytest.fixture(scope="module")
+def sample() -> pd.DataFrame:
+    """300 raw products mixing the values of `RAW_VALUES`."""
+
+    rng = np.random.default_rng(6)
+    num_rows = 300
+    columns = {
+        column: [values[index] for index in rng.integers(len(values), size=num_rows)]
+        for column, values in RAW_VALUES.items()
+    }
+
+    return pd.DataFrame(
+        {
+            "asin": [f"B{number:09d}" for number in range(num_rows)],
+            "type": rng.choice(["book", "product"], size=num_rows),
+            "title": [f"title {number}" for number in range(num_rows)],
+            "description": [f"description {number}" for number in range(num_rows)],
+            **columns,
+        }
+    )
+
+
+def _columns(sample: pd.DataFrame, column: str) -> list[pd.Series]:
+    return [sample[column], pd.Series(EDGE_CASES[column], dtype=object, name=column)]
+
+
+@pytest.mark.parametrize("column", list(PARSERS))
+def test_vectorized_parsers_match_the_scalar_ones(sample: pd.DataFrame, column: str) -> None:
+    scalar = getattr(data_processing, f"parse_{PARSERS[column]}")
+    vectorized = getattr(data_processing, f"parse_{PARSERS[column]}_vectorized")
+    for values in _columns(sample, column):
+        expected = values.map(scalar)
+        actual = vectorized(values)
+        pd.testing.assert_series_equal(actual, expected.astype(actual.dtype), check_names=False, check_exact=True)
+
+
+@pytest.mark.parametrize("column", list(PARSERS))
+def test_vectorized_parsers_give_the_sentinel_of_missing_values(column: str) -> None:
+    vectorized = getattr(data_processing, f"parse_{PARSERS[column]}_vectorized")
+    parsed = vectorized(pd.Series([None, np.nan, "", "abc"], dtype=object))
+    np.testing.assert_array_equal(parsed.to_numpy(), np.full(4, SENTINELS[column]))
+
+
+def test_vectorized_category_parser_matches_the_scalar_one(sample: pd.DataFrame) -> None:
+    categories = pd.concat(
+        [sample["category"], pd.Series([None, np.nan, [], ["Books", None], [" Toys & Games ", "Games", "Puzzles"]], dtype=object)],
+        ignore_index=True,
+    )
+    random.seed(6)
+    expected = categories.apply(data_processing.parse_category)
+    expected_next_draw = random.random()
+    random.seed(6)
+    actual = data_processing.parse_category_vectorized(categories)
+
+    assert actual.tolist() == expected.tolist()
+    # Both consumed the random stream identically.
+    assert random.random() == expected_next_draw
+
+
+def test_engines_process_the_sample_identically(sample: pd.DataFrame) -> None:
+    expected = data_processing.process_amazon_dataset(sample, engine="apply")
+    actual = data_processing.process_amazon_dataset(sample, engine="vectorized")
+
+    pd.testing.assert_frame_equal(actual, expected, check_exact=True)
@@ -0,0 +1,67 @@
+import itertools
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from superlinked_app import embedding_cache
+from superlinked_app.embedding_cache import EmbeddingCache
+from superlinked_app.embeddings import EmbeddingPipeline
+from test_embeddings import RecordingEmbedder
+
+
+@pytest.fixture
+def clock(monkeypatch) -> None:
+    """A clock ticking once per read, so every access of the cache has its own time."""
+
+    ticks = itertools.count(1)
+    monkeypatch.setattr(embedding_cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def test_duplicate_texts_are_embedded_once(tmp_path: Path) -> None:
+    cache = EmbeddingCache(tmp_path / "cache.sqlite")
+    embedder = RecordingEmbedder()
+
+    vectors = EmbeddingPipeline(embedder, dimensions=2, cache=cache).embed_texts(["usb cable", "lamp", "usb cable", "usb cable"])
+
+    assert embedder.requests == [["usb cable", "lamp"]]
+    assert vectors == [[9.0, 1.0], [4.0, 0.0], [9.0, 1.0], [9.0, 1.0]]
+    assert (cache.stats.duplicates, cache.stats.misses, cache.stats.hits) == (2, 2, 0)
+
+
+def test_cached_texts_are_not_embedded_again(tmp_path: Path) -> None:
+    cache = EmbeddingCache(tmp_path / "cache.sqlite")
+    EmbeddingPipeline(RecordingEmbedder(), dimensions=2, cache=cache).embed_texts(["usb cable"])
+    embedder = RecordingEmbedder()
+
+    EmbeddingPipeline(embedder, dimensions=2, cache=cache).embed_texts(["usb cable", "lamp"])
+
+    assert embedder.requests == [["lamp"]]
+    assert (cache.stats.hits, cache.stats.misses) == (1, 2)
+
+
+def test_the_least_recently_used_entries_are_evicted(tmp_path: Path, clock) -> None:
+    # Vectors of 2 float32 take 8 bytes, so the budget holds 10 entries.
+    cache = EmbeddingCache(tmp_path / "cache.sqlite", max_bytes=80)
+    texts = [f"text {number}" for number in range(11)]
+    for text in texts[:10]:
+        cache.put_many("model", {text: [1.0, 2.0]})
+    cache.get_many("model", [texts[0]])
+
+    cache.put_many("model", {texts[10]: [1.0, 2.0]})
+
+    # Going over the budget evicts down to 90% of it, the least recently used entries first.
+    assert set(cache.get_many("model", texts)) == set(texts) - {texts[1], texts[2]}
+    assert cache.stats.evictions == 2
+    assert cache.total_bytes == 72
+
+
+def test_the_budget_is_enforced_when_the_cache_is_opened(tmp_path: Path, clock) -> None:
+    cache = EmbeddingCache(tmp_path / "cache.sqlite", max_bytes=None)
+    cache.put_many("model", {f"text {number}": [1.0, 2.0] for number in range(10)})
+    cache.close()
+
+    cache = EmbeddingCache(tmp_path / "cache.sqlite", max_bytes=40)
+
+    assert cache.total_bytes == 32
+    assert cache.stats.evictions == 6
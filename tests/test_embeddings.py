@@ -0,0 +1,39 @@
+from pathlib import Path
+
+from superlinked_app.embedding_cache import EmbeddingCache
+from superlinked_app.embeddings import EmbeddingPipeline
+
+
+class RecordingEmbedder:
+    """Embeds a text as [its length, its number of spaces], recording what it was asked to embed."""
+
+    model = "recording-embedder"
+
+    def __init__(self) -> None:
+        self.requests: list[list[str]] = []
+
+    def embed(self, texts):
+        self.requests.append(list(texts))
+        return [[float(len(text)), float(text.count(" "))] for text in texts]
+
+
+def test_the_embedder_gets_the_original_texts_whether_the_cache_is_on_or_off(tmp_path: Path) -> None:
+    texts = ["  wireless   headphones ", "usb cable"]
+    uncached, cached = RecordingEmbedder(), RecordingEmbedder()
+
+    uncached_vectors = EmbeddingPipeline(uncached, dimensions=2).embed_texts(texts)
+    cached_vectors = EmbeddingPipeline(cached, dimensions=2, cache=EmbeddingCache(tmp_path / "cache.sqlite")).embed_texts(texts)
+
+    assert cached.requests == uncached.requests == [texts]
+    assert cached_vectors == uncached_vectors
+
+
+def test_texts_differing_in_whitespace_share_a_cache_entry(tmp_path: Path) -> None:
+    cache = EmbeddingCache(tmp_path / "cache.sqlite")
+    EmbeddingPipeline(RecordingEmbedder(), dimensions=2, cache=cache).embed_texts(["wireless headphones"])
+    embedder = RecordingEmbedder()
+
+    vectors = EmbeddingPipeline(embedder, dimensions=2, cache=cache).embed_texts(["  wireless   headphones "])
+
+    assert embedder.requests == []
+    assert vectors == [[19.0, 1.0]]
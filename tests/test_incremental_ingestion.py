@@ -0,0 +1,104 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from conftest import result_scores, semantic_params
+
+from superlinked_app.ann_index import ANNInMemoryVectorDatabase
+from superlinked_app.embeddings import EMBEDDING_COLUMNS, EmbeddingPipeline, HashEmbedder
+from superlinked_app.incremental_ingestion import IngestionState, apply_delta, compute_delta
+
+
+@pytest.fixture
+def catalogue(products) -> pd.DataFrame:
+    return products.iloc[:20].drop(columns=list(EMBEDDING_COLUMNS.values())).reset_index(drop=True)
+
+
+@pytest.fixture
+def state(tmp_path: Path):
+    state = IngestionState(tmp_path / "state.sqlite")
+    yield state
+    state.close()
+
+
+def _load(df: pd.DataFrame, state: IngestionState, previous: pd.DataFrame | None = None):
+    delta = compute_delta(df, state, EmbeddingPipeline(HashEmbedder()), previous)
+    state.commit(delta)
+
+    return delta
+
+
+def test_the_first_load_is_all_new(catalogue, state) -> None:
+    delta = _load(catalogue, state)
+
+    assert (delta.stats.new, delta.stats.changed, delta.stats.removed) == (20, 0, 0)
+    assert delta.stats.reembedded == {"title": 20, "description": 20}
+    assert delta.upserts["asin"].tolist() == catalogue["asin"].tolist()
+
+
+def test_an_unchanged_catalogue_is_an_empty_delta(catalogue, state) -> None:
+    first = _load(catalogue, state)
+
+    delta = _load(catalogue, state, first.snapshot)
+
+    assert delta.is_empty
+    assert delta.stats.unchanged == 20
+    assert delta.stats.reembedded == {"title": 0, "description": 0}
+
+
+def test_only_changed_texts_are_reembedded(catalogue, state) -> None:
+    first = _load(catalogue, state)
+    changed = catalogue.copy()
+    changed.loc[0, "price"] += 1
+    # Formatting-only edits change the row, not the embedded text.
+    changed.loc[1, "title"] = f"  {changed.loc[1, 'title']}  "
+    changed.loc[2, "description"] = "a new description"
+
+    delta = _load(changed, state, first.snapshot)
+
+    assert (delta.stats.new, delta.stats.changed, delta.stats.unchanged) == (0, 3, 17)
+    assert delta.stats.reembedded == {"title": 0, "description": 1}
+    assert delta.upserts["asin"].tolist() == catalogue["asin"][:3].tolist()
+    assert delta.upserts["description_embedding"][2] == HashEmbedder().embed_one("a new description")
+    assert delta.upserts["title_embedding"][1] == first.snapshot["title_embedding"][1]
+
+
+def test_removed_products_are_tombstoned_and_come_back_as_new(catalogue, state) -> None:
+    first = _load(catalogue, state)
+
+    removed = _load(catalogue.iloc[2:], state, first.snapshot)
+    restored = _load(catalogue, state, removed.snapshot)
+
+    assert removed.removed == catalogue["asin"][:2].tolist()
+    assert removed.upserts.empty
+    assert (restored.stats.new, restored.stats.unchanged, restored.removed) == (2, 18, [])
+
+
+@pytest.mark.parametrize(
+    "vector_database",
+    [
+        pytest.param(lambda: None, id="scan"),
+        pytest.param(lambda: ANNInMemoryVectorDatabase(index_type="exact"), id="exact"),
+        pytest.param(lambda: ANNInMemoryVectorDatabase(index_type="ivf", compact_store=True), id="ivf-compact"),
+    ],
+)
+def test_applied_deltas_update_and_remove_the_stored_products(catalogue, state, vector_database) -> None:
+    from superlinked import framework as sl
+    from superlinked_app import index, query
+
+    source = sl.InMemorySource(index.product, parser=sl.DataFrameParser(schema=index.product, mapping={index.product.id: "asin"}))
+    app = sl.InteractiveExecutor(sources=[source], indices=[index.product_index], vector_database=vector_database()).run()
+    first = _load(catalogue, state)
+    apply_delta(app, source, index.product, first)
+    params = semantic_params(first.snapshot, 5, limit=-1)
+    before = dict(result_scores(app.query(query.semantic_query, **params)))
+
+    changed = catalogue.iloc[2:].copy()
+    changed.loc[5, "price"] = 0.5
+    apply_delta(app, source, index.product, _load(changed, state, first.snapshot))
+    after = dict(result_scores(app.query(query.semantic_query, **params)))
+
+    assert set(before) == set(catalogue["asin"])
+    assert set(after) == set(catalogue["asin"][2:])
+    # The price minimizer space scores the cheaper product higher.
+    assert after[catalogue["asin"][5]] > before[catalogue["asin"][5]]
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from conftest import result_scores, semantic_params
+
+from superlinked_app.ann_index import ANNInMemoryVectorDatabase
+from superlinked_app.lexical_search import LexicalIndex, install_lexical_search, lexical_field_weights, tokenize
+from superlinked_app.product_store import OBJECT_ID_FIELD
+
+MODEL_NUMBER = "zx-9000"
+
+
+def test_joined_tokens_are_kept_whole_and_as_their_parts() -> None:
+    assert tokenize("Sony WH-1000XM4, USB-C cable") == ["sony", "wh-1000xm4", "wh", "1000xm4", "usb-c", "usb", "c", "cable"]
+
+
+def test_title_words_and_rare_words_score_higher() -> None:
+    index = LexicalIndex({"title": 2.0, "description": 1.0})
+    index.update("a", {"title": "usb cable", "description": "a long braided cable"})
+    index.update("b", {"title": "braided lamp", "description": "usb powered"})
+    index.update("c", {"title": "lamp shade", "description": "fits any lamp"})
+
+    assert index.search("usb", 10)[0] == ["a", "b"]
+    # 'braided' is rarer than 'lamp', and is in the title of b.
+    assert index.search("braided lamp", 10)[0][0] == "b"
+    assert index.search("usb", 1)[0] == ["a"]
+    assert index.search("chair", 10)[0] == []
+
+
+def test_updated_and_removed_rows_are_searched_with_their_new_terms() -> None:
+    index = LexicalIndex({"title": 1.0})
+    index.update("a", {"title": "usb cable"})
+    index.update("b", {"title": "lamp"})
+
+    index.update("a", {"title": "desk lamp"})
+    index.remove("b")
+
+    assert index.search("usb", 10)[0] == []
+    assert index.search("lamp", 10)[0] == ["a"]
+    assert len(index) == 1
+
+
+@pytest.fixture
+def lexical_app(make_app, products, monkeypatch):
+    """An app on the exact index with a lexical index, loaded with products of which the 11th has a model number in its title."""
+
+    from superlinked.framework.dsl.executor.query.query_executor import QueryExecutor
+    from superlinked_app import index, query
+
+    # The patch is undone after the test.
+    monkeypatch.setattr(QueryExecutor, "query", QueryExecutor.query)
+    install_lexical_search(query.build_queries(), query.lexical_query_param, query.lexical_weight_param, query.lexical_candidates_param)
+    df = products.copy()
+    df.loc[10, "title"] = f"{df.loc[10, 'title']} {MODEL_NUMBER}"
+    vector_database = ANNInMemoryVectorDatabase(index_type="exact", lexical_fields=lexical_field_weights(index.product, OBJECT_ID_FIELD))
+
+    return make_app(vector_database, df)
+
+
+def test_lexical_matches_are_fused_with_the_vector_scores(lexical_app, products) -> None:
+    from superlinked_app import query
+
+    params = semantic_params(products, 0, limit=-1)
+    vector_scores = dict(result_scores(lexical_app.query(query.semantic_query, **params)))
+
+    fused = result_scores(lexical_app.query(query.semantic_query, **params, lexical_query=MODEL_NUMBER, lexical_weight=2.0))
+
+    # The only match gets the whole weight, the other products keep their vector score.
+    model_asin = products["asin"][10]
+    assert fused[0][0] == model_asin
+    assert fused[0][1] == pytest.approx(vector_scores[model_asin] + 2.0, abs=1e-5)
+    others = {object_id: score for object_id, score in fused if object_id != model_asin}
+    np.testing.assert_allclose([others[object_id] for object_id in others], [vector_scores[object_id] for object_id in others], atol=1e-5)
+
+
+def test_lexical_queries_without_matches_search_as_before(lexical_app, products) -> None:
+    from superlinked_app import query
+
+    params = semantic_params(products, 0)
+    expected = result_scores(lexical_app.query(query.semantic_query, **params))
+
+    assert result_scores(lexical_app.query(query.semantic_query, **params, lexical_query="no such words")) == expected
+    assert result_scores(lexical_app.query(query.semantic_query, **params, lexical_query="   ")) == expected
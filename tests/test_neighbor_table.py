@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from superlinked_app.neighbor_table import NO_NEIGHBOR, NeighborTable
+
+K = 5
+
+
+def _vectors(num_rows: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(num_rows, 8)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _build(row_ids: list[str], vectors: np.ndarray) -> NeighborTable:
+    # The query vector of a product is its stored vector, scaled like a weight would.
+    return NeighborTable.build(row_ids, vectors, vectors * 2, K, "vector", block_size=16)
+
+
+def _neighbor_ids(table: NeighborTable) -> dict[str, list[str]]:
+    row_ids = table.row_ids.tolist()
+    return {
+        row_id: [row_ids[neighbor] for neighbor in neighbors if neighbor != NO_NEIGHBOR]
+        for row_id, neighbors in zip(row_ids, np.asarray(table.neighbors).tolist())
+    }
+
+
+@pytest.fixture
+def table() -> NeighborTable:
+    return _build([f"p{number}" for number in range(40)], _vectors(40, seed=6))
+
+
+def test_rows_list_the_best_products_first(table) -> None:
+    vectors = _vectors(40, seed=6)
+    expected = np.argsort(-(vectors * 2) @ vectors.T, axis=1, kind="stable")[:, :K]
+
+    np.testing.assert_array_equal(table.neighbors, expected)
+    assert table.find(vectors[7] * 2) == 7
+    assert table.find(vectors[7]) is None
+
+
+def test_an_update_without_changes_keeps_every_row(table) -> None:
+    vectors = _vectors(40, seed=6)
+
+    updated, stats = table.update(table.row_ids.tolist(), vectors, vectors * 2)
+
+    assert (stats.unchanged, stats.merged, stats.recomputed, stats.removed) == (40, 0, 0, 0)
+    np.testing.assert_array_equal(updated.neighbors, table.neighbors)
+
+
+def test_an_update_matches_a_rebuild(table) -> None:
+    row_ids = table.row_ids.tolist()
+    vectors = _vectors(40, seed=6)
+    # p3 and p10 are removed, p5 changes and p40 and p41 are new.
+    vectors[5] = _vectors(1, seed=7)[0]
+    keep = [row for row in range(40) if row not in (3, 10)]
+    row_ids = [row_ids[row] for row in keep] + ["p40", "p41"]
+    vectors = np.concatenate([vectors[keep], _vectors(2, seed=8)])
+
+    updated, stats = table.update(row_ids, vectors, vectors * 2, block_size=16)
+    rebuilt = _build(row_ids, vectors)
+
+    # Rows of unchanged products are merged with the changed ones, or recomputed if that can't be exact.
+    assert stats.removed == 2
+    assert stats.merged and stats.recomputed >= 3
+    assert stats.unchanged + stats.merged + stats.recomputed == len(row_ids)
+    assert _neighbor_ids(updated) == _neighbor_ids(rebuilt)
+    np.testing.assert_allclose(np.asarray(updated.scores, dtype=np.float32), np.asarray(rebuilt.scores, dtype=np.float32), atol=1e-3)
+    np.testing.assert_array_equal(updated.vector_keys, rebuilt.vector_keys)
+
+
+def test_tables_round_trip_through_a_directory(tmp_path: Path, table) -> None:
+    table.save(tmp_path / "neighbors")
+
+    loaded = NeighborTable.load(tmp_path / "neighbors")
+
+    assert (loaded.k, loaded.vector_field) == (K, "vector")
+    for name in ["row_ids", "neighbors", "scores", "query_keys", "vector_keys"]:
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(table, name))
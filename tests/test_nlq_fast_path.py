@@ -0,0 +1,79 @@
+import pytest
+
+from superlinked_app.embeddings import HashEmbedder
+from superlinked_app.nlq_fast_path import NLQFastPath, extract_constraints, parse_natural_query
+from tools.benchmark_nlq_fast_path import CASES, preset_params
+
+ASIN = "B000000042"
+
+
+@pytest.mark.parametrize(
+    ("natural_query", "type_", "max_price", "min_rating"),
+    [
+        ("books with a price lower than 100 and a rating bigger than 4", "book", 100.0, 4.0),
+        ("usb cables under $20", None, 20.0, None),
+        ("products cheaper than 50", "product", 50.0, None),
+        ("$20 or less phone case", None, 20.0, None),
+        ("wireless earbuds rated 4 stars or more", None, None, 4.0),
+        ("paperback thrillers at most 15 dollars with 4+ stars", "book", 15.0, 4.0),
+        # An age, not a price.
+        ("toys for kids under 12", None, None, None),
+        ("toys for kids under 12 years", None, None, None),
+    ],
+)
+def test_constraints_are_extracted(natural_query: str, type_, max_price, min_rating) -> None:
+    constraints = extract_constraints(natural_query)
+
+    assert (constraints.type, constraints.max_price, constraints.min_rating) == (type_, max_price, min_rating)
+
+
+@pytest.mark.parametrize(
+    ("natural_query", "ambiguity"),
+    [
+        ("toys for kids under 12", "unrecognized constraint 'under'"),
+        ("kitchen & dining under 25 dollars", "categories ['Kitchen & Dining'] are left to the LLM"),
+        ("books under $10 or under $20", "several price bounds [10.0, 20.0]"),
+        ("rated 6 stars or more", "rating bound 6 above 5"),
+        ("B000000001 or B000000002", "several product ids ['B000000001', 'B000000002']"),
+    ],
+)
+def test_ambiguous_constraints_are_left_to_the_llm(natural_query: str, ambiguity: str) -> None:
+    assert ambiguity in extract_constraints(natural_query).ambiguities
+
+
+@pytest.mark.parametrize(("query_name", "natural_query", "expected"), CASES, ids=[case[1] for case in CASES])
+def test_queries_are_parsed_or_left_to_the_llm(query_name: str, natural_query: str, expected: dict | None) -> None:
+    from superlinked_app import query
+
+    natural_query = natural_query.format(asin=ASIN)
+    params = preset_params(query_name, natural_query, HashEmbedder().embed_one)
+    param_infos = [
+        param_info.copy_with_new_value(params[param_info.name], False) if param_info.name in params else param_info
+        for param_info in getattr(query, query_name).calculate_param_infos()
+    ]
+
+    result = parse_natural_query(natural_query, param_infos)
+
+    weights = {param_info.name for param_info in param_infos if param_info.is_weight}
+    if expected is None:
+        assert not result.confident
+    else:
+        expected = {name: ASIN if value == "{asin}" else value for name, value in expected.items()}
+        assert result.confident, result.reasons
+        assert {name: value for name, value in result.params.items() if name not in weights} == expected
+
+
+def test_only_queries_the_rules_are_not_confident_about_reach_the_llm() -> None:
+    from superlinked_app import query
+
+    param_infos = query.filter_query.calculate_param_infos()
+    fast_path = NLQFastPath()
+    llm_queries = []
+
+    def evaluate(natural_query: str) -> dict:
+        return fast_path.evaluate(param_infos, natural_query, lambda: llm_queries.append(natural_query) or {"from": "llm"})
+
+    assert evaluate("books cheaper than 50")["price_smaller_than"] == 50.0
+    assert evaluate("toys for kids under 12") == {"from": "llm"}
+    assert llm_queries == ["toys for kids under 12"]
+    assert (fast_path.stats["all"].local, fast_path.stats["all"].llm) == (1, 1)
@@ -0,0 +1,55 @@
+import numpy as np
+
+from superlinked_app.product_store import ProductStore
+
+ROWS = {
+    "a": {"price": 1.5, "type": "book", "category": ["Books", "Literature & Fiction"], "title": "a novel", "review_count": 3, "embedding": [0.25, 0.5]},
+    "b": {"price": 2.5, "type": "product", "category": [], "title": "a lamp", "review_count": 4, "embedding": [0.75, 1.0]},
+}
+
+
+def _store(rows: dict) -> ProductStore:
+    store = ProductStore()
+    for row_id, values in rows.items():
+        store.update_row(row_id, values)
+
+    return store
+
+
+def test_rows_round_trip() -> None:
+    store = _store(ROWS)
+
+    assert store.to_dict() == ROWS
+    assert list(store) == ["a", "b"]
+
+
+def test_updates_merge_into_the_row() -> None:
+    store = _store(ROWS)
+
+    store.update_row("a", {"price": 3.0, "review_count": None})
+
+    assert store["a"]["price"] == 3.0
+    assert "review_count" not in dict(store["a"])
+    assert store["a"]["title"] == "a novel"
+
+
+def test_a_value_of_another_type_keeps_the_others() -> None:
+    store = _store(ROWS)
+
+    store.update_row("a", {"price": "free"})
+
+    assert store["a"]["price"] == "free"
+    assert store["b"]["price"] == 2.5
+
+
+def test_a_removed_row_leaves_nothing_behind_for_the_next_one() -> None:
+    store = _store(ROWS)
+
+    assert store.pop("a") == ROWS["a"]
+    store.update_row("c", {"price": 4.0, "embedding": [0.0, 0.5]})
+
+    assert "a" not in store
+    assert store.to_dict() == {"b": ROWS["b"], "c": {"price": 4.0, "embedding": [0.0, 0.5]}}
+    row_ids, vectors = store.vectors("embedding")
+    assert row_ids == ["b", "c"]
+    np.testing.assert_array_equal(vectors, np.array([[0.75, 1.0], [0.0, 0.5]], dtype=np.float32))
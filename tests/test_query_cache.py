@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+
+from superlinked_app.query_cache import QueryCache, install_nlq_cache
+
+
+def _param_info(name: str, value=None) -> SimpleNamespace:
+    return SimpleNamespace(name=name, value=value, is_default=False)
+
+
+@pytest.fixture
+def llm_calls(monkeypatch) -> list[list[str]]:
+    """The param names of every natural query the LLM is asked to fill, behind a fresh cache."""
+
+    from superlinked.framework.dsl.query.nlq_param_evaluator import NLQParamEvaluator
+
+    calls = []
+
+    def evaluate_param_infos(self, natural_query, client_config, system_prompt=None):
+        calls.append([param_info.name for param_info in self._param_infos])
+        return {param_info.name: f"{param_info.name} of {natural_query}" for param_info in self._param_infos}
+
+    monkeypatch.setattr(NLQParamEvaluator, "evaluate_param_infos", evaluate_param_infos)
+    install_nlq_cache(QueryCache())
+
+    return calls
+
+
+def _evaluate(param_infos: list[SimpleNamespace], natural_query: str) -> dict:
+    from superlinked.framework.dsl.query.nlq_param_evaluator import NLQParamEvaluator
+
+    evaluator = object.__new__(NLQParamEvaluator)
+    evaluator._param_infos = param_infos
+
+    return evaluator.evaluate_param_infos(natural_query, SimpleNamespace(model="gpt-4o"))
+
+
+def test_the_same_natural_query_of_two_queries_is_sent_to_the_llm_for_each(llm_calls: list[list[str]]) -> None:
+    filter_params = [_param_info("query_description"), _param_info("price_smaller_than")]
+    semantic_params = [_param_info("query_title"), _param_info("query_description")]
+
+    filter_values = _evaluate(filter_params, "books cheaper than 20")
+    semantic_values = _evaluate(semantic_params, "books cheaper than 20")
+
+    assert llm_calls == [["query_description", "price_smaller_than"], ["query_title", "query_description"]]
+    assert set(filter_values) == {"query_description", "price_smaller_than"}
+    assert semantic_values["query_title"] == "query_title of books cheaper than 20"
+
+
+def test_a_repeated_natural_query_is_answered_from_the_cache(llm_calls: list[list[str]]) -> None:
+    param_infos = [_param_info("query_title"), _param_info("query_description")]
+
+    first = _evaluate(param_infos, " wireless  headphones")
+    second = _evaluate(param_infos, "wireless headphones")
+    _evaluate([*param_infos[:1], _param_info("query_description", [0.1, 0.2])], "wireless headphones")
+
+    # Only the query with a preset param missed.
+    assert len(llm_calls) == 2
+    assert second == first
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+from conftest import result_scores, semantic_params
+
+from superlinked_app.sharding import ShardedApp, partition, shard_of
+
+NUM_SHARDS = 2
+
+
+def test_products_are_partitioned_by_a_stable_hash_of_their_id(products) -> None:
+    shards = partition(products, NUM_SHARDS)
+
+    assert shard_of("B000000000", 4) == 3
+    assert sum(len(shard) for shard in shards) == len(products)
+    assert sorted(pd.concat(shards)["asin"]) == sorted(products["asin"])
+    for shard, shard_df in enumerate(shards):
+        assert len(shard_df) and all(shard_of(asin, NUM_SHARDS) == shard for asin in shard_df["asin"])
+
+
+@pytest.fixture(scope="module")
+def sharded_app(products):
+    app = ShardedApp(NUM_SHARDS)
+    try:
+        app.put(products)
+        yield app
+    finally:
+        app.close()
+
+
+def test_sharded_queries_merge_to_the_results_of_one_app(sharded_app, make_app, products) -> None:
+    from superlinked_app import query
+    from tools.benchmark_queries import DEFAULT_PARAMS
+
+    asin = products["asin"][3]
+    requests = [
+        (query.semantic_query, semantic_params(products, 0)),
+        (query.semantic_query, semantic_params(products, 1, limit=1)),
+        (query.semantic_query, semantic_params(products, 2, limit=-1)),
+        # The product is in one shard, the others are given its vector.
+        (query.similar_items_query, semantic_params(products, 3, query_title=None, query_description=None, product_id=asin)),
+        (
+            query.filter_query,
+            {**DEFAULT_PARAMS["filter_query"], "query_description": products["description_embedding"][4], "filter_by_type": "book"},
+        ),
+    ]
+    app = make_app(None, products)
+
+    for query_descriptor, params in requests:
+        expected = result_scores(app.query(query_descriptor, **params))
+        results = result_scores(sharded_app.query(query_descriptor, **params))
+
+        assert [object_id for object_id, _ in results] == [object_id for object_id, _ in expected]
+        assert [score for _, score in results] == pytest.approx([score for _, score in expected], abs=1e-6)
+    assert [stats.products for stats in sharded_app.stats()] == [len(shard) for shard in partition(products, NUM_SHARDS)]
@@ -0,0 +1,90 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from conftest import result_scores, semantic_params
+
+from superlinked_app.ann_index import ANNInMemoryVectorDatabase, IVFFlatIndex
+from superlinked_app.product_store import ProductStore
+from superlinked_app.snapshot import Snapshot
+
+ROWS = {
+    "a": {"price": 1.5, "type": "book", "title": "a novel", "review_count": 3, "embedding": [0.25, 0.5]},
+    "b": {"price": 2.5, "type": "product", "title": "a lamp", "review_count": 4, "embedding": [0.75, 1.0]},
+}
+
+
+def _snapshot(fingerprint: str = "fingerprint") -> Snapshot:
+    store = ProductStore()
+    for row_id, values in ROWS.items():
+        store.update_row(row_id, values)
+
+    return Snapshot(store, {"embedding": (2, "IVFFlatIndex", {"offsets": np.array([0, 1, 2])})}, fingerprint)
+
+
+def test_snapshots_round_trip(tmp_path: Path) -> None:
+    _snapshot().save(tmp_path / "snapshot")
+
+    snapshot = Snapshot.load(tmp_path / "snapshot", "fingerprint")
+
+    assert snapshot.store.to_dict() == ROWS
+    rows, index_type, arrays = snapshot.indices["embedding"]
+    assert (rows, index_type) == (2, "IVFFlatIndex")
+    np.testing.assert_array_equal(arrays["offsets"], [0, 1, 2])
+
+
+def test_a_snapshot_replaces_the_previous_one(tmp_path: Path) -> None:
+    _snapshot("old").save(tmp_path / "snapshot")
+    _snapshot("new").save(tmp_path / "snapshot")
+
+    assert Snapshot.load(tmp_path / "snapshot", "new") is not None
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["snapshot"]
+
+
+def test_a_snapshot_of_another_fingerprint_is_ignored(tmp_path: Path) -> None:
+    _snapshot().save(tmp_path / "snapshot")
+
+    assert Snapshot.load(tmp_path / "snapshot", "other fingerprint") is None
+    assert Snapshot.load(tmp_path / "missing", "fingerprint") is None
+
+
+@pytest.fixture
+def ivf_builds(monkeypatch) -> list[int]:
+    """The rows of every IVF index built."""
+
+    builds = []
+    build = IVFFlatIndex.build
+
+    def recording_build(self, vectors):
+        builds.append(len(vectors))
+        return build(self, vectors)
+
+    monkeypatch.setattr(IVFFlatIndex, "build", recording_build)
+
+    return builds
+
+
+@pytest.mark.parametrize("compact_store", [False, True])
+def test_a_restored_database_answers_like_the_saved_one(make_app, products, tmp_path: Path, ivf_builds, compact_store) -> None:
+    from superlinked_app import query
+
+    def vector_database(fingerprint: str = "fingerprint") -> ANNInMemoryVectorDatabase:
+        return ANNInMemoryVectorDatabase(
+            index_type="ivf", compact_store=compact_store, snapshot_path=tmp_path / "snapshot", snapshot_fingerprint=fingerprint
+        )
+
+    params = [semantic_params(products, row) for row in [0, 50]]
+    saved = make_app(vector_database(), products)
+    expected = [result_scores(saved.query(query.semantic_query, **query_params)) for query_params in params]
+    saved.storage_manager._vdb_connector.save_snapshot()
+
+    restored = make_app(vector_database())
+    restored.storage_manager._vdb_connector.restore_snapshot()
+    results = [result_scores(restored.query(query.semantic_query, **query_params)) for query_params in params]
+    other = make_app(vector_database("other fingerprint"))
+    other.storage_manager._vdb_connector.restore_snapshot()
+
+    assert results == expected
+    # The restored IVF index is used as it is, not built again.
+    assert ivf_builds == [len(products)]
+    assert result_scores(other.query(query.semantic_query, **params[0])) == []
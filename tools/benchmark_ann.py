@@ -0,0 +1,84 @@
+import argparse
+import time
+import numpy as np
+from loguru import logger
+from superlinked_app.ann_index import BruteForceIndex, IVFFlatIndex, VectorIndex
+
+parser = argparse.ArgumentParser(description="Benchmark the in-memory ANN indices against brute force search")
+parser.add_argument("--rows", type=int, default=100_000, help="Number of synthetic products")
+parser.add_argument("--dimensions", type=int, default=512, help="Vector size")
+parser.add_argument("--num-queries", type=int, default=200, help="Number of queries")
+parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+parser.add_argument("--num-lists", type=int, default=None, help="IVF clusters, 2 * sqrt(rows) by default")
+parser.add_argument("--num-probes", type=int, nargs="+", default=[1, 4, 8, 16, 32], help="IVF probes to compare")
+
+
+def make_catalogue(args: argparse.Namespace, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+    """Clustered unit vectors, queries near random products and filter masks of various selectivity."""
+
+    centers = rng.standard_normal((max(args.rows // 100, 1), args.dimensions))
+    vectors = centers[rng.integers(len(centers), size=args.rows)] + 0.7 * rng.standard_normal((args.rows, args.dimensions))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.choice(args.rows, size=args.num_queries)] + 0.2 * rng.standard_normal(
+        (args.num_queries, args.dimensions)
+    ) / np.sqrt(args.dimensions)
+
+    product_type = rng.random(args.rows) < 0.3
+    category = rng.integers(40, size=args.rows)
+    price = rng.uniform(0, 1000, size=args.rows)
+    rating = rng.uniform(-1, 5, size=args.rows)
+    filters = {
+        "none": None,
+        "type": product_type,
+        "price+rating": (price <= 300) & (rating >= 3),
+        "category": category == 0,
+    }
+
+    return vectors.astype(np.float32), queries.astype(np.float32), filters
+
+
+def run_queries(index: VectorIndex, queries: np.ndarray, k: int, allowed: np.ndarray | None) -> tuple[list[np.ndarray], np.ndarray]:
+    results, latencies = [], []
+    for query in queries:
+        start_time = time.perf_counter()
+        positions, _ = index.search(query, k, allowed)
+        latencies.append(time.perf_counter() - start_time)
+        results.append(positions)
+
+    return results, np.array(latencies) * 1000
+
+
+def recall(results: list[np.ndarray], expected: list[np.ndarray]) -> float:
+    return float(np.mean([len(np.intersect1d(found, truth)) / max(len(truth), 1) for found, truth in zip(results, expected)]))
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    rng = np.random.default_rng(6)
+
+    vectors, queries, filters = make_catalogue(args, rng)
+    logger.info(f"Benchmarking {args.rows} vectors of {args.dimensions} dimensions with {args.num_queries} queries.")
+
+    brute_force = BruteForceIndex()
+    ivf = IVFFlatIndex(num_lists=args.num_lists)
+    for name, index in [("brute_force", brute_force), ("ivf", ivf)]:
+        start_time = time.perf_counter()
+        index.build(vectors)
+        logger.info(f"{name}: built in {time.perf_counter() - start_time:.2f}s, {index.nbytes / 1024**2:.1f} MB.")
+
+    for filter_name, allowed in filters.items():
+        selectivity = 1.0 if allowed is None else allowed.mean()
+        expected, latencies = run_queries(brute_force, queries, args.k, allowed)
+        logger.info(
+            f"filter={filter_name:<12} ({selectivity:6.1%} of rows) brute_force       "
+            f"p50 {np.percentile(latencies, 50):7.3f} ms, p99 {np.percentile(latencies, 99):7.3f} ms"
+        )
+        for num_probes in args.num_probes:
+            # The probe count only matters at query time, so one clustering serves all of them.
+            ivf.num_probes = num_probes
+            results, latencies = run_queries(ivf, queries, args.k, allowed)
+            logger.info(
+                f"filter={filter_name:<12} ({selectivity:6.1%} of rows) ivf(probes={num_probes:<3}) "
+                f"p50 {np.percentile(latencies, 50):7.3f} ms, p99 {np.percentile(latencies, 99):7.3f} ms, "
+                f"recall@{args.k} {recall(results, expected):.3f}"
+            )
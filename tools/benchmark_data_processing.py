@@ -0,0 +1,88 @@
+import argparse
+import random
+import sys
+import time
+import pandas as pd
+from pathlib import Path
+from loguru import logger
+from superlinked_app import data_processing
+from superlinked_app.data_processing import process_amazon_dataset
+
+parser = argparse.ArgumentParser(
+                                description="Check that the vectorized and apply-based processing engines agree and compare their speed"
+                                )
+parser.add_argument(
+                    "--dataset-path",
+                    type=Path,
+                    help="Raw JSON lines dataset (.json, .json.gz or .json.zst)",
+                    default=Path("data") / "sample.json",
+                    )
+parser.add_argument("--scale", type=int, default=1, help="Concatenate the dataset this many times to benchmark bigger inputs")
+parser.add_argument("--repeats", type=int, default=3, help="Timed runs per engine, the best one is reported")
+
+PARSED_COLUMNS = {
+    "category": "category",
+    "review_rating": "stars",
+    "review_count": "ratings",
+    "price": "price",
+}
+
+
+def best_time(func, repeats: int) -> tuple[float, object]:
+    timings = []
+    for _ in range(repeats):
+        random.seed(6)
+        start_time = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start_time)
+
+    return min(timings), result
+
+
+def check_equivalence(df: pd.DataFrame) -> bool:
+    """Both engines must produce the same processed frame, including the random category truncation."""
+
+    expected = process_amazon_dataset(df, engine="apply")
+    actual = process_amazon_dataset(df, engine="vectorized")
+    try:
+        pd.testing.assert_frame_equal(expected, actual, check_exact=True)
+    except AssertionError as e:
+        logger.error(f"The vectorized engine diverges from the apply engine:\n{e}")
+        return False
+
+    logger.info(f"Both engines produce identical output on {len(expected)} processed rows.")
+
+    return True
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    df = pd.read_json(args.dataset_path, lines=True)
+    df = pd.concat([df] * args.scale, ignore_index=True)
+    us_df = df[df["locale"] == "us"]
+    logger.info(f"Benchmarking on {len(df)} raw rows ({len(us_df)} US rows).")
+
+    if not check_equivalence(df):
+        sys.exit(1)
+
+    for output_column, input_column in PARSED_COLUMNS.items():
+        column = us_df[input_column]
+        apply_time, _ = best_time(
+            lambda: column.apply(getattr(data_processing, f"parse_{output_column}")), args.repeats
+        )
+        vectorized_time, _ = best_time(
+            lambda: getattr(data_processing, f"parse_{output_column}_vectorized")(column), args.repeats
+        )
+        logger.info(
+            f"parse_{output_column}: apply {apply_time * 1000:.1f} ms, "
+            f"vectorized {vectorized_time * 1000:.1f} ms ({apply_time / vectorized_time:.1f}x)."
+        )
+
+    apply_time, _ = best_time(lambda: process_amazon_dataset(df, engine="apply"), args.repeats)
+    vectorized_time, _ = best_time(lambda: process_amazon_dataset(df, engine="vectorized"), args.repeats)
+    logger.info(
+        f"process_amazon_dataset: apply {apply_time:.2f}s ({len(df) / apply_time:.0f} rows/sec), "
+        f"vectorized {vectorized_time:.2f}s ({len(df) / vectorized_time:.0f} rows/sec), "
+        f"{apply_time / vectorized_time:.1f}x faster."
+    )
@@ -0,0 +1,60 @@
+import argparse
+import sys
+import tempfile
+import time
+import pandas as pd
+from pathlib import Path
+from loguru import logger
+from superlinked_app import dataset_io
+from superlinked_app.embeddings import EmbeddingPipeline, HashEmbedder
+
+parser = argparse.ArgumentParser(description="Compare write/read speed and size of the processed dataset formats")
+parser.add_argument(
+                    "--input-path",
+                    type=Path,
+                    help="Processed dataset used as input",
+                    default=Path("data") / "processed_300_sample.jsonl",
+                    )
+parser.add_argument("--scale", type=int, default=10, help="Concatenate the dataset this many times")
+parser.add_argument(
+                    "--with-embeddings",
+                    action="store_true",
+                    help="Add title and description embeddings from the offline HashEmbedder",
+                    )
+
+FORMATS = ["jsonl", "parquet", "arrow"]
+
+
+def timed(func) -> tuple[float, object]:
+    start_time = time.perf_counter()
+    result = func()
+
+    return time.perf_counter() - start_time, result
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    df = dataset_io.read_processed_dataset(args.input_path)
+    if args.with_embeddings:
+        df = EmbeddingPipeline(HashEmbedder()).embed_dataframe(df)
+    df = pd.concat([df] * args.scale, ignore_index=True)
+    expected = dataset_io.to_arrow_table(df)
+    logger.info(f"Benchmarking {len(df)} rows with columns {list(df.columns)}.")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for output_format in FORMATS:
+            path = Path(tmp_dir) / f"dataset.{output_format}"
+            write_time, _ = timed(lambda: dataset_io.write_processed_dataset(df, path))
+            table_time, table = timed(lambda: dataset_io.read_processed_table(path))
+            pandas_time, _ = timed(lambda: dataset_io.read_processed_dataset(path))
+
+            # JSON only keeps 10 significant digits, so embeddings don't round trip exactly.
+            if output_format != "jsonl" and not table.equals(expected):
+                logger.error(f"The {output_format} dataset doesn't round trip.")
+                sys.exit(1)
+
+            logger.info(
+                f"{output_format}: {path.stat().st_size / 1024**2:.1f} MB, write {write_time:.2f}s, "
+                f"read as Arrow {table_time:.3f}s, read as pandas {pandas_time:.2f}s."
+            )
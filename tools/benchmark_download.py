@@ -0,0 +1,174 @@
+import argparse
+import gzip
+import hashlib
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from loguru import logger
+from superlinked_app import utils
+from superlinked_app.downloads import ChecksumError, Download
+
+parser = argparse.ArgumentParser(
+                                description="Benchmark ranged, resumable and pipelined downloads against a local throttled HTTP server"
+                                )
+parser.add_argument(
+                    "--dataset-path",
+                    type=Path,
+                    help="Raw JSON lines dataset, gzipped and served by the local server",
+                    default=Path("data") / "sample.json",
+                    )
+parser.add_argument("--scale", type=int, default=50, help="Concatenate the dataset this many times to serve a bigger file")
+parser.add_argument("--bandwidth-mbps", type=float, default=2.0, help="Bandwidth of every connection in MB/s")
+parser.add_argument("--connections", type=int, default=4, help="Connections of the ranged download")
+parser.add_argument("--segment-size-kb", type=int, default=256, help="Bytes per ranged request in KB")
+
+RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d*)")
+SEND_SIZE = 64 * 1024
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves one file with Range support, each connection throttled to `bandwidth` bytes per second."""
+
+    protocol_version = "HTTP/1.1"
+    content = b""
+    bandwidth = 1.0
+    supports_ranges = True
+    bytes_sent = 0
+    lock = threading.Lock()
+
+    def do_GET(self) -> None:
+        start, end = 0, len(self.content) - 1
+        match = RANGE_PATTERN.fullmatch(self.headers.get("Range", ""))
+        if self.supports_ranges and match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), end) if match.group(2) else end
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(self.content)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", '"benchmark"')
+        self.end_headers()
+
+        for offset in range(start, end + 1, SEND_SIZE):
+            block = self.content[offset : min(offset + SEND_SIZE, end + 1)]
+            try:
+                self.wfile.write(block)
+            except ConnectionError:
+                # The client cancelled the download.
+                return
+            with self.lock:
+                RangeHandler.bytes_sent += len(block)
+            time.sleep(len(block) / self.bandwidth)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_server(content: bytes, bandwidth: float) -> ThreadingHTTPServer:
+    RangeHandler.content = content
+    RangeHandler.bandwidth = bandwidth
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed_download(url: str, output_path: Path, **kwargs) -> float:
+    RangeHandler.bytes_sent = 0
+    start_time = time.perf_counter()
+    Download(url, output_path, **kwargs).start().wait()
+    return time.perf_counter() - start_time
+
+
+def check_equal(path: Path, expected: bytes, label: str) -> None:
+    if path.read_bytes() != expected:
+        raise AssertionError(f"{label}: '{path}' differs from the served file.")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    raw = args.dataset_path.read_bytes() * args.scale
+    content = gzip.compress(raw, compresslevel=6)
+    checksum = hashlib.sha256(content).hexdigest()
+    bandwidth = args.bandwidth_mbps * 1024**2
+    segment_size = args.segment_size_kb * 1024
+    server = start_server(content, bandwidth)
+    url = f"http://127.0.0.1:{server.server_port}/sample.json.gz"
+    logger.info(
+        f"Serving {len(content) / 1024**2:.1f} MB ({len(raw) / 1024**2:.1f} MB decompressed) "
+        f"at {args.bandwidth_mbps} MB/s per connection."
+    )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+
+        # Single connection, the way the download worked before.
+        RangeHandler.supports_ranges = False
+        elapsed = timed_download(url, temp_dir / "single.json.gz")
+        check_equal(temp_dir / "single.json.gz", content, "single connection")
+        single_time = elapsed
+        logger.info(f"single connection, no ranges: {elapsed:.2f}s.")
+        RangeHandler.supports_ranges = True
+
+        elapsed = timed_download(
+            url, temp_dir / "ranged.json.gz", connections=args.connections, segment_size=segment_size, sha256=checksum
+        )
+        check_equal(temp_dir / "ranged.json.gz", content, "ranged")
+        logger.info(f"{args.connections} connections: {elapsed:.2f}s, {single_time / elapsed:.2f}x, checksum verified.")
+
+        # Interrupt a download halfway and resume it.
+        download = Download(url, temp_dir / "resumed.json.gz", connections=args.connections, segment_size=segment_size)
+        download.start()
+        download.wait_for(len(content) // 2)
+        download.cancel()
+        RangeHandler.bytes_sent = 0
+        Download(url, temp_dir / "resumed.json.gz", connections=args.connections, segment_size=segment_size).start().wait()
+        check_equal(temp_dir / "resumed.json.gz", content, "resumed")
+        logger.info(f"resumed after an interruption: fetched {RangeHandler.bytes_sent / len(content):.0%} of the file again.")
+
+        try:
+            timed_download(url, temp_dir / "corrupt.json.gz", connections=args.connections, segment_size=segment_size, sha256="0" * 64)
+            raise AssertionError("A wrong checksum wasn't detected.")
+        except ChecksumError:
+            logger.info(f"wrong checksum rejected, partial file removed: {not (temp_dir / 'corrupt.json.gz.part').exists()}.")
+
+        # Download, then decompress, versus decompressing while downloading.
+        start_time = time.perf_counter()
+        Download(url, temp_dir / "sequential.json.gz", connections=args.connections, segment_size=segment_size).start().wait()
+        utils.decompress_gz(temp_dir / "sequential.json.gz", temp_dir / "sequential.json")
+        sequential_time = time.perf_counter() - start_time
+        check_equal(temp_dir / "sequential.json", raw, "sequential decompression")
+
+        start_time = time.perf_counter()
+        download = Download(url, temp_dir / "pipelined.json.gz", connections=args.connections, segment_size=segment_size)
+        download.start()
+        utils.decompress_gz(temp_dir / "pipelined.json.gz", temp_dir / "pipelined.json", download.open())
+        download.wait()
+        pipelined_time = time.perf_counter() - start_time
+        check_equal(temp_dir / "pipelined.json", raw, "pipelined decompression")
+        logger.info(
+            f"download then decompress: {sequential_time:.2f}s, pipelined: {pipelined_time:.2f}s "
+            f"({sequential_time / pipelined_time:.2f}x)."
+        )
+
+        # Streaming processing reads the first chunk long before the download ends.
+        start_time = time.perf_counter()
+        download = Download(url, temp_dir / "streamed.json.gz", connections=args.connections, segment_size=segment_size)
+        download.start()
+        num_rows = 0
+        first_chunk_time = None
+        for chunk in utils.iter_json_chunks(temp_dir / "streamed.json.gz", 1000, download.open()):
+            first_chunk_time = first_chunk_time or time.perf_counter() - start_time
+            num_rows += len(chunk)
+        download.wait()
+        logger.info(
+            f"streaming parse: first chunk after {first_chunk_time:.2f}s, {num_rows} rows after "
+            f"{time.perf_counter() - start_time:.2f}s."
+        )
+
+    server.shutdown()
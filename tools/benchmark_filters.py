@@ -0,0 +1,97 @@
+import argparse
+import time
+import numpy as np
+from loguru import logger
+from superlinked.framework.common.interface.comparison_operand import ComparisonOperation
+from superlinked.framework.common.interface.comparison_operation_type import ComparisonOperationType
+from superlinked.framework.common.storage.field.field import Field
+from superlinked.framework.common.storage.field.field_data_type import FieldDataType
+from superlinked.framework.storage.in_memory.in_memory_search import InMemorySearch
+from superlinked_app import constants
+from superlinked_app.filter_index import FilterIndex
+
+parser = argparse.ArgumentParser(description="Compare per-row filter evaluation with the bitmap and sorted-array filter indexes")
+parser.add_argument("--rows", type=int, default=200_000, help="Number of synthetic products")
+parser.add_argument("--repeats", type=int, default=5, help="Timed runs per filter, the best one is reported")
+
+TYPE = Field(FieldDataType.STRING, "type")
+CATEGORY = Field(FieldDataType.STRING_LIST, "category")
+PRICE = Field(FieldDataType.DOUBLE, "price")
+REVIEW_RATING = Field(FieldDataType.DOUBLE, "review_rating")
+
+
+def make_rows(num_rows: int, rng: np.random.Generator) -> list[dict]:
+    """Products shaped like the processed dataset, with a few missing prices and ratings."""
+
+    types = rng.choice(constants.TYPES, size=num_rows, p=[0.7, 0.3])
+    categories = rng.integers(len(constants.CATEGORIES), size=(num_rows, 2))
+    prices = rng.uniform(0, 1000, size=num_rows).round(2)
+    ratings = rng.integers(2, 11, size=num_rows) / 2
+    missing = rng.random(num_rows) < 0.05
+
+    return [
+        {
+            "type": str(types[i]),
+            "category": sorted({constants.CATEGORIES[j] for j in categories[i]}),
+            "price": None if missing[i] else float(prices[i]),
+            "review_rating": None if missing[i] else float(ratings[i]),
+        }
+        for i in range(num_rows)
+    ]
+
+
+def make_filters() -> dict[str, list[ComparisonOperation[Field]]]:
+    def op(type_: ComparisonOperationType, field: Field, other: object) -> ComparisonOperation[Field]:
+        return ComparisonOperation(type_, field, other)
+
+    return {
+        "type": [op(ComparisonOperationType.EQUAL, TYPE, "book")],
+        "category": [op(ComparisonOperationType.CONTAINS, CATEGORY, [constants.CATEGORIES[0]])],
+        "price+rating": [
+            op(ComparisonOperationType.LESS_EQUAL, PRICE, 300.0),
+            op(ComparisonOperationType.GREATER_EQUAL, REVIEW_RATING, 4.0),
+        ],
+        "all": [
+            op(ComparisonOperationType.EQUAL, TYPE, "product"),
+            op(ComparisonOperationType.CONTAINS, CATEGORY, [constants.CATEGORIES[1]]),
+            op(ComparisonOperationType.LESS_EQUAL, PRICE, 500.0),
+            op(ComparisonOperationType.GREATER_EQUAL, REVIEW_RATING, 3.0),
+        ],
+    }
+
+
+def best_time(func, repeats: int) -> tuple[float, np.ndarray]:
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start_time)
+
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    rng = np.random.default_rng(6)
+
+    rows = make_rows(args.rows, rng)
+    start_time = time.perf_counter()
+    filter_index = FilterIndex(rows, ["type", "category", "price", "review_rating"])
+    logger.info(
+        f"Built filter indexes over {args.rows} rows in {time.perf_counter() - start_time:.2f}s, "
+        f"{filter_index.nbytes / 1024**2:.1f} MB."
+    )
+
+    for name, filters in make_filters().items():
+        per_row_time, expected = best_time(
+            lambda: np.fromiter((InMemorySearch._is_subset(row, filters) for row in rows), dtype=bool, count=len(rows)),
+            args.repeats,
+        )
+        index_time, actual = best_time(lambda: filter_index.mask(filters), args.repeats)
+        if not np.array_equal(expected, actual):
+            raise RuntimeError(f"The filter indexes disagree with per-row evaluation on '{name}'.")
+
+        logger.info(
+            f"filter={name:<13} ({expected.mean():6.1%} of rows) per-row {per_row_time * 1000:8.2f} ms, "
+            f"indexed {index_time * 1000:7.2f} ms ({per_row_time / index_time:.0f}x)."
+        )
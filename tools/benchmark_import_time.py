@@ -0,0 +1,131 @@
+import argparse
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from loguru import logger
+
+ROOT_DIR = Path(__file__).parent.parent
+
+parser = argparse.ArgumentParser(
+                                description="Measure the cold-start import time of the app and the tools with 'python -X importtime'"
+                                )
+parser.add_argument(
+                    "--modules",
+                    nargs="+",
+                    help="Modules to import, each in a fresh interpreter",
+                    default=[
+                        "superlinked_app.query",
+                        "superlinked_app.index",
+                        "superlinked_app.embeddings",
+                        "tools.embed_dataset",
+                        "tools.download_and_process",
+                        "tools.fake_openai_server",
+                    ],
+                    )
+parser.add_argument("--repeats", type=int, default=5, help="Imports per module, the median is reported")
+parser.add_argument("--top", type=int, default=5, help="Heaviest top-level packages to list per module")
+parser.add_argument(
+                    "--baseline-ref",
+                    help="Git revision to measure as well, e.g. HEAD~1, checked out in a temporary worktree",
+                    default=None,
+                    )
+parser.add_argument(
+                    "--without-credentials",
+                    action="store_true",
+                    help="Unset OPENAI_API_KEY and hide the .env file, to check which modules import without credentials",
+                    )
+
+# import time:   self [us] | cumulative | imported package
+IMPORTTIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure(module: str, root_dir: Path, env: dict[str, str]) -> tuple[float, dict[str, float], str | None]:
+    """Wall time of importing `module` in a fresh interpreter, its self time per top-level package and its error."""
+
+    start_time = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root_dir,
+        env={**env, "PYTHONPATH": str(root_dir)},
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start_time
+
+    self_seconds = defaultdict(float)
+    for match in IMPORTTIME_PATTERN.finditer(result.stderr):
+        self_seconds[match.group(4).split(".")[0]] += int(match.group(1)) / 1e6
+    error = None
+    if result.returncode != 0:
+        error = next((line for line in reversed(result.stderr.splitlines()) if line and "import time:" not in line), "failed")
+
+    return elapsed, dict(self_seconds), error
+
+
+def measure_tree(label: str, root_dir: Path, args: argparse.Namespace, env: dict[str, str]) -> dict[str, float]:
+    medians = {}
+    for module in args.modules:
+        runs = [measure(module, root_dir, env) for _ in range(args.repeats)]
+        median = statistics.median(elapsed for elapsed, _, _ in runs)
+        medians[module] = median
+        _, self_seconds, error = runs[-1]
+        if error is not None:
+            logger.warning(f"[{label}] {module:<32} failed after {median * 1000:.0f} ms: {error}")
+            continue
+
+        top = sorted(self_seconds.items(), key=lambda item: item[1], reverse=True)[: args.top]
+        logger.info(
+            f"[{label}] {module:<32} {median * 1000:.0f} ms | "
+            + ", ".join(f"{package} {seconds * 1000:.0f} ms" for package, seconds in top)
+        )
+
+    return medians
+
+
+def checkout(ref: str, worktree_dir: Path) -> None:
+    subprocess.run(["git", "worktree", "add", "--detach", str(worktree_dir), ref], cwd=ROOT_DIR, check=True, capture_output=True)
+    # The untracked .env is read by the settings of older revisions at import.
+    if (ROOT_DIR / ".env").exists():
+        shutil.copy(ROOT_DIR / ".env", worktree_dir / ".env")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    hidden_env_file = None
+    if args.without_credentials:
+        env.pop("OPENAI_API_KEY", None)
+        if (ROOT_DIR / ".env").exists():
+            hidden_env_file = ROOT_DIR / ".env.hidden"
+            (ROOT_DIR / ".env").rename(hidden_env_file)
+
+    try:
+        current = measure_tree("current", ROOT_DIR, args, env)
+
+        if args.baseline_ref:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                worktree_dir = Path(temp_dir) / "baseline"
+                checkout(args.baseline_ref, worktree_dir)
+                if args.without_credentials:
+                    (worktree_dir / ".env").unlink(missing_ok=True)
+                try:
+                    baseline = measure_tree(args.baseline_ref, worktree_dir, args, env)
+                finally:
+                    subprocess.run(["git", "worktree", "remove", "--force", str(worktree_dir)], cwd=ROOT_DIR, check=True)
+
+            for module in args.modules:
+                logger.info(
+                    f"{module:<32} {baseline[module] * 1000:.0f} ms -> {current[module] * 1000:.0f} ms "
+                    f"({baseline[module] / current[module]:.1f}x)"
+                )
+    finally:
+        if hidden_env_file is not None:
+            hidden_env_file.rename(ROOT_DIR / ".env")
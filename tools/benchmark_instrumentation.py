@@ -0,0 +1,141 @@
+import argparse
+import os
+import pstats
+import re
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+from loguru import logger
+from superlinked_app import instrumentation
+from tools.benchmark_queries import DEFAULT_PARAMS, TEXT_PARAMS, build_app, configure_environment, load_workload
+from tools.fake_openai_server import start_fake_openai_server
+
+parser = argparse.ArgumentParser(
+                                description="Replay a query workload with per-stage instrumentation, scrape its metrics endpoint and profile slow requests"
+                                )
+parser.add_argument(
+                    "--workload-path",
+                    type=Path,
+                    help="JSON lines workload, see tools/benchmark_queries.py",
+                    default=Path("tools") / "query_workload.jsonl",
+                    )
+parser.add_argument(
+                    "--dataset-path",
+                    type=Path,
+                    help="Processed dataset to load, embedded through the fake server if it has no embedding columns",
+                    default=Path("data") / "processed_300_sample.jsonl",
+                    )
+parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at the same time")
+parser.add_argument("--repeat", type=int, default=3, help="Times the workload is replayed per setting")
+parser.add_argument("--embedding-latency-ms", type=float, default=20.0, help="Latency of the fake embeddings endpoint")
+parser.add_argument("--chat-latency-ms", type=float, default=100.0, help="Latency of the fake chat completions endpoint")
+parser.add_argument("--in-memory-index", choices=["scan", "exact", "ivf"], default="exact", help="Search of the InMemory vector database")
+parser.add_argument("--query-cache", action="store_true", help="Keep the natural-query and query-embedding cache enabled")
+parser.add_argument("--slow-request-ms", type=float, default=250.0, help="Requests at least this slow have their profile kept")
+parser.add_argument("--top", type=int, default=8, help="Functions listed from the profile of the slowest request")
+
+# superlinked_app_stage_duration_seconds_sum{kind="query",name="filter_query",stage="llm"} 1.23
+SUM_PATTERN = re.compile(r'superlinked_app_stage_duration_seconds_(sum|count)\{kind="(\w+)",name="(\w+)",stage="(\w+)"\} (\S+)')
+
+
+def make_runner(app):
+    from superlinked_app import index, query
+
+    def run(request: dict) -> float:
+        start_time = time.perf_counter()
+        with instrumentation.trace("query", request["query"]):
+            params = {**DEFAULT_PARAMS.get(request["query"], {}), **request["params"]}
+            for name in TEXT_PARAMS:
+                if isinstance(params.get(name), str):
+                    params[name] = index.openai_embed(params[name])
+            app.query(getattr(query, request["query"]), **params)
+
+        return time.perf_counter() - start_time
+
+    return run
+
+
+def replay(run, workload: list[dict], concurrency: int) -> tuple[float, np.ndarray]:
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(run, workload))
+
+    return time.perf_counter() - start_time, np.array(latencies) * 1000
+
+
+def scrape_stage_means(url: str) -> dict[tuple[str, str], float]:
+    """Mean milliseconds per query name and stage, from the histograms served at `url`."""
+
+    with urllib.request.urlopen(url) as response:
+        if response.headers.get("Content-Type") != instrumentation.PROMETHEUS_CONTENT_TYPE:
+            raise AssertionError(f"Unexpected content type {response.headers.get('Content-Type')}.")
+        text = response.read().decode("utf-8")
+
+    values = defaultdict(dict)
+    for match in SUM_PATTERN.finditer(text):
+        field, kind, name, stage, value = match.groups()
+        if kind == "query":
+            values[(name, stage)][field] = float(value)
+
+    return {key: value["sum"] / value["count"] * 1000 for key, value in values.items() if value.get("count")}
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    server = start_fake_openai_server(
+                                    embedding_latency_seconds=args.embedding_latency_ms / 1000,
+                                    chat_latency_seconds=args.chat_latency_ms / 1000,
+                                    )
+    configure_environment(args, f"http://127.0.0.1:{server.server_port}/v1")
+    os.environ["INSTRUMENTATION_ENABLED"] = "true"
+
+    app, asins = build_app(args.dataset_path)
+    workload = load_workload(args.workload_path, asins, args.repeat)
+    run = make_runner(app)
+    # Builds the queries, which installs the instrumentation.
+    for request in workload[: args.concurrency]:
+        run(request)
+
+    metrics_server = instrumentation.start_metrics_server(0, host="127.0.0.1")
+    metrics_url = f"http://127.0.0.1:{metrics_server.server_port}/metrics"
+
+    for enabled in [False, True, False, True]:
+        if enabled:
+            instrumentation.enable(instrumentation.InstrumentationConfig(slow_request_ms=float("inf")))
+        else:
+            instrumentation.disable()
+        elapsed, latencies = replay(run, workload, args.concurrency)
+        logger.info(
+            f"instrumentation {'on ' if enabled else 'off'}: {len(workload) / elapsed:.1f} req/s, "
+            f"p50 {np.percentile(latencies, 50):.1f} ms, p99 {np.percentile(latencies, 99):.1f} ms"
+        )
+
+    stage_means = scrape_stage_means(metrics_url)
+    for name in sorted({name for name, _ in stage_means}):
+        logger.info(
+            f"{name:<20} "
+            + ", ".join(f"{stage} {ms:.2f} ms" for (query_name, stage), ms in sorted(stage_means.items()) if query_name == name)
+        )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        profile_dir = Path(temp_dir)
+        instrumentation.enable(
+            instrumentation.InstrumentationConfig(
+                slow_request_ms=args.slow_request_ms, profile_sample_rate=1.0, profile_dir=profile_dir
+            )
+        )
+        # One request at a time, cProfile only follows the thread it was enabled in.
+        replay(run, workload, 1)
+        profiles = sorted(profile_dir.glob("*.prof"), key=lambda path: int(path.stem.rsplit("-", 1)[1][:-2]))
+        logger.info(f"{len(profiles)} of {len(workload)} requests were slower than {args.slow_request_ms:g} ms and profiled.")
+        if profiles:
+            logger.info(f"Slowest: {profiles[-1].name}")
+            pstats.Stats(str(profiles[-1])).sort_stats("cumulative").print_stats(args.top)
+
+    server.shutdown()
+    metrics_server.shutdown()
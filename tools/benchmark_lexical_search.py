@@ -0,0 +1,129 @@
+import argparse
+import os
+import time
+from pathlib import Path
+import numpy as np
+from loguru import logger
+from superlinked_app.lexical_search import DEFAULT_CANDIDATES, DEFAULT_WEIGHT
+from tools.benchmark_product_store import load_products
+from tools.benchmark_queries import DEFAULT_PARAMS
+
+parser = argparse.ArgumentParser(
+                                description="Compare the recall and latency of dense-only search with the BM25 candidates fused with the vector scores"
+                                )
+parser.add_argument(
+                    "--dataset-path",
+                    type=Path,
+                    help="Processed dataset, embedded with the offline HashEmbedder if it has no embedding columns",
+                    default=Path("data") / "processed_896_sample.jsonl",
+                    )
+parser.add_argument("--queries", type=int, default=100, help="Products looked up by each kind of query")
+parser.add_argument("--lexical-weight", type=float, default=DEFAULT_WEIGHT, help="Weight of the BM25 score fused with the vector score")
+parser.add_argument("--lexical-candidates", type=int, default=DEFAULT_CANDIDATES, help="BM25 matches re-scored by the vector index")
+parser.add_argument("--in-memory-index", choices=["exact", "ivf"], default="exact", help="Search of the InMemory vector database")
+
+
+def make_queries(df, num_queries: int) -> dict[str, list[tuple[str, str]]]:
+    """(text, ASIN of the product it looks up) per kind of query: its ASIN, 3 words of its title, its title."""
+
+    rng = np.random.default_rng(6)
+    rows = rng.choice(len(df), size=min(num_queries, len(df)), replace=False)
+    queries: dict[str, list[tuple[str, str]]] = {"asin": [], "title words": [], "full title": []}
+    for row in rows:
+        asin, title = df["asin"][row], df["title"][row]
+        words = list(dict.fromkeys(title.split()))
+        queries["asin"].append((asin, asin))
+        queries["title words"].append((" ".join(rng.choice(words, size=min(3, len(words)), replace=False)), asin))
+        queries["full title"].append((title, asin))
+
+    return queries
+
+
+def run(app, queries: list[tuple[str, str]], embed, lexical_params: dict | None) -> tuple[float, float]:
+    """Recall of the looked up products in the results, and mean latency in ms."""
+
+    from superlinked_app import query
+
+    found, latencies = 0, []
+    for text, asin in queries:
+        vector = embed(text)
+        params = {**DEFAULT_PARAMS["semantic_query"], "query_title": vector, "query_description": vector}
+        if lexical_params is not None:
+            params = {**params, "lexical_query": text, **lexical_params}
+        start_time = time.perf_counter()
+        result = app.query(query.semantic_query, **params)
+        latencies.append(time.perf_counter() - start_time)
+        found += asin in [entry.entity.header.object_id for entry in result.entries]
+
+    return found / len(queries), float(np.mean(latencies)) * 1000
+
+
+def search_only_us(connector, queries: list[tuple[str, str]], embed, lexical_params: dict, app) -> tuple[float, float]:
+    """Mean time of the search step alone, without Superlinked's query overhead: the whole index and the lexical candidates."""
+
+    from superlinked.framework.dsl.executor.query.query_executor import QueryExecutor
+    from superlinked.framework.dsl.query.query_param_value_setter import QueryParamValueSetter
+    from superlinked_app import query
+    from superlinked_app.lexical_search import LexicalQuery, lexical_query
+
+    semantic_query = query.semantic_query
+    executor = QueryExecutor(app, semantic_query, app._query_vector_factory_by_index[semantic_query.index])
+    vector_field = semantic_query.index._node_id
+    row_ids, index, _ = connector._get_index(vector_field, [])
+    query_vectors = []
+    for text, _ in queries:
+        vector = embed(text)
+        descriptor = QueryParamValueSetter.set_values(semantic_query, {**DEFAULT_PARAMS["semantic_query"], "query_title": vector, "query_description": vector})
+        query_vectors.append(np.asarray(executor._produce_query_vector(descriptor).value, dtype=np.float32))
+
+    start_time = time.perf_counter()
+    for query_vector in query_vectors:
+        index.search(query_vector, 10)
+    index_us = (time.perf_counter() - start_time) / len(queries) * 1e6
+    start_time = time.perf_counter()
+    for (text, _), query_vector in zip(queries, query_vectors):
+        with lexical_query(LexicalQuery(text, lexical_params["lexical_weight"], lexical_params["lexical_candidates"])):
+            connector._search_lexical(vector_field, row_ids, index, query_vector, 10, None)
+    lexical_us = (time.perf_counter() - start_time) / len(queries) * 1e6
+
+    return index_us, lexical_us
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    os.environ["IN_MEMORY_INDEX"] = args.in_memory_index
+    os.environ["LEXICAL_SEARCH_ENABLED"] = "true"
+    os.environ["QUERY_CACHE_ENABLED"] = "false"
+    os.environ["NLQ_FAST_PATH_ENABLED"] = "false"
+
+    from superlinked import framework as sl
+    from superlinked_app import ann_index, index
+    from superlinked_app.config import settings
+    from superlinked_app.embeddings import HashEmbedder
+
+    df = load_products(args.dataset_path)
+    source = sl.InMemorySource(
+                            index.product,
+                            parser=sl.DataFrameParser(schema=index.product, mapping={index.product.id: "asin"}),
+                            )
+    app = sl.InteractiveExecutor(
+                                sources=[source],
+                                indices=[index.product_index],
+                                vector_database=ann_index.in_memory_vector_database(settings),
+                                ).run()
+    start_time = time.perf_counter()
+    source.put([df])
+    connector = app.storage_manager._vdb_connector
+    logger.info(f"Loaded and indexed {len(connector._lexical_index)} products in {time.perf_counter() - start_time:.2f}s.")
+
+    embed = HashEmbedder().embed_one
+    lexical_params = {"lexical_weight": args.lexical_weight, "lexical_candidates": args.lexical_candidates}
+    for kind, queries in make_queries(df, args.queries).items():
+        dense_recall, dense_ms = run(app, queries, embed, None)
+        hybrid_recall, hybrid_ms = run(app, queries, embed, lexical_params)
+        logger.info(
+            f"{kind:<12} recall@{DEFAULT_PARAMS['semantic_query']['limit']}: dense {dense_recall:.0%}, hybrid {hybrid_recall:.0%}; "
+            f"query latency: dense {dense_ms:.2f} ms, hybrid {hybrid_ms:.2f} ms"
+        )
+    index_us, lexical_us = search_only_us(connector, make_queries(df, args.queries)["title words"], embed, lexical_params, app)
+    logger.info(f"Search of {len(df)} products alone: whole index {index_us:.1f} us/query, lexical candidates {lexical_us:.1f} us/query.")
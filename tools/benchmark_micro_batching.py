@@ -0,0 +1,158 @@
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+from loguru import logger
+from superlinked_app.ann_index import BruteForceIndex
+from superlinked_app.micro_batching import BatchingConfig, MicroBatchScheduler, query_type, set_scheduler
+from tools.benchmark_queries import DEFAULT_PARAMS, build_app, configure_environment
+from tools.fake_openai_server import start_fake_openai_server
+
+parser = argparse.ArgumentParser(
+                                description="Load test the micro-batching scheduler with a local load generator and a fake OpenAI server"
+                                )
+parser.add_argument(
+                    "--dataset-path",
+                    type=Path,
+                    help="Processed dataset to load, embedded through the fake server if it has no embedding columns",
+                    default=Path("data") / "processed_300_sample.jsonl",
+                    )
+parser.add_argument("--concurrency", type=int, default=16, help="Clients sending requests back to back")
+parser.add_argument("--requests", type=int, default=320, help="Requests per setting")
+parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[0.0, 2.0, 5.0], help="Wait limits to compare with batching off")
+parser.add_argument("--max-batch-size", type=int, default=32, help="Largest batch")
+parser.add_argument(
+                    "--query-type-overrides",
+                    type=json.loads,
+                    help="Limits per query type as JSON, e.g. '{\"filter_query\": {\"max_wait_ms\": 0.5}}'",
+                    default={},
+                    )
+parser.add_argument("--embedding-latency-ms", type=float, default=50.0, help="Latency of the fake embeddings endpoint")
+parser.add_argument("--in-memory-index", choices=["exact", "ivf"], default="exact", help="Search of the InMemory vector database")
+parser.add_argument("--scoring-rows", type=int, default=50_000, help="Rows of the synthetic matrix of the scoring benchmark")
+parser.add_argument("--scoring-batch-sizes", type=int, nargs="+", default=[1, 8, 32], help="Batch sizes of the scoring benchmark")
+
+QUERY_TYPES = ["filter_query", "semantic_query"]
+
+
+def benchmark_scoring(num_rows: int, batch_sizes: list[int], dimensions: int = 1536, k: int = 10) -> None:
+    """Score queries one by one and as one matrix multiply, checking both return the same rows."""
+
+    rng = np.random.default_rng(6)
+    vectors = rng.standard_normal((num_rows, dimensions), dtype=np.float32)
+    index = BruteForceIndex()
+    index.build(vectors)
+    allowed = rng.random(num_rows) < 0.5
+
+    for batch_size in batch_sizes:
+        queries = rng.standard_normal((batch_size, dimensions), dtype=np.float32)
+        masks = [None if i % 2 else allowed for i in range(batch_size)]
+
+        start_time = time.perf_counter()
+        one_by_one = [index.search(query, k, mask) for query, mask in zip(queries, masks)]
+        one_by_one_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        batched = index.search_batch(queries, [k] * batch_size, masks)
+        batched_time = time.perf_counter() - start_time
+
+        for (positions, scores), (batch_positions, batch_scores) in zip(one_by_one, batched):
+            if not np.array_equal(positions, batch_positions) or not np.allclose(scores, batch_scores, rtol=1e-4):
+                raise AssertionError(f"Batched scoring returned different rows for a batch of {batch_size}.")
+        logger.info(
+            f"scoring {batch_size:>3} queries x {num_rows} rows: one by one {one_by_one_time / batch_size * 1000:.2f} ms/query, "
+            f"batched {batched_time / batch_size * 1000:.2f} ms/query ({one_by_one_time / batched_time:.1f}x)"
+        )
+
+
+def make_workload(titles: list[str], num_requests: int) -> list[tuple[str, str]]:
+    rng = np.random.default_rng(6)
+    return [
+        (QUERY_TYPES[i % len(QUERY_TYPES)], f"{titles[rng.integers(len(titles))]} #{i}")
+        for i in range(num_requests)
+    ]
+
+
+def count_differences(results: list, reference: list) -> tuple[int, int]:
+    """Results with other scores than the reference, and results that only picked or ordered tied products differently."""
+
+    different, tied = 0, 0
+    for entries, reference_entries in zip(results, reference):
+        if [entry_id for entry_id, _ in entries] == [entry_id for entry_id, _ in reference_entries]:
+            continue
+        scores = [score for _, score in entries]
+        reference_scores = [score for _, score in reference_entries]
+        if len(scores) == len(reference_scores) and np.allclose(scores, reference_scores, atol=1e-5):
+            tied += 1
+        else:
+            different += 1
+
+    return different, tied
+
+
+def run_load(app, workload: list[tuple[str, str]], concurrency: int) -> tuple[float, np.ndarray, list]:
+    from superlinked_app import index, query
+
+    def run(request: tuple[str, str]) -> tuple[float, list[tuple[str, float]]]:
+        name, text = request
+        start_time = time.perf_counter()
+        with query_type(name):
+            params = {**DEFAULT_PARAMS[name], "query_description": index.openai_embed(text)}
+            if name == "semantic_query":
+                params["query_title"] = params["query_description"]
+            result = app.query(getattr(query, name), **params)
+        return time.perf_counter() - start_time, [(entry.entity.header.object_id, entry.entity.score) for entry in result.entries]
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run, workload))
+
+    return time.perf_counter() - start_time, np.array([latency for latency, _ in results]) * 1000, [entries for _, entries in results]
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    args.query_cache = False
+
+    benchmark_scoring(args.scoring_rows, args.scoring_batch_sizes)
+
+    server = start_fake_openai_server(embedding_latency_seconds=args.embedding_latency_ms / 1000)
+    configure_environment(args, f"http://127.0.0.1:{server.server_port}/v1")
+    app, _ = build_app(args.dataset_path)
+
+    from superlinked_app import dataset_io
+
+    titles = dataset_io.read_processed_dataset(args.dataset_path)["title"].dropna().tolist()
+    workload = make_workload(titles, args.requests)
+    set_scheduler(None)
+    run_load(app, workload[: args.concurrency], args.concurrency)
+
+    reference = None
+    for max_wait_ms in [None, *args.max_wait_ms]:
+        scheduler = None
+        if max_wait_ms is not None:
+            scheduler = MicroBatchScheduler(BatchingConfig(max_wait_ms, args.max_batch_size), args.query_type_overrides)
+        set_scheduler(scheduler)
+
+        elapsed, latencies, results = run_load(app, workload, args.concurrency)
+        if reference is None:
+            reference = results
+        else:
+            different, tied = count_differences(results, reference)
+            if different:
+                logger.warning(f"{different} of {len(results)} results differ from the ones without batching.")
+            if tied:
+                logger.info(f"{tied} of {len(results)} results break ties between equal scores differently.")
+
+        label = "batching off" if max_wait_ms is None else f"max wait {max_wait_ms:g} ms"
+        logger.info(
+            f"{label:<16} {len(workload) / elapsed:.1f} req/s, p50 {np.percentile(latencies, 50):.1f} ms, "
+            f"p95 {np.percentile(latencies, 95):.1f} ms, p99 {np.percentile(latencies, 99):.1f} ms"
+        )
+        if scheduler is not None:
+            scheduler.log_stats()
+
+    logger.info(f"Fake server requests: {server.RequestHandlerClass.request_counts}.")
+    server.shutdown()
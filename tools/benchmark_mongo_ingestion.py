@@ -0,0 +1,92 @@
+import argparse
+import os
+import time
+from pathlib import Path
+import pandas as pd
+from loguru import logger
+from tools.benchmark_product_store import load_products
+
+parser = argparse.ArgumentParser(
+                                description="Compare the ingestion throughput of one write per round-trip, as Superlinked's MongoDB connector does, with the batched unordered bulk writes, against a local mongod"
+                                )
+parser.add_argument(
+                    "--dataset-path",
+                    type=Path,
+                    help="Processed dataset, embedded with the offline HashEmbedder if it has no embedding columns",
+                    default=Path("data") / "processed_896_sample.jsonl",
+                    )
+parser.add_argument(
+                    "--mongo-url",
+                    type=str,
+                    help="mongod to write to, e.g. started with 'docker run -d -p 27017:27017 mongo:7'",
+                    default="mongodb://localhost:27017",
+                    )
+parser.add_argument("--db-name", type=str, default="benchmark-mongo-ingestion", help="Database written to, dropped before every run and afterwards")
+parser.add_argument("--copies", type=int, default=4, help="Copies of the dataset loaded, with their own ASINs")
+parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000], help="Products per bulk write")
+parser.add_argument("--writers", type=int, nargs="+", default=[0, 4], help="Writer threads, 0 writes from the ingesting thread")
+parser.add_argument("--write-concern", type=str, default="1", help="Write concern of the bulk writes: 0, 1, ... or 'majority'")
+
+
+def copy_products(df: pd.DataFrame, copies: int) -> pd.DataFrame:
+    """`df` `copies` times, the ASINs of the copies suffixed with their number."""
+
+    frames = [df] + [df.assign(asin=df["asin"] + f"-{copy}") for copy in range(1, copies)]
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def ingest(df: pd.DataFrame, mongo_url: str, db_name: str, write_settings) -> tuple[float, dict]:
+    """Seconds to load `df`, up to the last write acknowledged, and the stored documents by _id."""
+
+    from pymongo import MongoClient
+    from superlinked import framework as sl
+    from superlinked_app import index
+    from superlinked_app.mongo_ingestion import BulkMongoDBVectorDatabase
+
+    MongoClient(mongo_url).drop_database(db_name)
+    source = sl.InMemorySource(
+                            index.product,
+                            parser=sl.DataFrameParser(schema=index.product, mapping={index.product.id: "asin"}),
+                            )
+    vector_database = BulkMongoDBVectorDatabase(url=mongo_url, db_name=db_name, write_settings=write_settings)
+    app = sl.InteractiveExecutor(sources=[source], indices=[index.product_index], vector_database=vector_database).run()
+    connector = app.storage_manager._vdb_connector
+
+    start_time = time.perf_counter()
+    source.put([df])
+    connector.flush()
+    seconds = time.perf_counter() - start_time
+
+    docs = {doc["_id"]: doc for doc in connector._db[connector.collection_name].find()}
+    connector.close_connection()
+
+    return seconds, docs
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    os.environ["QUERY_CACHE_ENABLED"] = "false"
+    os.environ["NLQ_FAST_PATH_ENABLED"] = "false"
+
+    from pymongo import MongoClient
+    from superlinked_app.mongo_ingestion import MongoWriteSettings
+
+    write_concern = int(args.write_concern) if args.write_concern.isdigit() else args.write_concern
+    df = copy_products(load_products(args.dataset_path), args.copies)
+    # A batch of 1 without writer threads sends every write on its own, like Superlinked's connector.
+    seconds, reference = ingest(df, args.mongo_url, args.db_name, MongoWriteSettings(batch_size=1, writers=0, write_concern=write_concern))
+    logger.info(f"{len(df)} products, one write per round-trip: {seconds:.2f}s, {len(df) / seconds:.0f} products/s, {len(reference)} documents.")
+
+    for batch_size in args.batch_sizes:
+        for writers in args.writers:
+            write_settings = MongoWriteSettings(batch_size=batch_size, writers=writers, write_concern=write_concern)
+            bulk_seconds, docs = ingest(df, args.mongo_url, args.db_name, write_settings)
+            if docs != reference:
+                different = sum(docs.get(mongo_id) != doc for mongo_id, doc in reference.items())
+                raise AssertionError(f"{different} of {len(reference)} documents differ from the ones written one by one.")
+            logger.info(
+                f"{len(df)} products, batches of {batch_size}, {writers} writers: {bulk_seconds:.2f}s, "
+                f"{len(df) / bulk_seconds:.0f} products/s ({seconds / bulk_seconds:.1f}x faster), documents match."
+            )
+    MongoClient(args.mongo_url).drop_database(args.db_name)
@@ -0,0 +1,172 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+from loguru import logger
+from tools.benchmark_queries import DEFAULT_PARAMS, TEXT_PARAMS, build_app, configure_environment, load_workload
+from tools.fake_openai_server import start_fake_openai_server
+
+parser = argparse.ArgumentParser(
+                                description="Check the rule-based natural-query parser and compare its latency with the LLM's through a fake OpenAI server"
+                                )
+parser.add_argument(
+                    "--workload-path",
+                    type=Path,
+                    help="JSON lines workload, its requests with a 'natural_query' are replayed, see tools/benchmark_queries.py",
+                    default=Path("tools") / "query_workload.jsonl",
+                    )
+parser.add_argument(
+                    "--dataset-path",
+                    type=Path,
+                    help="Processed dataset to load, embedded through the fake server if it has no embedding columns",
+                    default=Path("data") / "processed_300_sample.jsonl",
+                    )
+parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at the same time")
+parser.add_argument("--repeat", type=int, default=5, help="Times the natural queries are replayed")
+parser.add_argument("--embedding-latency-ms", type=float, default=50.0, help="Latency of the fake embeddings endpoint")
+parser.add_argument("--chat-latency-ms", type=float, default=400.0, help="Latency of the fake chat completions endpoint")
+parser.add_argument("--in-memory-index", choices=["scan", "exact", "ivf"], default="scan", help="Search of the InMemory vector database")
+
+# (query, natural query, the filter params the rules must extract or None if the LLM must be asked).
+# '{asin}' is replaced with a product of the dataset.
+CASES = [
+    ("filter_query", "books with a price lower than 100 and a rating bigger than 4",
+     {"filter_by_type": "book", "price_smaller_than": 100.0, "review_rating_bigger_than": 4.0}),
+    ("filter_query", "usb cables under $20 with a rating above 3", {"price_smaller_than": 20.0, "review_rating_bigger_than": 3.0}),
+    ("filter_query", "toys for kids under 12", None),
+    ("filter_query", "products cheaper than 50", {"filter_by_type": "product", "price_smaller_than": 50.0}),
+    ("filter_query", "novels with a rating higher than 4.5", {"filter_by_type": "book", "review_rating_bigger_than": 4.5}),
+    ("filter_query", "$20 or less phone case", {"price_smaller_than": 20.0}),
+    ("filter_query", "wireless earbuds rated 4 stars or more", {"review_rating_bigger_than": 4.0}),
+    ("filter_query", "paperback thrillers at most 15 dollars with 4+ stars",
+     {"filter_by_type": "book", "price_smaller_than": 15.0, "review_rating_bigger_than": 4.0}),
+    ("filter_query", "video games under $30 rated 4 stars or more", None),
+    ("filter_query", "kitchen & dining under 25 dollars", None),
+    ("filter_query", "headphones over $100", None),
+    ("filter_query", "cheapest usb cable", None),
+    ("filter_query", "books between 10 and 20 dollars", None),
+    ("filter_query", "anything but books", None),
+    ("semantic_query", "comfortable wireless headphones", {}),
+    ("semantic_query", "cookbooks for beginners", {"filter_by_type": "book"}),
+    ("semantic_query", "books about cooking with a rating bigger than 4", None),
+    ("similar_items_query", "books like {asin}", {"filter_by_type": "book", "product_id": "{asin}"}),
+    ("similar_items_query", "similar products with a rating bigger than 4.5 and a price lower than 100", None),
+]
+
+
+def preset_params(query_name: str, natural_query: str, embed) -> dict:
+    params = {**DEFAULT_PARAMS[query_name], "natural_query": natural_query, "query_description": embed(natural_query)}
+    if query_name != "filter_query":
+        params["query_title"] = params["query_description"]
+    return params
+
+
+def check_cases(asin: str, embed) -> None:
+    """Parse every case with the params a caller sets, checking what the rules extract and when they give up."""
+
+    from superlinked_app import query
+    from superlinked_app.nlq_fast_path import parse_natural_query
+
+    for query_name, natural_query, expected in CASES:
+        natural_query = natural_query.format(asin=asin)
+        params = preset_params(query_name, natural_query, embed)
+        if "product_id" in (expected or {}):
+            expected = {**expected, "product_id": asin}
+        param_infos = [
+            param_info.copy_with_new_value(params[param_info.name], False) if param_info.name in params else param_info
+            for param_info in getattr(query, query_name).calculate_param_infos()
+        ]
+        result = parse_natural_query(natural_query, param_infos)
+        weights = {param_info.name for param_info in param_infos if param_info.is_weight}
+        extracted = {name: value for name, value in result.params.items() if name not in weights}
+        if expected is None and result.confident:
+            raise AssertionError(f"'{natural_query}' should go to the LLM, the rules extracted {extracted}.")
+        if expected is not None and (not result.confident or extracted != expected):
+            raise AssertionError(f"'{natural_query}': expected {expected}, got {extracted} ({'; '.join(result.reasons)}).")
+        logger.info(f"{query_name:<20} {natural_query!r:<75} -> {extracted if result.confident else 'LLM: ' + '; '.join(result.reasons)}")
+
+
+def make_requests(workload_path: Path, asins: list[str], repeat: int) -> list[dict]:
+    """The natural queries of the workload and the cases."""
+
+    requests = [request for request in load_workload(workload_path, asins, 1) if request["params"].get("natural_query")]
+    for query_name, natural_query, expected in CASES:
+        natural_query = natural_query.format(asin=asins[0])
+        params = {"natural_query": natural_query, "query_description": natural_query}
+        if query_name != "filter_query":
+            params["query_title"] = natural_query
+        if query_name == "similar_items_query":
+            # The fake LLM can't fill a product id, so the LLM-only run needs it set.
+            params["product_id"] = asins[0]
+        requests.append({"query": query_name, "params": params})
+
+    return requests * repeat
+
+
+def replay(app, requests: list[dict], concurrency: int) -> tuple[np.ndarray, list[list[str]]]:
+    from superlinked_app import index, query
+
+    def run(request: dict) -> tuple[float, list[str]]:
+        start_time = time.perf_counter()
+        params = {**DEFAULT_PARAMS[request["query"]], **request["params"]}
+        for name in TEXT_PARAMS:
+            if isinstance(params.get(name), str):
+                params[name] = index.openai_embed(params[name])
+        result = app.query(getattr(query, request["query"]), **params)
+        return time.perf_counter() - start_time, [entry.entity.header.object_id for entry in result.entries]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run, requests))
+
+    return np.array([latency for latency, _ in results]) * 1000, [ids for _, ids in results]
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    args.query_cache = False
+
+    server = start_fake_openai_server(
+                                    embedding_latency_seconds=args.embedding_latency_ms / 1000,
+                                    chat_latency_seconds=args.chat_latency_ms / 1000,
+                                    )
+    configure_environment(args, f"http://127.0.0.1:{server.server_port}/v1")
+    # The fast path is installed by hand after the LLM-only run.
+    os.environ["NLQ_FAST_PATH_ENABLED"] = "false"
+
+    app, asins = build_app(args.dataset_path)
+
+    from superlinked_app import index
+    from superlinked_app.nlq_fast_path import NLQFastPath, install_nlq_fast_path
+    from superlinked_app.query_cache import get_query_cache
+
+    check_cases(asins[0], index.openai_embed)
+    requests = make_requests(args.workload_path, asins, args.repeat)
+    logger.info(f"Replaying {len(requests)} natural queries with concurrency {args.concurrency}.")
+
+    counts = dict(server.RequestHandlerClass.request_counts)
+    llm_latencies, llm_results = replay(app, requests, args.concurrency)
+    llm_chats = server.RequestHandlerClass.request_counts["chat"] - counts["chat"]
+
+    fast_path = NLQFastPath(get_query_cache().query_type)
+    install_nlq_fast_path(fast_path)
+    counts = dict(server.RequestHandlerClass.request_counts)
+    fast_latencies, fast_results = replay(app, requests, args.concurrency)
+    fast_chats = server.RequestHandlerClass.request_counts["chat"] - counts["chat"]
+
+    fast_path.log_stats()
+    local = sum(stats.local for stats in fast_path.stats.values())
+    logger.info(f"{local} of {len(requests)} natural queries ({local / len(requests):.0%}) parsed locally, chat requests {llm_chats} -> {fast_chats}.")
+    for label, latencies in [("LLM only", llm_latencies), ("fast path", fast_latencies)]:
+        logger.info(
+            f"{label:<10} mean {latencies.mean():.1f} ms, p50 {np.percentile(latencies, 50):.1f} ms, "
+            f"p95 {np.percentile(latencies, 95):.1f} ms"
+        )
+    logger.info(f"Mean latency {llm_latencies.mean():.1f} ms -> {fast_latencies.mean():.1f} ms ({llm_latencies.mean() / fast_latencies.mean():.1f}x).")
+    # The fake LLM only picks option names that appear literally, e.g. not the 'book' type of "novels",
+    # and only reads bounds phrased like "lower than 100", so these differences are expected.
+    different = sum(ids != reference for ids, reference in zip(fast_results, llm_results))
+    logger.info(f"{different} of {len(requests)} results differ from the ones of the fake LLM's params.")
+
+    server.shutdown()
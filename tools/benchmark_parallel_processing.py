@@ -0,0 +1,68 @@
+import argparse
+import io
+import os
+import sys
+import time
+import pandas as pd
+from pathlib import Path
+from loguru import logger
+from superlinked_app.data_processing import process_amazon_dataset, process_amazon_dataset_parallel
+
+parser = argparse.ArgumentParser(
+                                description="Measure how process_amazon_dataset scales with worker processes and check the output doesn't change"
+                                )
+parser.add_argument(
+                    "--dataset-path",
+                    type=Path,
+                    help="Raw JSON lines dataset",
+                    default=Path("data") / "sample.json",
+                    )
+parser.add_argument("--scale", type=int, default=20, help="Concatenate the dataset this many times to benchmark bigger inputs")
+parser.add_argument("--partition-size", type=int, default=10_000, help="Raw rows per partition")
+parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Worker counts to compare")
+parser.add_argument("--engine", choices=["apply", "vectorized"], default="vectorized", help="Parsing engine")
+
+
+def text_partitions(lines: list[str], partition_size: int) -> list[str]:
+    """JSON lines text blocks, as the streaming reader hands them to the workers."""
+
+    return ["".join(lines[start : start + partition_size]) for start in range(0, len(lines), partition_size)]
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    lines = args.dataset_path.read_text(encoding="utf-8").splitlines(keepends=True) * args.scale
+    partitions = text_partitions(lines, args.partition_size)
+    logger.info(
+        f"Benchmarking {len(lines)} raw rows in {len(partitions)} partitions on {os.cpu_count()} CPUs "
+        f"with the {args.engine} engine."
+    )
+
+    start_time = time.perf_counter()
+    process_amazon_dataset(pd.read_json(io.StringIO("".join(lines)), lines=True), engine=args.engine)
+    baseline_time = time.perf_counter() - start_time
+    logger.info(f"single process, one random stream: {baseline_time:.2f}s ({len(lines) / baseline_time:.0f} rows/sec).")
+
+    reference = None
+    reference_time = None
+    for num_workers in args.workers:
+        start_time = time.perf_counter()
+        processed = pd.concat(list(process_amazon_dataset_parallel(partitions, num_workers, engine=args.engine)))
+        elapsed = time.perf_counter() - start_time
+
+        if reference is None:
+            reference, reference_time = processed, elapsed
+        else:
+            try:
+                pd.testing.assert_frame_equal(reference, processed, check_exact=True)
+            except AssertionError as e:
+                logger.error(f"The output with {num_workers} workers differs from the output with {args.workers[0]}:\n{e}")
+                sys.exit(1)
+
+        logger.info(
+            f"workers={num_workers:<2} {elapsed:.2f}s ({len(lines) / elapsed:.0f} rows/sec), "
+            f"{reference_time / elapsed:.2f}x vs {args.workers[0]} worker(s), {len(processed)} processed rows."
+        )
+
+    logger.info(f"The output is identical for {', '.join(map(str, args.workers))} workers.")
@@ -0,0 +1,131 @@
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+from loguru import logger
+from tools.benchmark_queries import DEFAULT_PARAMS
+
+parser = argparse.ArgumentParser(
+                                description="Compare the memory of the dict of Python objects per product with the compact array-backed product store"
+                                )
+parser.add_argument(
+                    "--dataset-path",
+                    type=Path,
+                    help="Processed dataset, embedded with the offline HashEmbedder if it has no embedding columns",
+                    default=Path("data") / "processed_896_sample.jsonl",
+                    )
+parser.add_argument("--sizes", type=int, nargs="+", default=[300, 850, 0], help="Products loaded, 0 for the whole dataset")
+parser.add_argument("--queries", type=int, default=20, help="Queries per query type whose results must match between the stores")
+
+
+def load_products(dataset_path: Path):
+    from superlinked_app import dataset_io
+    from superlinked_app.embeddings import EMBEDDING_COLUMNS, EmbeddingPipeline, HashEmbedder
+
+    df = dataset_io.read_processed_dataset(dataset_path).dropna().reset_index(drop=True)
+    if not set(EMBEDDING_COLUMNS.values()) <= set(df.columns):
+        logger.info(f"Embedding {len(df)} products with the offline HashEmbedder.")
+        df = EmbeddingPipeline(HashEmbedder()).embed_dataframe(df)
+
+    return df
+
+
+def build_app(df, compact_store: bool):
+    """An app on the 'exact' index with the given store, and the bytes allocated to load `df` into it."""
+
+    from superlinked import framework as sl
+    from superlinked_app import index
+    from superlinked_app.ann_index import ANNInMemoryVectorDatabase
+
+    gc.collect()
+    tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    source = sl.InMemorySource(
+                            index.product,
+                            parser=sl.DataFrameParser(schema=index.product, mapping={index.product.id: "asin"}),
+                            )
+    executor = sl.InteractiveExecutor(
+                                    sources=[source],
+                                    indices=[index.product_index],
+                                    vector_database=ANNInMemoryVectorDatabase(index_type="exact", compact_store=compact_store),
+                                    )
+    app = executor.run()
+    start_time = time.perf_counter()
+    source.put([df])
+    load_seconds = time.perf_counter() - start_time
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0] - start_memory
+    tracemalloc.stop()
+
+    return app, memory, load_seconds
+
+
+def run_queries(app, df, num_queries: int) -> list[list[tuple[str, float]]]:
+    from superlinked_app import query
+
+    rng = np.random.default_rng(6)
+    rows = rng.choice(len(df), size=min(num_queries, len(df)), replace=False)
+    results = []
+    for row in rows:
+        params = {**DEFAULT_PARAMS["semantic_query"], "query_description": df["description_embedding"][row]}
+        params["query_title"] = df["title_embedding"][row]
+        for name, query_params in [
+            ("semantic_query", params),
+            ("similar_items_query", {**params, "query_title": None, "query_description": None, "product_id": df["asin"][row]}),
+        ]:
+            result = app.query(getattr(query, name), **query_params)
+            results.append([(entry.entity.header.object_id, entry.entity.score) for entry in result.entries])
+
+    return results
+
+
+def count_differences(results: list, reference: list) -> int:
+    """Results with other scores, beyond the float32 rounding of the stored vectors.
+
+    Products with equal scores may come in another order.
+    """
+
+    different = 0
+    for entries, reference_entries in zip(results, reference):
+        scores = [score for _, score in entries]
+        reference_scores = [score for _, score in reference_entries]
+        if len(scores) != len(reference_scores) or not np.allclose(scores, reference_scores, atol=1e-5):
+            different += 1
+
+    return different
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    os.environ["QUERY_CACHE_ENABLED"] = "false"
+    os.environ["NLQ_FAST_PATH_ENABLED"] = "false"
+
+    products = load_products(args.dataset_path)
+    for size in args.sizes:
+        if size > len(products):
+            logger.warning(f"The dataset only has {len(products)} products with every field, skipping {size}.")
+            continue
+        df = products if not size else products.head(size).reset_index(drop=True)
+        memory, reference = {}, None
+        for compact_store in [False, True]:
+            app, memory[compact_store], load_seconds = build_app(df, compact_store)
+            results = run_queries(app, df, args.queries)
+            connector = app.storage_manager._vdb_connector
+            store_bytes = f", arrays {connector._vdb.nbytes / 2**20:.1f} MiB" if compact_store else ""
+            logger.info(
+                f"{len(df):>6} products, {'compact' if compact_store else 'dict':<7} store: "
+                f"{memory[compact_store] / 2**20:.1f} MiB allocated ({memory[compact_store] / len(df) / 1024:.1f} KiB per product"
+                f"{store_bytes}), loaded in {load_seconds:.2f}s"
+            )
+            if reference is None:
+                reference = results
+            elif different := count_differences(results, reference):
+                raise AssertionError(f"{different} of {len(results)} query results differ between the stores.")
+            del app, connector
+        logger.info(
+            f"{len(df):>6} products: compact store {memory[False] / memory[True]:.1f}x smaller, "
+            f"{len(reference)} query results match."
+        )
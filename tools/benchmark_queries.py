@@ -0,0 +1,222 @@
+import argparse
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+from loguru import logger
+from tools.fake_openai_server import start_fake_openai_server
+
+parser = argparse.ArgumentParser(
+                                description="Replay a query workload against the InMemory app with a local fake OpenAI server"
+                                )
+parser.add_argument(
+                    "--workload-path",
+                    type=Path,
+                    help=(
+                        "JSON lines workload, one {\"query\": <name in query.py>, \"params\": {...}} per request. "
+                        "'query_title' and 'query_description' texts are embedded, a null 'product_id' is sampled from the dataset"
+                    ),
+                    default=Path("tools") / "query_workload.jsonl",
+                    )
+parser.add_argument(
+                    "--dataset-path",
+                    type=Path,
+                    help="Processed dataset to load, embedded through the fake server if it has no embedding columns",
+                    default=Path("data") / "processed_300_sample.jsonl",
+                    )
+parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at the same time")
+parser.add_argument("--repeat", type=int, default=3, help="Times the workload is replayed")
+parser.add_argument("--warmup", type=int, default=5, help="Requests run before timing starts")
+parser.add_argument("--embedding-latency-ms", type=float, default=50.0, help="Latency of the fake embeddings endpoint")
+parser.add_argument("--chat-latency-ms", type=float, default=400.0, help="Latency of the fake chat completions endpoint")
+parser.add_argument(
+                    "--in-memory-index",
+                    choices=["scan", "exact", "ivf"],
+                    help="Search of the InMemory vector database, see IN_MEMORY_INDEX",
+                    default="scan",
+                    )
+parser.add_argument("--query-cache", action="store_true", help="Keep the natural-query and query-embedding cache enabled")
+
+# Params every request of a query gets unless the workload sets them.
+BASE_PARAMS = {
+    "title_weight": 1.0,
+    "description_weight": 1.0,
+    "review_rating_maximizer_weight": 1.0,
+    "price_minimizer_weights": 1.0,
+    "description_similar_clause_weight": 1.0,
+    "limit": 10,
+}
+DEFAULT_PARAMS = {
+    "filter_query": BASE_PARAMS,
+    "semantic_query": {**BASE_PARAMS, "title_similar_clause_weight": 1.0},
+    "similar_items_query": {**BASE_PARAMS, "title_similar_clause_weight": 1.0},
+}
+TEXT_PARAMS = ["query_title", "query_description"]
+STAGES = ["llm", "embedding", "search"]
+
+
+class StageTimer:
+    """Accumulates the time the current thread spends in each stage of a request."""
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    def reset(self) -> None:
+        self._local.seconds = defaultdict(float)
+
+    def seconds(self) -> dict[str, float]:
+        return dict(self._local.seconds)
+
+    def wrap(self, stage: str, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if hasattr(self._local, "seconds"):
+                    self._local.seconds[stage] += time.perf_counter() - start_time
+
+        return timed
+
+
+def configure_environment(args: argparse.Namespace, base_url: str) -> None:
+    """Point the app at the fake server. Must run before any superlinked_app module is imported."""
+
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "sk-offline-benchmark"
+    os.environ["IN_MEMORY_INDEX"] = args.in_memory_index
+    os.environ["QUERY_CACHE_ENABLED"] = str(args.query_cache).lower()
+
+
+def load_workload(path: Path, asins: list[str], repeat: int) -> list[dict]:
+    requests = [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+    rng = np.random.default_rng(6)
+    for request in requests:
+        if "product_id" in request["params"] and request["params"]["product_id"] is None:
+            request["params"]["product_id"] = asins[rng.integers(len(asins))]
+
+    return requests * repeat
+
+
+def build_app(dataset_path: Path):
+    from superlinked import framework as sl
+    from superlinked_app import ann_index, dataset_io, index, vector_compression
+    from superlinked_app.config import settings
+    from superlinked_app.embeddings import EMBEDDING_COLUMNS, EmbeddingPipeline, OpenAIEmbedder
+
+    df = dataset_io.read_processed_dataset(dataset_path).dropna()
+    if not set(EMBEDDING_COLUMNS.values()) <= set(df.columns):
+        logger.info(f"Embedding {len(df)} products through the fake server.")
+        df = EmbeddingPipeline(OpenAIEmbedder()).embed_dataframe(df)
+    df = vector_compression.compress_embedding_columns(df, settings.EMBEDDING_DIMENSIONS)
+
+    source = sl.InMemorySource(
+                            index.product,
+                            parser=sl.DataFrameParser(schema=index.product, mapping={index.product.id: "asin"}),
+                            )
+    executor = sl.InteractiveExecutor(
+                                    sources=[source],
+                                    indices=[index.product_index],
+                                    vector_database=ann_index.in_memory_vector_database(settings),
+                                    )
+    app = executor.run()
+    start_time = time.perf_counter()
+    source.put([df])
+    logger.info(f"Loaded {len(df)} products in {time.perf_counter() - start_time:.2f}s.")
+
+    return app, df["asin"].tolist()
+
+
+def make_runner(app, timer: StageTimer):
+    from superlinked.framework.dsl.executor.query.query_executor import QueryExecutor
+    from superlinked.framework.dsl.query.nlq_param_evaluator import NLQParamEvaluator
+    from superlinked_app import index, query
+
+    NLQParamEvaluator.evaluate_param_infos = timer.wrap("llm", NLQParamEvaluator.evaluate_param_infos)
+    QueryExecutor._knn_search = timer.wrap("search", QueryExecutor._knn_search)
+    embed = timer.wrap("embedding", index.openai_embed)
+
+    def run(request: dict) -> dict:
+        timer.reset()
+        start_time = time.perf_counter()
+        error = None
+        try:
+            params = {**DEFAULT_PARAMS.get(request["query"], {}), **request["params"]}
+            for name in TEXT_PARAMS:
+                if isinstance(params.get(name), str):
+                    params[name] = embed(params[name])
+            app.query(getattr(query, request["query"]), **params)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        latency = time.perf_counter() - start_time
+
+        return {"label": request_label(request), "latency": latency, "stages": timer.seconds(), "error": error}
+
+    return run
+
+
+def request_label(request: dict) -> str:
+    return request["query"] + (" (natural)" if request["params"].get("natural_query") else "")
+
+
+def report(label: str, results: list[dict], elapsed: float | None = None) -> None:
+    ok = [result for result in results if result["error"] is None]
+    if not ok:
+        logger.warning(f"{label:<32} {len(results)} requests, all failed: {results[0]['error']}")
+        return
+
+    latencies = np.array([result["latency"] for result in ok]) * 1000
+    stage_ms = {stage: np.mean([result["stages"].get(stage, 0.0) for result in ok]) * 1000 for stage in STAGES}
+    stage_ms["other"] = max(latencies.mean() - sum(stage_ms.values()), 0.0)
+    split = ", ".join(f"{stage} {ms:.1f} ms ({ms / latencies.mean():.0%})" for stage, ms in stage_ms.items())
+    throughput = f", {len(ok) / elapsed:.1f} req/s" if elapsed else ""
+    logger.info(
+        f"{label:<32} {len(ok)} ok, {len(results) - len(ok)} failed{throughput}, p50 {np.percentile(latencies, 50):.1f} ms, "
+        f"p95 {np.percentile(latencies, 95):.1f} ms, p99 {np.percentile(latencies, 99):.1f} ms | {split}"
+    )
+    for result in results:
+        if result["error"] is not None:
+            logger.warning(f"{label:<32} first error: {result['error']}")
+            break
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    server = start_fake_openai_server(
+                                    embedding_latency_seconds=args.embedding_latency_ms / 1000,
+                                    chat_latency_seconds=args.chat_latency_ms / 1000,
+                                    )
+    configure_environment(args, f"http://127.0.0.1:{server.server_port}/v1")
+
+    app, asins = build_app(args.dataset_path)
+    workload = load_workload(args.workload_path, asins, args.repeat)
+    timer = StageTimer()
+    run = make_runner(app, timer)
+
+    for request in workload[: args.warmup]:
+        run(request)
+
+    logger.info(
+        f"Replaying {len(workload)} requests with concurrency {args.concurrency}, "
+        f"{args.in_memory_index} search, query cache {'on' if args.query_cache else 'off'}."
+    )
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(run, workload))
+    elapsed = time.perf_counter() - start_time
+
+    by_label = defaultdict(list)
+    for result in results:
+        by_label[result["label"]].append(result)
+    for label, label_results in sorted(by_label.items()):
+        report(label, label_results)
+    report("all", results, elapsed)
+    logger.info(f"Fake server requests: {server.RequestHandlerClass.request_counts}.")
+    server.shutdown()
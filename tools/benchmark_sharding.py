@@ -0,0 +1,123 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+from loguru import logger
+from tools.benchmark_mongo_ingestion import copy_products
+from tools.benchmark_product_store import count_differences, load_products, run_queries
+from tools.benchmark_queries import DEFAULT_PARAMS
+
+parser = argparse.ArgumentParser(
+                                description="Query throughput and memory of the products sharded across worker processes, whose results must match a single app's"
+                                )
+parser.add_argument(
+                    "--dataset-path",
+                    type=Path,
+                    help="Processed dataset, embedded with the offline HashEmbedder if it has no embedding columns",
+                    default=Path("data") / "processed_896_sample.jsonl",
+                    )
+parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4], help="Shard counts to compare with a single app")
+parser.add_argument("--copies", type=int, default=4, help="Copies of the dataset loaded, with their own ASINs")
+parser.add_argument("--queries", type=int, default=300, help="Queries timed per run, a third of every query type")
+parser.add_argument("--concurrency", type=int, default=8, help="Queries in flight at the same time")
+parser.add_argument("--check-queries", type=int, default=20, help="Queries per query type whose results must match the single app's")
+parser.add_argument("--in-memory-index", choices=["scan", "exact", "ivf"], default="exact", help="Search of every shard, 'ivf' results aren't exact")
+
+
+def make_workload(df, num_queries: int) -> list[tuple[str, dict]]:
+    """(query name, params) of `num_queries` queries, alternating the query types."""
+
+    rng = np.random.default_rng(6)
+    workload = []
+    for number, row in enumerate(rng.choice(len(df), size=num_queries)):
+        vectors = {"query_title": df["title_embedding"][row], "query_description": df["description_embedding"][row]}
+        query_name = ["filter_query", "semantic_query", "similar_items_query"][number % 3]
+        if query_name == "filter_query":
+            params = {**DEFAULT_PARAMS[query_name], "query_description": vectors["query_description"], "price_smaller_than": 100.0}
+        elif query_name == "semantic_query":
+            params = {**DEFAULT_PARAMS[query_name], **vectors}
+        else:
+            params = {**DEFAULT_PARAMS[query_name], "product_id": df["asin"][row]}
+        workload.append((query_name, params))
+
+    return workload
+
+
+def queries_per_second(app, workload: list[tuple[str, dict]], concurrency: int) -> float:
+    from superlinked_app import query
+
+    def run(request: tuple[str, dict]) -> None:
+        query_name, params = request
+        app.query(getattr(query, query_name), **params)
+
+    for request in workload[:concurrency]:
+        run(request)
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, workload))
+
+    return len(workload) / (time.perf_counter() - start_time)
+
+
+def build_single_app(df):
+    from superlinked import framework as sl
+    from superlinked_app import ann_index, index
+    from superlinked_app.config import settings
+    from superlinked_app.utils import rss_mb
+
+    start_memory = rss_mb()
+    source = sl.InMemorySource(
+                            index.product,
+                            parser=sl.DataFrameParser(schema=index.product, mapping={index.product.id: "asin"}),
+                            )
+    app = sl.InteractiveExecutor(
+                                sources=[source],
+                                indices=[index.product_index],
+                                vector_database=ann_index.in_memory_vector_database(settings),
+                                ).run()
+    source.put([df])
+
+    return app, rss_mb() - start_memory
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    os.environ["IN_MEMORY_INDEX"] = args.in_memory_index
+    os.environ["QUERY_CACHE_ENABLED"] = "false"
+    os.environ["NLQ_FAST_PATH_ENABLED"] = "false"
+
+    from superlinked_app.sharding import ShardedApp
+
+    df = copy_products(load_products(args.dataset_path), args.copies)
+    workload = make_workload(df, args.queries)
+    app, single_memory = build_single_app(df)
+    reference = run_queries(app, df, args.check_queries)
+    single_qps = queries_per_second(app, workload, args.concurrency)
+    del app
+    logger.info(
+        f"{len(df)} products on {os.cpu_count()} CPUs, single app: {single_qps:.0f} queries/s "
+        f"at concurrency {args.concurrency}, {single_memory:.0f} MB for the products and indexes."
+    )
+
+    for num_shards in args.shards:
+        sharded_app = ShardedApp(num_shards)
+        try:
+            start_time = time.perf_counter()
+            sharded_app.put(df)
+            load_seconds = time.perf_counter() - start_time
+            different = count_differences(run_queries(sharded_app, df, args.check_queries), reference)
+            if different and args.in_memory_index != "ivf":
+                raise AssertionError(f"{different} of {len(reference)} query results of {num_shards} shards differ from the single app's.")
+            qps = queries_per_second(sharded_app, workload, args.concurrency)
+            stats = sharded_app.stats()
+        finally:
+            sharded_app.close()
+        match = f"{different} of {len(reference)} results differ (IVF)" if different else "results match"
+        logger.info(
+            f"{num_shards} shards: {qps:.0f} queries/s ({qps / single_qps:.2f}x the single app), loaded in {load_seconds:.2f}s, "
+            f"{min(stat.products for stat in stats)}-{max(stat.products for stat in stats)} products per shard, "
+            f"RSS {sum(stat.rss_mb for stat in stats):.0f} MB in total, {max(stat.rss_mb for stat in stats):.0f} MB for the largest shard "
+            f"of which {max(stat.rss_mb - stat.startup_rss_mb for stat in stats):.0f} MB for its products and indexes, {match}."
+        )
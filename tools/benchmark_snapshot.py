@@ -0,0 +1,121 @@
+import argparse
+import os
+import shutil
+import time
+from pathlib import Path
+from loguru import logger
+from tools.benchmark_product_store import count_differences, load_products, run_queries
+
+parser = argparse.ArgumentParser(
+                                description="Compare a full load of the InMemory vector database with a restore of its snapshot, which must answer the same"
+                                )
+parser.add_argument(
+                    "--dataset-path",
+                    type=Path,
+                    help="Processed dataset, embedded with the offline HashEmbedder if it has no embedding columns",
+                    default=Path("data") / "processed_896_sample.jsonl",
+                    )
+parser.add_argument(
+                    "--snapshot-path",
+                    type=Path,
+                    help="Directory the snapshot is written to, removed afterwards",
+                    default=Path("data") / "benchmark_snapshot",
+                    )
+parser.add_argument("--stores", choices=["dict", "compact"], nargs="+", default=["compact", "dict"], help="Stores of the InMemory vector database")
+parser.add_argument("--in-memory-index", choices=["exact", "ivf"], default="ivf", help="Search of the InMemory vector database")
+parser.add_argument("--queries", type=int, default=20, help="Queries per query type whose results must match after the restore")
+
+
+def build_app(store: str, index_type: str, snapshot_path: Path, snapshot_fingerprint: str):
+    from superlinked import framework as sl
+    from superlinked_app import index
+    from superlinked_app.ann_index import ANNInMemoryVectorDatabase
+
+    source = sl.InMemorySource(
+                            index.product,
+                            parser=sl.DataFrameParser(schema=index.product, mapping={index.product.id: "asin"}),
+                            )
+    vector_database = ANNInMemoryVectorDatabase(
+                                                index_type=index_type,
+                                                compact_store=store == "compact",
+                                                snapshot_path=snapshot_path,
+                                                snapshot_fingerprint=snapshot_fingerprint,
+                                                )
+    app = sl.InteractiveExecutor(sources=[source], indices=[index.product_index], vector_database=vector_database).run()
+
+    return app, source
+
+
+def first_query_seconds(app, df) -> float:
+    """Time of a first query, which builds the vector and filter indexes that aren't restored."""
+
+    start_time = time.perf_counter()
+    run_queries(app, df, 1)
+
+    return time.perf_counter() - start_time
+
+
+def check_fingerprint_changes() -> None:
+    """Editing a space of the index must give another fingerprint, so its snapshot is ignored."""
+
+    from superlinked import framework as sl
+    from superlinked_app import index
+    from superlinked_app.snapshot import index_fingerprint
+
+    price_space = sl.NumberSpace(number=index.product.price, mode=sl.Mode.MINIMUM, min_value=0.0, max_value=500)
+    edited_index = sl.Index(
+                            spaces=[index.title_space, index.description_space, index.review_rating_maximizer_space, price_space],
+                            fields=[index.product.type, index.product.category, index.product.review_rating, index.product.price],
+                            )
+    if index_fingerprint(edited_index) == index_fingerprint(index.product_index):
+        raise AssertionError("Another price space gives the same snapshot fingerprint.")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    os.environ["QUERY_CACHE_ENABLED"] = "false"
+    os.environ["NLQ_FAST_PATH_ENABLED"] = "false"
+
+    from superlinked_app import index
+    from superlinked_app.snapshot import index_fingerprint
+
+    check_fingerprint_changes()
+    fingerprint = index_fingerprint(index.product_index)
+    df = load_products(args.dataset_path)
+    for store in args.stores:
+        shutil.rmtree(args.snapshot_path, ignore_errors=True)
+        app, source = build_app(store, args.in_memory_index, args.snapshot_path, fingerprint)
+        start_time = time.perf_counter()
+        source.put([df])
+        load_seconds = time.perf_counter() - start_time
+        load_seconds += first_query_seconds(app, df)
+        reference = run_queries(app, df, args.queries)
+        start_time = time.perf_counter()
+        app.storage_manager._vdb_connector.persist(None)
+        save_seconds = time.perf_counter() - start_time
+        del app, source
+
+        app, _ = build_app(store, args.in_memory_index, args.snapshot_path, fingerprint)
+        connector = app.storage_manager._vdb_connector
+        start_time = time.perf_counter()
+        connector.restore(None)
+        restore_seconds = time.perf_counter() - start_time
+        restored_indices = len(connector._restored_indices)
+        restore_seconds += first_query_seconds(app, df)
+        if different := count_differences(run_queries(app, df, args.queries), reference):
+            raise AssertionError(f"{different} query results of the restored '{store}' store differ from the loaded one.")
+        del app, connector
+
+        app, _ = build_app(store, args.in_memory_index, args.snapshot_path, f"{fingerprint}:edited")
+        app.storage_manager._vdb_connector.restore(None)
+        if len(app.storage_manager._vdb_connector._vdb):
+            raise AssertionError("A snapshot of other schemas or spaces was restored.")
+        del app
+
+        logger.info(
+            f"{store:<7} store, {args.in_memory_index} index, {len(df)} products: load and first query {load_seconds:.2f}s "
+            f"(without embedding), snapshot written in {save_seconds:.2f}s, restore and first query {restore_seconds:.2f}s "
+            f"({load_seconds / restore_seconds:.1f}x faster, {restored_indices} vector indexes restored), "
+            "query results match, snapshots of other spaces are ignored."
+        )
+    shutil.rmtree(args.snapshot_path, ignore_errors=True)
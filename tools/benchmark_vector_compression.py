@@ -0,0 +1,84 @@
+import argparse
+import time
+import numpy as np
+from pathlib import Path
+from loguru import logger
+from superlinked_app import constants, dataset_io
+from superlinked_app.vector_compression import QUANTIZATIONS, quantize, truncate_embeddings
+
+parser = argparse.ArgumentParser(description="Measure recall@k against memory for truncated and quantized embeddings")
+parser.add_argument(
+                    "--input-path",
+                    type=Path,
+                    help="Embedded dataset from 'make embed-sample-dataset', synthetic vectors are used if it doesn't exist",
+                    default=Path("data") / "processed_300_sample_embedded.jsonl",
+                    )
+parser.add_argument("--synthetic-rows", type=int, default=20_000, help="Rows of the synthetic corpus")
+parser.add_argument("--num-queries", type=int, default=200, help="Number of queries")
+parser.add_argument("--k", type=int, default=10, help="Neighbours compared against the full precision baseline")
+parser.add_argument(
+                    "--dimensions",
+                    type=int,
+                    nargs="+",
+                    default=[1536, 1024, 768, 512, 256, 128],
+                    help="Embedding sizes to compare",
+                    )
+
+
+def load_vectors(args: argparse.Namespace, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """Return (corpus, queries). Real data searches descriptions with titles."""
+
+    if args.input_path.exists():
+        table = dataset_io.read_processed_table(args.input_path, ["title_embedding", "description_embedding"])
+        corpus = dataset_io.embedding_matrix(table, "description_embedding")
+        titles = dataset_io.embedding_matrix(table, "title_embedding")
+        queries = titles[rng.choice(len(titles), size=min(args.num_queries, len(titles)), replace=False)]
+        logger.info(f"Loaded {len(corpus)} embeddings from '{args.input_path}'.")
+        return corpus, queries
+
+    # Clustered vectors whose variance decays along the dimensions, like the
+    # leading-dimension-heavy text-embedding-3 vectors.
+    dimensions = constants.EMBEDDING_DIMENSIONS
+    decay = 1 / np.sqrt(1 + np.arange(dimensions) / 64)
+    centers = rng.standard_normal((args.synthetic_rows // 50, dimensions)) * decay
+    assignments = rng.integers(len(centers), size=args.synthetic_rows)
+    corpus = centers[assignments] + 0.5 * rng.standard_normal((args.synthetic_rows, dimensions)) * decay
+    queries = corpus[rng.choice(len(corpus), size=args.num_queries)] + 0.3 * rng.standard_normal(
+        (args.num_queries, dimensions)
+    ) * decay
+    logger.info(f"Generated {len(corpus)} synthetic embeddings.")
+
+    return truncate_embeddings(corpus, dimensions), truncate_embeddings(queries, dimensions)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    rng = np.random.default_rng(6)
+
+    corpus, queries = load_vectors(args, rng)
+    k = min(args.k, len(corpus))
+    baseline = top_k(queries @ corpus.T, k)
+
+    for dimensions in sorted(args.dimensions, reverse=True):
+        if dimensions > corpus.shape[1]:
+            continue
+        truncated_queries = truncate_embeddings(queries, dimensions)
+        truncated_corpus = truncate_embeddings(corpus, dimensions)
+        for quantization in QUANTIZATIONS:
+            vectors = quantize(truncated_corpus, quantization)
+
+            start_time = time.perf_counter()
+            neighbours = top_k(vectors.dot(truncated_queries), k)
+            query_ms = (time.perf_counter() - start_time) / len(queries) * 1000
+
+            recall = np.mean([len(set(found) & set(expected)) / k for found, expected in zip(neighbours, baseline)])
+            logger.info(
+                f"dimensions={dimensions:<5} quantization={quantization:<8} "
+                f"{vectors.nbytes / len(corpus):>6.0f} bytes/vector, {vectors.nbytes / 1024**2:>7.1f} MB, "
+                f"recall@{k} {recall:.3f}, {query_ms:.3f} ms/query, "
+                f"Superlinked InMemory {2 * dimensions * 8 * len(corpus) / 1024**2:.1f} MB for both text spaces."
+            )
@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+import numpy as np
+from loguru import logger
+from superlinked_app.neighbor_table import NeighborTable
+from tools.benchmark_queries import DEFAULT_PARAMS, build_app
+
+parser = argparse.ArgumentParser(
+                                description="Precompute the nearest products of every product, answering 'more like this' queries without a search"
+                                )
+parser.add_argument(
+                    "--dataset-path",
+                    type=Path,
+                    help="Embedded processed dataset, see tools/embed_dataset.py",
+                    default=Path("data") / "processed_300_sample_embedded.parquet",
+                    )
+parser.add_argument(
+                    "--output-path",
+                    type=Path,
+                    help="Directory of the table, set NEIGHBOR_TABLE_PATH to it to serve it",
+                    default=Path("data") / "neighbors",
+                    )
+parser.add_argument("--k", type=int, default=50, help="Neighbours kept per product, the largest limit the table answers")
+parser.add_argument("--block-size", type=int, default=1024, help="Products scored per matrix multiply")
+parser.add_argument(
+                    "--weights",
+                    type=json.loads,
+                    help="Weights of similar_items_query the table is computed for, as JSON, other weights never hit it",
+                    default={},
+                    )
+parser.add_argument(
+                    "--incremental",
+                    action="store_true",
+                    help="Update the existing table, only recomputing what new, changed and removed products affect",
+                    )
+parser.add_argument("--check", type=int, default=0, help="Products whose table answers are compared with a full search")
+parser.add_argument("--in-memory-index", choices=["exact", "ivf"], default="exact", help="Search of the InMemory vector database for --check")
+
+# Filters the check adds to the 'more like this' queries, None is no filter. Only the type one, any
+# category filter value fails in Superlinked's filter validation.
+CHECK_FILTERS = [None, {"filter_by_type": "book"}, {"filter_by_type": "product"}]
+
+
+def query_params(weights: dict) -> dict:
+    """similar_items_query params without a product id: the weights, and no text to match."""
+
+    params = {name: value for name, value in DEFAULT_PARAMS["similar_items_query"].items() if name.endswith(("weight", "weights"))}
+    unknown = set(weights) - set(params)
+    if unknown:
+        raise ValueError(f"Unknown weights {', '.join(sorted(unknown))}, expected some of {', '.join(sorted(params))}.")
+
+    return {**params, **weights}
+
+
+def stored_vectors(app, vector_field: str) -> tuple[list[str], np.ndarray]:
+    """Row ids and vectors of the index vector field, as the InMemory vector databases keep them."""
+
+    vdb = app.storage_manager._vdb_connector._vdb
+    row_ids = [row_id for row_id, values in vdb.items() if values.get(vector_field) is not None]
+    vectors = np.array([vdb[row_id][vector_field].value for row_id in row_ids], dtype=np.float32)
+
+    return row_ids, vectors.reshape(len(row_ids), -1)
+
+
+def query_vectors(app, row_ids: list[str], vectors: np.ndarray, params: dict, sample_size: int = 64) -> np.ndarray:
+    """The query vector Superlinked produces for the 'more like this' query of every row.
+
+    Superlinked takes about 5 ms per product. Every dimension of these vectors
+    is either the stored one scaled by a weight or a constant, e.g. the number
+    spaces only keep the direction to maximize, so that map is fitted on a
+    sample and used for all rows when it reproduces Superlinked's vectors
+    bit for bit, which the table lookup needs.
+    """
+
+    from superlinked.framework.dsl.executor.query.query_executor import QueryExecutor
+    from superlinked.framework.dsl.query.query_param_value_setter import QueryParamValueSetter
+    from superlinked.framework.storage.in_memory.in_memory_vdb import InMemoryVDB
+    from superlinked_app import query
+
+    similar_items_query = query.similar_items_query
+    executor = QueryExecutor(app, similar_items_query, app._query_vector_factory_by_index[similar_items_query.index])
+
+    def produce(rows: np.ndarray) -> np.ndarray:
+        produced = []
+        for row in rows:
+            product_id = InMemoryVDB._get_entity_id_from_row_id(row_ids[row]).object_id
+            descriptor = QueryParamValueSetter.set_values(similar_items_query, {**params, "product_id": product_id})
+            produced.append(executor._produce_query_vector(descriptor).value)
+        return np.array(produced, dtype=np.float32).reshape(len(rows), -1)
+
+    rng = np.random.default_rng(6)
+    sample = rng.choice(len(row_ids), size=min(sample_size, len(row_ids)), replace=False)
+    sample_queries = produce(sample)
+    constant = (sample_queries == sample_queries[:1]).all(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = sample_queries / vectors[sample]
+    scale = np.array([column[np.isfinite(column)][0] if np.isfinite(column).any() else 0.0 for column in ratios.T], dtype=np.float32)
+
+    def fitted(rows_vectors: np.ndarray) -> np.ndarray:
+        return np.where(constant, sample_queries[0], rows_vectors * scale).astype(np.float32)
+
+    if np.array_equal(fitted(vectors[sample]), sample_queries):
+        return fitted(vectors)
+
+    logger.info(f"The query vectors aren't a scaling of the stored ones, producing all {len(row_ids)} through Superlinked.")
+    return produce(np.arange(len(row_ids)))
+
+
+def check_incremental(table: NeighborTable, row_ids: list[str], vectors: np.ndarray, queries: np.ndarray, block_size: int) -> None:
+    """Update a table of an edited catalogue to the current one, and compare it with the table built from scratch."""
+
+    rng = np.random.default_rng(6)
+    num_edits = max(1, len(row_ids) // 50)
+    removed = rng.choice(len(row_ids), size=num_edits, replace=False)
+    changed = rng.choice(np.setdiff1d(np.arange(len(row_ids)), removed), size=num_edits, replace=False)
+    kept = np.setdiff1d(np.arange(len(row_ids)), removed)
+    old_vectors, old_queries = vectors.copy(), queries.copy()
+    old_vectors[changed] = vectors[rng.permutation(changed)] + 0.01
+    old_queries[changed] = queries[rng.permutation(changed)] + 0.01
+    # A product that was since removed from the catalogue.
+    old_row_ids = [row_ids[row] for row in kept] + ["removed:product"]
+    old_table = NeighborTable.build(
+                                    old_row_ids,
+                                    np.concatenate([old_vectors[kept], -old_vectors[:1]]),
+                                    np.concatenate([old_queries[kept], -old_queries[:1]]),
+                                    table.k,
+                                    table.vector_field,
+                                    table.params,
+                                    block_size,
+                                    )
+
+    start_time = time.perf_counter()
+    updated, stats = old_table.update(row_ids, vectors, queries, block_size)
+    logger.info(f"Incremental update of {num_edits} new, {num_edits} changed and 1 removed products in {time.perf_counter() - start_time:.2f}s: {stats}.")
+    different = (updated.neighbors != table.neighbors).any(axis=1)
+    # Products that only differ by the float16 rounding of tied scores are the same neighbours.
+    same_scores = np.isclose(updated.scores.astype(np.float32), table.scores.astype(np.float32), atol=1e-3).all(axis=1)
+    if (different & ~same_scores).any():
+        raise AssertionError(f"{int((different & ~same_scores).sum())} rows of the updated table differ from the rebuilt one.")
+    logger.info(f"The updated table matches the rebuilt one ({int(different.sum())} rows order tied neighbours differently).")
+
+
+def check_queries(app, table: NeighborTable, params: dict, num_products: int) -> None:
+    """Run 'more like this' queries without and with the table, which must return the same products."""
+
+    from superlinked.framework.storage.in_memory.in_memory_vdb import InMemoryVDB
+    from superlinked_app import query
+
+    connector = app.storage_manager._vdb_connector
+    product_ids = [InMemoryVDB._get_entity_id_from_row_id(row_id).object_id for row_id in table.row_ids[:num_products].tolist()]
+    requests = [
+        {**params, "limit": min(10, table.k), "product_id": product_id, **(filters or {})}
+        for product_id in product_ids
+        for filters in CHECK_FILTERS
+    ]
+
+    def run() -> tuple[float, list[list[tuple[str, float]]]]:
+        start_time = time.perf_counter()
+        results = [app.query(query.similar_items_query, **request) for request in requests]
+        return (time.perf_counter() - start_time) / len(requests) * 1000, [
+            [(entry.entity.header.object_id, entry.entity.score) for entry in result.entries] for result in results
+        ]
+
+    connector._neighbor_table = None
+    connector.invalidate_indices()
+    search_ms, reference = run()
+    connector._neighbor_table = table
+    connector.invalidate_indices()
+    run()
+    if not connector._neighbor_rows:
+        raise AssertionError("The table wasn't used, it doesn't match the stored vectors.")
+    table_ms, results = run()
+
+    different = 0
+    for entries, reference_entries in zip(results, reference):
+        ids, reference_ids = [entry_id for entry_id, _ in entries], [entry_id for entry_id, _ in reference_entries]
+        scores, reference_scores = [score for _, score in entries], [score for _, score in reference_entries]
+        if ids != reference_ids and not (len(ids) == len(reference_ids) and np.allclose(scores, reference_scores, atol=1e-5)):
+            different += 1
+    if different:
+        raise AssertionError(f"{different} of {len(requests)} table answers differ from the full search.")
+    logger.info(
+        f"{len(requests)} 'more like this' queries, with and without filters, return the same products: "
+        f"full search {search_ms:.2f} ms/query, table {table_ms:.2f} ms/query."
+    )
+
+    # The search alone, without Superlinked's query overhead.
+    vector_field = table.vector_field
+    _, index, _ = connector._get_index(vector_field, [])
+    queries = query_vectors(app, table.row_ids[:num_products].tolist(), stored_vectors(app, vector_field)[1][:num_products], params)
+    start_time = time.perf_counter()
+    for query_vector in queries:
+        index.search(query_vector, 10)
+    index_us = (time.perf_counter() - start_time) / len(queries) * 1e6
+    start_time = time.perf_counter()
+    for query_vector in queries:
+        connector._search_neighbor_table(vector_field, index, query_vector, 10, None)
+    table_us = (time.perf_counter() - start_time) / len(queries) * 1e6
+    logger.info(f"Search of {len(table.row_ids)} products: index {index_us:.1f} us/query, table {table_us:.1f} us/query.")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    os.environ["IN_MEMORY_INDEX"] = args.in_memory_index
+    os.environ["QUERY_CACHE_ENABLED"] = "false"
+
+    app, _ = build_app(args.dataset_path)
+
+    from superlinked_app import query
+
+    params = query_params(args.weights)
+    vector_field = query.similar_items_query.index._node_id
+    row_ids, vectors = stored_vectors(app, vector_field)
+
+    start_time = time.perf_counter()
+    queries = query_vectors(app, row_ids, vectors, params)
+    logger.info(f"Produced {len(queries)} query vectors in {time.perf_counter() - start_time:.2f}s.")
+
+    start_time = time.perf_counter()
+    if args.incremental and (args.output_path / "meta.json").exists():
+        table = NeighborTable.load(args.output_path, mmap=False)
+        if table.vector_field != vector_field or table.params != params:
+            raise ValueError(f"The table at '{args.output_path}' was built for other weights or another index, rebuild it without --incremental.")
+        table, stats = table.update(row_ids, vectors, queries, args.block_size)
+        logger.info(f"Updated the table in {time.perf_counter() - start_time:.2f}s: {stats}.")
+    else:
+        table = NeighborTable.build(row_ids, vectors, queries, args.k, vector_field, params, args.block_size)
+        logger.info(f"Computed the {table.k} nearest neighbours of {len(row_ids)} products in {time.perf_counter() - start_time:.2f}s.")
+    table.save(args.output_path)
+
+    if args.check:
+        check_incremental(NeighborTable.build(row_ids, vectors, queries, table.k, vector_field, params, args.block_size), row_ids, vectors, queries, args.block_size)
+        check_queries(app, NeighborTable.load(args.output_path), params, args.check)
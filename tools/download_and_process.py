@@ -1,9 +1,17 @@
 import argparse
+import random
+import time
 import pandas as pd
+from contextlib import ExitStack
 from pathlib import Path
+from typing import BinaryIO
 from loguru import logger
-from superlinked_app import utils
-from superlinked_app.data_processing import process_amazon_dataset
+from superlinked_app import constants, utils
+from superlinked_app.downloads import Download
+from superlinked_app.dataset_io import ProcessedDatasetWriter, write_processed_dataset
+from superlinked_app.data_processing import process_amazon_dataset, process_amazon_dataset_parallel, split_partitions
+
+SAMPLE_SIZES = [100, 300]
 
 parser = argparse.ArgumentParser(description="Download and decompress data file")
 parser.add_argument(
@@ -17,9 +25,48 @@ parser.add_argument(
                     help="Directory to save downloaded data",
                     default=Path("data"),
                     )
+parser.add_argument(
+                    "--streaming",
+                    action="store_true",
+                    help="Decompress and process the dataset chunk by chunk with bounded memory",
+                    )
+parser.add_argument(
+                    "--output-format",
+                    choices=sorted(set(constants.PROCESSED_DATASET_FORMATS.values())),
+                    help="Format of the processed datasets",
+                    default="jsonl",
+                    )
+parser.add_argument(
+                    "--chunk-size",
+                    type=int,
+                    help="Rows per chunk in streaming mode, and per partition with --workers",
+                    default=100_000,
+                    )
+parser.add_argument(
+                    "--workers",
+                    type=int,
+                    help=(
+                        "Process partitions of --chunk-size rows in this many processes. The category "
+                        "truncation is seeded per partition, so the output doesn't depend on the worker count"
+                    ),
+                    default=None,
+                    )
+parser.add_argument(
+                    "--connections",
+                    type=int,
+                    help="Parallel ranged requests of the download, a partial download is resumed",
+                    default=4,
+                    )
+parser.add_argument(
+                    "--sha256",
+                    help="Expected SHA-256 hex digest of the downloaded file",
+                    default=None,
+                    )
+
 
+def start_download(url: str, output_path: Path, connections: int, sha256: str | None) -> tuple[Path, Download | None]:
+    """Start downloading the dataset in the background, None instead of the download if it's already there."""
 
-def download_dataset(url: str, output_path: Path) -> Path:
     is_sample = url.endswith(".gz")
 
     # Set compressed file path based on compression type
@@ -29,44 +76,158 @@ def download_dataset(url: str, output_path: Path) -> Path:
         compressed_file_output_path = output_path / "esci.json.zst"
 
     # Download file if it doesn't exist
-    if not compressed_file_output_path.exists():
-        logger.info(
-            f"Downloading data from '{url}' to '{compressed_file_output_path}'."
-        )
-        successful = utils.download_file(url, compressed_file_output_path)
-        if not successful:
-            raise RuntimeError("Failed to download the requested file.")
-
-    # Decompress file
+    if compressed_file_output_path.exists():
+        return compressed_file_output_path, None
+
+    logger.info(
+        f"Downloading data from '{url}' to '{compressed_file_output_path}' over {connections} connections."
+    )
+    return compressed_file_output_path, Download(url, compressed_file_output_path, connections, sha256=sha256).start()
+
+
+def download_dataset(
+    url: str, output_path: Path, decompress: bool = True, connections: int = 4, sha256: str | None = None
+) -> Path:
+    compressed_file_output_path, download = start_download(url, output_path, connections, sha256)
+    if not decompress:
+        return download.wait() if download else compressed_file_output_path
+
+    # Decompress file, while it downloads
     output_file = compressed_file_output_path.with_suffix("")
     logger.info(f"Decompressing '{compressed_file_output_path}' to '{output_file}'.")
-    if is_sample:
-        utils.decompress_gz(compressed_file_output_path, output_file)
-    else:
-        utils.decompress_zst(compressed_file_output_path, output_file)
+    try:
+        stream = download.open() if download else None
+        if compressed_file_output_path.suffix == ".gz":
+            utils.decompress_gz(compressed_file_output_path, output_file, stream)
+        else:
+            utils.decompress_zst(compressed_file_output_path, output_file, stream)
+        if download:
+            download.wait()
+    except BaseException:
+        if download:
+            download.cancel()
+        raise
 
     return output_file
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def get_processed_dataset_path(dataset_path: Path, sample: int | str, output_format: str = "jsonl") -> Path:
+    return dataset_path.parent / f"processed_{sample}_{dataset_path.stem}.{output_format}"
+
+
+def log_throughput(num_rows: int, start_time: float) -> None:
+    elapsed = time.perf_counter() - start_time
+    logger.info(
+        f"Processed {num_rows} raw rows in {elapsed:.1f}s "
+        f"({num_rows / elapsed:.0f} rows/sec), peak RSS {utils.peak_rss_mb():.0f} MB."
+    )
+
+
+def process_in_memory(dataset_path: Path, output_format: str, chunk_size: int, num_workers: int | None) -> None:
+    start_time = time.perf_counter()
 
-    dataset_path = download_dataset(args.data_url, args.data_dir)
-    logger.info("Processing dataset.")
     df = pd.read_json(str(dataset_path), lines=True)
-    processed_df = process_amazon_dataset(df)
+    if num_workers is None:
+        processed_df = process_amazon_dataset(df)
+    else:
+        partitions = list(process_amazon_dataset_parallel(split_partitions(df, chunk_size), num_workers))
+        processed_df = pd.concat(partitions) if partitions else process_amazon_dataset(df)
 
-    for sample in [100, 300, len(df)]:
+    for sample in [*SAMPLE_SIZES, len(df)]:
         sample = min(len(processed_df), sample)
         sampled_df_processed = processed_df.head(sample)
 
-        processed_dataset_path = (
-                                dataset_path.parent
-                                / f"processed_{sample}_{dataset_path.name.replace('.json', '.jsonl')}"
-                                )
+        processed_dataset_path = get_processed_dataset_path(dataset_path, sample, output_format)
         logger.info(f"Saving processed dataset to '{processed_dataset_path}'.")
-        sampled_df_processed.to_json(
-                                    processed_dataset_path, 
-                                    orient="records", 
-                                    lines=True
-                                    )
\ No newline at end of file
+        write_processed_dataset(sampled_df_processed, processed_dataset_path)
+
+    log_throughput(len(df), start_time)
+
+
+def process_streaming(
+    compressed_dataset_path: Path,
+    chunk_size: int,
+    output_format: str,
+    num_workers: int | None,
+    stream: BinaryIO | None = None,
+) -> None:
+    """Process the compressed dataset chunk by chunk, appending to the output files.
+
+    With `stream`, e.g. a download in progress, the compressed content is read
+    from it instead of from `compressed_dataset_path`.
+
+    Only one chunk of raw and processed rows is held in memory at a time, or
+    two per worker with `num_workers`. The category truncation draws continue
+    a single random stream across chunks, or are seeded per chunk with
+    `num_workers`, so the output is identical to the in-memory path with the
+    same settings.
+    """
+
+    start_time = time.perf_counter()
+    dataset_path = compressed_dataset_path.with_suffix("")
+
+    random.seed(6)
+    num_raw_rows = [0]
+    num_processed_rows = 0
+    partial_paths = {
+        sample: get_processed_dataset_path(dataset_path, sample, output_format).with_suffix(".partial")
+        for sample in [*SAMPLE_SIZES, "all"]
+    }
+    with ExitStack() as stack:
+        writers = {
+            sample: stack.enter_context(ProcessedDatasetWriter(path, output_format))
+            for sample, path in partial_paths.items()
+        }
+
+        def count_raw_rows(chunks):
+            for chunk in chunks:
+                num_raw_rows[0] += len(chunk) if isinstance(chunk, pd.DataFrame) else chunk.count("\n")
+                yield chunk
+
+        if num_workers is None:
+            processed_chunks = (
+                process_amazon_dataset(chunk, seed=None)
+                for chunk in count_raw_rows(utils.iter_json_chunks(compressed_dataset_path, chunk_size, stream))
+            )
+        else:
+            processed_chunks = process_amazon_dataset_parallel(
+                count_raw_rows(utils.iter_text_chunks(compressed_dataset_path, chunk_size, stream)), num_workers
+            )
+
+        for processed_chunk in processed_chunks:
+            for sample in SAMPLE_SIZES:
+                remaining = sample - num_processed_rows
+                if remaining > 0:
+                    writers[sample].write(processed_chunk.head(remaining))
+            writers["all"].write(processed_chunk)
+
+            num_processed_rows += len(processed_chunk)
+            log_throughput(num_raw_rows[0], start_time)
+
+    for sample, partial_path in partial_paths.items():
+        size = num_processed_rows if sample == "all" else min(num_processed_rows, sample)
+        processed_dataset_path = get_processed_dataset_path(dataset_path, size, output_format)
+        logger.info(f"Saving processed dataset to '{processed_dataset_path}'.")
+        partial_path.replace(processed_dataset_path)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    if args.streaming:
+        # Decompression and processing start as soon as the first bytes arrive.
+        compressed_dataset_path, download = start_download(args.data_url, args.data_dir, args.connections, args.sha256)
+        logger.info("Processing dataset.")
+        try:
+            stream = download.open() if download else None
+            process_streaming(compressed_dataset_path, args.chunk_size, args.output_format, args.workers, stream)
+            if download:
+                download.wait()
+        except BaseException:
+            if download:
+                download.cancel()
+            raise
+    else:
+        dataset_path = download_dataset(args.data_url, args.data_dir, True, args.connections, args.sha256)
+        logger.info("Processing dataset.")
+        process_in_memory(dataset_path, args.output_format, args.chunk_size, args.workers)
@@ -0,0 +1,133 @@
+import argparse
+import json
+from pathlib import Path
+from loguru import logger
+from superlinked_app import constants
+from superlinked_app.dataset_io import (
+    ProcessedDatasetWriter,
+    dataset_format,
+    iter_processed_dataset,
+    read_processed_dataset,
+    write_processed_dataset,
+)
+from superlinked_app.embedding_cache import EmbeddingCache
+from superlinked_app.embeddings import EmbeddingPipeline, HashEmbedder, OpenAIEmbedder
+from superlinked_app.incremental_ingestion import IngestionState, compute_delta
+
+parser = argparse.ArgumentParser(description="Precompute title and description embeddings for a processed dataset")
+parser.add_argument(
+                    "--input-path",
+                    type=Path,
+                    help="Processed dataset to embed (.jsonl, .parquet or .arrow)",
+                    default=Path("data") / "processed_300_sample.jsonl",
+                    )
+parser.add_argument(
+                    "--output-path",
+                    type=Path,
+                    help="Where to write the embedded dataset, in the format of its extension (defaults to '<input>_embedded<input extension>')",
+                    default=None,
+                    )
+parser.add_argument("--chunk-size", type=int, default=1000, help="Rows read and written at a time")
+parser.add_argument("--batch-size", type=int, default=128, help="Texts per embeddings request")
+parser.add_argument("--max-workers", type=int, default=4, help="Concurrent embeddings requests")
+parser.add_argument("--max-retries", type=int, default=6, help="Retries per request on rate limits and transient errors")
+parser.add_argument("--model", default=constants.EMBEDDING_MODEL_ID, help="Embedding model id")
+parser.add_argument(
+                    "--dimensions",
+                    type=int,
+                    default=constants.EMBEDDING_DIMENSIONS,
+                    help="Embedding size, text-embedding-3 models return shortened vectors natively",
+                    )
+parser.add_argument("--base-url", default=None, help="OpenAI compatible endpoint, e.g. a local fake server")
+parser.add_argument(
+                    "--fake",
+                    action="store_true",
+                    help="Use the deterministic offline HashEmbedder instead of the OpenAI API",
+                    )
+parser.add_argument("--fake-latency-ms", type=float, default=0.0, help="Simulated latency per request of the fake embedder")
+parser.add_argument(
+                    "--cache-path",
+                    type=Path,
+                    help="SQLite embedding cache shared between runs",
+                    default=Path("data") / "embedding_cache.sqlite",
+                    )
+parser.add_argument("--cache-max-mb", type=int, default=2048, help="Size budget of the embedding cache")
+parser.add_argument("--no-cache", action="store_true", help="Always call the embedder, bypassing the cache")
+parser.add_argument(
+                    "--incremental",
+                    action="store_true",
+                    help=(
+                        "Only embed new and changed products, reusing the embeddings of the existing output. "
+                        "Also writes the upserts to '<output>_delta' and the removed asins to '<output>_removed.json'"
+                    ),
+                    )
+parser.add_argument(
+                    "--state-path",
+                    type=Path,
+                    help="SQLite file with the per-asin fingerprints of the last incremental run (defaults to '<output>.ingestion.sqlite')",
+                    default=None,
+                    )
+
+
+def embed_dataset(input_path: Path, output_path: Path, pipeline: EmbeddingPipeline, chunk_size: int) -> None:
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with ProcessedDatasetWriter(output_path) as writer:
+        for chunk in iter_processed_dataset(input_path, chunk_size):
+            writer.write(pipeline.embed_dataframe(chunk))
+            logger.info(f"Embedded {pipeline.stats.rows} rows so far.")
+
+
+def embed_dataset_incremental(input_path: Path, output_path: Path, pipeline: EmbeddingPipeline, state_path: Path) -> None:
+    """Re-embed only what changed since the last run and write the new snapshot and the delta."""
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    state = IngestionState(state_path)
+    previous = read_processed_dataset(output_path) if output_path.exists() else None
+    delta = compute_delta(read_processed_dataset(input_path), state, pipeline, previous)
+    pipeline.stats.rows += len(delta.upserts)
+    delta.stats.log()
+
+    delta_path = output_path.with_name(f"{output_path.stem}_delta{output_path.suffix}")
+    removed_path = output_path.with_name(f"{output_path.stem}_removed.json")
+    write_processed_dataset(delta.upserts, delta_path)
+    removed_path.write_text(json.dumps(delta.removed))
+    # The previous snapshot may be memory-mapped, so it is replaced rather than overwritten.
+    partial_path = output_path.with_suffix(".partial")
+    with ProcessedDatasetWriter(partial_path, dataset_format(output_path)) as writer:
+        writer.write(delta.snapshot)
+    partial_path.replace(output_path)
+    logger.info(f"Wrote {len(delta.upserts)} upserts to '{delta_path}' and {len(delta.removed)} removals to '{removed_path}'.")
+
+    state.commit(delta)
+    state.close()
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    if args.fake:
+        embedder = HashEmbedder(dimensions=args.dimensions, latency_seconds=args.fake_latency_ms / 1000)
+    else:
+        dimensions = None if args.dimensions == constants.EMBEDDING_DIMENSIONS else args.dimensions
+        embedder = OpenAIEmbedder(model=args.model, base_url=args.base_url, dimensions=dimensions)
+    cache = None if args.no_cache else EmbeddingCache(args.cache_path, max_bytes=args.cache_max_mb * 1024**2)
+    pipeline = EmbeddingPipeline(
+                                embedder,
+                                batch_size=args.batch_size,
+                                max_workers=args.max_workers,
+                                max_retries=args.max_retries,
+                                dimensions=args.dimensions,
+                                cache=cache,
+                                )
+
+    output_path = args.output_path or args.input_path.with_name(f"{args.input_path.stem}_embedded{args.input_path.suffix}")
+    logger.info(f"Embedding '{args.input_path}' with '{embedder.model}' to '{output_path}'.")
+    if args.incremental:
+        state_path = args.state_path or output_path.with_suffix(".ingestion.sqlite")
+        embed_dataset_incremental(args.input_path, output_path, pipeline, state_path)
+    else:
+        embed_dataset(args.input_path, output_path, pipeline, args.chunk_size)
+    pipeline.stats.log()
+    if cache is not None:
+        cache.stats.log()
+        cache.close()
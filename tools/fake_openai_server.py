@@ -0,0 +1,204 @@
+import argparse
+import base64
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from loguru import logger
+from superlinked_app import constants
+from superlinked_app.embeddings import HashEmbedder
+
+parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI embeddings and chat completions endpoints")
+parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+parser.add_argument("--embedding-latency-ms", type=float, default=50.0, help="Simulated latency of an embeddings request")
+parser.add_argument("--chat-latency-ms", type=float, default=400.0, help="Simulated latency of a chat completion")
+
+# Bounds the fake LLM reads from a natural query, e.g. "a price lower than 100".
+UPPER_BOUND_PATTERN = re.compile(r"\b(?:lower|less|smaller|cheaper|under|below)(?: than)?\s*\$?(\d+(?:\.\d+)?)", re.IGNORECASE)
+LOWER_BOUND_PATTERN = re.compile(r"\b(?:bigger|higher|greater|more|over|above)(?: than)?\s*(\d+(?:\.\d+)?)", re.IGNORECASE)
+# Superlinked doesn't put param options in the schema, so they are looked up by param name.
+OPTIONS_BY_PARAM_NAME = {
+    "type": constants.TYPES,
+    "categ": constants.CATEGORIES,
+}
+EMPTY_VALUES = {"string": "", "number": 0.0, "integer": 0, "boolean": False, "array": [], "object": {}}
+
+
+def fill_arguments(schema: dict, prompt: str) -> dict:
+    """Deterministic answer of the fake LLM for a function-calling JSON schema.
+
+    Options of a param (e.g. the product types) are picked when they appear in
+    the prompt, params named like '..._smaller_than' and '..._bigger_than' get
+    the bounds found in the prompt, and everything else is left out so the
+    schema defaults apply. Required params that are still missing get an empty
+    value of their type, so the answer always validates.
+    """
+
+    upper_bound = UPPER_BOUND_PATTERN.search(prompt)
+    lower_bound = LOWER_BOUND_PATTERN.search(prompt)
+
+    arguments = {}
+    for name, property_schema in schema.get("properties", {}).items():
+        options = _find_options(property_schema, schema.get("$defs", {})) or next(
+            (options for hint, options in OPTIONS_BY_PARAM_NAME.items() if hint in name), []
+        )
+        if options:
+            # Case-sensitive, so 'books' selects the 'book' type but not the 'Books' category.
+            found = [option for option in options if re.search(rf"\b{re.escape(option)}s?\b", prompt)]
+            if found:
+                arguments[name] = found if property_schema.get("type") == "array" else found[0]
+        elif "smaller" in name and upper_bound:
+            arguments[name] = float(upper_bound.group(1))
+        elif "bigger" in name and lower_bound:
+            arguments[name] = float(lower_bound.group(1))
+
+    for name in schema.get("required", []):
+        if name not in arguments:
+            arguments[name] = EMPTY_VALUES.get(schema["properties"].get(name, {}).get("type"))
+
+    return arguments
+
+
+def _find_options(property_schema: dict, definitions: dict) -> list[str]:
+    if "$ref" in property_schema:
+        property_schema = definitions.get(property_schema["$ref"].rsplit("/", 1)[-1], {})
+    if "enum" in property_schema:
+        return [option for option in property_schema["enum"] if isinstance(option, str)]
+    for key in ("anyOf", "allOf", "oneOf"):
+        for option_schema in property_schema.get(key, []):
+            if options := _find_options(option_schema, definitions):
+                return options
+    if "items" in property_schema:
+        return _find_options(property_schema["items"], definitions)
+
+    return []
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    embedders: dict[int, HashEmbedder] = {}
+    embedding_latency_seconds = 0.0
+    chat_latency_seconds = 0.0
+    request_counts = {"embeddings": 0, "chat": 0}
+    lock = threading.Lock()
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/embeddings"):
+            self._count("embeddings")
+            time.sleep(self.embedding_latency_seconds)
+            self._send(200, self._embeddings(body))
+        elif self.path.endswith("/chat/completions"):
+            self._count("chat")
+            time.sleep(self.chat_latency_seconds)
+            self._send(200, self._chat_completion(body))
+        else:
+            self._send(404, {"error": {"message": f"Unknown endpoint '{self.path}'.", "type": "invalid_request_error"}})
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _count(self, endpoint: str) -> None:
+        with self.lock:
+            self.request_counts[endpoint] += 1
+
+    def _send(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _embeddings(self, body: dict) -> dict:
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dimensions = body.get("dimensions") or constants.EMBEDDING_DIMENSIONS
+        with self.lock:
+            embedder = self.embedders.setdefault(dimensions, HashEmbedder(dimensions=dimensions))
+
+        data = []
+        for i, text in enumerate(texts):
+            vector = embedder.embed_one(str(text))
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        num_tokens = sum(len(str(text)) // 4 + 1 for text in texts)
+
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", constants.EMBEDDING_MODEL_ID),
+            "usage": {"prompt_tokens": num_tokens, "total_tokens": num_tokens},
+        }
+
+    def _chat_completion(self, body: dict) -> dict:
+        prompt = next((m["content"] for m in reversed(body.get("messages", [])) if m.get("role") == "user"), "")
+        tools = body.get("tools") or []
+        if tools:
+            function = tools[0]["function"]
+            arguments = json.dumps(fill_arguments(function.get("parameters", {}), prompt))
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{"id": "call_0", "type": "function", "function": {"name": function["name"], "arguments": arguments}}],
+            }
+            finish_reason = "tool_calls"
+        else:
+            schema = (body.get("response_format") or {}).get("json_schema", {}).get("schema", {})
+            message = {"role": "assistant", "content": json.dumps(fill_arguments(schema, prompt))}
+            finish_reason = "stop"
+
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": len(prompt) // 4 + 1, "completion_tokens": 16, "total_tokens": len(prompt) // 4 + 17},
+        }
+
+
+def start_fake_openai_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    embedding_latency_seconds: float = 0.0,
+    chat_latency_seconds: float = 0.0,
+) -> ThreadingHTTPServer:
+    """Serve the fake endpoints from a daemon thread, port 0 picks a free port.
+
+    Point the OpenAI clients at it with `OPENAI_BASE_URL=http://<host>:<port>/v1`.
+    """
+
+    handler = type(
+        "ConfiguredFakeOpenAIHandler",
+        (FakeOpenAIHandler,),
+        {
+            "embedders": {},
+            "embedding_latency_seconds": embedding_latency_seconds,
+            "chat_latency_seconds": chat_latency_seconds,
+            "request_counts": {"embeddings": 0, "chat": 0},
+            "lock": threading.Lock(),
+        },
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    server = start_fake_openai_server(
+        args.host, args.port, args.embedding_latency_ms / 1000, args.chat_latency_ms / 1000
+    )
+    logger.info(f"Fake OpenAI server listening on http://{args.host}:{server.server_port}/v1.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,103 @@
+import argparse
+import os
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from loguru import logger
+from superlinked_app import constants, dataset_io, utils
+from superlinked_app.synthetic_catalogue import NO_RATING, CatalogueProfile, SyntheticCatalogue
+
+parser = argparse.ArgumentParser(
+                                description="Generate a synthetic catalogue of embedded products, distributed like a processed sample, for offline benchmarks at scale"
+                                )
+parser.add_argument(
+                    "--sample-path",
+                    type=Path,
+                    help="Processed dataset the type, category, price, rating and text distributions are fitted on",
+                    default=Path("data") / "processed_896_sample.jsonl",
+                    )
+parser.add_argument(
+                    "--output-path",
+                    type=Path,
+                    help="Where to write the catalogue, in the format of its extension (defaults to 'data/synthetic_<rows>.parquet')",
+                    default=None,
+                    )
+parser.add_argument("--rows", type=int, default=100_000, help="Products generated, e.g. 10000 to 10000000")
+parser.add_argument("--dimensions", type=int, default=constants.EMBEDDING_DIMENSIONS, help="Length of the title and description embeddings")
+parser.add_argument("--clusters", type=int, default=1000, help="Clusters of products sharing a type, a category, words and close embeddings")
+parser.add_argument("--cluster-spread", type=float, default=0.6, help="Distance of the products' embeddings from their cluster's center")
+parser.add_argument("--seed", type=int, default=6, help="The same seed always gives the same products")
+parser.add_argument("--check", type=int, default=0, help="Products of the output loaded into an InMemory app and queried, 0 to skip")
+
+
+def summarize(df: pd.DataFrame) -> str:
+    """Type shares, categories of `constants.CATEGORIES`, and price and rating quartiles of a processed dataset."""
+
+    ratings = df["review_rating"].fillna(NO_RATING)
+    categories = df["category"].map(lambda values: sum(value in constants.CATEGORIES for value in values))
+    types = ", ".join(f"{name} {share:.0%}" for name, share in df["type"].value_counts(normalize=True).sort_index().items())
+
+    return (
+        f"types {types}; {np.mean(categories == 0):.0%} without category, {categories.mean():.2f} per product; "
+        f"price quartiles {np.percentile(df['price'], [25, 50, 75]).round(2).tolist()}; "
+        f"{np.mean(ratings == NO_RATING):.0%} unrated, rating quartiles {np.percentile(ratings[ratings != NO_RATING], [25, 50, 75]).round(1).tolist()}"
+    )
+
+
+def check_catalogue(path: Path, num_rows: int, dimensions: int) -> None:
+    """Load the first `num_rows` products into an InMemory app and query them, which fails on rows that don't fit `ProductSchema`."""
+
+    os.environ["QUERY_CACHE_ENABLED"] = "false"
+    os.environ["NLQ_FAST_PATH_ENABLED"] = "false"
+    os.environ["IN_MEMORY_INDEX"] = "exact"
+    os.environ["EMBEDDING_DIMENSIONS"] = str(dimensions)
+
+    from superlinked import framework as sl
+    from superlinked_app import ann_index, index
+    from superlinked_app.config import settings
+    from tools.benchmark_product_store import run_queries
+
+    df = next(dataset_io.iter_processed_dataset(path, num_rows))
+    source = sl.InMemorySource(
+                            index.product,
+                            parser=sl.DataFrameParser(schema=index.product, mapping={index.product.id: "asin"}),
+                            )
+    app = sl.InteractiveExecutor(
+                                sources=[source],
+                                indices=[index.product_index],
+                                vector_database=ann_index.in_memory_vector_database(settings),
+                                ).run()
+    source.put([df])
+    results = run_queries(app, df, 10)
+    if not all(results):
+        raise AssertionError("A query of the synthetic products returned nothing.")
+    logger.info(f"Loaded and queried the first {len(df)} products.")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    output_path = args.output_path or Path("data") / f"synthetic_{args.rows}.parquet"
+
+    sample = dataset_io.read_processed_dataset(args.sample_path)
+    profile = CatalogueProfile.fit(sample)
+    catalogue = SyntheticCatalogue(
+                                profile,
+                                args.rows,
+                                dimensions=args.dimensions,
+                                num_clusters=args.clusters,
+                                cluster_spread=args.cluster_spread,
+                                seed=args.seed,
+                                )
+    logger.info(f"Sample of {len(sample)} products: {summarize(sample)}.")
+    logger.info(f"Synthetic products: {summarize(catalogue.block(0))}.")
+
+    start_time = time.perf_counter()
+    catalogue.write(output_path)
+    elapsed = time.perf_counter() - start_time
+    logger.info(
+        f"Wrote {args.rows} products to '{output_path}' ({output_path.stat().st_size / 2**20:.0f} MiB) in {elapsed:.1f}s "
+        f"({args.rows / elapsed:.0f} rows/sec), peak RSS {utils.peak_rss_mb():.0f} MB."
+    )
+    if args.check:
+        check_catalogue(output_path, args.check, args.dimensions)